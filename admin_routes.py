@@ -1,28 +1,22 @@
 """
-Admin Routes for Ride-Share Application
-This module contains all admin panel routes and functionality.
+Admin panel routes for the Ride-Share application.
+
+Login, the dashboard, user, ride and safety report management, and the
+request profiler's settings page. Imported by app.py once the helpers it
+uses are defined, and registered on the application by create_app().
 """
 
-from flask import render_template, redirect, url_for, flash, request
-from flask_login import login_required, current_user, login_user, logout_user
-from functools import wraps
 from datetime import datetime, timedelta
-from sqlalchemy import func, text
-from app import app, db, User, Ride, Booking, Report, AdminLog, utc_now
 
+from flask import Response, abort, current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+from sqlalchemy.orm import joinedload
 
-def admin_required(f):
-    """Decorator to require admin privileges for a route."""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated:
-            flash('Please log in to access the admin panel.', 'error')
-            return redirect(url_for('admin_login'))
-        if not current_user.is_admin:
-            flash('Access denied. Administrator privileges required.', 'error')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    return decorated_function
+from app import (route, admin_required, get_pending_sos_count, invalidate_pending_sos_count,
+                 publish_sos_event, read_stats_rollup, refresh_stats_rollup, ride_location_contains,
+                 profiler, STATS_PACKAGE_TYPES, STATS_WINDOW_DAYS)
+from models import db, utc_now, User, Ride, Booking, Report, AdminLog
+from sampling_profiler import summarize
 
 
 def log_admin_action(action, target_type=None, target_id=None, details=None):
@@ -38,26 +32,13 @@ def log_admin_action(action, target_type=None, target_id=None, details=None):
         )
         db.session.add(log)
         db.session.commit()
+        return True
     except Exception as e:
-        app.logger.error(f"Failed to log admin action: {str(e)}")
-
+        # Prevent logging failure from crashing the app
+        current_app.logger.error(f"Failed to log admin action: {str(e)}")
+        return False
 
-def _time_ago(dt):
-    """Helper to calculate time ago."""
-    now = datetime.now()
-    diff = now - dt
-    
-    if diff.days > 0:
-        return f"{diff.days}d ago"
-    elif diff.seconds // 3600 > 0:
-        return f"{diff.seconds // 3600}h ago"
-    elif diff.seconds // 60 > 0:
-        return f"{diff.seconds // 60}m ago"
-    else:
-        return "just now"
-
-
-@app.route('/admin/login', methods=['GET', 'POST'])
+@route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Admin login page."""
     if current_user.is_authenticated and current_user.is_admin:
@@ -81,8 +62,7 @@ def admin_login():
     
     return render_template('admin/login.html')
 
-
-@app.route('/admin/logout')
+@route('/admin/logout')
 @login_required
 @admin_required
 def admin_logout():
@@ -90,39 +70,57 @@ def admin_logout():
     log_admin_action('Admin logout')
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('admin_login'))
+    return redirect(url_for('login'))
 
+def _time_ago(dt):
+    """Helper to calculate time ago."""
+    if not dt:
+        return 'N/A'
+    now = datetime.now()
+    diff = now - dt
+    
+    if diff.days > 0:
+        return f"{diff.days}d ago"
+    elif diff.seconds // 3600 > 0:
+        return f"{diff.seconds // 3600}h ago"
+    elif diff.seconds // 60 > 0:
+        return f"{diff.seconds // 60}m ago"
+    else:
+        return "just now"
 
-@app.route('/admin')
-@app.route('/admin/dashboard')
+@route('/admin')
+@route('/admin/dashboard')
 @login_required
 @admin_required
 def admin_dashboard():
     """Admin dashboard with statistics."""
-    # Calculate statistics
-    total_users = User.query.count()
-    new_users_month = User.query.filter(
-        User.created_at >= datetime.now() - timedelta(days=30)
-    ).count()
-    
-    total_rides = Ride.query.count()
-    active_rides = Ride.query.filter(
-        Ride.status.in_([Ride.STATUS_UPCOMING, Ride.STATUS_ONGOING])
-    ).count()
-    
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status=Booking.STATUS_PENDING).count()
-    
-    # SOS and reports
-    active_sos = Report.query.filter_by(
-        report_type='emergency',
-        status='pending'
-    ).count()
-    pending_reports = Report.query.filter_by(status='pending').count()
+    # Counters come from the stats_rollup table (see refresh_stats_rollup).
+    # Gauges are only ever written by a refresh, so their absence means the
+    # rollup has never been built: build it now rather than show zeros.
+    totals, daily = read_stats_rollup()
+    if 'active_rides' not in totals:
+        refresh_stats_rollup(full=True)
+        totals, daily = read_stats_rollup()
+    
+    total_users = totals.get('users_created', 0)
+    new_users_month = sum(daily.get('users_created', {}).values())
+    total_rides = totals.get('rides_created', 0)
+    active_rides = totals.get('active_rides', 0)
+    total_bookings = totals.get('bookings_created', 0)
+    pending_bookings = totals.get('pending_bookings', 0)
+    
+    # SOS and reports stay live: the SOS count is shared with the sidebar
+    # badge cache and pending reports is a small indexed count
+    try:
+        active_sos = get_pending_sos_count()
+        pending_reports = Report.query.filter_by(status='pending').count()
+    except:
+        active_sos = 0
+        pending_reports = 0
     
     # Trust metrics
-    total_green_flags = db.session.query(func.sum(User.green_flags)).scalar() or 0
-    total_red_flags = db.session.query(func.sum(User.red_flags)).scalar() or 0
+    total_green_flags = totals.get('green_flags', 0)
+    total_red_flags = totals.get('red_flags', 0)
     total_flags = total_green_flags + total_red_flags
     avg_trust_score = round((total_green_flags / total_flags * 100) if total_flags > 0 else 0, 1)
     
@@ -166,40 +164,28 @@ def admin_dashboard():
     # Sort by time
     recent_activity.sort(key=lambda x: x['time_ago'])
     
-    # User growth data (last 30 days)
+    # User growth data (last 30 days) from the daily rollup buckets
+    growth = daily.get('users_created', {})
+    today = utc_now().date()
+    
     user_growth_labels = []
     user_growth_data = []
-    for i in range(29, -1, -1):
-        day = datetime.now() - timedelta(days=i)
-        day_start = datetime(day.year, day.month, day.day)
-        day_end = day_start + timedelta(days=1)
-        count = User.query.filter(
-            User.created_at >= day_start,
-            User.created_at < day_end
-        ).count()
+    for i in range(STATS_WINDOW_DAYS - 1, -1, -1):
+        day = today - timedelta(days=i)
         user_growth_labels.append(day.strftime('%b %d'))
-        user_growth_data.append(count)
+        user_growth_data.append(growth.get(day, 0))
     
     # Package distribution
-    package_distribution = [
-        Ride.query.filter_by(package_type='daily').count(),
-        Ride.query.filter_by(package_type='weekly').count(),
-        Ride.query.filter_by(package_type='biweekly').count(),
-        Ride.query.filter_by(package_type='monthly').count()
-    ]
-    
-    pending_sos_count = active_sos
+    package_distribution = [totals.get(f'rides_package:{package_type}', 0)
+                            for package_type in STATS_PACKAGE_TYPES]
     
     return render_template('admin/dashboard.html',
                          stats=stats,
                          recent_activity=recent_activity,
                          user_growth_labels=user_growth_labels,
                          user_growth_data=user_growth_data,
-                         package_distribution=package_distribution,
-                         pending_sos_count=pending_sos_count)
-
-
-@app.route('/admin/users')
+                         package_distribution=package_distribution)
+@route('/admin/users')
 @login_required
 @admin_required
 def admin_users():
@@ -226,16 +212,11 @@ def admin_users():
     
     users = query.paginate(page=request.args.get('page', 1, type=int), per_page=50, error_out=False)
     
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
     return render_template('admin/users/list.html',
                          users=users,
                          search=search,
-                         sort_by=sort_by,
-                         pending_sos_count=pending_sos_count)
-
-
-@app.route('/admin/users/<int:user_id>')
+                         sort_by=sort_by)
+@route('/admin/users/<int:user_id>')
 @login_required
 @admin_required
 def admin_user_detail(user_id):
@@ -249,17 +230,12 @@ def admin_user_detail(user_id):
     completed_offered = Ride.query.filter_by(driver_id=user_id, status=Ride.STATUS_COMPLETED).count()
     completion_rate = round((completed_offered / total_offered * 100) if total_offered > 0 else 0, 1)
     
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
     return render_template('admin/users/detail.html',
                          user=user,
                          rides_offered=rides_offered,
                          rides_taken=rides_taken,
-                         completion_rate=completion_rate,
-                         pending_sos_count=pending_sos_count)
-
-
-@app.route('/admin/rides')
+                         completion_rate=completion_rate)
+@route('/admin/rides')
 @login_required
 @admin_required
 def admin_rides():
@@ -273,10 +249,9 @@ def admin_rides():
         query = query.filter_by(status=status_filter)
     
     if search:
-        query = query.join(User).filter(
+        query = query.join(User, Ride.driver).filter(
             db.or_(
-                Ride.start_location.ilike(f'%{search}%'),
-                Ride.end_location.ilike(f'%{search}%'),
+                ride_location_contains(search),
                 User.username.ilike(f'%{search}%')
             )
         )
@@ -287,29 +262,48 @@ def admin_rides():
         error_out=False
     )
     
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
     return render_template('admin/rides/list.html',
                          rides=rides,
                          status_filter=status_filter,
-                         search=search,
-                         pending_sos_count=pending_sos_count)
-
-
-@app.route('/admin/rides/<int:ride_id>')
+                         search=search)
+@route('/admin/rides/<int:ride_id>')
 @login_required
 @admin_required
 def admin_ride_detail(ride_id):
     """Admin ride detail view."""
     ride = Ride.query.get_or_404(ride_id)
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
     
-    return render_template('admin/rides/detail.html',
-                         ride=ride,
-                         pending_sos_count=pending_sos_count)
+    return render_template('admin/rides/detail.html', ride=ride)
 
+@route('/admin/rides/<int:ride_id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def admin_cancel_ride(ride_id):
+    """Admin cancel ride."""
+    ride = Ride.query.get_or_404(ride_id)
+    
+    if ride.status in ['CANCELLED', 'COMPLETED']:
+        flash('Ride is already cancelled or completed.', 'warning')
+        return redirect(url_for('admin_ride_detail', ride_id=ride_id))
+    
+    ride.status = 'CANCELLED'
+    
+    # Cancel all pending bookings
+    for booking in ride.bookings:
+        if booking.status == 'PENDING':
+            booking.status = 'REJECTED'
+        elif booking.status == 'CONFIRMED':
+            booking.status = 'CANCELLED'
+            
+    db.session.commit()
+    
+    log_admin_action('Cancel Ride', target_type='Ride', target_id=ride.id, 
+                    details=f'Ride {ride.id} cancelled by admin')
+    
+    flash('Ride has been cancelled successfully.', 'success')
+    return redirect(url_for('admin_ride_detail', ride_id=ride_id))
 
-@app.route('/admin/safety')
+@route('/admin/safety')
 @login_required
 @admin_required
 def admin_safety():
@@ -317,11 +311,11 @@ def admin_safety():
     sos_alerts = Report.query.filter_by(
         report_type='emergency',
         status='pending'
-    ).order_by(Report.created_at.desc()).all()
+    ).options(joinedload(Report.user)).order_by(Report.created_at.desc()).all()
     
     reports = Report.query.filter_by(
         status='pending'
-    ).order_by(Report.created_at.desc()).limit(20).all()
+    ).options(joinedload(Report.user)).order_by(Report.created_at.desc()).limit(20).all()
     
     pending_sos_count = len(sos_alerts)
     
@@ -329,9 +323,7 @@ def admin_safety():
                          sos_alerts=sos_alerts,
                          reports=reports,
                          pending_sos_count=pending_sos_count)
-
-
-@app.route('/admin/reports/<int:report_id>/resolve', methods=['POST'])
+@route('/admin/reports/<int:report_id>/resolve', methods=['POST'])
 @login_required
 @admin_required
 def admin_resolve_report(report_id):
@@ -340,14 +332,15 @@ def admin_resolve_report(report_id):
     report.status = 'resolved'
     report.resolved_at = utc_now()
     db.session.commit()
+    invalidate_pending_sos_count()
+    if report.report_type == 'emergency':
+        publish_sos_event('sos_cancel', report)
     
     log_admin_action('Resolved report', 'report', report_id, f'Type: {report.report_type}')
     
     flash('Report has been resolved.', 'success')
     return redirect(url_for('admin_safety'))
-
-
-@app.route('/admin/reports/<int:report_id>/dismiss', methods=['POST'])
+@route('/admin/reports/<int:report_id>/dismiss', methods=['POST'])
 @login_required
 @admin_required
 def admin_dismiss_report(report_id):
@@ -356,8 +349,65 @@ def admin_dismiss_report(report_id):
     report.status = 'dismissed'
     report.resolved_at = utc_now()
     db.session.commit()
+    invalidate_pending_sos_count()
+    if report.report_type == 'emergency':
+        publish_sos_event('sos_cancel', report)
     
     log_admin_action('Dismissed report', 'report', report_id, f'Type: {report.report_type}')
     
     flash('Report has been dismissed.', 'success')
     return redirect(url_for('admin_safety'))
+
+@route('/admin/profiling', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_profiling():
+    """Switch request profiling on or off and browse the sampled stacks per endpoint."""
+    if request.method == 'POST':
+        endpoint = request.form.get('endpoint', '')
+        try:
+            fraction = float(request.form.get('percent', '1')) / 100
+            interval_ms = int(request.form.get('interval_ms', '5'))
+        except ValueError:
+            fraction = interval_ms = None
+        if fraction is None or not 0 < fraction <= 1 or not 1 <= interval_ms <= 100 or \
+                (endpoint and endpoint not in current_app.view_functions):
+            flash('Choose a percentage between 0 and 100, an interval of 1-100 ms and a known endpoint.', 'error')
+            return redirect(url_for('admin_profiling'))
+        enabled = request.form.get('enabled') == 'on'
+        profiler.update_settings(enabled=enabled, fraction=fraction, endpoint=endpoint, interval_ms=interval_ms)
+        log_admin_action('Profiling ' + ('enabled' if enabled else 'disabled'),
+                         details=f'{fraction:.2%} of {endpoint or "all"} requests every {interval_ms} ms')
+        flash('Profiling settings saved. Every worker picks them up within a second.', 'success')
+        return redirect(url_for('admin_profiling'))
+    
+    profiles = profiler.profiles()
+    selected = request.args.get('view') or next(iter(sorted(profiles)), None)
+    return render_template('admin/profiling.html',
+                         settings=profiler.settings(),
+                         endpoints=sorted(endpoint for endpoint in current_app.view_functions if endpoint != 'static'),
+                         samples={endpoint: sum(stacks.values()) for endpoint, stacks in sorted(profiles.items())},
+                         selected=selected,
+                         hot_functions=summarize(profiles[selected]) if selected in profiles else [])
+
+@route('/admin/profiling/<view>.collapsed')
+@login_required
+@admin_required
+def admin_profile_download(view):
+    """An endpoint's sampled stacks in collapsed format, for flamegraph.pl or speedscope."""
+    stacks = profiler.profiles().get(view)
+    if not stacks:
+        abort(404)
+    body = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    return Response(body, mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={view}.collapsed'})
+
+@route('/admin/profiling/clear', methods=['POST'])
+@login_required
+@admin_required
+def admin_profile_clear():
+    """Delete every collected profile."""
+    profiler.clear()
+    log_admin_action('Cleared profiles')
+    flash('Profiles cleared.', 'success')
+    return redirect(url_for('admin_profiling'))
@@ -4,9 +4,13 @@ Ride-Share Web Application - Main Application File
 This is the main Flask application file that handles:
 1. User authentication (register, login, logout)
 2. Ride management (offer, search, book, cancel)
-3. Database models and relationships
-4. Form handling and validation
-5. Route definitions and business logic
+3. Route definitions and business logic
+4. The application factory, create_app()
+
+Database models live in models.py, forms in forms.py, the admin panel in
+admin_routes.py and chatbot answers in chatbot.py. Forms and the chatbot
+are imported by the views that use them, so starting a worker or running
+a script does not load WTForms or the Gemini SDK.
 
 The application uses:
 - Flask: Web framework
@@ -19,72 +23,170 @@ Author: Antigravity
 Date: January 2026
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, IntegerField, FloatField, DateTimeField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
-import bcrypt
-import os
-from sqlalchemy import inspect, text, func
-from datetime import datetime, timedelta, timezone
-import bcrypt
+import sys
+
+if __name__ == '__main__':
+    # Run as a script: admin_routes.py and chatbot.py import from `app`, and
+    # must get this module rather than load a second copy of it
+    sys.modules['app'] = sys.modules[__name__]
+
+from flask import Flask, Response, current_app, g, render_template, request, redirect, url_for, flash, jsonify
+from sqlalchemy.orm import contains_eager, joinedload, load_only, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 import os
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, text, func, update, select, case, event, table, column, literal_column, bindparam
+from datetime import date, datetime, timedelta
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import uuid
-import os
-from google import genai
+import base64
+import hashlib
+import hmac
+import json
+import math
+import sqlite3
+import time
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables first: prometheus_client reads PROMETHEUS_MULTIPROC_DIR
+# when it is imported
 load_dotenv()
 
-# Import admin routes (must be after app initialization)
-# Will be imported at the end of file after all models are defined
-
-def utc_now():
-    """Return current UTC time as a naive datetime (for SQLite compatibility).
-    This avoids the deprecation warning while maintaining compatibility with existing data."""
-    return datetime.now(timezone.utc).replace(tzinfo=None)
-
-# Initialize Flask application and configure it
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24).hex()
-# Database Configuration
-database_url = os.environ.get('DATABASE_URL')
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///rideshare.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['GOOGLE_MAPS_API_KEY'] = os.environ.get('GOOGLE_MAPS_API_KEY', '')
-app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY', '')
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+from prometheus_client import Counter, Gauge, Histogram
+from models import (db, utc_now, FUEL_PRICES, AVERAGE_SPEED, User, Review, Car, Wallet, Ride, Booking,
+                    Report, Expense, AdminLog, StatsRollup, StatsEvent)
+from ttl_cache import create_cache
+from geo_index import (RideSpatialIndex, RouteCorridorIndex, simplify_polyline, match_route,
+                       ROUTE_MAX_POINTS)
+from sos_broker import create_broker, format_sse
+from query_counter import QueryCounter
+import metrics
+from sampling_profiler import SamplingProfiler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Process-wide services, shared by every application create_app() builds
+# Shared cache for cheap-but-hot values; CACHE_URL is memory:// (per process) or redis://...
+cache = create_cache(os.environ.get('CACHE_URL', 'memory://'))
+# Prometheus metrics at /metrics. Processes sharing PROMETHEUS_MULTIPROC_DIR (gunicorn workers
+# and the ride scheduler) report one merged view; without it each process reports only its own.
+# With METRICS_TOKEN set, scrapers must send it as a bearer token.
+HTTP_REQUEST_DURATION = Histogram(
+    'rideshare_http_request_duration_seconds', 'Time to build a response, by Flask endpoint', ['endpoint'])
+HTTP_REQUESTS = Counter(
+    'rideshare_http_requests_total', 'Responses sent, by Flask endpoint and status code', ['endpoint', 'status'])
+DB_QUERIES = Counter(
+    'rideshare_db_queries_total', 'SQL statements run while handling requests, by Flask endpoint', ['endpoint'])
+DB_QUERY_SECONDS = Counter(
+    'rideshare_db_query_seconds_total', 'Time spent in SQL statements, by Flask endpoint', ['endpoint'])
+CACHE_REQUESTS = Counter(
+    'rideshare_cache_requests_total', 'Cache lookups, by cache and result (hit or miss)', ['cache', 'result'])
+CHATBOT_DURATION = Histogram(
+    'rideshare_chatbot_request_duration_seconds', 'Gemini calls, by outcome (ok, error, timeout, saturated)',
+    ['outcome'], buckets=(.1, .25, .5, 1, 2, 5, 10, 20, 30))
+SOS_STREAMS = Gauge(
+    'rideshare_sos_streams', 'Admin SOS alert streams open', multiprocess_mode='livesum')
+# Request profiler, switched on from /admin/profiling. Its settings and the collapsed stacks
+# it records are shared by every worker through PROFILE_DIR (default instance/profiles)
+profiler = SamplingProfiler(os.environ.get('PROFILE_DIR') or os.path.join(BASE_DIR, 'instance', 'profiles'))
+
+# Extensions, bound to the application by create_app()
+login_manager = LoginManager()
+login_manager.login_view = 'login'
+login_manager.login_message_category = 'info'
+query_counter = QueryCounter()
+
+
+# Routes and request hooks
+# Views and hooks are declared with @route and @hook, which work like
+# @app.route and @app.before_request etc. but wait for create_app() to
+# register them, so importing this module (or admin_routes.py) does not
+# need an application.
+_app_setup = []
+
+def route(rule, **options):
+    """Declare a view for `rule`; options are those of Flask.route."""
+    def decorator(view):
+        _app_setup.append(lambda app: app.add_url_rule(rule, view_func=view, **options))
+        return view
+    return decorator
+
+def hook(name):
+    """Declare a request hook or context processor, e.g. @hook('after_request')."""
+    def decorator(function):
+        _app_setup.append(lambda app: getattr(app, name)(function))
+        return function
+    return decorator
+
+def create_app(config=None):
+    """
+    Create and configure the Flask application.
+    
+    Settings are read from the environment (and .env); extensions are bound
+    and every route and hook declared with @route/@hook is registered.
+    
+    Args:
+        config: dict of settings applied over the environment's (optional)
+    
+    Returns:
+        Flask: the new application
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.urandom(24).hex()
+    # Database Configuration
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///rideshare.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['GOOGLE_MAPS_API_KEY'] = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+    app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY', '')
+    app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'static', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+    # Chatbot: seconds to wait for Gemini, and how many calls may be in flight at once
+    app.config['CHATBOT_TIMEOUT_SECONDS'] = float(os.environ.get('CHATBOT_TIMEOUT_SECONDS', '20'))
+    app.config['CHATBOT_MAX_CONCURRENCY'] = int(os.environ.get('CHATBOT_MAX_CONCURRENCY', '8'))
+    # Gemini API endpoint override, e.g. a proxy or a local stand-in server; empty for Google's
+    app.config['GEMINI_BASE_URL'] = os.environ.get('GEMINI_BASE_URL', '')
+    # Chatbot answer cache: model answers kept, seeded FAQ answers pinned
+    app.config['CHATBOT_CACHE_SIZE'] = int(os.environ.get('CHATBOT_CACHE_SIZE', '500'))
+    app.config['CHATBOT_CACHE_TTL'] = int(os.environ.get('CHATBOT_CACHE_TTL', str(24 * 3600)))
+    # SQL instrumentation: flag a request that runs one statement shape more than
+    # SQL_REPEAT_LIMIT times ('warn', 'raise' or 'off'); the HTML toolbar follows debug mode unless set
+    app.config['SQL_REPEAT_LIMIT'] = int(os.environ.get('SQL_REPEAT_LIMIT', '10'))
+    app.config['SQL_REPEAT_ACTION'] = os.environ.get('SQL_REPEAT_ACTION', 'warn')
+    app.config['SQL_DEBUG_TOOLBAR'] = {'1': True, '0': False}.get(os.environ.get('SQL_DEBUG_TOOLBAR', ''))
+    # Slow query log: statements over SQL_SLOW_QUERY_MS are written with their plan to a rotating
+    # file (default instance/slow_queries.log); unset disables it
+    app.config['SQL_SLOW_QUERY_MS'] = float(os.environ['SQL_SLOW_QUERY_MS']) if os.environ.get('SQL_SLOW_QUERY_MS') else None
+    if os.environ.get('SQL_SLOW_QUERY_LOG'):
+        app.config['SQL_SLOW_QUERY_LOG'] = os.environ['SQL_SLOW_QUERY_LOG']
+    app.config.update(config or {})
+    
+    db.init_app(app)
+    login_manager.init_app(app)
+    # Before the hooks below: after_request hooks run in reverse order, and
+    # record_request_metrics needs the request's SQL statistics
+    query_counter.init_app(app)
+    for setup in _app_setup:
+        setup(app)
+    return app
+
 # Context processor to inject common variables into all templates
-@app.context_processor
+@hook('context_processor')
 def inject_now():
     """Make 'now' available in all templates for footer copyright year etc."""
     return {'now': datetime.now()}
 
-@app.route('/uploads/<filename>')
+@route('/uploads/<filename>')
 def uploaded_file(filename):
     """Serve uploaded files."""
     from flask import send_from_directory
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-# Constants
-FUEL_PRICES = {
-    'petrol': 102.0,  # ₹102 per liter
-    'diesel': 88.0,   # ₹88 per liter
-    'electric': 10.0  # ₹10 per kWh
-}
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
 # Car Database with mileage and fuel type
 CAR_DATABASE = {
@@ -121,11 +223,37 @@ CAR_DATABASE = {
     }
 }
 
-# Initialize extensions
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-login_manager.login_message_category = 'info'
+# Request metrics
+# Registered after QueryCounter: after_request hooks run in reverse order, so
+# the request's SQL statistics (which also carry its start time) are still
+# available here. A request that raised never reaches after_request, so its
+# statistics are still there at teardown and it is recorded as a 500.
+# g and request are resolved once per call: each proxy lookup costs about a
+# microsecond, which would be most of the overhead.
+def record_request(status_code):
+    sql_stats = g._get_current_object().get('sql_stats')
+    if sql_stats is None:
+        return
+    endpoint = request._get_current_object().endpoint or 'unmatched'
+    HTTP_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - sql_stats.started)
+    HTTP_REQUESTS.labels(endpoint, status_code).inc()
+    if sql_stats.count:
+        DB_QUERIES.labels(endpoint).inc(sql_stats.count)
+        DB_QUERY_SECONDS.labels(endpoint).inc(sql_stats.duration)
+    metrics.run_callbacks()
+
+@hook('after_request')
+def record_request_metrics(response):
+    record_request(response.status_code)
+    return response
+
+@hook('teardown_request')
+def record_failed_request_metrics(exc):
+    record_request(500)
+
+@hook('before_request')
+def profile_selected_requests():
+    profiler.maybe_profile(request._get_current_object())
 
 # Add package durations
 PACKAGE_DURATIONS = {
@@ -135,9 +263,6 @@ PACKAGE_DURATIONS = {
     'monthly': 30
 }
 
-# Average speed for time estimation (km/h)
-AVERAGE_SPEED = 40  # Considering city traffic and stops
-
 # Time restrictions for different package types (in hours, 24-hour format)
 TIME_RESTRICTIONS = {
     'daily': {
@@ -174,7 +299,7 @@ def save_upload_file(file, prefix=''):
         unique_filename = f"{prefix}_{uuid.uuid4().hex}_{filename}"
         
         # Create upload directory if it doesn't exist
-        upload_dir = app.config['UPLOAD_FOLDER']
+        upload_dir = current_app.config['UPLOAD_FOLDER']
         os.makedirs(upload_dir, exist_ok=True)
         
         # Save file
@@ -231,7 +356,7 @@ def validate_ride_time(start_datetime, distance, package_type):
     
     return True, None
 
-@app.route('/fix_sequences_temp_route')
+@route('/fix_sequences_temp_route')
 def fix_sequences_route():
     """Temporary route to fix PostgreSQL sequences."""
     try:
@@ -242,581 +367,6 @@ def fix_sequences_route():
         return f"Error: {str(e)}"
 
 
-class User(UserMixin, db.Model):
-    """Model for user accounts."""
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(256))
-    phone = db.Column(db.String(20), nullable=True)
-    is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
-    
-    # Stats and ratings
-    total_rides = db.Column(db.Integer, default=0)
-    rating = db.Column(db.Float, default=0.0)
-    green_flags = db.Column(db.Integer, default=0)
-    red_flags = db.Column(db.Integer, default=0)
-    
-    # Relationships
-    cars = db.relationship('Car', backref='owner', lazy=True)
-    rides_offered = db.relationship('Ride', backref='driver', lazy=True, foreign_keys='Ride.driver_id')
-    bookings = db.relationship('Booking', backref='passenger', lazy=True, foreign_keys='Booking.passenger_id')
-    reviews_given = db.relationship('Review', backref='reviewer', lazy=True, foreign_keys='Review.reviewer_id')
-    reviews_received = db.relationship('Review', backref='reviewed', lazy=True, foreign_keys='Review.reviewed_id')
-    reports = db.relationship('Report', backref='user', lazy=True)
-    
-    def __repr__(self):
-        return f'<User {self.username}>'
-        
-    def set_password(self, password):
-        """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
-        
-    def check_password(self, password):
-        """Check if the provided password matches the stored hash."""
-        return check_password_hash(self.password_hash, password)
-        
-    @property
-    def current_ride(self):
-        """Get the user's current active ride (as driver or passenger)."""
-        current_time = utc_now()
-        
-        # Check if user is driving any current rides
-        driver_ride = next((ride for ride in self.rides_offered 
-                          if ride.start_date <= current_time 
-                          and ride.end_date >= current_time), None)
-        if driver_ride:
-            return driver_ride
-            
-        # Check if user is a passenger in any current rides
-        passenger_booking = next((booking for booking in self.bookings 
-                                if booking.status == Booking.STATUS_CONFIRMED
-                                and booking.ride.start_date <= current_time 
-                                and booking.ride.end_date >= current_time), None)
-        if passenger_booking:
-            return passenger_booking.ride
-            
-        return None
-
-class Review(db.Model):
-    """Model for user reviews."""
-    # Review type constants
-    TYPE_PASSENGER_TO_DRIVER = 'passenger_to_driver'
-    TYPE_DRIVER_TO_PASSENGER = 'driver_to_passenger'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    reviewer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    reviewed_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
-    rating = db.Column(db.Integer, nullable=False)
-    comment = db.Column(db.Text)
-    flag_type = db.Column(db.String(10), nullable=True)  # 'green' or 'red'
-    review_type = db.Column(db.String(30), nullable=True)  # 'passenger_to_driver' or 'driver_to_passenger'
-    created_at = db.Column(db.DateTime, default=utc_now)
-    
-    def __repr__(self):
-        return f'<Review {self.reviewer_id} -> {self.reviewed_id}>'
-    
-    @property
-    def is_driver_review(self):
-        """Check if this is a review of a driver (by a passenger)."""
-        return self.review_type == self.TYPE_PASSENGER_TO_DRIVER
-    
-    @property
-    def is_passenger_review(self):
-        """Check if this is a review of a passenger (by a driver)."""
-        return self.review_type == self.TYPE_DRIVER_TO_PASSENGER
-
-class Car(db.Model):
-    """Model for user's cars."""
-    id = db.Column(db.Integer, primary_key=True)
-    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    make = db.Column(db.String(50), nullable=False)
-    model = db.Column(db.String(50), nullable=False)
-    year = db.Column(db.Integer, nullable=False)
-    color = db.Column(db.String(20), nullable=False)
-    license_plate = db.Column(db.String(20), unique=True, nullable=False)
-    fuel_type = db.Column(db.String(20), nullable=False)  # petrol, diesel, electric
-    mileage = db.Column(db.Float, nullable=False)  # km per liter
-    ac = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
-    
-    def __repr__(self):
-        return f'<Car {self.make} {self.model} ({self.license_plate})>'
-
-class Wallet(db.Model):
-    """Wallet model for storing ride expenses."""
-    id = db.Column(db.Integer, primary_key=True)
-    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
-    fuel_cost = db.Column(db.Float, nullable=False, default=0.0)
-    toll_cost = db.Column(db.Float, nullable=False, default=0.0)
-    other_costs = db.Column(db.Float, nullable=False, default=0.0)
-    description = db.Column(db.String(200))
-    date_added = db.Column(db.DateTime, nullable=False, default=utc_now)
-
-class Ride(db.Model):
-    """Model for rides."""
-    # Status Constants
-    STATUS_UPCOMING = 'UPCOMING'
-    STATUS_ONGOING = 'ONGOING'
-    STATUS_COMPLETED = 'COMPLETED'
-    STATUS_CANCELLED = 'CANCELLED'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False)
-    start_location = db.Column(db.String(200), nullable=False)
-    end_location = db.Column(db.String(200), nullable=False)
-    
-    # Scheduled times
-    start_date = db.Column(db.DateTime, nullable=False)
-    end_date = db.Column(db.DateTime, nullable=False)
-    
-    # Actual times
-    actual_start_time = db.Column(db.DateTime, nullable=True)
-    actual_end_time = db.Column(db.DateTime, nullable=True)
-    
-    # Estimated times
-    estimated_end_time = db.Column(db.DateTime, nullable=True)
-    error_buffer_minutes = db.Column(db.Integer, default=15)  # Buffer time in minutes
-    
-    available_seats = db.Column(db.Integer, nullable=False)
-    price_per_seat = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='UPCOMING')  # UPCOMING, ONGOING, COMPLETED, CANCELLED
-    distance = db.Column(db.Float, nullable=False)  # Distance in kilometers
-    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
-    
-    # Completion tracking
-    auto_completed = db.Column(db.Boolean, default=False)  # Track if auto-completed by time
-    completed_by = db.Column(db.String(20), nullable=True)  # 'DRIVER', 'SYSTEM', 'AUTO'
-    
-    # Add package_type with nullable=True to handle existing records
-    package_type = db.Column(db.String(20), nullable=True, default='weekly')  # weekly, biweekly, monthly
-    
-    # Safety images
-    license_photo = db.Column(db.String(300), nullable=True)  # Driver's license photo
-    driver_photo = db.Column(db.String(300), nullable=True)  # Driver's photo
-    vehicle_photo = db.Column(db.String(300), nullable=True)  # Vehicle photo
-    
-    # Relationships
-    bookings = db.relationship('Booking', backref='ride', lazy=True)
-    car = db.relationship('Car', backref='rides', lazy=True)
-    wallet = db.relationship('Wallet', backref='ride', lazy=True)
-    reports = db.relationship('Report', backref='ride', lazy=True)
-    expenses = db.relationship('Expense', backref='ride', lazy=True)
-    
-    def __repr__(self):
-        return f'<Ride {self.id} {self.start_location} to {self.end_location}>'
-    
-    @property
-    def origin(self):
-        """Alias for start_location for template compatibility."""
-        return self.start_location
-    
-    @property
-    def destination(self):
-        """Alias for end_location for template compatibility."""
-        return self.end_location
-    
-    @property
-    def seats(self):
-        """Alias for available_seats for template compatibility."""
-        return self.available_seats
-    
-    def get_total_wallet_expenses(self):
-        """Calculate total expenses for this ride."""
-        total = 0
-        for wallet_entry in self.wallet:
-            total += wallet_entry.fuel_cost + wallet_entry.toll_cost + wallet_entry.other_costs
-        return total
-        
-    def get_estimated_total_cost(self):
-        """Calculate estimated total cost for the ride (fuel only)."""
-        # Get car and fuel details
-        fuel_price = FUEL_PRICES.get(self.car.fuel_type.lower(), 100.0)  # Default to 100 if fuel type not found
-        mileage = self.car.mileage or 15.0  # Default to 15 kmpl if mileage not set
-        
-        # Calculate fuel cost based on distance and mileage
-        fuel_cost = (self.distance / mileage) * fuel_price
-        
-        return round(fuel_cost, 2)
-        
-    def get_average_cost_per_seat(self):
-        """Calculate average cost per seat based on package type cost sharing."""
-        total_cost = self.get_estimated_total_cost()
-        
-        if self.package_type == 'daily':
-            # Daily: Driver pays 50%, passengers share 50%
-            passenger_share = total_cost * 0.50
-        else:
-            # Weekly/Bi-weekly/Monthly: Driver pays 25%, passengers share 75%
-            passenger_share = total_cost * 0.75
-        
-        # Price per seat = passenger share divided by available seats
-        per_seat_cost = passenger_share / self.available_seats if self.available_seats > 0 else 0
-        return round(per_seat_cost, 2)
-        
-    def calculate_fare_for_booking(self, booking):
-        """Calculate fare for a specific booking."""
-        # Only allow cancellation of pending/confirmed bookings
-        if booking.status not in [Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]:
-            return 0
-            
-        per_seat_cost = self.get_average_cost_per_seat()
-        return round(per_seat_cost * booking.seats, 2)
-        
-    def get_estimated_time(self):
-        """Calculate estimated time to reach destination in minutes."""
-        if not self.distance:
-            return 0
-        # Calculate time in hours, then convert to minutes
-        time_hours = self.distance / AVERAGE_SPEED
-        return round(time_hours * 60)
-    
-    def get_estimated_end_time(self):
-        """Calculate estimated end time of the ride."""
-        if self.estimated_end_time:
-            return self.estimated_end_time
-        estimated_minutes = self.get_estimated_time()
-        # Use actual_start_time if ride has started, otherwise use scheduled start_date
-        start_time = self.actual_start_time if self.actual_start_time else self.start_date
-        return start_time + timedelta(minutes=estimated_minutes)
-    
-    def get_max_completion_time(self):
-        """Calculate maximum time for ride completion (estimated_end_time + error_buffer)."""
-        estimated_end = self.get_estimated_end_time()
-        buffer = self.error_buffer_minutes or 15
-        return estimated_end + timedelta(minutes=buffer)
-    
-    def should_auto_complete(self):
-        """Check if ride should be auto-completed based on time."""
-        if self.status != self.STATUS_ONGOING:
-            return False
-        current_time = utc_now()
-        max_time = self.get_max_completion_time()
-        return current_time >= max_time
-    
-    def is_severely_overdue(self):
-        """Check if UPCOMING ride is more than 1 hour overdue."""
-        if self.status != self.STATUS_UPCOMING:
-            return False
-        current_time = utc_now()
-        hours_overdue = (current_time - self.start_date).total_seconds() / 3600
-        return hours_overdue > 1
-    
-    def can_start(self):
-        """Check if ride can be started."""
-        return self.status == self.STATUS_UPCOMING
-    
-    def can_end(self):
-        """Check if ride can be ended."""
-        return self.status == self.STATUS_ONGOING
-    
-    def start_ride(self):
-        """Start the ride - change status to ONGOING."""
-        if not self.can_start():
-            return False, "Ride cannot be started"
-        
-        self.status = self.STATUS_ONGOING
-        self.actual_start_time = utc_now()
-        
-        # Calculate estimated end time if not set
-        if not self.estimated_end_time:
-            self.estimated_end_time = self.get_estimated_end_time()
-        
-        # Set dynamic buffer based on distance
-        if self.distance <= 50:
-            self.error_buffer_minutes = 30
-        elif self.distance <= 100:
-            self.error_buffer_minutes = 45
-        elif self.distance <= 200:
-            self.error_buffer_minutes = 60
-        else:
-            self.error_buffer_minutes = 90
-        
-        # Update all confirmed bookings to ONGOING
-        for booking in self.bookings:
-            if booking.status == booking.STATUS_CONFIRMED:
-                booking.passenger_ride_status = 'ONGOING'
-        
-        return True, "Ride started successfully"
-    
-    def end_ride(self, completed_by='DRIVER'):
-        """End the ride - change status to COMPLETED."""
-        if not self.can_end():
-            return False, "Ride cannot be ended"
-        
-        self.status = self.STATUS_COMPLETED
-        self.actual_end_time = utc_now()
-        self.completed_by = completed_by
-        
-        # Mark all confirmed/ongoing bookings as completed
-        for booking in self.bookings:
-            if booking.status in [booking.STATUS_CONFIRMED]:
-                booking.status = booking.STATUS_COMPLETED
-                booking.passenger_ride_status = 'COMPLETED'
-                if not booking.passenger_completed_at:
-                    booking.passenger_completed_at = utc_now()
-        
-        return True, "Ride ended successfully"
-    
-    def auto_complete_ride(self):
-        """Auto-complete ride when time exceeds buffer."""
-        self.auto_completed = True
-        return self.end_ride(completed_by='AUTO')
-    
-    def notify_passengers(self, message_type):
-        """Send notification to all confirmed passengers."""
-        # In production, this would send actual notifications (email/SMS/push)
-        # For now, it logs the notification
-        passengers = [b.passenger for b in self.bookings if b.status in [b.STATUS_CONFIRMED, b.STATUS_PENDING]]
-        notification_messages = {
-            'RIDE_STARTED': f'Your ride from {self.start_location} to {self.end_location} has started!',
-            'RIDE_ENDED': f'Your ride from {self.start_location} to {self.end_location} has been completed.',
-            'RIDE_CANCELLED': f'The ride from {self.start_location} to {self.end_location} has been cancelled.'
-        }
-        app.logger.info(f'Notification {message_type}: {notification_messages.get(message_type)} sent to {len(passengers)} passengers')
-        return True
-    
-    def calculate_fare_distribution(self):
-        """Calculate fare distribution for all passengers and driver."""
-        total_cost = self.get_estimated_total_cost()
-        
-        # Get confirmed bookings
-        confirmed_bookings = [b for b in self.bookings if b.status == b.STATUS_CONFIRMED]
-        total_booked_seats = sum(b.seats for b in confirmed_bookings)
-        
-        # Calculate per seat cost (including driver's seat)
-        total_seats = total_booked_seats + 1  # +1 for driver
-        per_seat_cost = total_cost / total_seats if total_seats > 0 else 0
-        
-        # Calculate driver's share
-        driver_share = per_seat_cost
-        
-        # Calculate each passenger's share
-        booking_shares = []
-        for booking in confirmed_bookings:
-            booking_share = per_seat_cost * booking.seats
-            booking_shares.append({
-                'passenger_id': booking.passenger_id,
-                'passenger_name': booking.passenger.username,
-                'seats': booking.seats,
-                'share': round(booking_share, 2)
-            })
-        
-        return {
-            'total_cost': round(total_cost, 2),
-            'driver_share': round(driver_share, 2),
-            'per_seat_cost': round(per_seat_cost, 2),
-            'bookings': booking_shares
-        }
-
-class Booking(db.Model):
-    """Model for ride bookings."""
-    # Status Constants
-    STATUS_PENDING = 'PENDING'
-    STATUS_CONFIRMED = 'CONFIRMED'
-    STATUS_CANCELLED = 'CANCELLED'
-    STATUS_COMPLETED = 'COMPLETED'
-    STATUS_REJECTED = 'REJECTED'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
-    passenger_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    seats = db.Column(db.Integer, nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, CONFIRMED, CANCELLED, COMPLETED, REJECTED
-    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
-    pickup_address = db.Column(db.String(200), nullable=False)
-    drop_address = db.Column(db.String(200), nullable=False)
-    share = db.Column(db.Float, nullable=True)
-    contact_number = db.Column(db.String(20), nullable=True)
-    booking_date = db.Column(db.DateTime, nullable=False, default=utc_now)
-    
-    # Individual passenger completion tracking
-    passenger_ride_status = db.Column(db.String(20), default='UPCOMING')  # UPCOMING, ONGOING, COMPLETED
-    passenger_completed_at = db.Column(db.DateTime, nullable=True)
-    
-    # Relationships
-    reviews = db.relationship('Review', backref='booking', lazy=True)
-    
-    def __repr__(self):
-        return f'<Booking {self.id} {self.status}>'
-
-    def can_cancel(self):
-        """Check if booking can be cancelled."""
-        return self.status in [self.STATUS_PENDING, self.STATUS_CONFIRMED]
-    
-    def complete_passenger_ride(self):
-        """Mark passenger's individual ride as completed."""
-        if self.status != self.STATUS_CONFIRMED:
-            return False, "Only confirmed bookings can be completed"
-        
-        if self.ride.status != self.ride.STATUS_ONGOING:
-            return False, "Ride must be ongoing to complete"
-        
-        # Mark passenger as completed
-        self.passenger_ride_status = 'COMPLETED'
-        self.passenger_completed_at = utc_now()
-        
-        # Note: This doesn't change booking.status to COMPLETED
-        # That only happens when driver ends the entire ride
-        
-        return True, "Your ride marked as completed"
-
-class Report(db.Model):
-    """Model for user reports and feedback."""
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=True)
-    report_type = db.Column(db.String(20), nullable=False)  # 'emergency', 'feedback', 'complaint'
-    subject = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, resolved, dismissed
-    created_at = db.Column(db.DateTime, default=utc_now)
-    resolved_at = db.Column(db.DateTime)
-    emergency_type = db.Column(db.String(50))  # For emergency reports: 'medical', 'accident', 'breakdown', etc.
-    location = db.Column(db.String(200))  # Location when emergency/incident occurred
-
-class Expense(db.Model):
-    """Model for ride expenses."""
-    id = db.Column(db.Integer, primary_key=True)
-    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
-    toll_cost = db.Column(db.Float, default=0.0)
-    other_costs = db.Column(db.Float, default=0.0)
-    description = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=utc_now)
-
-class AdminLog(db.Model):
-    """Model for admin activity logging."""
-    id = db.Column(db.Integer, primary_key=True)
-    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    action = db.Column(db.String(100), nullable=False)  # e.g., "Suspended user", "Resolved SOS"
-    target_type = db.Column(db.String(50))  # user, ride, report, sos
-    target_id = db.Column(db.Integer)
-    details = db.Column(db.Text)
-    ip_address = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
-    
-    # Relationship
-    admin = db.relationship('User', backref='admin_logs', foreign_keys=[admin_id])
-    
-    def __repr__(self):
-        return f'<AdminLog {self.id}: {self.action}>'
-    
-class ReportForm(FlaskForm):
-    """Form for submitting reports and feedback."""
-    report_type = SelectField('Report Type', choices=[
-        ('emergency', 'Emergency'),
-        ('feedback', 'General Feedback'),
-        ('complaint', 'Complaint')
-    ], validators=[DataRequired()])
-    subject = StringField('Subject', validators=[DataRequired(), Length(min=5, max=100)])
-    description = TextAreaField('Description', validators=[DataRequired(), Length(min=10, max=500)])
-    emergency_type = SelectField('Emergency Type', choices=[
-        ('', 'Select Emergency Type'),
-        ('medical', 'Medical Emergency'),
-        ('accident', 'Accident'),
-        ('breakdown', 'Vehicle Breakdown'),
-        ('safety', 'Safety Concern'),
-        ('other', 'Other')
-    ])
-    location = StringField('Location')
-    submit = SubmitField('Submit Report')
-
-    def validate_emergency_type(self, field):
-        if self.report_type.data == 'emergency' and not field.data:
-            raise ValidationError('Please select the type of emergency')
-
-# Form Classes
-class RegistrationForm(FlaskForm):
-    """Form for user registration with validation."""
-    username = StringField('Username', validators=[
-        DataRequired(),
-        Length(min=4, max=20, message='Username must be between 4 and 20 characters')
-    ])
-    email = StringField('Email', validators=[
-        DataRequired(),
-        Email(message='Please enter a valid email address')
-    ])
-    password = PasswordField('Password', validators=[
-        DataRequired(),
-        Length(min=6, message='Password must be at least 6 characters long')
-    ])
-    confirm_password = PasswordField('Confirm Password', validators=[
-        DataRequired(),
-        EqualTo('password', message='Passwords must match')
-    ])
-    submit = SubmitField('Create Account')
-
-    def validate_username(self, field):
-        """Validate if the username is already taken."""
-        if User.query.filter_by(username=field.data).first():
-            raise ValidationError('Username is already taken')
-
-    def validate_email(self, field):
-        """Validate if the email is already registered."""
-        if User.query.filter_by(email=field.data).first():
-            raise ValidationError('Email is already registered')
-
-class LoginForm(FlaskForm):
-    """Form for user login with validation."""
-    email = StringField('Email', validators=[
-        DataRequired(message='Please enter your email'),
-        Email(message='Please enter a valid email address')
-    ])
-    password = PasswordField('Password', validators=[
-        DataRequired(message='Please enter your password')
-    ])
-    submit = SubmitField('Log In')
-
-class RideForm(FlaskForm):
-    """Form for offering a new ride with validation."""
-    origin = StringField('Origin', validators=[DataRequired()])
-    destination = StringField('Destination', validators=[DataRequired()])
-    start_date = DateTimeField('Start Date and Time', 
-                        format='%Y-%m-%dT%H:%M',
-                        validators=[DataRequired()],
-                        render_kw={"type": "datetime-local"})
-    package_type = SelectField('Package Type', validators=[DataRequired()], 
-                     choices=[('weekly', 'Weekly'), ('biweekly', 'Bi-Weekly'), ('monthly', 'Monthly')])
-    seats = IntegerField('Available Seats', validators=[
-        DataRequired(),
-        NumberRange(min=1, max=8, message='Number of seats must be between 1 and 8')
-    ])
-    car = SelectField('Car Model', validators=[DataRequired()], 
-                     choices=[])
-    distance = FloatField('Distance (km)', validators=[
-        DataRequired(),
-        NumberRange(min=0, message='Distance cannot be negative')
-    ])
-    submit = SubmitField('Offer Ride')
-
-    def validate_start_date(self, field):
-        """Validate if the ride start date is in the future."""
-        if field.data <= datetime.now():
-            raise ValidationError('Ride start date must be in the future')
-
-class BookingForm(FlaskForm):
-    """Form for booking a ride with validation."""
-    seats = IntegerField('Number of Seats', validators=[
-        DataRequired(),
-        NumberRange(min=1, max=8, message='Number of seats must be between 1 and 8')
-    ])
-    contact_number = StringField('Contact Number', validators=[
-        DataRequired(),
-        Length(min=10, max=15, message='Please enter a valid contact number')
-    ])
-    pickup_address = StringField('Pickup Address', validators=[
-        DataRequired(),
-        Length(max=200, message='Address is too long (maximum 200 characters)')
-    ])
-    drop_address = StringField('Drop Address', validators=[
-        DataRequired(),
-        Length(max=200, message='Address is too long (maximum 200 characters)')
-    ])
-    submit = SubmitField('Confirm Booking')
-
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
@@ -837,30 +387,403 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def log_admin_action(action, target_type=None, target_id=None, details=None):
-    """Helper function to log admin actions."""
-    try:
-        log = AdminLog(
-            admin_id=current_user.id,
-            action=action,
-            target_type=target_type,
-            target_id=target_id,
-            details=details,
-            ip_address=request.remote_addr
-        )
-        db.session.add(log)
+
+# Seat reservation
+# Seat counts are only ever changed by conditional, in-database arithmetic so
+# concurrent requests cannot overbook a ride or release the same seats twice.
+def reserve_seats(ride_id, seats):
+    """
+    Atomically take `seats` from a ride's available seats.
+    
+    The decrement only applies if enough seats are still free and the ride is
+    still open, so two passengers racing for the last seat cannot both win.
+    The change is part of the current transaction; the caller commits.
+    
+    Returns:
+        bool: True if the seats were reserved
+    """
+    result = db.session.execute(
+        update(Ride)
+        .where(Ride.id == ride_id,
+               Ride.available_seats >= seats,
+               Ride.status.notin_([Ride.STATUS_CANCELLED, Ride.STATUS_COMPLETED]))
+        .values(available_seats=Ride.available_seats - seats),
+        execution_options={'synchronize_session': False})
+    return result.rowcount == 1
+
+def release_booking(booking, new_status, from_statuses=None):
+    """
+    Move a booking to `new_status` and give its seats back to the ride.
+    
+    The status change is conditional on the booking still being in one of
+    `from_statuses` (PENDING/CONFIRMED by default), so seats are restored at
+    most once even if the same cancellation is submitted twice.
+    The change is part of the current transaction; the caller commits.
+    
+    Returns:
+        bool: True if this call released the booking
+    """
+    from_statuses = from_statuses or [Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]
+    sync = {'synchronize_session': False}
+    moved = db.session.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, Booking.status.in_(from_statuses))
+        .values(status=new_status),
+        execution_options=sync).rowcount
+    if not moved:
+        return False
+    db.session.execute(
+        update(Ride)
+        .where(Ride.id == booking.ride_id)
+        .values(available_seats=Ride.available_seats + booking.seats),
+        execution_options=sync)
+    return True
+
+
+# Booking time conflicts
+def _estimated_end_time(estimated_end_time, actual_start_time, start_date, distance):
+    """Column-level equivalent of Ride.get_estimated_end_time() for projected rows."""
+    if estimated_end_time:
+        return estimated_end_time
+    estimated_minutes = round(distance / AVERAGE_SPEED * 60) if distance else 0
+    return (actual_start_time or start_date) + timedelta(minutes=estimated_minutes)
+
+def booking_conflict_query(passenger_id, ride):
+    """
+    Query the rides the passenger is actively booked on that may overlap `ride`.
+    
+    Rides overlap when each starts before the other's estimated end. Both
+    ends are stored columns, so this is one query driven by the passenger's
+    bookings (ix_booking_passenger_id_status) instead of loading every
+    booking and recomputing end times in Python. Rides whose end was never
+    stored (loaded by import_data.py before backfill_estimated_end_times()
+    ran) are returned as candidates with the columns needed to compute it.
+    """
+    return db.session.query(Ride.id, Ride.estimated_end_time, Ride.actual_start_time,
+                            Ride.start_date, Ride.distance)\
+        .join(Booking, Booking.ride_id == Ride.id)\
+        .filter(Booking.passenger_id == passenger_id,
+                Booking.status.in_([Booking.STATUS_CONFIRMED, Booking.STATUS_PENDING]),
+                Ride.id != ride.id,
+                Ride.start_date < ride.get_estimated_end_time(),
+                db.or_(Ride.estimated_end_time > ride.start_date, Ride.estimated_end_time.is_(None)))\
+        .order_by(Ride.start_date)
+
+def find_booking_conflict(passenger_id, ride):
+    """
+    Find a passenger's active booking on another ride that overlaps `ride`.
+    
+    Returns:
+        int: id of the earliest conflicting ride, or None
+    """
+    for row in booking_conflict_query(passenger_id, ride):
+        if _estimated_end_time(*row[1:]) > ride.start_date:
+            return row.id
+    return None
+
+def backfill_estimated_end_times(batch_size=1000):
+    """
+    Persist estimated_end_time on rides created before it was set on insert.
+    
+    Returns:
+        int: number of rides updated
+    """
+    updated = 0
+    while True:
+        rides = Ride.query.filter(Ride.estimated_end_time.is_(None))\
+            .options(load_only(Ride.id, Ride.start_date, Ride.actual_start_time,
+                               Ride.distance, Ride.estimated_end_time))\
+            .limit(batch_size).all()
+        if not rides:
+            return updated
+        db.session.execute(update(Ride), [
+            {'id': ride.id, 'estimated_end_time': ride.get_estimated_end_time()} for ride in rides])
         db.session.commit()
-    except Exception as e:
-        app.logger.error(f"Failed to log admin action: {str(e)}")
+        updated += len(rides)
+
+
+# Rating aggregates
+# User.rating is the mean of the reviews a user has received. It is derived
+# from rating_sum/rating_count, which are bumped in SQL as each review is
+# written, so adding a review never re-reads the user's review history.
+def record_review(user_id, rating, flag_type=None):
+    """
+    Fold a new review into the reviewed user's rating and flag counters.
+    
+    A single UPDATE computes every column from the row's current values, so
+    concurrent reviews of the same user cannot lose each other's increments.
+    The change is part of the current transaction; the caller adds the Review
+    and commits.
+    """
+    new_sum = func.coalesce(User.rating_sum, 0) + rating
+    new_count = func.coalesce(User.rating_count, 0) + 1
+    values = {
+        'rating_sum': new_sum,
+        'rating_count': new_count,
+        'rating': db.cast(new_sum, db.Float) / new_count
+    }
+    if flag_type == 'green':
+        values['green_flags'] = func.coalesce(User.green_flags, 0) + 1
+    elif flag_type == 'red':
+        values['red_flags'] = func.coalesce(User.red_flags, 0) + 1
+    db.session.execute(
+        update(User).where(User.id == user_id).values(**values),
+        execution_options={'synchronize_session': False})
+    if flag_type in ('green', 'red'):
+        bump_stat(f'{flag_type}_flags', daily=False)
+
+def check_rating_aggregates(fix=False):
+    """
+    Recompute every user's rating aggregates from the review table and diff
+    them against the stored values.
+    
+    One grouped query reads all reviews; with fix=True the mismatching users
+    are corrected in a single executemany UPDATE and committed. This doubles
+    as the backfill for databases created before the aggregate columns.
+    
+    Returns:
+        list: dicts of {'id', 'stored': (sum, count, rating), 'actual': (sum, count, rating)}
+        for every user whose stored aggregates were wrong
+    """
+    totals = {user_id: (int(total), count) for user_id, total, count in db.session.query(
+        Review.reviewed_id, func.sum(Review.rating), func.count(Review.id)
+    ).group_by(Review.reviewed_id)}
+    
+    mismatches = []
+    for user_id, rating_sum, rating_count, rating in db.session.query(
+            User.id, User.rating_sum, User.rating_count, User.rating).order_by(User.id):
+        actual_sum, actual_count = totals.get(user_id, (0, 0))
+        actual_rating = actual_sum / actual_count if actual_count else 0.0
+        stored = (rating_sum or 0, rating_count or 0, rating or 0.0)
+        if stored[:2] != (actual_sum, actual_count) or abs(stored[2] - actual_rating) > 1e-9:
+            mismatches.append({'id': user_id, 'stored': stored,
+                               'actual': (actual_sum, actual_count, actual_rating)})
+    
+    if fix and mismatches:
+        db.session.execute(update(User), [
+            {'id': m['id'], 'rating_sum': m['actual'][0], 'rating_count': m['actual'][1],
+             'rating': m['actual'][2]}
+            for m in mismatches])
+        db.session.commit()
+    return mismatches
+
+
+# Statistics rollup
+# The admin dashboard reads counters from stats_rollup instead of counting the
+# live tables. Write paths count events in their own transaction with
+# bump_stat(), which appends stats_event rows rather than updating the shared
+# stats_rollup rows, so concurrent writers never queue on one row lock.
+# refresh_stats_rollup() (run by ride_scheduler.py) folds those rows into
+# stats_rollup and recomputes gauges every tick, and periodically rebuilds the
+# counters from the source tables, repairing drift from paths that bypass
+# bump_stat (imports, deletes).
+STATS_ALL_TIME = date(1970, 1, 1)
+STATS_WINDOW_DAYS = 30
+STATS_DAILY_METRICS = ('users_created', 'rides_created', 'bookings_created', 'reports_created')
+STATS_PACKAGE_TYPES = ('daily', 'weekly', 'biweekly', 'monthly')
+STATS_FOLD_BATCH_SIZE = 500  # stats_event ids per DELETE ... IN (...)
+
+def _upsert_stat(metric, day, amount):
+    """Add `amount` to one bucket, creating it if needed, in a single statement."""
+    values = {'metric': metric, 'day': day, 'value': amount}
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        insert_stmt = sqlite_insert(StatsRollup).values(**values)
+    elif dialect == 'postgresql':
+        # Imported here: the PostgreSQL dialect costs SQLite deployments ~35ms at startup
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        insert_stmt = postgresql_insert(StatsRollup).values(**values)
+    else:
+        insert_stmt = None
+    if insert_stmt is not None:
+        db.session.execute(insert_stmt.on_conflict_do_update(
+            index_elements=['metric', 'day'], set_={'value': StatsRollup.value + amount}))
+        return
+    updated = db.session.execute(
+        update(StatsRollup)
+        .where(StatsRollup.metric == metric, StatsRollup.day == day)
+        .values(value=StatsRollup.value + amount),
+        execution_options={'synchronize_session': False}).rowcount
+    if not updated:
+        db.session.execute(StatsRollup.__table__.insert().values(**values))
+
+def bump_stat(metric, amount=1, daily=True):
+    """
+    Count an event in the statistics rollup.
+    
+    Args:
+        metric: metric name, e.g. 'rides_created'
+        amount: how much to add (negative to subtract)
+        daily: also add to today's bucket, not just the all-time total
+    
+    The change is part of the current transaction; the caller commits.
+    It only inserts rows, so it takes no lock other writers wait for.
+    """
+    events = [{'metric': metric, 'day': STATS_ALL_TIME, 'amount': amount}]
+    if daily:
+        events.append({'metric': metric, 'day': utc_now().date(), 'amount': amount})
+    db.session.execute(StatsEvent.__table__.insert(), events)
+
+def _fold_stats_events():
+    """
+    Add the stats_event rows committed so far to stats_rollup and delete them.
+    
+    Rows are deleted by the ids that were read, so one committed while this
+    runs is left for the next fold rather than dropped.
+    """
+    events = db.session.query(StatsEvent.id, StatsEvent.metric, StatsEvent.day, StatsEvent.amount).all()
+    totals = {}
+    for _, metric, day, amount in events:
+        totals[(metric, day)] = totals.get((metric, day), 0) + amount
+    for (metric, day), amount in totals.items():
+        _upsert_stat(metric, day, amount)
+    ids = [event.id for event in events]
+    for start in range(0, len(ids), STATS_FOLD_BATCH_SIZE):
+        db.session.execute(StatsEvent.__table__.delete().where(
+            StatsEvent.id.in_(ids[start:start + STATS_FOLD_BATCH_SIZE])))
+
+def _replace_stats(rows):
+    """Overwrite the given {(metric, day): value} buckets."""
+    if rows:
+        # One executemany DELETE for all buckets rather than a statement per bucket
+        db.session.execute(StatsRollup.__table__.delete().where(
+            StatsRollup.metric == bindparam('bucket_metric'), StatsRollup.day == bindparam('bucket_day')),
+            [{'bucket_metric': metric, 'bucket_day': day} for metric, day in rows])
+        db.session.execute(StatsRollup.__table__.insert(), [
+            {'metric': metric, 'day': day, 'value': value} for (metric, day), value in rows.items()])
+
+def refresh_stats_rollup(full=False, now=None):
+    """
+    Recompute rollup values from the source tables and commit.
+    
+    Counted events (stats_event) are folded in and gauges (active_rides,
+    pending_bookings) are refreshed every time. With full=True the all-time
+    totals and the last STATS_WINDOW_DAYS daily buckets of every counter are
+    rebuilt as well.
+    
+    Returns:
+        int: number of buckets written
+    """
+    now = now or utc_now()
+    _fold_stats_events()
+    rows = {
+        ('active_rides', STATS_ALL_TIME): Ride.query.filter(
+            Ride.status.in_([Ride.STATUS_UPCOMING, Ride.STATUS_ONGOING])).count(),
+        ('pending_bookings', STATS_ALL_TIME): Booking.query.filter_by(status=Booking.STATUS_PENDING).count()
+    }
+    if full:
+        window_start = now.date() - timedelta(days=STATS_WINDOW_DAYS - 1)
+        for metric, model in zip(STATS_DAILY_METRICS, (User, Ride, Booking, Report)):
+            rows[(metric, STATS_ALL_TIME)] = db.session.query(func.count(model.id)).scalar()
+            for offset in range(STATS_WINDOW_DAYS):
+                rows[(metric, window_start + timedelta(days=offset))] = 0
+            per_day = db.session.query(func.date(model.created_at), func.count(model.id))\
+                .filter(model.created_at >= datetime.combine(window_start, datetime.min.time()))\
+                .group_by(func.date(model.created_at))
+            for day, count in per_day:
+                rows[(metric, date.fromisoformat(str(day)))] = count
+        packages = dict(db.session.query(Ride.package_type, func.count(Ride.id)).group_by(Ride.package_type).all())
+        for package_type in STATS_PACKAGE_TYPES:
+            rows[(f'rides_package:{package_type}', STATS_ALL_TIME)] = packages.get(package_type, 0)
+        rows[('green_flags', STATS_ALL_TIME)] = db.session.query(func.sum(User.green_flags)).scalar() or 0
+        rows[('red_flags', STATS_ALL_TIME)] = db.session.query(func.sum(User.red_flags)).scalar() or 0
+    _replace_stats(rows)
+    db.session.commit()
+    return len(rows)
+
+def read_stats_rollup(today=None):
+    """
+    Load the dashboard's view of the rollup: every all-time value plus the
+    daily buckets of the last STATS_WINDOW_DAYS days, including events not
+    yet folded into stats_rollup.
+    
+    Returns:
+        tuple: ({metric: all-time value}, {metric: {day: value}})
+    """
+    today = today or utc_now().date()
+    window_start = today - timedelta(days=STATS_WINDOW_DAYS - 1)
+    totals, daily = {}, {}
+    for metric, day, value in db.session.query(StatsRollup.metric, StatsRollup.day, StatsRollup.value)\
+            .filter(db.or_(StatsRollup.day == STATS_ALL_TIME,
+                           db.and_(StatsRollup.day >= window_start, StatsRollup.day <= today))):
+        if day == STATS_ALL_TIME:
+            totals[metric] = value
+        else:
+            daily.setdefault(metric, {})[day] = value
+    for metric, day, amount in db.session.query(StatsEvent.metric, StatsEvent.day, func.sum(StatsEvent.amount))\
+            .filter(db.or_(StatsEvent.day == STATS_ALL_TIME,
+                           db.and_(StatsEvent.day >= window_start, StatsEvent.day <= today)))\
+            .group_by(StatsEvent.metric, StatsEvent.day):
+        if day == STATS_ALL_TIME:
+            totals[metric] = totals.get(metric, 0) + amount
+        else:
+            daily.setdefault(metric, {})[day] = daily.get(metric, {}).get(day, 0) + amount
+    return totals, daily
+
+
+# Pending SOS badge
+# Every admin page shows the number of pending emergency reports. The count is
+# cached for a few seconds and dropped whenever a report is created or
+# resolved, so the badge normally costs a cache lookup instead of a query.
+PENDING_SOS_CACHE_KEY = 'admin:pending_sos_count'
+PENDING_SOS_CACHE_TTL = 15
+
+def get_pending_sos_count():
+    """Number of pending emergency reports, served from the cache when fresh."""
+    return cache.get_or_set(
+        PENDING_SOS_CACHE_KEY,
+        lambda: Report.query.filter_by(report_type='emergency', status='pending').count(),
+        PENDING_SOS_CACHE_TTL)
+
+def invalidate_pending_sos_count():
+    """Drop the cached count; call after committing a report change."""
+    cache.delete(PENDING_SOS_CACHE_KEY)
+
+@hook('context_processor')
+def inject_pending_sos_count():
+    """Make 'pending_sos_count' available to the admin sidebar badge."""
+    if current_user.is_authenticated and current_user.is_admin:
+        return {'pending_sos_count': get_pending_sos_count()}
+    return {}
+
+
+# SOS alert stream
+# SOS triggers and cancellations (including an admin resolving or dismissing
+# an emergency report) are published to sos_broker once committed, and
+# /admin/stream/sos relays them to every connected admin as Server-Sent
+# Events. Idle streams only send a comment every few seconds as a keepalive.
+# SOS_BROKER_URL (default: CACHE_URL) is memory:// for a single worker, or redis://...
+# so events reach the admins streaming from every gunicorn worker
+sos_broker = create_broker(os.environ.get('SOS_BROKER_URL') or os.environ.get('CACHE_URL', 'memory://'))
+SOS_STREAM_HEARTBEAT_SECONDS = 15
+SOS_STREAM_RETRY_MS = 3000
+
+def publish_sos_event(name, report):
+    """
+    Announce a committed change to an emergency report on the SOS stream.
+    
+    Args:
+        name: 'sos_trigger' for a new alert, 'sos_cancel' once it is no longer pending
+        report: the emergency Report
+    
+    Returns:
+        Event: the published event
+    """
+    if name == 'sos_trigger':
+        data = _map_sos(report)
+    else:
+        data = {'id': report.id, 'user_id': report.user_id, 'status': report.status}
+    data['pending_sos_count'] = get_pending_sos_count()
+    return sos_broker.publish(name, data)
 
 
 # Route handlers
-@app.route('/')
+@route('/')
 def index():
     """Home page route."""
     return redirect(url_for('search_rides'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     """User registration route with form handling."""
     if current_user.is_authenticated:
@@ -870,12 +793,14 @@ def register():
             return redirect(next_page)
         return redirect(url_for('dashboard'))
     
+    from forms import RegistrationForm
     form = RegistrationForm()
     if form.validate_on_submit():
         try:
             user = User(username=form.username.data, email=form.email.data)
             user.set_password(form.password.data)
             db.session.add(user)
+            bump_stat('users_created')
             db.session.commit()
             flash('Registration successful! Please log in.', 'success')
             # Preserve next parameter when redirecting to login
@@ -886,11 +811,11 @@ def register():
         except Exception as e:
             db.session.rollback()
             flash('An error occurred during registration. Please try again.', 'danger')
-            app.logger.error(f'Registration error: {str(e)}')
+            current_app.logger.error(f'Registration error: {str(e)}')
     
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     """User login route with authentication."""
     if current_user.is_authenticated:
@@ -903,6 +828,7 @@ def login():
             return redirect(url_for('admin_dashboard'))
         return redirect(url_for('dashboard'))
     
+    from forms import LoginForm
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
@@ -918,7 +844,7 @@ def login():
     
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     """User logout route."""
@@ -926,51 +852,35 @@ def logout():
     flash('You have been logged out successfully.', 'info')
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
 def dashboard():
     """User dashboard showing offered and booked rides."""
     current_time = utc_now()
     
-    # Auto-handle overdue rides
-    # 1. Auto-complete ONGOING rides that exceeded their buffer time
-    ongoing_rides = Ride.query.filter(Ride.status == Ride.STATUS_ONGOING).all()
-    for ride in ongoing_rides:
-        if ride.should_auto_complete():
-            ride.auto_complete_ride()
-    
-    # 2. Auto-start and complete UPCOMING rides that are severely overdue (>1 hour past start)
-    # This ensures both drivers and passengers see correct status
-    overdue_rides = Ride.query.filter(
-        Ride.status == Ride.STATUS_UPCOMING,
-        Ride.start_date < current_time - timedelta(hours=1)
-    ).all()
-    
-    for ride in overdue_rides:
-        app.logger.info(f"Auto-completing overdue ride {ride.id}")
-        ride.start_ride()
-        ride.auto_complete_ride()
-        
-        # Explicitly handle PENDING bookings that wouldn't be caught by end_ride
-        for booking in ride.bookings:
-            if booking.status == Booking.STATUS_PENDING:
-                booking.status = Booking.STATUS_REJECTED
+    # Time-based ride transitions (auto-start/auto-complete) are applied by the
+    # lifecycle scheduler (see sweep_ride_lifecycle), so this view only reads.
     
-    db.session.commit()
+    # Load what the template walks (each ride's bookings and their passengers,
+    # each booking's ride and driver) up front instead of one query per row
+    rides_offered = Ride.query.filter_by(driver_id=current_user.id)\
+        .options(selectinload(Ride.bookings).joinedload(Booking.passenger)).all()
+    bookings = Booking.query.filter_by(passenger_id=current_user.id)\
+        .options(joinedload(Booking.ride).joinedload(Ride.driver)).all()
     
     # Get active rides (UPCOMING or ONGOING rides)
-    active_rides = [ride for ride in current_user.rides_offered 
+    active_rides = [ride for ride in rides_offered 
                    if ride.status in [Ride.STATUS_UPCOMING, Ride.STATUS_ONGOING]]
     
     # Get past rides (COMPLETED or CANCELLED rides)
-    past_rides = [ride for ride in current_user.rides_offered 
+    past_rides = [ride for ride in rides_offered 
                  if ride.status in [Ride.STATUS_COMPLETED, Ride.STATUS_CANCELLED]]
     
     # Get active and past bookings
-    active_bookings = [booking for booking in current_user.bookings 
+    active_bookings = [booking for booking in bookings 
                       if booking.status in [Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED] and 
                       booking.passenger_ride_status != 'COMPLETED']
-    past_bookings = [booking for booking in current_user.bookings 
+    past_bookings = [booking for booking in bookings 
                     if booking.status in [Booking.STATUS_COMPLETED, Booking.STATUS_CANCELLED, Booking.STATUS_REJECTED] or
                     booking.passenger_ride_status == 'COMPLETED']
     
@@ -982,7 +892,7 @@ def dashboard():
     
     # Calculate total passengers (confirmed bookings)
     total_passengers = sum(
-        booking.seats for booking in current_user.bookings 
+        booking.seats for booking in bookings 
         if booking.status == 'confirmed'
     )
     
@@ -991,11 +901,11 @@ def dashboard():
                          past_rides=past_rides,
                          active_bookings=active_bookings,
                          past_bookings=past_bookings,
-                         rides_offered=current_user.rides_offered,
+                         rides_offered=rides_offered,
                          current_time=current_time,
                          total_passengers=total_passengers)
 
-@app.route('/offer-ride', methods=['GET', 'POST'])
+@route('/offer-ride', methods=['GET', 'POST'])
 @login_required
 def offer_ride():
     """Offer a new ride."""
@@ -1013,9 +923,13 @@ def offer_ride():
             available_seats = request.form.get('seats')
             distance = request.form.get('distance')
             package_type = request.form.get('package_type', 'weekly')
+            # Set by the map picker; absent when locations are typed in
+            start_point = parse_coordinates(request.form.get('start_lat'), request.form.get('start_lng'))
+            end_point = parse_coordinates(request.form.get('end_lat'), request.form.get('end_lng'))
+            route_points = parse_route_polyline(request.form.get('route_polyline'), start_point, end_point)
             
             # Debug logging
-            app.logger.info(f"Form data: {request.form}")
+            current_app.logger.info(f"Form data: {request.form}")
             
             # Validate inputs
             if not all([start_location, end_location, start_date_str, available_seats, distance, package_type]):
@@ -1160,6 +1074,11 @@ def offer_ride():
                 car_id=car.id,
                 start_location=start_location,
                 end_location=end_location,
+                start_lat=start_point[0] if start_point else None,
+                start_lng=start_point[1] if start_point else None,
+                end_lat=end_point[0] if end_point else None,
+                end_lng=end_point[1] if end_point else None,
+                route_polyline=encode_route_polyline(route_points),
                 start_date=start_date,
                 end_date=end_date,  # Set based on package type
                 available_seats=available_seats,
@@ -1195,6 +1114,8 @@ def offer_ride():
             ride.price_per_seat = price_per_seat
             
             db.session.add(ride)
+            bump_stat('rides_created')
+            bump_stat(f'rides_package:{package_type}', daily=False)
             db.session.commit()
             
             flash('Ride offered successfully!', 'success')
@@ -1202,44 +1123,517 @@ def offer_ride():
             
         except ValueError as e:
             flash(str(e), 'error')
-            app.logger.error(f"Validation error: {str(e)}")
+            current_app.logger.error(f"Validation error: {str(e)}")
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while offering the ride. Please try again.', 'error')
-            app.logger.error(f"Error offering ride: {str(e)}")
+            current_app.logger.error(f"Error offering ride: {str(e)}")
     
     return render_template('offer_ride.html', 
                          car_choices=car_choices,
-                         google_maps_api_key=app.config['GOOGLE_MAPS_API_KEY'],
+                         google_maps_api_key=current_app.config['GOOGLE_MAPS_API_KEY'],
                          now=datetime.now(),
                          timedelta=timedelta)
 
-@app.route('/search-rides')
-def search_rides():
-    """Route for searching available rides with advanced filters."""
-    # Get search parameters
-    origin = request.args.get('origin', '')
-    destination = request.args.get('destination', '')
-    date = request.args.get('date', '')
-    package_type = request.args.get('package_type', '')
-    max_price = request.args.get('max_price', '')
-    seats_needed = request.args.get('seats_needed', '')
-    sort_by = request.args.get('sort_by', 'date')
-    fuel_type = request.args.get('fuel_type', '')
-    ac_preference = request.args.get('ac_preference', '')
-    driver_rating = request.args.get('driver_rating', '')
-    
-    # Base query - only UPCOMING rides (exclude COMPLETED and CANCELLED)
-    query = Ride.query.filter(
-        Ride.start_date > utc_now(),
-        Ride.status == Ride.STATUS_UPCOMING
-    )
+# ============================================
+# LOCATION SEARCH
+# ============================================
+# Substring search on ride locations without leading-wildcard scans:
+# - PostgreSQL: pg_trgm GIN indexes, which serve ILIKE '%term%' directly
+#   and rank matches with similarity().
+# - SQLite: an FTS5 table with the trigram tokenizer, kept in sync with the
+#   ride table by triggers and ranked with bm25().
+# - Anything else (or before the migration has run): plain ILIKE.
+# Trigram matching is a case-insensitive substring match, so results are the
+# same as the ILIKE filters; terms shorter than 3 characters use ILIKE.
+
+LOCATION_FTS_TABLE = 'ride_location_fts'
+ride_location_fts = table(LOCATION_FTS_TABLE, column('rowid'),
+                          column('start_location'), column('end_location'))
+
+LOCATION_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {LOCATION_FTS_TABLE} USING fts5(
+        start_location, end_location, content='ride', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {LOCATION_FTS_TABLE}_ai AFTER INSERT ON ride BEGIN
+        INSERT INTO {LOCATION_FTS_TABLE}(rowid, start_location, end_location)
+        VALUES (new.id, new.start_location, new.end_location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {LOCATION_FTS_TABLE}_ad AFTER DELETE ON ride BEGIN
+        INSERT INTO {LOCATION_FTS_TABLE}({LOCATION_FTS_TABLE}, rowid, start_location, end_location)
+        VALUES ('delete', old.id, old.start_location, old.end_location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {LOCATION_FTS_TABLE}_au AFTER UPDATE OF start_location, end_location ON ride BEGIN
+        INSERT INTO {LOCATION_FTS_TABLE}({LOCATION_FTS_TABLE}, rowid, start_location, end_location)
+        VALUES ('delete', old.id, old.start_location, old.end_location);
+        INSERT INTO {LOCATION_FTS_TABLE}(rowid, start_location, end_location)
+        VALUES (new.id, new.start_location, new.end_location);
+    END""",
+]
+
+LOCATION_TRGM_INDEXES = {
+    'ix_ride_start_location_trgm': 'ride USING gin (start_location gin_trgm_ops)',
+    'ix_ride_end_location_trgm': 'ride USING gin (end_location gin_trgm_ops)',
+    'ix_user_username_trgm': '"user" USING gin (username gin_trgm_ops)',
+    'ix_user_email_trgm': '"user" USING gin (email gin_trgm_ops)',
+}
+
+# Minimum term length a trigram index can serve
+TRIGRAM_MIN_LENGTH = 3
+
+_location_search_backends = {}
+
+def _sqlite_supports_fts5(connection):
+    """Check for FTS5 with the trigram tokenizer (SQLite 3.34+)."""
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+@event.listens_for(Ride.__table__, 'after_create')
+def _create_location_fts(target, connection, **kw):
+    """Create the FTS5 shadow table and its sync triggers with the ride table."""
+    if connection.dialect.name == 'sqlite' and _sqlite_supports_fts5(connection):
+        for statement in LOCATION_FTS_DDL:
+            connection.exec_driver_sql(statement)
+
+@event.listens_for(Ride.__table__, 'before_drop')
+def _drop_location_fts(target, connection, **kw):
+    """Drop the FTS5 shadow table before its content table goes away."""
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {LOCATION_FTS_TABLE}')
+    _location_search_backends.clear()
+
+def ensure_location_search():
+    """
+    Set up the location search backend on an existing database.
+    
+    Idempotent. On SQLite the FTS5 table is created and filled from the ride
+    table the first time; on PostgreSQL the pg_trgm extension and GIN indexes
+    are created (this needs permission to create the extension).
+    
+    Returns:
+        list: names of the objects that were created
+    """
+    created = []
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite' and _sqlite_supports_fts5(conn):
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = ?", (LOCATION_FTS_TABLE,)).scalar()
+            for statement in LOCATION_FTS_DDL:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {LOCATION_FTS_TABLE}({LOCATION_FTS_TABLE}) VALUES ('rebuild')")
+                created.append(LOCATION_FTS_TABLE)
+        elif dialect == 'postgresql':
+            conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            existing = {ix['name'] for name in ('ride', 'user') for ix in inspect(conn).get_indexes(name)}
+            for index_name, definition in LOCATION_TRGM_INDEXES.items():
+                if index_name not in existing:
+                    conn.exec_driver_sql(f'CREATE INDEX {index_name} ON {definition}')
+                    created.append(index_name)
+    _location_search_backends.clear()
+    return created
+
+def location_search_backend():
+    """Return 'trigram', 'fts5' or 'substring' for the configured database."""
+    key = str(db.engine.url)
+    if key not in _location_search_backends:
+        backend = 'substring'
+        with db.engine.connect() as conn:
+            if conn.dialect.name == 'sqlite':
+                if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = ?",
+                                        (LOCATION_FTS_TABLE,)).scalar():
+                    backend = 'fts5'
+            elif conn.dialect.name == 'postgresql':
+                if conn.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").scalar():
+                    backend = 'trigram'
+        _location_search_backends[key] = backend
+    return _location_search_backends[key]
+
+def _fts_phrase(term):
+    """Quote a user-supplied term as an FTS5 phrase."""
+    return '"' + term.replace('"', '""') + '"'
+
+def apply_location_search(query, origin, destination):
+    """
+    Restrict a Ride query to rides whose start/end locations contain
+    `origin` / `destination` (case-insensitive substring match).
+    
+    Returns:
+        tuple: (query, relevance) where relevance is a score expression
+        (higher is a closer match), or None if the backend cannot rank
+    """
+    terms = [(Ride.start_location, origin), (Ride.end_location, destination)]
+    terms = [(col, value) for col, value in terms if value]
+    if not terms:
+        return query, None
+    
+    backend = location_search_backend()
+    
+    if backend == 'fts5':
+        indexed = [(col, value) for col, value in terms if len(value) >= TRIGRAM_MIN_LENGTH]
+        for col, value in terms:
+            if len(value) < TRIGRAM_MIN_LENGTH:
+                query = query.filter(col.ilike(f'%{value}%'))
+        if not indexed:
+            return query, None
+        match = ' AND '.join(f'{col.key} : {_fts_phrase(value)}' for col, value in indexed)
+        fts = literal_column(LOCATION_FTS_TABLE)
+        matches = select(
+            ride_location_fts.c.rowid.label('ride_id'),
+            (-func.bm25(fts)).label('relevance')
+        ).where(fts.op('MATCH')(match)).subquery()
+        query = query.join(matches, matches.c.ride_id == Ride.id)
+        return query, matches.c.relevance
+    
+    for col, value in terms:
+        query = query.filter(col.ilike(f'%{value}%'))
+    
+    if backend == 'trigram':
+        relevance = sum((func.similarity(col, value) for col, value in terms[1:]),
+                        func.similarity(*terms[0]))
+        return query, relevance
+    
+    return query, None
+
+def ride_location_contains(term):
+    """Boolean clause: the ride's start or end location contains `term`."""
+    if location_search_backend() == 'fts5' and len(term) >= TRIGRAM_MIN_LENGTH:
+        fts = literal_column(LOCATION_FTS_TABLE)
+        return Ride.id.in_(select(ride_location_fts.c.rowid).where(fts.op('MATCH')(_fts_phrase(term))))
+    return db.or_(Ride.start_location.ilike(f'%{term}%'), Ride.end_location.ilike(f'%{term}%'))
+
+# ============================================
+# GEOSPATIAL RIDE INDEX
+# ============================================
+
+# Radius and route-corridor search over ride coordinates is answered from
+# in-process grid indexes (geo_index) instead of the database. Each process
+# keeps its own copy: changed rides are pulled in by updated_at on every lookup, and rides
+# that stopped being bookable are pruned on an interval (the search query still
+# filters on status, so a stale entry costs nothing but a wasted candidate).
+ride_spatial_index = RideSpatialIndex()
+ride_corridor_index = RouteCorridorIndex()
+GEO_DEFAULT_RADIUS_KM = 5.0
+GEO_MAX_RADIUS_KM = 50.0
+# A coordinate search hands its matching ride ids to SQL through this
+# per-connection temporary table rather than an IN list, which would need
+# one bound parameter per ride (stock SQLite builds allow 32766), so the
+# other search filters always see every match
+GEO_MATCHES = table('search_geo_match', column('ride_id'))
+GEO_INDEX_PRUNE_SECONDS = 300
+GEO_INDEX_BATCH_SIZE = 500  # ride ids per IN (...) when re-adding missed rides
+# How far before the last sync each catch-up looks, for rides whose transaction
+# committed after that sync although their updated_at is earlier
+GEO_INDEX_SYNC_MARGIN_SECONDS = 120
+
+_spatial_index_state = {'synced_at': None, 'pruned_at': None}
+
+def parse_coordinates(lat, lng):
+    """
+    Parse a latitude/longitude pair from form or query string values.
+    
+    Returns:
+        tuple: (lat, lng) as floats, or None if either is missing or out of range
+    """
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+def parse_route_polyline(raw, start_point=None, end_point=None):
+    """
+    Parse and simplify a route posted as a JSON list of [lat, lng] pairs.
+    
+    Falls back to the straight line between start_point and end_point when
+    the route is missing or malformed.
+    
+    Returns:
+        list: (lat, lng) tuples, or None if there is nothing to build a route from
+    """
+    points = []
+    try:
+        for pair in json.loads(raw or '[]')[:ROUTE_MAX_POINTS * 10]:
+            point = parse_coordinates(*pair)
+            if point is None:
+                raise ValueError
+            points.append(point)
+    except (TypeError, ValueError):
+        points = []
+    if len(points) < 2:
+        if not (start_point and end_point):
+            return None
+        points = [start_point, end_point]
+    points = simplify_polyline(points)
+    if len(points) > ROUTE_MAX_POINTS:
+        step = math.ceil(len(points) / ROUTE_MAX_POINTS)
+        points = points[:-1:step] + [points[-1]]
+    return points
+
+def encode_route_polyline(points):
+    """Serialise a route for Ride.route_polyline."""
+    if not points:
+        return None
+    return json.dumps([[round(lat, 6), round(lng, 6)] for lat, lng in points], separators=(',', ':'))
+
+def ride_route(ride_row):
+    """
+    The route of a ride (or a row with the same coordinate columns): the
+    stored polyline, else the straight line between its endpoints, else None.
+    """
+    start_point = parse_coordinates(ride_row.start_lat, ride_row.start_lng)
+    end_point = parse_coordinates(ride_row.end_lat, ride_row.end_lng)
+    return parse_route_polyline(ride_row.route_polyline, start_point, end_point)
+
+def reset_ride_spatial_index():
+    """Empty the spatial indexes so the next lookup reloads them from the database."""
+    ride_spatial_index.clear()
+    ride_corridor_index.clear()
+    _spatial_index_state.update(synced_at=None, pruned_at=None)
+
+@event.listens_for(Ride.__table__, 'before_drop')
+def _reset_spatial_index_on_drop(target, connection, **kw):
+    # Ride ids are reused once the table is recreated
+    reset_ride_spatial_index()
+
+def _index_rides(rows):
+    """Add (or refresh) ride rows with their coordinates and route in the spatial indexes."""
+    for row in rows:
+        if None not in (row.start_lat, row.start_lng, row.end_lat, row.end_lng):
+            ride_spatial_index.add(row.id, row.start_lat, row.start_lng, row.end_lat, row.end_lng)
+        route = ride_route(row)
+        if route:
+            ride_corridor_index.add(row.id, route)
+
+def _open_ride_geometry(now):
+    """Query of the coordinates and route of rides that can still be booked."""
+    return db.session.query(Ride.id, Ride.start_lat, Ride.start_lng, Ride.end_lat, Ride.end_lng,
+                            Ride.route_polyline)\
+        .filter(Ride.status == Ride.STATUS_UPCOMING, Ride.start_date > now)
+
+def sync_ride_spatial_index(now=None):
+    """
+    Bring the spatial index up to date with the ride table.
+    
+    Rides are only ever offered as UPCOMING and their coordinates never change
+    afterwards, so catching up reads the open rides changed since the last
+    sync (ix_ride_updated_at). The window reaches GEO_INDEX_SYNC_MARGIN_SECONDS
+    further back: updated_at is set when a ride is flushed, and with concurrent
+    offers its transaction can commit after a later sync has already run.
+    Every GEO_INDEX_PRUNE_SECONDS the index is reconciled with the open rides:
+    rides no longer open are dropped and any the catch-up missed are added.
+    """
+    now = now or utc_now()
+    synced_at = _spatial_index_state['synced_at']
+    query = _open_ride_geometry(now)
+    if synced_at is not None:
+        query = query.filter(Ride.updated_at >= synced_at - timedelta(seconds=GEO_INDEX_SYNC_MARGIN_SECONDS))
+    _spatial_index_state['synced_at'] = now
+    _index_rides(query.all())
+    
+    pruned_at = _spatial_index_state['pruned_at']
+    if pruned_at is None or (now - pruned_at).total_seconds() >= GEO_INDEX_PRUNE_SECONDS:
+        _spatial_index_state['pruned_at'] = now
+        if pruned_at is not None:
+            open_ids = set()
+            missing = []
+            has_geometry = db.or_(Ride.start_lat.isnot(None), Ride.route_polyline.isnot(None))
+            indexed = ride_spatial_index.ids() | ride_corridor_index.ids()
+            for ride_id, mappable in db.session.query(Ride.id, has_geometry).filter(
+                    Ride.status == Ride.STATUS_UPCOMING, Ride.start_date > now):
+                open_ids.add(ride_id)
+                if mappable and ride_id not in indexed:
+                    missing.append(ride_id)
+            for ride_id in ride_spatial_index.ids() - open_ids:
+                ride_spatial_index.discard(ride_id)
+            for ride_id in ride_corridor_index.ids() - open_ids:
+                ride_corridor_index.discard(ride_id)
+            for start in range(0, len(missing), GEO_INDEX_BATCH_SIZE):
+                batch = missing[start:start + GEO_INDEX_BATCH_SIZE]
+                _index_rides(_open_ride_geometry(now).filter(Ride.id.in_(batch)).all())
+
+def rides_near(origin=None, destination=None, radius_km=GEO_DEFAULT_RADIUS_KM):
+    """
+    Ids of open rides starting within radius_km of origin and/or ending within
+    radius_km of destination, nearest first.
+    
+    Args:
+        origin: (lat, lng) or None
+        destination: (lat, lng) or None
+        radius_km: search radius, clamped to GEO_MAX_RADIUS_KM
+    """
+    sync_ride_spatial_index()
+    radius_km = max(0.0, min(radius_km, GEO_MAX_RADIUS_KM))
+    return ride_spatial_index.nearby(origin, destination, radius_km)
+
+def rides_on_route(pickup, drop, buffer_km=GEO_DEFAULT_RADIUS_KM):
+    """
+    Open rides whose route passes within buffer_km of pickup and then of drop.
+    
+    Args:
+        pickup: (lat, lng) where the passenger gets in
+        drop: (lat, lng) where the passenger gets out
+        buffer_km: allowed distance from the route, clamped to GEO_MAX_RADIUS_KM
+    
+    Returns:
+        list: geo_index.RouteMatch tuples, smallest detour first
+    """
+    sync_ride_spatial_index()
+    buffer_km = max(0.0, min(buffer_km, GEO_MAX_RADIUS_KM))
+    return ride_corridor_index.match(pickup, drop, buffer_km)
+
+def load_geo_matches(ride_ids):
+    """
+    Replace the contents of this session's GEO_MATCHES table with ride_ids.
+    
+    Returns:
+        Select: the matched ids, for Ride.id.in_()
+    """
+    connection = db.session.connection()
+    connection.execute(text('CREATE TEMPORARY TABLE IF NOT EXISTS search_geo_match (ride_id INTEGER PRIMARY KEY)'))
+    connection.execute(GEO_MATCHES.delete())
+    if ride_ids:
+        connection.execute(GEO_MATCHES.insert(), [{'ride_id': ride_id} for ride_id in dict.fromkeys(ride_ids)])
+    return select(GEO_MATCHES.c.ride_id)
+
+def ride_route_match(ride, pickup, drop, buffer_km=GEO_DEFAULT_RADIUS_KM):
+    """
+    Check a single ride's route against a pickup and drop.
+    
+    Returns:
+        tuple: (pickup_km, drop_km, pickup_offset_km, drop_offset_km), or None
+        if the ride has no route or does not pass both points in order
+    """
+    route = ride_route(ride)
+    if not route:
+        return None
+    return match_route(route, pickup, drop, buffer_km)
+
+# ============================================
+# RIDE SEARCH
+# ============================================
+
+# Columns rendered by the ride cards in search_rides.html. Everything else on
+# Ride/Car/User is deferred so a results page never pulls photos' siblings,
+# password hashes or lifecycle bookkeeping it does not show.
+SEARCH_RIDE_COLUMNS = (
+    Ride.id, Ride.driver_id, Ride.car_id, Ride.start_location, Ride.end_location,
+    Ride.start_date, Ride.end_date, Ride.available_seats, Ride.price_per_seat,
+    Ride.distance, Ride.package_type, Ride.status,
+    Ride.license_photo, Ride.driver_photo, Ride.vehicle_photo
+)
+SEARCH_CAR_COLUMNS = (Car.id, Car.make, Car.model, Car.year, Car.color,
+                      Car.fuel_type, Car.mileage, Car.ac)
+SEARCH_DRIVER_COLUMNS = (User.id, User.username, User.rating, User.green_flags, User.red_flags)
+
+# Search results are paginated by keyset; per_page is capped so no request can
+# materialise the whole ride table.
+SEARCH_PAGE_SIZE = 12
+SEARCH_MAX_PAGE_SIZE = 50
+
+# sort_by -> (sort column, descending). Ride.id breaks ties in the same direction.
+# 'relevance' (location match quality) is resolved per query by apply_location_search().
+SEARCH_SORT_KEYS = {
+    'date': (Ride.start_date, False),
+    'price_low': (Ride.price_per_seat, False),
+    'price_high': (Ride.price_per_seat, True),
+    'distance': (Ride.distance, False)
+}
+
+def encode_search_cursor(sort_by, value, ride_id):
+    """Encode the position after (sort value, ride id) as an opaque token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, value, ride_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_search_cursor(token, sort_by):
+    """
+    Decode a cursor produced by encode_search_cursor().
+    
+    Returns:
+        tuple: (sort value, ride id), or None if the token is malformed or
+        was issued for a different sort order
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, ride_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort_by:
+            return None
+        if sort_by == 'date':
+            value = datetime.fromisoformat(value)
+        else:
+            value = float(value)
+        return value, int(ride_id)
+    except (ValueError, TypeError):
+        return None
+
+def _ride_search(params):
+    """
+    Build the query behind the ride search page.
+    
+    Ride, Car and driver are fetched in a single statement: both relationships
+    are joined once and populated from that join (contains_eager), so
+    rendering ride.car.* / ride.driver.* on each card never lazy-loads.
+    
+    Args:
+        params: mapping of search parameters (usually request.args)
+    
+    Returns:
+        tuple: (filtered and sorted query of UPCOMING rides, effective sort_by,
+        sort expression, descending)
+    """
+    origin = params.get('origin', '')
+    destination = params.get('destination', '')
+    date = params.get('date', '')
+    package_type = params.get('package_type', '')
+    max_price = params.get('max_price', '')
+    seats_needed = params.get('seats_needed', '')
+    sort_by = params.get('sort_by', 'date')
+    fuel_type = params.get('fuel_type', '')
+    ac_preference = params.get('ac_preference', '')
+    driver_rating = params.get('driver_rating', '')
+    origin_point = parse_coordinates(params.get('origin_lat'), params.get('origin_lng'))
+    destination_point = parse_coordinates(params.get('destination_lat'), params.get('destination_lng'))
+    
+    # Base query - only UPCOMING rides (exclude COMPLETED and CANCELLED).
+    # car_id and driver_id are non-nullable, so the inner joins drop no rides.
+    query = Ride.query\
+        .join(Car, Ride.car)\
+        .join(User, Ride.driver)\
+        .options(
+            load_only(*SEARCH_RIDE_COLUMNS),
+            contains_eager(Ride.car).load_only(*SEARCH_CAR_COLUMNS),
+            contains_eager(Ride.driver).load_only(*SEARCH_DRIVER_COLUMNS)
+        )\
+        .filter(
+            Ride.start_date > utc_now(),
+            Ride.status == Ride.STATUS_UPCOMING
+        )
     
-    # Apply filters
-    if origin:
-        query = query.filter(Ride.start_location.ilike(f'%{origin}%'))
-    if destination:
-        query = query.filter(Ride.end_location.ilike(f'%{destination}%'))
+    # Apply filters. A side given as coordinates is matched geographically
+    # and its free-text term is ignored: with both a pickup and a drop, any
+    # ride whose route passes both in order matches; with one, the ride must
+    # start (or end) within the radius.
+    if origin_point or destination_point:
+        try:
+            radius_km = float(params.get('radius', GEO_DEFAULT_RADIUS_KM))
+        except ValueError:
+            radius_km = GEO_DEFAULT_RADIUS_KM
+        if origin_point and destination_point:
+            ride_ids = [match.ride_id for match in rides_on_route(origin_point, destination_point, radius_km)]
+        else:
+            ride_ids = rides_near(origin_point, destination_point, radius_km)
+        query = query.filter(Ride.id.in_(load_geo_matches(ride_ids)))
+        if origin_point:
+            origin = ''
+        if destination_point:
+            destination = ''
+    query, relevance = apply_location_search(query, origin, destination)
     if date:
         try:
             search_date = datetime.strptime(date, '%Y-%m-%d')
@@ -1266,36 +1660,99 @@ def search_rides():
             pass
     
     if fuel_type:
-        query = query.join(Car).filter(Car.fuel_type == fuel_type)
+        query = query.filter(Car.fuel_type == fuel_type)
     
-    if ac_preference:
-        query = query.join(Car)
-        if ac_preference == 'ac':
-            query = query.filter(Car.ac == True)
-        elif ac_preference == 'non_ac':
-            query = query.filter(Car.ac == False)
+    if ac_preference == 'ac':
+        query = query.filter(Car.ac == True)
+    elif ac_preference == 'non_ac':
+        query = query.filter(Car.ac == False)
     
     if driver_rating:
         try:
             min_rating = float(driver_rating)
-            query = query.join(User, Ride.driver_id == User.id).filter(User.rating >= min_rating)
+            query = query.filter(User.rating >= min_rating)
         except ValueError:
             pass
     
-    # Apply sorting
-    if sort_by == 'price_low':
-        query = query.order_by(Ride.price_per_seat.asc())
-    elif sort_by == 'price_high':
-        query = query.order_by(Ride.price_per_seat.desc())
-    elif sort_by == 'distance':
-        query = query.order_by(Ride.distance.asc())
-    else:  # default: date
-        query = query.order_by(Ride.start_date.asc())
+    # Apply sorting (default: date), with Ride.id as a unique tie-breaker so
+    # the order is total and can be resumed from a cursor
+    if sort_by == 'relevance' and relevance is not None:
+        column, descending = relevance, True
+    else:
+        if sort_by not in SEARCH_SORT_KEYS:
+            sort_by = 'date'
+        column, descending = SEARCH_SORT_KEYS[sort_by]
+    if descending:
+        query = query.order_by(column.desc(), Ride.id.desc())
+    else:
+        query = query.order_by(column.asc(), Ride.id.asc())
+    
+    return query, sort_by, column, descending
+
+def build_ride_search_query(params):
+    """Filtered and sorted query of UPCOMING rides for the search parameters."""
+    return _ride_search(params)[0]
+
+def search_rides_page(params):
+    """
+    Fetch one page of search results using keyset pagination.
+    
+    The page starts right after the (sort value, ride id) encoded in the
+    `cursor` parameter, so each page costs the same no matter how deep it is.
     
-    rides = query.all()
-    return render_template('search_rides.html', rides=rides, now=utc_now())
+    Args:
+        params: mapping of search parameters (usually request.args)
+    
+    Returns:
+        tuple: (rides on this page, cursor for the next page or None)
+    """
+    try:
+        per_page = int(params.get('per_page', SEARCH_PAGE_SIZE))
+    except ValueError:
+        per_page = SEARCH_PAGE_SIZE
+    per_page = max(1, min(per_page, SEARCH_MAX_PAGE_SIZE))
+    
+    query, sort_by, column, descending = _ride_search(params)
+    
+    cursor = decode_search_cursor(params.get('cursor', ''), sort_by)
+    if cursor:
+        value, last_id = cursor
+        if descending:
+            query = query.filter(db.or_(column < value, db.and_(column == value, Ride.id < last_id)))
+        else:
+            query = query.filter(db.or_(column > value, db.and_(column == value, Ride.id > last_id)))
+    
+    # Fetch one extra row to learn whether another page exists
+    rows = query.add_columns(column).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_ride, last_value = rows[-1]
+        next_cursor = encode_search_cursor(sort_by, last_value, last_ride.id)
+    
+    return [ride for ride, _ in rows], next_cursor
 
-@app.route('/book-ride/<int:ride_id>', methods=['GET', 'POST'])
+@route('/search-rides')
+def search_rides():
+    """Route for searching available rides with advanced filters."""
+    rides, next_cursor = search_rides_page(request.args)
+    
+    next_url = None
+    if next_cursor:
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        next_url = url_for('search_rides', **next_args)
+    
+    first_url = None
+    if request.args.get('cursor'):
+        first_args = request.args.to_dict()
+        first_args.pop('cursor')
+        first_url = url_for('search_rides', **first_args)
+    
+    return render_template('search_rides.html', rides=rides, now=utc_now(),
+                           next_url=next_url, first_url=first_url)
+
+@route('/book-ride/<int:ride_id>', methods=['GET', 'POST'])
 @login_required
 def book_ride(ride_id):
     ride = Ride.query.get_or_404(ride_id)
@@ -1326,25 +1783,37 @@ def book_ride(ride_id):
         return redirect(url_for('search_rides'))
 
     # Check for time collision with other active bookings
-    ride_end_time = ride.get_estimated_end_time()
+    conflicting_ride_id = find_booking_conflict(current_user.id, ride)
+    if conflicting_ride_id:
+        flash(f'Time Conflict: You already have a booking for ride #{conflicting_ride_id} during this time.', 'error')
+        return redirect(url_for('search_rides'))
     
-    user_bookings = Booking.query.filter_by(passenger_id=current_user.id)\
-        .filter(Booking.status.in_([Booking.STATUS_CONFIRMED, Booking.STATUS_PENDING]))\
-        .join(Ride).all()
-        
-    for booking in user_bookings:
-        # Skip this ride if it somehow got in the list (already checked above)
-        if booking.ride_id == ride.id:
-            continue
-            
-        other_ride = booking.ride
-        other_ride_end = other_ride.get_estimated_end_time()
-        
-        # Check overlap: (StartA < EndB) and (EndA > StartB)
-        if (ride.start_date < other_ride_end) and (ride_end_time > other_ride.start_date):
-            flash(f'Time Conflict: You already have a booking for ride #{other_ride.id} during this time.', 'error')
+    # Pickup/drop chosen in a route search; they travel in the query string
+    # (the booking form posts back to the same URL) and prefill the addresses
+    pickup_point = parse_coordinates(request.values.get('pickup_lat'), request.values.get('pickup_lng'))
+    drop_point = parse_coordinates(request.values.get('drop_lat'), request.values.get('drop_lng'))
+    route_match = None
+    if pickup_point and drop_point and ride_route(ride):
+        try:
+            buffer_km = float(request.values.get('radius', GEO_DEFAULT_RADIUS_KM))
+        except ValueError:
+            buffer_km = GEO_DEFAULT_RADIUS_KM
+        route_match = ride_route_match(ride, pickup_point, drop_point,
+                                       max(0.0, min(buffer_km, GEO_MAX_RADIUS_KM)))
+        if route_match is None:
+            flash('This ride does not pass near your pickup and drop points.', 'error')
             return redirect(url_for('search_rides'))
     
+    def point_label(point):
+        return f'Near {point[0]:.5f}, {point[1]:.5f}' if point else ''
+    
+    booking_context = dict(
+        ride=ride,
+        route_match=route_match,
+        pickup_address=request.values.get('pickup_address') or point_label(pickup_point),
+        drop_address=request.values.get('drop_address') or point_label(drop_point)
+    )
+    
     if request.method == 'POST':
         try:
             seats = int(request.form.get('seats', 1))
@@ -1355,15 +1824,21 @@ def book_ride(ride_id):
             # Validate inputs
             if not all([pickup_address, drop_address, contact]):
                 flash('Please fill in all required fields.', 'error')
-                return render_template('book_ride.html', ride=ride)
+                return render_template('book_ride.html', **booking_context)
             
             if seats < 1 or seats > ride.available_seats:
                 flash(f'Please select between 1 and {ride.available_seats} seats.', 'error')
-                return render_template('book_ride.html', ride=ride)
+                return render_template('book_ride.html', **booking_context)
             
             if not contact.isdigit() or len(contact) != 10:
                 flash('Please enter a valid 10-digit contact number.', 'error')
-                return render_template('book_ride.html', ride=ride)
+                return render_template('book_ride.html', **booking_context)
+            
+            # Reduce available seats immediately (even for pending bookings)
+            if not reserve_seats(ride.id, seats):
+                db.session.rollback()
+                flash('Sorry, those seats were just taken. Please check availability and try again.', 'error')
+                return redirect(url_for('book_ride', ride_id=ride.id))
             
             # Create booking
             booking = Booking(
@@ -1376,10 +1851,8 @@ def book_ride(ride_id):
                 created_at=utc_now()
             )
             
-            # Reduce available seats immediately (even for pending bookings)
-            ride.available_seats -= seats
-            
             db.session.add(booking)
+            bump_stat('bookings_created')
             db.session.commit()
             
             flash('Booking request sent successfully! The driver will confirm your booking.', 'success')
@@ -1388,33 +1861,41 @@ def book_ride(ride_id):
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while booking. Please try again.', 'error')
-            app.logger.error(f"Booking error: {str(e)}")
+            current_app.logger.error(f"Booking error: {str(e)}")
     
-    return render_template('book_ride.html', ride=ride)
+    return render_template('book_ride.html', **booking_context)
 
-@app.route('/my-bookings')
+@route('/my-bookings')
 @login_required
 def my_bookings():
     """Route for viewing user's bookings."""
     current_time = utc_now()
     
-    # Get active and past bookings based on status
+    # Get active and past bookings based on status, with each ride's driver
+    # and car filled in from the same query
+    ride_options = (contains_eager(Booking.ride).joinedload(Ride.driver),
+                    contains_eager(Booking.ride).joinedload(Ride.car))
     active_bookings = Booking.query.filter_by(passenger_id=current_user.id)\
         .filter(Booking.status.in_([Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]))\
-        .join(Ride)\
+        .join(Ride).options(*ride_options)\
         .order_by(Ride.start_date).all()
         
     past_bookings = Booking.query.filter_by(passenger_id=current_user.id)\
         .filter(Booking.status.in_([Booking.STATUS_COMPLETED, Booking.STATUS_CANCELLED, Booking.STATUS_REJECTED]))\
-        .join(Ride)\
+        .join(Ride).options(*ride_options)\
         .order_by(Ride.start_date.desc()).all()
     
+    # This passenger's reviews by booking (instead of scanning every driver's reviews)
+    reviews_by_booking = {review.booking_id: review
+                          for review in Review.query.filter_by(reviewer_id=current_user.id)}
+    
     return render_template('my_bookings.html', 
                          active_bookings=active_bookings,
                          past_bookings=past_bookings,
+                         reviews_by_booking=reviews_by_booking,
                          current_time=current_time)
 
-@app.route('/booking/<int:booking_id>/details')
+@route('/booking/<int:booking_id>/details')
 @login_required
 def booking_details(booking_id):
     """View details of a specific booking including co-passengers."""
@@ -1436,7 +1917,7 @@ def booking_details(booking_id):
                          co_passengers=co_passengers,
                          current_time=utc_now())
 
-@app.route('/booking/<int:booking_id>/confirm', methods=['POST'])
+@route('/booking/<int:booking_id>/confirm', methods=['POST'])
 @login_required
 def confirm_booking(booking_id):
     """Confirm a booking request."""
@@ -1453,7 +1934,7 @@ def confirm_booking(booking_id):
         return redirect(url_for('dashboard'))
         
     # Note: No need to check seat availability here because seats were already 
-    # reduced when the PENDING booking was created (see line 1380 in book_ride route)
+    # reduced when the PENDING booking was created (see reserve_seats in book_ride route)
         
     # Confirm the booking (seats already reduced when booking was created)
     booking.status = Booking.STATUS_CONFIRMED
@@ -1463,7 +1944,7 @@ def confirm_booking(booking_id):
     flash('Booking confirmed successfully!', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/booking/<int:booking_id>/reject', methods=['POST'])
+@route('/booking/<int:booking_id>/reject', methods=['POST'])
 @login_required
 def reject_booking(booking_id):
     """Reject a booking request."""
@@ -1479,18 +1960,17 @@ def reject_booking(booking_id):
         flash('This booking cannot be rejected.', 'error')
         return redirect(url_for('dashboard'))
         
-    # Restore seats since this was a pending booking
-    booking.ride.available_seats += booking.seats
-    
-    # Reject the booking
-    booking.status = Booking.STATUS_REJECTED
+    # Reject the booking and restore seats since this was a pending booking
+    if not release_booking(booking, Booking.STATUS_REJECTED, [Booking.STATUS_PENDING]):
+        flash('This booking cannot be rejected.', 'error')
+        return redirect(url_for('dashboard'))
     db.session.commit()
     
     # Send notification to passenger (you can implement this later)
     flash('Booking rejected.', 'info')
     return redirect(url_for('dashboard'))
 
-@app.route('/booking/<int:booking_id>/remove', methods=['POST'])
+@route('/booking/<int:booking_id>/remove', methods=['POST'])
 @login_required
 def remove_passenger(booking_id):
     """Remove a passenger from a ride."""
@@ -1509,17 +1989,16 @@ def remove_passenger(booking_id):
     # Store passenger info for flash message
     passenger_name = booking.passenger.username
     
-    # Restore the seats since this was a confirmed booking
-    booking.ride.available_seats += booking.seats
-    
-    # Mark booking as cancelled
-    booking.status = Booking.STATUS_CANCELLED
+    # Mark booking as cancelled and restore the seats since this was a confirmed booking
+    if not release_booking(booking, Booking.STATUS_CANCELLED, [Booking.STATUS_CONFIRMED]):
+        flash('Can only remove confirmed passengers.', 'error')
+        return redirect(url_for('dashboard'))
     db.session.commit()
     
     flash(f'Passenger {passenger_name} has been removed from the ride.', 'info')
     return redirect(url_for('dashboard'))
 
-@app.route('/cancel-booking/<int:booking_id>', methods=['POST'])
+@route('/cancel-booking/<int:booking_id>', methods=['POST'])
 @login_required
 def cancel_booking(booking_id):
     """Route for cancelling a booking."""
@@ -1530,24 +2009,20 @@ def cancel_booking(booking_id):
         elif not booking.can_cancel():
             flash('This booking cannot be cancelled.', 'danger')
         else:
-            # If booking was confirmed, restore the seats
-            if booking.status == Booking.STATUS_CONFIRMED:
-                booking.ride.available_seats += booking.seats
-            elif booking.status == Booking.STATUS_PENDING:
-                # Also restore seats for pending bookings since they reduce seats too
-                booking.ride.available_seats += booking.seats
-            
-            booking.status = Booking.STATUS_CANCELLED
-            db.session.commit()
-            flash('Booking cancelled successfully.', 'success')
+            # Restore the seats for both confirmed and pending bookings since both reduce seats
+            if release_booking(booking, Booking.STATUS_CANCELLED):
+                db.session.commit()
+                flash('Booking cancelled successfully.', 'success')
+            else:
+                flash('This booking cannot be cancelled.', 'danger')
     except Exception as e:
         db.session.rollback()
         flash('An error occurred while cancelling the booking. Please try again.', 'danger')
-        app.logger.error(f'Booking cancellation error: {str(e)}')
+        current_app.logger.error(f'Booking cancellation error: {str(e)}')
     
     return redirect(url_for('dashboard'))
 
-@app.route('/ride/<int:ride_id>/mark-complete', methods=['POST'])
+@route('/ride/<int:ride_id>/mark-complete', methods=['POST'])
 @login_required
 def mark_ride_complete(ride_id):
     """Driver marks ride as complete."""
@@ -1570,11 +2045,11 @@ def mark_ride_complete(ride_id):
     except Exception as e:
         db.session.rollback()
         flash('An error occurred. Please try again.', 'error')
-        app.logger.error(f'Mark ride complete error: {str(e)}')
+        current_app.logger.error(f'Mark ride complete error: {str(e)}')
     
     return redirect(url_for('dashboard'))
 
-@app.route('/ride/<int:ride_id>/start', methods=['POST'])
+@route('/ride/<int:ride_id>/start', methods=['POST'])
 @login_required
 def start_ride(ride_id):
     """Driver starts the ride."""
@@ -1600,11 +2075,11 @@ def start_ride(ride_id):
     except Exception as e:
         db.session.rollback()
         flash('An error occurred. Please try again.', 'error')
-        app.logger.error(f'Start ride error: {str(e)}')
+        current_app.logger.error(f'Start ride error: {str(e)}')
     
     return redirect(url_for('dashboard'))
 
-@app.route('/ride/<int:ride_id>/end', methods=['POST'])
+@route('/ride/<int:ride_id>/end', methods=['POST'])
 @login_required
 def end_ride(ride_id):
     """Driver ends the ride."""
@@ -1630,11 +2105,11 @@ def end_ride(ride_id):
     except Exception as e:
         db.session.rollback()
         flash('An error occurred. Please try again.', 'error')
-        app.logger.error(f'End ride error: {str(e)}')
+        current_app.logger.error(f'End ride error: {str(e)}')
     
     return redirect(url_for('dashboard'))
 
-@app.route('/booking/<int:booking_id>/mark-complete', methods=['POST'])
+@route('/booking/<int:booking_id>/mark-complete', methods=['POST'])
 @login_required
 def mark_booking_complete(booking_id):
     """Passenger marks their individual ride as complete."""
@@ -1658,46 +2133,127 @@ def mark_booking_complete(booking_id):
     except Exception as e:
         db.session.rollback()
         flash('An error occurred. Please try again.', 'error')
-        app.logger.error(f'Mark booking complete error: {str(e)}')
+        current_app.logger.error(f'Mark booking complete error: {str(e)}')
     
     return redirect(url_for('my_bookings'))
 
-@app.route('/check-completed-rides')
+def _max_completion_time(estimated_end_time, actual_start_time, start_date, distance, error_buffer_minutes):
+    """Column-level equivalent of Ride.get_max_completion_time() for projected rows."""
+    estimated_end_time = _estimated_end_time(estimated_end_time, actual_start_time, start_date, distance)
+    return estimated_end_time + timedelta(minutes=error_buffer_minutes or 15)
+
+def sweep_ride_lifecycle(now=None):
+    """
+    Apply time-based ride transitions in bulk.
+    
+    1. ONGOING rides past their max completion time are auto-completed.
+    2. UPCOMING rides more than 1 hour past their start are started and
+       auto-completed in one step; their PENDING bookings are rejected.
+    
+    All writes are set-based UPDATEs guarded by the current status, so
+    overlapping sweeps cannot complete the same ride twice.
+    
+    Returns:
+        dict: number of rides moved by each transition
+    """
+    now = now or utc_now()
+    sync = {'synchronize_session': False}
+    
+    # 1. ONGOING rides that exceeded their buffer time
+    ongoing = db.session.query(
+        Ride.id, Ride.estimated_end_time, Ride.actual_start_time,
+        Ride.start_date, Ride.distance, Ride.error_buffer_minutes
+    ).filter(Ride.status == Ride.STATUS_ONGOING).all()
+    due_ids = [row.id for row in ongoing if _max_completion_time(*row[1:]) <= now]
+    
+    auto_completed = 0
+    if due_ids:
+        db.session.execute(
+            update(Booking)
+            .where(Booking.ride_id.in_(due_ids), Booking.status == Booking.STATUS_CONFIRMED)
+            .values(status=Booking.STATUS_COMPLETED,
+                    passenger_ride_status='COMPLETED',
+                    passenger_completed_at=func.coalesce(Booking.passenger_completed_at, now)),
+            execution_options=sync)
+        auto_completed = db.session.execute(
+            update(Ride)
+            .where(Ride.id.in_(due_ids), Ride.status == Ride.STATUS_ONGOING)
+            .values(status=Ride.STATUS_COMPLETED, actual_end_time=now,
+                    completed_by='AUTO', auto_completed=True),
+            execution_options=sync).rowcount
+    
+    # 2. UPCOMING rides that are severely overdue (>1 hour past start).
+    # Bookings are updated first because they select rides by their current status.
+    overdue_filter = (Ride.status == Ride.STATUS_UPCOMING,
+                      Ride.start_date < now - timedelta(hours=1))
+    overdue = db.session.query(Ride.id, Ride.distance).filter(*overdue_filter).all()
+    overdue_ids = select(Ride.id).where(*overdue_filter).scalar_subquery()
+    db.session.execute(
+        update(Booking)
+        .where(Booking.ride_id.in_(overdue_ids), Booking.status == Booking.STATUS_CONFIRMED)
+        .values(status=Booking.STATUS_COMPLETED,
+                passenger_ride_status='COMPLETED',
+                passenger_completed_at=func.coalesce(Booking.passenger_completed_at, now)),
+        execution_options=sync)
+    db.session.execute(
+        update(Booking)
+        .where(Booking.ride_id.in_(overdue_ids), Booking.status == Booking.STATUS_PENDING)
+        .values(status=Booking.STATUS_REJECTED),
+        execution_options=sync)
+    overdue_completed = 0
+    if overdue:
+        # One executemany: like Ride.start_ride(), each ride's estimated end is
+        # re-estimated from the actual start, which depends on its distance
+        overdue_completed = db.session.execute(
+            Ride.__table__.update()
+            .where(Ride.id == bindparam('ride_id'), Ride.status == Ride.STATUS_UPCOMING)
+            .values(status=Ride.STATUS_COMPLETED,
+                    actual_start_time=now, actual_end_time=now,
+                    estimated_end_time=bindparam('estimated_end'),
+                    completed_by='AUTO', auto_completed=True,
+                    # Same distance-based buffer that Ride.start_ride() assigns
+                    error_buffer_minutes=case(
+                        (Ride.distance <= 50, 30),
+                        (Ride.distance <= 100, 45),
+                        (Ride.distance <= 200, 60),
+                        else_=90)),
+            [{'ride_id': row.id, 'estimated_end': _estimated_end_time(None, now, now, row.distance)}
+             for row in overdue]).rowcount
+    
+    db.session.commit()
+    
+    if auto_completed or overdue_completed:
+        current_app.logger.info(f'Lifecycle sweep: auto-completed {auto_completed} ongoing rides, '
+                        f'{overdue_completed} overdue rides')
+    
+    return {'auto_completed': auto_completed, 'overdue_completed': overdue_completed}
+
+@route('/check-completed-rides')
 def check_completed_rides():
     """Background task to auto-complete rides based on time."""
     try:
-        # Get all ONGOING rides that should be auto-completed
-        rides = Ride.query.filter(Ride.status == Ride.STATUS_ONGOING).all()
-        
-        completed_count = 0
-        for ride in rides:
-            if ride.should_auto_complete():
-                ride.auto_complete_ride()
-                completed_count += 1
+        result = sweep_ride_lifecycle()
         
-        if completed_count > 0:
-            db.session.commit()
-            
         return jsonify({
             'success': True,
-            'completed_rides': completed_count
+            'completed_rides': result['auto_completed'] + result['overdue_completed']
         })
         
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Auto-complete rides error: {str(e)}')
+        current_app.logger.error(f'Auto-complete rides error: {str(e)}')
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-@app.route('/bookings')
+@route('/bookings')
 @login_required
 def bookings():
     """Redirect to my-bookings for consistency."""
     return redirect(url_for('my_bookings'))
 
-@app.route('/booking/<int:booking_id>/review', methods=['GET', 'POST'])
+@route('/booking/<int:booking_id>/review', methods=['GET', 'POST'])
 @login_required
 def submit_review(booking_id):
     """Submit a review for a ride (passenger reviewing driver)."""
@@ -1750,17 +2306,8 @@ def submit_review(booking_id):
                 
                 db.session.add(review)
                 
-                # Update user flags
-                reviewed_user = User.query.get(reviewed_id)
-                if flag_type == 'green':
-                    reviewed_user.green_flags = (reviewed_user.green_flags or 0) + 1
-                elif flag_type == 'red':
-                    reviewed_user.red_flags = (reviewed_user.red_flags or 0) + 1
-                
-                # Update user rating based on flags
-                user_reviews = Review.query.filter_by(reviewed_id=reviewed_id).all()
-                total_rating = sum(r.rating for r in user_reviews) + rating
-                reviewed_user.rating = total_rating / (len(user_reviews) + 1)
+                # Update user flags and rating
+                record_review(reviewed_id, rating, flag_type)
                 
                 db.session.commit()
                 
@@ -1770,12 +2317,12 @@ def submit_review(booking_id):
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while submitting your review. Please try again.', 'error')
-            app.logger.error(f"Review error: {str(e)}")
+            current_app.logger.error(f"Review error: {str(e)}")
     
     return render_template('submit_review.html', booking=booking, review_target='driver')
 
 
-@app.route('/booking/<int:booking_id>/rate-passenger', methods=['GET', 'POST'])
+@route('/booking/<int:booking_id>/rate-passenger', methods=['GET', 'POST'])
 @login_required
 def rate_passenger(booking_id):
     """Driver rates a passenger after ride completion."""
@@ -1833,34 +2380,26 @@ def rate_passenger(booking_id):
                 
                 db.session.add(review)
                 
-                # Update passenger flags
-                passenger = User.query.get(reviewed_id)
-                if flag_type == 'green':
-                    passenger.green_flags = (passenger.green_flags or 0) + 1
-                elif flag_type == 'red':
-                    passenger.red_flags = (passenger.red_flags or 0) + 1
-                
-                # Update passenger rating based on flags
-                user_reviews = Review.query.filter_by(reviewed_id=reviewed_id).all()
-                total_rating = sum(r.rating for r in user_reviews) + rating
-                passenger.rating = total_rating / (len(user_reviews) + 1)
+                # Update passenger flags and rating
+                record_review(reviewed_id, rating, flag_type)
                 
                 db.session.commit()
                 
-                flash(f'Thank you for rating {passenger.username}!', 'success')
+                flash(f'Thank you for rating {booking.passenger.username}!', 'success')
                 return redirect(url_for('view_ride', ride_id=booking.ride_id))
                 
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while submitting your rating. Please try again.', 'error')
-            app.logger.error(f"Passenger rating error: {str(e)}")
+            current_app.logger.error(f"Passenger rating error: {str(e)}")
     
     return render_template('submit_review.html', booking=booking, review_target='passenger')
 
-@app.route('/report', methods=['GET', 'POST'])
+@route('/report', methods=['GET', 'POST'])
 @login_required
 def submit_report():
     """Submit a new report or feedback."""
+    from forms import ReportForm
     form = ReportForm()
     
     # If user is in an active ride, pre-fill ride information
@@ -1884,7 +2423,9 @@ def submit_report():
         )
         
         db.session.add(report)
+        bump_stat('reports_created')
         db.session.commit()
+        invalidate_pending_sos_count()
         
         if form.report_type.data == 'emergency':
             flash('Emergency report submitted! Our team will contact you immediately.', 'warning')
@@ -1896,21 +2437,21 @@ def submit_report():
     
     return render_template('submit_report.html', form=form, active_booking=active_booking)
 
-@app.route('/get-car-models/<make>')
+@route('/get-car-models/<make>')
 def get_car_models(make):
     """Get car models for a given make."""
     if make in CAR_DATABASE:
         return jsonify(list(CAR_DATABASE[make].keys()))
     return jsonify([])
 
-@app.route('/get-car-details/<make>/<model>')
+@route('/get-car-details/<make>/<model>')
 def get_car_details(make, model):
     """Get car details for a given make and model."""
     if make in CAR_DATABASE and model in CAR_DATABASE[make]:
         return jsonify(CAR_DATABASE[make][model])
     return jsonify({})
 
-@app.route('/add-car', methods=['GET', 'POST'])
+@route('/add-car', methods=['GET', 'POST'])
 @login_required
 def add_car():
     """Add a new car."""
@@ -1969,7 +2510,7 @@ def add_car():
                          now=datetime.now(),
                          car_makes=list(CAR_DATABASE.keys()))
 
-@app.route('/ride/<int:ride_id>')
+@route('/ride/<int:ride_id>')
 @login_required
 def view_ride(ride_id):
     """View details of a specific ride."""
@@ -2002,7 +2543,7 @@ def view_ride(ride_id):
     # Otherwise redirect to book_ride for regular view
     return redirect(url_for('book_ride', ride_id=ride_id))
 
-@app.route('/ride/<int:ride_id>/cancel', methods=['POST'])
+@route('/ride/<int:ride_id>/cancel', methods=['POST'])
 @login_required
 def cancel_ride(ride_id):
     """Cancel a ride."""
@@ -2021,9 +2562,7 @@ def cancel_ride(ride_id):
     # Cancel all pending and confirmed bookings and restore seats
     for booking in ride.bookings:
         if booking.status in [Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]:
-            # Restore seats
-            ride.available_seats += booking.seats
-            booking.status = Booking.STATUS_CANCELLED
+            release_booking(booking, Booking.STATUS_CANCELLED)
     
     ride.status = Ride.STATUS_CANCELLED
     db.session.commit()
@@ -2031,27 +2570,37 @@ def cancel_ride(ride_id):
     flash('Ride cancelled successfully.', 'success')
     return redirect(url_for('my_rides'))
 
-@app.route('/user/<int:user_id>/reviews')
+@route('/user/<int:user_id>/reviews')
 @login_required
 def user_reviews(user_id):
     """View reviews for a specific user."""
     user = User.query.get_or_404(user_id)
-    reviews = Review.query.filter_by(reviewed_id=user_id).order_by(Review.created_at.desc()).all()
+    reviews = Review.query.filter_by(reviewed_id=user_id)\
+        .options(joinedload(Review.reviewer), joinedload(Review.booking).joinedload(Booking.ride))\
+        .order_by(Review.created_at.desc()).all()
     
     return render_template('reviews.html', user=user, reviews=reviews)
 
-@app.route('/user/<int:user_id>')
+@route('/user/<int:user_id>')
 @login_required
 def user_profile(user_id):
     """View a user's profile."""
-    user = User.query.get_or_404(user_id)
+    # The template walks these relationships (reviews with their reviewer and
+    # ride, rides with their bookings), so load them in a few batched queries
+    user = User.query.options(
+        selectinload(User.reviews_received).joinedload(Review.reviewer),
+        selectinload(User.reviews_received).joinedload(Review.booking).joinedload(Booking.ride),
+        selectinload(User.rides_offered).selectinload(Ride.bookings),
+        selectinload(User.bookings),
+        selectinload(User.cars),
+    ).filter_by(id=user_id).first_or_404()
     
     # Get user's rides (if driver) and bookings (if passenger)
-    rides_as_driver = Ride.query.filter_by(driver_id=user_id).order_by(Ride.start_date.desc()).all()
-    bookings_as_passenger = Booking.query.filter_by(passenger_id=user_id).order_by(Booking.created_at.desc()).all()
+    rides_as_driver = sorted(user.rides_offered, key=lambda ride: ride.start_date, reverse=True)
+    bookings_as_passenger = sorted(user.bookings, key=lambda booking: booking.created_at, reverse=True)
     
     # Get user's reviews
-    reviews = Review.query.filter_by(reviewed_id=user_id).order_by(Review.created_at.desc()).limit(5).all()
+    reviews = sorted(user.reviews_received, key=lambda review: review.created_at or datetime.min, reverse=True)[:5]
     
     return render_template(
         'user_profile.html', 
@@ -2062,63 +2611,135 @@ def user_profile(user_id):
         current_time=utc_now()
     )
 
-@app.route('/chatbot', methods=['POST'])
+@route('/chatbot', methods=['POST'])
 def chatbot():
     """Handle chatbot requests with Gemini AI."""
-    try:
-        data = request.get_json()
-        user_message = data.get('message', '').strip()
-        
-        if not user_message:
-            return jsonify({'error': 'No message provided'}), 400
-        
-        if not app.config['GEMINI_API_KEY']:
-            return jsonify({
-                'response': 'I apologize, but the chatbot service is currently unavailable. Please contact support for assistance.'
-            }), 200
-        
-        # Create Gemini client with new API
-        client = genai.Client(api_key=app.config['GEMINI_API_KEY'])
-        
-        # System prompt for the chatbot
-        system_instruction = """You are RideShareBot, an AI assistant for a Ride-Share web application. The app allows users to register, log in, offer rides, search for rides, book rides, manage bookings, add cars, review other users, and submit reports or feedback. Users can be drivers or passengers. The app uses Google Maps, supports file uploads (such as license and vehicle photos), and has a wallet for ride expenses.
-
-Your tasks:
-- Answer questions about using the site (e.g., how to register, offer a ride, book a ride, cancel a booking, add a car, submit a review, or report an issue).
-- Explain features like ride packages (daily, weekly, biweekly, monthly), wallet/expenses, and user reviews.
-- Help users troubleshoot common issues (e.g., login problems, booking errors, uploading documents).
-- Guide users to the correct page or form for their needs.
-- Be friendly, concise, and clear. If you don't know the answer, suggest contacting support.
-
-Always answer as if you are part of the Ride-Share site's support team. If a user asks about something outside the Ride-Share app, politely decline to answer.
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get('message') or '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    # Loaded on first use, with the Gemini client (see chatbot.py).
+    # Timeouts, saturation and model errors come back as the fallback reply
+    from chatbot import answer_chat_message
+    return jsonify({'response': answer_chat_message(user_message)}), 200
 
-If you need more information, ask the user for clarification."""
-        
-        # Generate response using new API
-        response = client.models.generate_content(
-            model='models/gemini-2.5-flash',
-            contents=user_message,
-            config={
-                'system_instruction': system_instruction,
-                'temperature': 0.7,
-            }
-        )
-        
-        return jsonify({
-            'response': response.text
-        }), 200
-        
-    except Exception as e:
-        app.logger.error(f'Chatbot error: {str(e)}')
-        return jsonify({
-            'response': 'I apologize, but I encountered an error. Please try again or contact support if the issue persists.'
-        }), 200
+@route('/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """
+    Streaming variant of /chatbot for the chat widget.
+    
+    Replies with Server-Sent Events: one 'chunk' event ({"text": ...}) per
+    piece of the answer as the model produces it, then a 'done' event.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get('message') or '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    from chatbot import stream_chat_answer
+    chunks = stream_chat_answer(user_message)
+    
+    def events():
+        for chunk in chunks:
+            yield f'event: chunk\ndata: {json.dumps({"text": chunk})}\n\n'
+        yield 'event: done\ndata: {}\n\n'
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # ============================================
 # MAP FEATURES ROUTES
 # ============================================
 
-@app.route('/admin/map')
+# The admin map polls /api/rides/map with the version it last saw and gets
+# back only what changed. Versions are server timestamps (ms since epoch);
+# rows are re-sent for MAP_DELTA_OVERLAP_SECONDS before the given version so
+# a transaction that committed late is never skipped (the client's patching
+# is idempotent).
+MAP_DELTA_OVERLAP_SECONDS = 5
+MAP_RIDE_STATUSES = ('UPCOMING', 'ONGOING')
+
+def encode_map_version(moment):
+    """Timestamp -> integer version handed to map clients."""
+    return int((moment - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+def decode_map_version(version):
+    """Integer version -> naive UTC timestamp, or None if malformed."""
+    try:
+        return datetime(1970, 1, 1) + timedelta(milliseconds=int(version))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def _map_ride(ride):
+    return {
+        'id': ride.id,
+        'driver': {
+            'id': ride.driver.id,
+            'username': ride.driver.username,
+            'email': ride.driver.email
+        },
+        'start_location': ride.start_location,
+        'end_location': ride.end_location,
+        # Rides offered without the map have no coordinates; pin them on Mumbai
+        'start_lat': ride.start_lat if ride.start_lat is not None else 19.0760,
+        'start_lng': ride.start_lng if ride.start_lng is not None else 72.8777,
+        'end_lat': ride.end_lat if ride.end_lat is not None else 19.0760,
+        'end_lng': ride.end_lng if ride.end_lng is not None else 72.8777,
+        'available_seats': ride.available_seats,
+        'price_per_seat': ride.price_per_seat,
+        'start_date': ride.start_date.isoformat(),
+        'status': ride.status
+    }
+
+def _map_sos(report):
+    """A pending emergency report, in the shape admin_map.js draws SOS markers from."""
+    return {
+        'id': report.id,
+        'user_id': report.user_id,
+        'username': report.user.username,
+        'email': report.user.email,
+        'phone': report.user.phone,
+        'sos_location': report.location,
+        'sos_timestamp': report.created_at.isoformat() if report.created_at else None,
+        'sos_message': report.description
+    }
+
+def rides_map_payload(since=None):
+    """
+    Build the admin map data, either in full or as a delta.
+    
+    Args:
+        since: timestamp of the client's last version, or None for everything
+    
+    Returns:
+        dict: {'full', 'rides', 'removed_rides', 'sos', 'removed_sos'}; with
+        since=None nothing is ever removed
+    """
+    rides_query = Ride.query.join(User, Ride.driver).options(contains_eager(Ride.driver))
+    sos_query = Report.query.join(User, Report.user).options(contains_eager(Report.user))\
+        .filter(Report.report_type == 'emergency')
+    if since is None:
+        rides = rides_query.filter(Ride.status.in_(MAP_RIDE_STATUSES)).order_by(Ride.id).all()
+        reports = sos_query.filter(Report.status == 'pending').order_by(Report.id).all()
+        return {'full': True, 'rides': [_map_ride(ride) for ride in rides], 'removed_rides': [],
+                'sos': [_map_sos(report) for report in reports], 'removed_sos': []}
+    
+    since = since - timedelta(seconds=MAP_DELTA_OVERLAP_SECONDS)
+    changed_rides = rides_query.filter(Ride.updated_at > since).order_by(Ride.id).all()
+    changed_reports = sos_query.filter(db.or_(Report.created_at > since, Report.resolved_at > since))\
+        .order_by(Report.id).all()
+    return {
+        'full': False,
+        'rides': [_map_ride(ride) for ride in changed_rides if ride.status in MAP_RIDE_STATUSES],
+        'removed_rides': [ride.id for ride in changed_rides if ride.status not in MAP_RIDE_STATUSES],
+        'sos': [_map_sos(report) for report in changed_reports if report.status == 'pending'],
+        'removed_sos': [report.id for report in changed_reports if report.status != 'pending']
+    }
+
+@route('/admin/map')
 @login_required
 def admin_map():
     """Admin map dashboard showing all rides and SOS emergencies."""
@@ -2126,48 +2747,30 @@ def admin_map():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('dashboard'))
     
-    # Get all active rides
-    rides = Ride.query.filter(
-        Ride.status.in_(['UPCOMING', 'ONGOING'])
-    ).all()
-    
-    # Get all SOS alerts
-    sos_users = User.query.filter_by(sos_active=True).all()
-    
-    return render_template('admin_map.html', rides=rides, sos_users=sos_users)
+    # Rides and SOS alerts are loaded by admin_map.js from /api/rides/map
+    return render_template('admin_map.html')
 
-@app.route('/api/rides/map')
+@route('/api/rides/map')
 @login_required
 def get_rides_for_map():
-    """API endpoint to get ride data for map display."""
-    rides = Ride.query.filter(
-        Ride.status.in_(['UPCOMING', 'ONGOING'])
-    ).all()
-    
-    rides_data = []
-    for ride in rides:
-        rides_data.append({
-            'id': ride.id,
-            'driver': {
-                'id': ride.driver.id,
-                'username': ride.driver.username,
-                'email': ride.driver.email
-            },
-            'start_location': ride.start_location,
-            'end_location': ride.end_location,
-            'start_lat': ride.start_lat if hasattr(ride, 'start_lat') else 19.0760,
-            'start_lng': ride.start_lng if hasattr(ride, 'start_lng') else 72.8777,
-            'end_lat': ride.end_lat if hasattr(ride, 'end_lat') else 19.0760,
-            'end_lng': ride.end_lng if hasattr(ride, 'end_lng') else 72.8777,
-            'available_seats': ride.available_seats,
-            'price_per_seat': ride.price_per_seat,
-            'start_date': ride.start_date.isoformat(),
-            'status': ride.status
-        })
+    """
+    API endpoint to get ride data for map display.
+    
+    Without `since` every active ride and pending SOS is returned; with
+    `since=<version>` only what changed after that version. Responses carry
+    an ETag over their data, so a poll with nothing new is answered 304.
+    """
+    now = utc_now()
+    since = decode_map_version(request.args['since']) if request.args.get('since') else None
+    payload = rides_map_payload(since)
     
-    return jsonify(rides_data)
+    etag = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    response = jsonify(dict(payload, version=encode_map_version(now)))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
-@app.route('/api/sos/trigger', methods=['POST'])
+@route('/api/sos/trigger', methods=['POST'])
 @login_required
 def trigger_sos():
     """Trigger SOS emergency alert."""
@@ -2189,14 +2792,17 @@ def trigger_sos():
         emergency_type='safety'
     )
     db.session.add(report)
+    bump_stat('reports_created')
     
     db.session.commit()
+    invalidate_pending_sos_count()
+    publish_sos_event('sos_trigger', report)
     
-    app.logger.warning(f'🚨 SOS ALERT: User {current_user.username} at {current_user.sos_location}')
+    current_app.logger.warning(f'🚨 SOS ALERT: User {current_user.username} at {current_user.sos_location}')
     
     return jsonify({'success': True, 'message': 'SOS alert sent to admin'})
 
-@app.route('/api/sos/cancel', methods=['POST'])
+@route('/api/sos/cancel', methods=['POST'])
 @login_required
 def cancel_sos():
     """Cancel SOS emergency alert."""
@@ -2205,10 +2811,43 @@ def cancel_sos():
     current_user.sos_timestamp = None
     current_user.sos_message = None
     
+    # The user's pending emergency reports are no longer active alerts
+    alerts = Report.query.filter_by(user_id=current_user.id, report_type='emergency', status='pending').all()
+    for report in alerts:
+        report.status = 'dismissed'
+        report.resolved_at = utc_now()
+    
     db.session.commit()
+    if alerts:
+        invalidate_pending_sos_count()
+        for report in alerts:
+            publish_sos_event('sos_cancel', report)
     
     return jsonify({'success': True, 'message': 'SOS alert cancelled'})
 
+@route('/admin/stream/sos')
+@login_required
+@admin_required
+def admin_sos_stream():
+    """
+    Server-Sent Events stream of SOS triggers and cancellations for admins.
+    
+    A reconnecting EventSource sends Last-Event-ID and is first replayed
+    any events it missed that the broker still remembers. The stream holds
+    no database connection, so idle admins only cost a queue each.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    
+    def stream():
+        with SOS_STREAMS.track_inprogress(), sos_broker.subscribe(last_event_id) as subscription:
+            yield f'retry: {SOS_STREAM_RETRY_MS}\n\n'
+            while True:
+                event = subscription.get(timeout=SOS_STREAM_HEARTBEAT_SECONDS)
+                yield format_sse(event) if event else ': keepalive\n\n'
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ============================================
 # END OF MAP FEATURES ROUTES
 # ============================================
@@ -2216,385 +2855,66 @@ def cancel_sos():
 # Application entry point
 
 # ============================================================================
-# ADMIN PANEL HELPERS & ROUTES
+# METRICS ENDPOINT
 # ============================================================================
 
-def log_admin_action(action, target_type=None, target_id=None, details=None):
-    """Helper function to log admin actions."""
-    try:
-        from app import db  # Ensure db is available
-        log = AdminLog(
-            admin_id=current_user.id,
-            action=action,
-            target_type=target_type,
-            target_id=target_id,
-            details=details,
-            ip_address=request.remote_addr
-        )
-        db.session.add(log)
-        db.session.commit()
-        return True
-    except Exception as e:
-        # Prevent logging failure from crashing the app
-        print(f"Failed to log admin action: {str(e)}")
-        return False
+SHARED_CACHE_HITS = metrics.RunningTotal(CACHE_REQUESTS.labels('shared', 'hit'))
+SHARED_CACHE_MISSES = metrics.RunningTotal(CACHE_REQUESTS.labels('shared', 'miss'))
 
-@app.route('/admin/login', methods=['GET', 'POST'])
-def admin_login():
-    """Admin login page."""
-    if current_user.is_authenticated and current_user.is_admin:
-        return redirect(url_for('admin_dashboard'))
-    
-    if request.method == 'POST':
-        email = request.form.get('email')
-        password = request.form.get('password')
-        
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
-            if user.is_admin:
-                login_user(user)
-                log_admin_action('Admin login', details=f'IP: {request.remote_addr}')
-                flash('Welcome to the admin panel!', 'success')
-                return redirect(url_for('admin_dashboard'))
-            else:
-                flash('Access denied. Administrator privileges required.', 'error')
-        else:
-            flash('Invalid email or password.', 'error')
-    
-    return render_template('admin/login.html')
+def collect_cache_metrics():
+    """Copy the shared cache's hit and miss counts into the request counters."""
+    SHARED_CACHE_HITS.update(cache.hits)
+    SHARED_CACHE_MISSES.update(cache.misses)
 
-@app.route('/admin/logout')
-@login_required
-@admin_required
-def admin_logout():
-    """Admin logout."""
-    log_admin_action('Admin logout')
-    logout_user()
-    flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+metrics.register_callback(collect_cache_metrics)
 
-def _time_ago(dt):
-    """Helper to calculate time ago."""
-    if not dt:
-        return 'N/A'
-    now = datetime.now()
-    diff = now - dt
-    
-    if diff.days > 0:
-        return f"{diff.days}d ago"
-    elif diff.seconds // 3600 > 0:
-        return f"{diff.seconds // 3600}h ago"
-    elif diff.seconds // 60 > 0:
-        return f"{diff.seconds // 60}m ago"
-    else:
-        return "just now"
+@route('/metrics')
+def prometheus_metrics():
+    """Metrics in the Prometheus text format, merged across processes sharing PROMETHEUS_MULTIPROC_DIR."""
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
-@app.route('/admin')
-@app.route('/admin/dashboard')
-@login_required
-@admin_required
-def admin_dashboard():
-    """Admin dashboard with statistics."""
-    # Calculate statistics
-    total_users = User.query.count()
-    new_users_month = User.query.filter(
-        User.created_at >= datetime.now() - timedelta(days=30)
-    ).count()
-    
-    total_rides = Ride.query.count()
-    active_rides = Ride.query.filter(
-        Ride.status.in_([Ride.STATUS_UPCOMING, Ride.STATUS_ONGOING])
-    ).count()
-    
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status=Booking.STATUS_PENDING).count()
-    
-    # SOS and reports - handle if Report model doesn't exist
-    try:
-        active_sos = Report.query.filter_by(
-            report_type='emergency',
-            status='pending'
-        ).count()
-        pending_reports = Report.query.filter_by(status='pending').count()
-    except:
-        active_sos = 0
-        pending_reports = 0
-    
-    # Trust metrics
-    total_green_flags = db.session.query(func.sum(User.green_flags)).scalar() or 0
-    total_red_flags = db.session.query(func.sum(User.red_flags)).scalar() or 0
-    total_flags = total_green_flags + total_red_flags
-    avg_trust_score = round((total_green_flags / total_flags * 100) if total_flags > 0 else 0, 1)
-    
-    stats = {
-        'total_users': total_users,
-        'new_users_month': new_users_month,
-        'total_rides': total_rides,
-        'active_rides': active_rides,
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'active_sos': active_sos,
-        'pending_reports': pending_reports,
-        'total_green_flags': total_green_flags,
-        'total_red_flags': total_red_flags,
-        'avg_trust_score': avg_trust_score
-    }
-    
-    # Recent activity
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    recent_rides = Ride.query.order_by(Ride.created_at.desc()).limit(5).all()
-    
-    recent_activity = []
-    for user in recent_users:
-        recent_activity.append({
-            'icon': 'person-plus',
-            'color': 'primary',
-            'title': f'New user: {user.username}',
-            'description': f'Registered from {user.email}',
-            'time_ago': _time_ago(user.created_at)
-        })
-    
-    for ride in recent_rides:
-        recent_activity.append({
-            'icon': 'car-front',
-            'color': 'success',
-            'title': f'New ride: {ride.origin} → {ride.destination}',
-            'description': f'By {ride.driver.username}',
-            'time_ago': _time_ago(ride.created_at)
-        })
-    
-    # Sort by time
-    recent_activity.sort(key=lambda x: x['time_ago'])
-    
-    # User growth data (last 30 days) - Optimized to use single query
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    
-    # Get counts grouped by date
-    growth_results = db.session.query(
-        func.date(User.created_at).label('reg_date'),
-        func.count(User.id)
-    ).filter(User.created_at >= thirty_days_ago)\
-     .group_by('reg_date')\
-     .order_by('reg_date').all()
-    
-    # Convert results to dictionary for easy lookup
-    growth_dict = {str(res[0]): res[1] for res in growth_results}
-    
-    user_growth_labels = []
-    user_growth_data = []
-    for i in range(29, -1, -1):
-        day = datetime.now() - timedelta(days=i)
-        date_str = day.strftime('%Y-%m-%d')
-        user_growth_labels.append(day.strftime('%b %d'))
-        user_growth_data.append(growth_dict.get(date_str, 0))
-    
-    # Package distribution - Optimized to use single query
-    distribution_results = db.session.query(
-        Ride.package_type,
-        func.count(Ride.id)
-    ).group_by(Ride.package_type).all()
-    
-    dist_dict = {res[0]: res[1] for res in distribution_results}
-    
-    package_distribution = [
-        dist_dict.get('daily', 0),
-        dist_dict.get('weekly', 0),
-        dist_dict.get('biweekly', 0),
-        dist_dict.get('monthly', 0)
-    ]
-    
-    pending_sos_count = active_sos
-    
-    return render_template('admin/dashboard.html',
-                         stats=stats,
-                         recent_activity=recent_activity,
-                         user_growth_labels=user_growth_labels,
-                         user_growth_data=user_growth_data,
-                         package_distribution=package_distribution,
-                         pending_sos_count=pending_sos_count)
-@app.route('/admin/users')
-@login_required
-@admin_required
-def admin_users():
-    """Admin user management page."""
-    search = request.args.get('search', '')
-    sort_by = request.args.get('sort', 'created_at')
-    
-    query = User.query
-    
-    if search:
-        query = query.filter(
-            db.or_(
-                User.username.ilike(f'%{search}%'),
-                User.email.ilike(f'%{search}%')
-            )
-        )
-    
-    if sort_by == 'username':
-        query = query.order_by(User.username)
-    elif sort_by == 'email':
-        query = query.order_by(User.email)
-    else:
-        query = query.order_by(User.created_at.desc())
-    
-    users = query.paginate(page=request.args.get('page', 1, type=int), per_page=50, error_out=False)
-    
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
-    return render_template('admin/users/list.html',
-                         users=users,
-                         search=search,
-                         sort_by=sort_by,
-                         pending_sos_count=pending_sos_count)
-@app.route('/admin/users/<int:user_id>')
-@login_required
-@admin_required
-def admin_user_detail(user_id):
-    """Admin user detail view."""
-    user = User.query.get_or_404(user_id)
-    
-    rides_offered = Ride.query.filter_by(driver_id=user_id).count()
-    rides_taken = Booking.query.filter_by(passenger_id=user_id, status=Booking.STATUS_COMPLETED).count()
-    
-    total_offered = Ride.query.filter_by(driver_id=user_id).count()
-    completed_offered = Ride.query.filter_by(driver_id=user_id, status=Ride.STATUS_COMPLETED).count()
-    completion_rate = round((completed_offered / total_offered * 100) if total_offered > 0 else 0, 1)
-    
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
-    return render_template('admin/users/detail.html',
-                         user=user,
-                         rides_offered=rides_offered,
-                         rides_taken=rides_taken,
-                         completion_rate=completion_rate,
-                         pending_sos_count=pending_sos_count)
-@app.route('/admin/rides')
-@login_required
-@admin_required
-def admin_rides():
-    """Admin ride management page."""
-    status_filter = request.args.get('status', '')
-    search = request.args.get('search', '')
-    
-    query = Ride.query
-    
-    if status_filter:
-        query = query.filter_by(status=status_filter)
-    
-    if search:
-        query = query.join(User).filter(
-            db.or_(
-                Ride.start_location.ilike(f'%{search}%'),
-                Ride.end_location.ilike(f'%{search}%'),
-                User.username.ilike(f'%{search}%')
-            )
-        )
-    
-    rides = query.order_by(Ride.start_date.desc()).paginate(
-        page=request.args.get('page', 1, type=int),
-        per_page=50,
-        error_out=False
-    )
-    
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
-    return render_template('admin/rides/list.html',
-                         rides=rides,
-                         status_filter=status_filter,
-                         search=search,
-                         pending_sos_count=pending_sos_count)
-@app.route('/admin/rides/<int:ride_id>')
-@login_required
-@admin_required
-def admin_ride_detail(ride_id):
-    """Admin ride detail view."""
-    ride = Ride.query.get_or_404(ride_id)
-    pending_sos_count = Report.query.filter_by(report_type='emergency', status='pending').count()
-    
-    return render_template('admin/rides/detail.html',
-                         ride=ride,
-                         pending_sos_count=pending_sos_count)
 
-@app.route('/admin/rides/<int:ride_id>/cancel', methods=['POST'])
-@login_required
-@admin_required
-def admin_cancel_ride(ride_id):
-    """Admin cancel ride."""
-    ride = Ride.query.get_or_404(ride_id)
-    
-    if ride.status in ['CANCELLED', 'COMPLETED']:
-        flash('Ride is already cancelled or completed.', 'warning')
-        return redirect(url_for('admin_ride_detail', ride_id=ride_id))
-    
-    ride.status = 'CANCELLED'
-    
-    # Cancel all pending bookings
-    for booking in ride.bookings:
-        if booking.status == 'PENDING':
-            booking.status = 'REJECTED'
-        elif booking.status == 'CONFIRMED':
-            booking.status = 'CANCELLED'
-            
-    db.session.commit()
-    
-    log_admin_action('Cancel Ride', target_type='Ride', target_id=ride.id, 
-                    details=f'Ride {ride.id} cancelled by admin')
-    
-    flash('Ride has been cancelled successfully.', 'success')
-    return redirect(url_for('admin_ride_detail', ride_id=ride_id))
+# ============================================================================
+# DATABASE MIGRATIONS
+# ============================================================================
 
-@app.route('/admin/safety')
-@login_required
-@admin_required
-def admin_safety():
-    """Admin safety center - SOS alerts and reports."""
-    sos_alerts = Report.query.filter_by(
-        report_type='emergency',
-        status='pending'
-    ).order_by(Report.created_at.desc()).all()
-    
-    reports = Report.query.filter_by(
-        status='pending'
-    ).order_by(Report.created_at.desc()).limit(20).all()
-    
-    pending_sos_count = len(sos_alerts)
-    
-    return render_template('admin/safety/reports.html',
-                         sos_alerts=sos_alerts,
-                         reports=reports,
-                         pending_sos_count=pending_sos_count)
-@app.route('/admin/reports/<int:report_id>/resolve', methods=['POST'])
-@login_required
-@admin_required
-def admin_resolve_report(report_id):
-    """Resolve a report."""
-    report = Report.query.get_or_404(report_id)
-    report.status = 'resolved'
-    report.resolved_at = utc_now()
-    db.session.commit()
-    
-    log_admin_action('Resolved report', 'report', report_id, f'Type: {report.report_type}')
-    
-    flash('Report has been resolved.', 'success')
-    return redirect(url_for('admin_safety'))
-@app.route('/admin/reports/<int:report_id>/dismiss', methods=['POST'])
-@login_required
-@admin_required
-def admin_dismiss_report(report_id):
-    """Dismiss a report."""
-    report = Report.query.get_or_404(report_id)
-    report.status = 'dismissed'
-    report.resolved_at = utc_now()
-    db.session.commit()
+def ensure_indexes():
+    """
+    Create declared indexes that are missing from an existing database.
     
-    log_admin_action('Dismissed report', 'report', report_id, f'Type: {report.report_type}')
+    db.create_all() only creates indexes together with new tables, so
+    databases created before an index was declared need this step. Safe to
+    run repeatedly on SQLite and PostgreSQL; tables that do not exist yet
+    are skipped (create_all builds them with their indexes), as are indexes
+    on columns that have not been migrated in yet.
     
-    flash('Report has been dismissed.', 'success')
-    return redirect(url_for('admin_safety'))
+    Returns:
+        list: names of the indexes that were created
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for mapped_table in db.metadata.sorted_tables:
+        if mapped_table.name not in existing_tables:
+            continue
+        existing_indexes = {ix['name'] for ix in inspector.get_indexes(mapped_table.name)}
+        existing_columns = {col['name'] for col in inspector.get_columns(mapped_table.name)}
+        for index in sorted(mapped_table.indexes, key=lambda ix: ix.name):
+            if index.name not in existing_indexes and \
+                    all(col.name in existing_columns for col in index.columns):
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
 
-# ============================================================================
-# END OF ADMIN ROUTES
-# ============================================================================
+# Admin panel routes (admin_routes.py), declared once the helpers they use exist
+import admin_routes  # noqa: E402,F401
+
+# The application served by gunicorn (app:app) and used by the scripts
+app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
@@ -2651,6 +2971,16 @@ if __name__ == '__main__':
                 conn.execute(text('ALTER TABLE user ADD COLUMN red_flags INTEGER DEFAULT 0'))
                 conn.commit()
         
+        # Add rating aggregates to user table and backfill them from reviews
+        if 'rating_sum' not in user_columns or 'rating_count' not in user_columns:
+            with db.engine.connect() as conn:
+                for column_name in ('rating_sum', 'rating_count'):
+                    if column_name not in user_columns:
+                        conn.execute(text(f'ALTER TABLE user ADD COLUMN {column_name} INTEGER NOT NULL DEFAULT 0'))
+                conn.commit()
+            fixed = check_rating_aggregates(fix=True)
+            print(f"Added rating aggregate columns; backfilled {len(fixed)} user(s).")
+        
         # Add flag_type and review_type to review table
         try:
             review_columns = [col['name'] for col in inspector.get_columns('review')]
@@ -2695,6 +3025,50 @@ if __name__ == '__main__':
         except Exception as e:
             print(f"Migration error for ride table: {e}")
         
+        # Add map coordinates to ride table
+        try:
+            ride_columns = [col['name'] for col in inspector.get_columns('ride')]
+            for column_name in ('start_lat', 'start_lng', 'end_lat', 'end_lng'):
+                if column_name not in ride_columns:
+                    with db.engine.connect() as conn:
+                        conn.execute(text(f'ALTER TABLE ride ADD COLUMN {column_name} FLOAT DEFAULT NULL'))
+                        conn.commit()
+                        print(f"Added {column_name} column to ride table.")
+            if 'route_polyline' not in ride_columns:
+                with db.engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE ride ADD COLUMN route_polyline TEXT DEFAULT NULL'))
+                    conn.commit()
+                    print("Added route_polyline column to ride table.")
+            if 'updated_at' not in ride_columns:
+                with db.engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE ride ADD COLUMN updated_at DATETIME DEFAULT NULL'))
+                    conn.execute(text('UPDATE ride SET updated_at = created_at'))
+                    conn.commit()
+                    print("Added updated_at column to ride table.")
+        except Exception as e:
+            print(f"Migration error for ride coordinates: {e}")
+        
+        # Add change tracking used by incremental exports
+        for tracked_table in ('user', 'booking', 'review', 'report'):
+            try:
+                if 'updated_at' not in [col['name'] for col in inspector.get_columns(tracked_table)]:
+                    quoted = db.engine.dialect.identifier_preparer.quote(tracked_table)
+                    with db.engine.connect() as conn:
+                        conn.execute(text(f'ALTER TABLE {quoted} ADD COLUMN updated_at TIMESTAMP DEFAULT NULL'))
+                        conn.execute(text(f'UPDATE {quoted} SET updated_at = created_at'))
+                        conn.commit()
+                        print(f"Added updated_at column to {tracked_table} table.")
+            except Exception as e:
+                print(f"Migration error for {tracked_table} updated_at: {e}")
+        
+        # Persist estimated end times for rides offered before they were stored
+        try:
+            backfilled = backfill_estimated_end_times()
+            if backfilled:
+                print(f"Stored estimated end times for {backfilled} ride(s).")
+        except Exception as e:
+            print(f"Migration error for estimated end times: {e}")
+        
         # Add completion tracking fields to booking table
         if 'marked_complete_by_passenger' not in booking_columns:
             with db.engine.connect() as conn:
@@ -2707,7 +3081,14 @@ if __name__ == '__main__':
                 conn.commit()
                 print("Added passenger_completed_at column to booking table.")
         
-    # Admin routes are defined above in the main app.py file
-    # No need for separate import to avoid circular dependencies
-    
+        # Add indexes declared after the tables were first created
+        # (after the column migrations, since some indexes cover new columns)
+        for index_name in ensure_indexes():
+            print(f"Created index {index_name}.")
+        try:
+            for name in ensure_location_search():
+                print(f"Created location search object {name}.")
+        except Exception as e:
+            print(f"Location search setup skipped (substring search will be used): {e}")
+        
     app.run(debug=True)
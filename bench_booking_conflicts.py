@@ -0,0 +1,98 @@
+"""
+Benchmark for the booking time-conflict check in book_ride.
+A heavy commuter with hundreds of active bookings opens a booking page; the
+old flow loaded every booking and recomputed each ride's end time in Python,
+find_booking_conflict() asks the database with one range query.
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+
+Usage: python bench_booking_conflicts.py [--bookings 500] [--repeat 50]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='rideshare-bench-'), 'bench.db')
+
+from app import app, db, User, Car, Ride, Booking, find_booking_conflict, utc_now
+
+
+def legacy_conflict(passenger_id, ride):
+    """The pre-index check: every active booking, end times computed in Python."""
+    ride_end_time = ride.get_estimated_end_time()
+    user_bookings = Booking.query.filter_by(passenger_id=passenger_id)\
+        .filter(Booking.status.in_([Booking.STATUS_CONFIRMED, Booking.STATUS_PENDING]))\
+        .join(Ride).all()
+    for booking in user_bookings:
+        if booking.ride_id == ride.id:
+            continue
+        other_ride = booking.ride
+        if ride.start_date < other_ride.get_estimated_end_time() and ride_end_time > other_ride.start_date:
+            return other_ride.id
+    return None
+
+
+def setup(bookings):
+    """One passenger booked on `bookings` daily rides, plus a free slot to test."""
+    db.drop_all()
+    db.create_all()
+    driver = User(username='bench_driver', email='bench_driver@example.com')
+    passenger = User(username='bench_passenger', email='bench_passenger@example.com')
+    db.session.add_all([driver, passenger])
+    db.session.flush()
+    car = Car(owner_id=driver.id, make='Maruti', model='Swift', year=2022, color='White',
+              license_plate='BENCH-1', fuel_type='petrol', mileage=23.2)
+    db.session.add(car)
+    db.session.flush()
+
+    first = utc_now().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    rides = [Ride(driver_id=driver.id, car_id=car.id, start_location='A', end_location='B',
+                  start_date=first + timedelta(days=i), end_date=first + timedelta(days=i + 1),
+                  available_seats=3, price_per_seat=100.0, distance=30.0, status=Ride.STATUS_UPCOMING)
+             for i in range(bookings)]
+    free_slot = Ride(driver_id=driver.id, car_id=car.id, start_location='B', end_location='A',
+                     start_date=first + timedelta(hours=10), end_date=first + timedelta(days=1),
+                     available_seats=3, price_per_seat=100.0, distance=30.0, status=Ride.STATUS_UPCOMING)
+    db.session.add_all(rides + [free_slot])
+    db.session.flush()
+    db.session.add_all([Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1,
+                                status=Booking.STATUS_CONFIRMED, pickup_address='A', drop_address='B')
+                        for ride in rides])
+    db.session.commit()
+    return passenger.id, free_slot.id
+
+
+def timed(check, passenger_id, ride_id, repeat):
+    """Mean seconds per check, each run on a fresh session like a request would."""
+    total = 0.0
+    for _ in range(repeat):
+        db.session.remove()
+        ride = db.session.get(Ride, ride_id)
+        started = time.perf_counter()
+        result = check(passenger_id, ride)
+        total += time.perf_counter() - started
+    return total / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Booking conflict check benchmark.')
+    parser.add_argument('--bookings', type=int, default=500, help='Active bookings (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=50, help='Checks per flow (default: %(default)s)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        print(f"{args.bookings} active bookings, {args.repeat} checks per flow\n")
+        passenger_id, ride_id = setup(args.bookings)
+        print(f"{'flow':<10} {'per check':>12} {'conflict':>9}")
+        for name, check in [('legacy', legacy_conflict), ('sql', find_booking_conflict)]:
+            seconds, result = timed(check, passenger_id, ride_id, args.repeat)
+            print(f"{name:<10} {seconds * 1000:>10.2f}ms {str(result):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Import benchmark.
+Generates a synthetic dataset, exports it, then loads it twice into a fresh
+database: once the way the old import_data.py did (a query.get() per record,
+dateutil parsing, one ORM object per row) and once with the bulk loader.
+Reports rows/second for both.
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set
+(use a scratch PostgreSQL database to exercise COPY and --workers).
+
+Usage: python bench_import.py [--users 5000] [--batch-size 5000] [--workers 1]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='rideshare-bench-'), 'bench.db')
+
+from dateutil import parser as date_parser
+from sqlalchemy.exc import LegacyAPIWarning
+
+from app import app, db, User, Car, Ride, Booking, utc_now
+from export_data import export_data, json_default
+from import_data import import_data
+
+LEGACY_MODELS = [('users', User), ('cars', Car), ('rides', Ride), ('bookings', Booking)]
+
+
+def generate(users):
+    """Fill a fresh database with `users` users and cars, 2x rides and 4x bookings."""
+    now = utc_now()
+    db.drop_all()
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench_{i}', 'email': f'bench_{i}@example.com', 'password_hash': 'x' * 100,
+         'phone': '9800000000', 'created_at': now} for i in range(1, users + 1)])
+    db.session.execute(Car.__table__.insert(), [
+        {'id': i, 'owner_id': i, 'make': 'Maruti', 'model': 'Swift', 'year': 2022, 'color': 'White',
+         'license_plate': f'BENCH-{i}', 'fuel_type': 'petrol', 'mileage': 23.2, 'created_at': now}
+        for i in range(1, users + 1)])
+    db.session.execute(Ride.__table__.insert(), [
+        {'id': i, 'driver_id': i % users + 1, 'car_id': i % users + 1, 'start_location': 'Andheri',
+         'end_location': 'Bandra', 'start_date': now + timedelta(days=1), 'end_date': now + timedelta(days=8),
+         'available_seats': 3, 'price_per_seat': 100.0, 'distance': 20.0, 'status': 'upcoming',
+         'package_type': 'weekly', 'created_at': now, 'updated_at': now} for i in range(1, 2 * users + 1)])
+    db.session.execute(Booking.__table__.insert(), [
+        {'id': i, 'ride_id': i % (2 * users) + 1, 'passenger_id': (i * 7) % users + 1, 'seats': 1,
+         'status': 'confirmed', 'pickup_address': 'Andheri East', 'drop_address': 'Bandra West',
+         'created_at': now, 'booking_date': now} for i in range(1, 4 * users + 1)])
+    db.session.commit()
+
+
+def write_legacy_backup(path):
+    """The same data in the old rideshare_backup.json shape."""
+    data = {key: [{column.name: getattr(row, column.name) for column in model.__table__.columns}
+                  for row in model.query.all()]
+            for key, model in LEGACY_MODELS}
+    with open(path, 'w') as f:
+        json.dump(data, f, default=json_default)
+
+
+def legacy_import(path):
+    """The old import loop: a SELECT and an ORM object per record, dateutil for every datetime."""
+    warnings.simplefilter('ignore', LegacyAPIWarning)
+    db.drop_all()
+    db.create_all()
+    with open(path) as f:
+        data = json.load(f)
+    for key, model in LEGACY_MODELS:
+        datetimes = {column.name for column in model.__table__.columns if isinstance(column.type, db.DateTime)}
+        for record in data[key]:
+            if not model.query.get(record['id']):
+                values = {name: date_parser.parse(value) if name in datetimes and value else value
+                          for name, value in record.items()}
+                db.session.add(model(**values))
+        db.session.commit()
+    return sum(len(data[key]) for key, _ in LEGACY_MODELS)
+
+
+def timed(label, rows, fn, *args):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {rows:>8} rows  {elapsed:>7.2f}s  {rows / elapsed:>9.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import benchmark: old per-row loop vs bulk loader.')
+    parser.add_argument('--users', type=int, default=5000,
+                        help='Users (and cars); rides are 2x and bookings 4x this (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Bulk loader batch size (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1, help='Bulk loader parallel tables (default: %(default)s)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rideshare-bench-')
+    export_dir, backup = os.path.join(workdir, 'export'), os.path.join(workdir, 'backup.json')
+    rows = 8 * args.users
+    with app.app_context():
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        generate(args.users)
+        write_legacy_backup(backup)
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_data(export_dir, compress='gzip')
+        db.session.remove()
+        print(f"Dataset: {rows} rows in users, cars, rides and bookings\n")
+
+        legacy = timed('legacy', rows, legacy_import, backup)
+        db.session.remove()
+    bulk = timed('bulk', rows, import_data, export_dir, args.batch_size, args.workers)
+    print(f"\nspeedup: {legacy / bulk:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Contention benchmark for seat reservation.
+Hundreds of concurrent bookers race for the seats of a single ride, once with
+the old read-check-write flow and once with reserve_seats(), and the script
+reports how many seats each approach oversold.
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set
+(use a scratch PostgreSQL database for realistic row locking).
+
+Usage: python bench_seat_reservation.py [--bookers 300] [--seats 20]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='rideshare-bench-'), 'bench.db')
+
+from app import app, db, User, Car, Ride, Booking, reserve_seats, utc_now
+
+
+def legacy_book(ride_id, passenger_id):
+    """The pre-reservation flow: check in Python, then write the new value back."""
+    ride = db.session.get(Ride, ride_id)
+    if ride.available_seats < 1:
+        return False
+    time.sleep(0)  # let other bookers interleave between check and write
+    ride.available_seats -= 1
+    db.session.add(Booking(ride_id=ride_id, passenger_id=passenger_id, seats=1,
+                           pickup_address='Bench', drop_address='Bench'))
+    return True
+
+
+def atomic_book(ride_id, passenger_id):
+    if not reserve_seats(ride_id, 1):
+        return False
+    db.session.add(Booking(ride_id=ride_id, passenger_id=passenger_id, seats=1,
+                           pickup_address='Bench', drop_address='Bench'))
+    return True
+
+
+def setup(bookers, seats):
+    """Create a fresh ride with `seats` seats and `bookers` passengers."""
+    db.drop_all()
+    db.create_all()
+    driver = User(username='bench_driver', email='bench_driver@example.com')
+    passengers = [User(username=f'bench_{i}', email=f'bench_{i}@example.com') for i in range(bookers)]
+    db.session.add_all([driver] + passengers)
+    db.session.flush()
+    car = Car(owner_id=driver.id, make='Maruti', model='Swift', year=2022, color='White',
+              license_plate='BENCH-1', fuel_type='petrol', mileage=23.2)
+    db.session.add(car)
+    db.session.flush()
+    start = utc_now() + timedelta(days=1)
+    ride = Ride(driver_id=driver.id, car_id=car.id, start_location='A', end_location='B',
+                start_date=start, end_date=start + timedelta(days=7), available_seats=seats,
+                price_per_seat=100.0, distance=20.0, status=Ride.STATUS_UPCOMING)
+    db.session.add(ride)
+    db.session.commit()
+    return ride.id, [p.id for p in passengers]
+
+
+def run(book, bookers, seats):
+    with app.app_context():
+        ride_id, passenger_ids = setup(bookers, seats)
+
+    barrier = threading.Barrier(bookers)
+    errors = []
+
+    def worker(passenger_id):
+        with app.app_context():
+            barrier.wait()
+            try:
+                book(ride_id, passenger_id)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(pid,)) for pid in passenger_ids]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        booked = db.session.query(db.func.coalesce(db.func.sum(Booking.seats), 0)).scalar()
+        remaining = db.session.get(Ride, ride_id).available_seats
+    return {
+        'booked': booked,
+        'remaining': remaining,
+        'oversold': max(0, booked - seats),
+        'inconsistent': booked + remaining != seats,
+        'errors': len(errors),
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seat reservation contention benchmark.')
+    parser.add_argument('--bookers', type=int, default=300, help='Concurrent bookers (default: %(default)s)')
+    parser.add_argument('--seats', type=int, default=20, help='Seats on the ride (default: %(default)s)')
+    args = parser.parse_args()
+
+    print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{args.bookers} concurrent bookers, {args.seats} seats\n")
+    print(f"{'flow':<10} {'booked':>7} {'left':>6} {'oversold':>9} {'consistent':>11} {'errors':>7} {'time':>8}")
+    for name, book in [('legacy', legacy_book), ('atomic', atomic_book)]:
+        r = run(book, args.bookers, args.seats)
+        print(f"{name:<10} {r['booked']:>7} {r['remaining']:>6} {r['oversold']:>9} "
+              f"{'no' if r['inconsistent'] else 'yes':>11} {r['errors']:>7} {r['elapsed']:>7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
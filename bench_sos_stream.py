@@ -0,0 +1,153 @@
+"""
+Load test for the admin SOS stream.
+Opens many idle /admin/stream/sos connections, triggers SOS alerts as a
+passenger and reports how long each alert took to reach every connection.
+
+The app is served from this process on a throwaway SQLite database; with
+--gevent it runs under gevent's WSGI server (as gunicorn.conf.py does in
+production), otherwise under Werkzeug's thread-per-connection server.
+
+Usage: python bench_sos_stream.py [--connections 500] [--alerts 20] [--gevent]
+"""
+
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import http.client
+import logging
+import os
+import selectors
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='rideshare-bench-'), 'bench.db')
+
+from app import app, db, User, sos_broker
+
+
+def setup():
+    """Create an admin and a passenger; return their session cookies."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(username='bench_admin', email='bench_admin@example.com', is_admin=True)
+        passenger = User(username='bench_passenger', email='bench_passenger@example.com')
+        db.session.add_all([admin, passenger])
+        db.session.commit()
+        user_ids = admin.id, passenger.id
+
+    cookies = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        cookies.append('session=' + client.get_cookie('session').value)
+    return cookies
+
+
+def serve(use_gevent):
+    """Start the app on a free local port in the background; return the port."""
+    if use_gevent:
+        from gevent.pywsgi import WSGIServer
+        server = WSGIServer(('127.0.0.1', 0), app, log=None, spawn=10000)
+        server.start()
+        return server.server_port
+
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server.socket.listen(4096)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port
+
+
+def open_streams(port, cookie, count):
+    """Open `count` SSE connections and return their sockets."""
+    request = (f'GET /admin/stream/sos HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n'
+               'Accept: text/event-stream\r\n\r\n').encode()
+    streams = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(request)
+        sock.setblocking(False)
+        streams.append(sock)
+    return streams
+
+
+def run(args):
+    admin_cookie, passenger_cookie = setup()
+    port = serve(args.gevent)
+    streams = open_streams(port, admin_cookie, args.connections)
+
+    deadline = time.monotonic() + 30
+    while sos_broker.subscriber_count < args.connections and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print(f"{sos_broker.subscriber_count}/{args.connections} streams subscribed")
+
+    selector = selectors.DefaultSelector()
+    for sock in streams:
+        selector.register(sock, selectors.EVENT_READ, bytearray())
+
+    latencies = []
+    for alert in range(args.alerts):
+        marker = f'bench alert {alert}"'.encode()
+        waiting = set(streams)
+        sent_at = time.perf_counter()
+
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('POST', '/api/sos/trigger', body=f'{{"message": "bench alert {alert}"}}',
+                     headers={'Content-Type': 'application/json', 'Cookie': passenger_cookie})
+        conn.getresponse().read()
+        conn.close()
+
+        alert_deadline = time.monotonic() + 10
+        while waiting and time.monotonic() < alert_deadline:
+            for key, _ in selector.select(timeout=1):
+                sock, buffer = key.fileobj, key.data
+                buffer.extend(sock.recv(65536))
+                if sock in waiting and marker in buffer:
+                    latencies.append(time.perf_counter() - sent_at)
+                    waiting.discard(sock)
+                    del buffer[:]
+        if waiting:
+            print(f"alert {alert}: {len(waiting)} stream(s) never received it")
+
+    for sock in streams:
+        sock.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admin SOS stream load test.')
+    parser.add_argument('--connections', type=int, default=500,
+                        help='Idle admin streams to hold open (default: %(default)s)')
+    parser.add_argument('--alerts', type=int, default=20, help='SOS alerts to trigger (default: %(default)s)')
+    parser.add_argument('--gevent', action='store_true', help="Serve with gevent's WSGI server")
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.logger.setLevel(logging.ERROR)
+    print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"Server: {'gevent' if args.gevent else 'werkzeug (threaded)'}, "
+          f"{args.connections} streams, {args.alerts} alerts\n")
+    latencies = sorted(run(args))
+    if not latencies:
+        print("No alerts delivered")
+        return
+
+    ms = [latency * 1000 for latency in latencies]
+    print(f"\ndeliveries: {len(ms)}/{args.connections * args.alerts}")
+    print(f"latency ms: p50 {statistics.median(ms):.1f}  "
+          f"p95 {ms[int(len(ms) * 0.95) - 1]:.1f}  max {ms[-1]:.1f}")
+
+
+if __name__ == '__main__':
+    main()
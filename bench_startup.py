@@ -0,0 +1,75 @@
+"""
+Benchmark for the cost of importing the application, which every gunicorn
+worker and every script (export_data.py, seed_data.py, diag.py) pays before
+doing any work. Imports the module in a fresh interpreter under
+`python -X importtime`, with GEMINI_API_KEY set so a chatbot-enabled
+deployment is measured, and reports the total and its costliest imports.
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+
+Usage: python bench_startup.py [--module app] [--repeat 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(module='app', env=None):
+    """
+    Import `module` in a fresh interpreter and read its -X importtime report.
+
+    Args:
+        module: name of the module to import
+        env: extra environment variables for the interpreter
+
+    Returns:
+        tuple: (seconds to import `module`, {module imported by it: cumulative seconds})
+    """
+    environment = dict(os.environ, GEMINI_API_KEY='bench-key')
+    environment['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='rideshare-bench-'), 'bench.db')
+    environment.update(env or {})
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=BASE_DIR, env=environment, capture_output=True, text=True, check=True)
+    # Lines look like 'import time:   self [us] | cumulative |   name', two spaces of indent per level
+    total, imported = None, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if level == 0 and name == module:
+            total = int(cumulative) / 1e6
+        else:
+            imported.setdefault(name, int(cumulative) / 1e6)
+    return total, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Application import time benchmark.')
+    parser.add_argument('--module', default='app', help='Module to import (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to time (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=15, help='Costliest imports to list (default: %(default)s)')
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.repeat)]
+    totals = [total for total, _ in runs]
+    print(f"import {args.module}: median {statistics.median(totals) * 1000:.0f}ms, "
+          f"min {min(totals) * 1000:.0f}ms over {args.repeat} runs\n")
+
+    # Costliest imports in the fastest run; nested modules count towards their parents too
+    _, imported = min(runs, key=lambda run: run[0])
+    print(f"{'module':<45} {'cumulative':>10}")
+    for name, seconds in sorted(imported.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<45} {seconds * 1000:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Chatbot answers for the Ride-Share application.
+
+The /chatbot views import this module on first use rather than app.py
+importing it, and the Gemini client is only created when a question first
+needs the model: the google-genai SDK takes about a second to import, which
+every worker and script would otherwise pay at startup.
+"""
+
+import threading
+
+from flask import current_app, url_for
+
+from app import PACKAGE_DURATIONS, TIME_RESTRICTIONS, CHATBOT_DURATION, CACHE_REQUESTS, metrics
+from faq_cache import SemanticCache
+from gemini_chat import ChatService, create_genai_client, FALLBACK_RESPONSE, UNAVAILABLE_RESPONSE
+
+# One Gemini client (and connection pool) for the whole process, created on first use
+_chat_service = None
+_chat_service_lock = threading.Lock()
+
+def get_chat_service():
+    """The process-wide ChatService; its Gemini client is created on the first call."""
+    global _chat_service
+    if _chat_service is None:
+        with _chat_service_lock:
+            if _chat_service is None:
+                config = current_app.config
+                _chat_service = ChatService(
+                    create_genai_client(config['GEMINI_API_KEY'], config['CHATBOT_TIMEOUT_SECONDS'],
+                                        config['CHATBOT_MAX_CONCURRENCY'], config['GEMINI_BASE_URL'] or None)
+                    if config['GEMINI_API_KEY'] else None,
+                    timeout=config['CHATBOT_TIMEOUT_SECONDS'],
+                    max_concurrency=config['CHATBOT_MAX_CONCURRENCY'],
+                    on_result=lambda outcome, seconds: CHATBOT_DURATION.labels(outcome).observe(seconds))
+    return _chat_service
+
+
+# Chatbot FAQ answers
+# Most chatbot questions are the same few how-tos. Answers are cached by
+# normalised question with near-duplicate matching (faq_cache.SemanticCache),
+# and the cache is seeded with answers built from the app's own routes and
+# package rules, so common questions never reach Gemini.
+_chat_answer_cache = None
+_chat_answer_cache_lock = threading.Lock()
+
+def _format_hour(hour):
+    """24-hour clock hour -> '7:00 PM'."""
+    return f"{hour % 12 or 12}:00 {'AM' if hour % 24 < 12 else 'PM'}"
+
+def build_faq_corpus():
+    """
+    FAQ entries generated from the current routes and package rules.
+    
+    Must run inside a request (or test request) context for url_for.
+    
+    Returns:
+        list: (questions, answer) pairs
+    """
+    packages = ', '.join(f"{name} ({days} day{'s' if days != 1 else ''})"
+                         for name, days in PACKAGE_DURATIONS.items())
+    windows = '; '.join(
+        f"{name}: start between {_format_hour(rules['start_min'])} and {_format_hour(rules['start_max'])}, "
+        f"finish by {_format_hour(rules['end_deadline'])}"
+        for name, rules in TIME_RESTRICTIONS.items())
+    return [
+        (['How do I offer a ride?', 'How can I become a driver?', 'Post a ride', 'Create a ride'],
+         f"Go to Offer Ride ({url_for('offer_ride')}), pick your car, route, start time, package and seats, "
+         f"then submit. You need a car on your profile first: add one at {url_for('add_car')}."),
+        (['How do I book a ride?', 'How can I reserve a seat?', 'Book a seat', 'Join a ride'],
+         f"Search for rides at {url_for('search_rides')}, open one that fits and choose Book Now. "
+         f"Enter your pickup and drop points and the number of seats; the driver then confirms your booking."),
+        (['How do I search for rides?', 'Find a ride near me', 'Look for rides'],
+         f"Use Search Rides ({url_for('search_rides')}). Filter by origin and destination, date, price and "
+         f"car preferences, or use Near Me to find rides passing close to your location."),
+        (['How do I cancel a booking?', 'Cancel my reservation'],
+         f"Open My Bookings ({url_for('my_bookings')}) and cancel the booking. Pending and confirmed "
+         f"bookings can be cancelled; your seats go back to the ride straight away."),
+        (['How do I cancel a ride I offered?', 'Cancel my ride as a driver'],
+         f"Open the ride from your dashboard ({url_for('dashboard')}) and choose Cancel Ride before it "
+         f"starts. Every pending and confirmed booking on it is cancelled along with the ride."),
+        (['What ride packages are there?', 'What packages are available?', 'What is a weekly package?'],
+         f"Rides are offered as packages: {packages}. The package sets how many days the ride repeats "
+         f"and when it may run."),
+        (['What time can rides start?', 'What are the ride timings?', 'Time restrictions for packages'],
+         f"Allowed times per package: {windows}."),
+        (['How is the price calculated?', 'How does the wallet work?', 'How are ride costs shared?'],
+         "The fare is based on the estimated fuel cost of the trip. For daily rides passengers share 50% "
+         "of it, for weekly, biweekly and monthly rides 75%, split across the seats offered."),
+        (['How do I add a car?', 'Register my vehicle'],
+         f"Go to Add Car ({url_for('add_car')}) and enter its make, model, year, colour, number plate "
+         f"and fuel type."),
+        (['How do I review a driver?', 'How do I rate a passenger?', 'Leave a review'],
+         f"Once a booking is completed, open it from My Bookings ({url_for('my_bookings')}) or your "
+         f"dashboard and leave a rating with an optional green or red flag."),
+        (['How do I report a problem?', 'Submit a complaint', 'Report a user'],
+         f"Use the Report page ({url_for('submit_report')}) to send feedback, a complaint or an "
+         f"emergency report to the admins. In an emergency use the SOS button instead."),
+        (['How do I sign up?', 'Create an account', 'How do I register?'],
+         f"Register at {url_for('register')} with a username, email and password, then log in at "
+         f"{url_for('login')}."),
+    ]
+
+def get_chat_answer_cache():
+    """The process-wide chatbot answer cache, seeded on first use."""
+    global _chat_answer_cache
+    if _chat_answer_cache is None:
+        with _chat_answer_cache_lock:
+            if _chat_answer_cache is None:
+                answer_cache = SemanticCache(capacity=current_app.config['CHATBOT_CACHE_SIZE'],
+                                             ttl=current_app.config['CHATBOT_CACHE_TTL'])
+                for questions, answer in build_faq_corpus():
+                    answer_cache.seed(questions, answer)
+                _chat_answer_cache = answer_cache
+    return _chat_answer_cache
+
+def answer_chat_message(message):
+    """
+    Answer a chatbot message from the cache, falling back to Gemini.
+    
+    Only real model answers are cached; fallback replies are not.
+    """
+    answer_cache = get_chat_answer_cache()
+    answer = answer_cache.get(message)
+    if answer is None:
+        answer = get_chat_service().ask(message)
+        if answer and answer not in (FALLBACK_RESPONSE, UNAVAILABLE_RESPONSE):
+            answer_cache.put(message, answer)
+    return answer
+
+def stream_chat_answer(message):
+    """
+    Like answer_chat_message, but as an iterable of text chunks.
+    
+    Cached answers come back as a single chunk; otherwise the model's chunks
+    are forwarded as they arrive and the full answer is cached once the
+    model finishes it. Call inside the request (the cache is seeded with
+    url_for on first use); iterating can happen after it.
+    """
+    answer_cache = get_chat_answer_cache()
+    answer = answer_cache.get(message)
+    if answer is not None:
+        return [answer]
+    return get_chat_service().stream(message, on_complete=lambda text: answer_cache.put(message, text))
+
+ANSWER_CACHE_HITS = metrics.RunningTotal(CACHE_REQUESTS.labels('chatbot_answers', 'hit'))
+ANSWER_CACHE_MISSES = metrics.RunningTotal(CACHE_REQUESTS.labels('chatbot_answers', 'miss'))
+
+def collect_answer_cache_metrics():
+    """Copy the answer cache's hit and miss counts into the request counters."""
+    if _chat_answer_cache is not None:
+        answer_stats = _chat_answer_cache.stats()
+        ANSWER_CACHE_HITS.update(answer_stats['hits'] + answer_stats['near_hits'])
+        ANSWER_CACHE_MISSES.update(answer_stats['misses'])
+
+metrics.register_callback(collect_answer_cache_metrics)
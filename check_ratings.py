@@ -0,0 +1,37 @@
+"""
+Recompute users' rating aggregates (rating_sum, rating_count, rating) from the
+review table and report any that have drifted. Run with --fix to write the
+recomputed values back; on a database that predates the aggregate columns
+this is the one-shot backfill.
+
+Usage: python check_ratings.py [--fix]
+"""
+
+import argparse
+
+from app import app, check_rating_aggregates
+
+
+def check_ratings(fix=False):
+    with app.app_context():
+        print(f"Target DB: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        mismatches = check_rating_aggregates(fix=fix)
+        for m in mismatches:
+            stored_sum, stored_count, stored_rating = m['stored']
+            actual_sum, actual_count, actual_rating = m['actual']
+            print(f"user {m['id']}: stored {stored_sum}/{stored_count} = {stored_rating:.2f}, "
+                  f"reviews {actual_sum}/{actual_count} = {actual_rating:.2f}")
+        if not mismatches:
+            print("All rating aggregates match the reviews.")
+        elif fix:
+            print(f"Fixed {len(mismatches)} user(s).")
+        else:
+            print(f"{len(mismatches)} user(s) out of date; rerun with --fix to correct them.")
+        return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check (and optionally fix) user rating aggregates.')
+    parser.add_argument('--fix', action='store_true', help='write the recomputed aggregates back')
+    args = parser.parse_args()
+    check_ratings(fix=args.fix)
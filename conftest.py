@@ -0,0 +1,95 @@
+"""
+Shared pytest fixtures for the Ride-Share application.
+Points the app at a throwaway SQLite file before it is imported, so tests
+never touch rideshare.db or a DATABASE_URL from the environment.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+_test_dir = tempfile.mkdtemp(prefix='rideshare-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_test_dir, 'test.db')
+
+import pytest
+from sqlalchemy import event
+
+from app import app as flask_app, db, User, Car, Ride, utc_now
+
+
+@pytest.fixture
+def app():
+    """App with a fresh schema for each test."""
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SQL_REPEAT_ACTION='raise')
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Factory for users; usernames/emails are derived from `name`."""
+    def _make_user(name, **kwargs):
+        user = User(username=name, email=f'{name}@example.com', **kwargs)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return _make_user
+
+
+@pytest.fixture
+def make_ride(app):
+    """Factory for UPCOMING rides, each with its own driver car."""
+    def _make_ride(driver, **kwargs):
+        car = Car(owner_id=driver.id, make='Maruti', model='Swift', year=2022, color='White',
+                  license_plate=f'MH01-{driver.id}-{Car.query.count()}',
+                  fuel_type='petrol', mileage=23.2, ac=kwargs.pop('ac', True))
+        db.session.add(car)
+        db.session.flush()
+        start_date = kwargs.pop('start_date', utc_now() + timedelta(days=1))
+        values = dict(start_location='Andheri', end_location='Bandra', available_seats=3,
+                      price_per_seat=100.0, distance=20.0, package_type='weekly',
+                      status=Ride.STATUS_UPCOMING)
+        values.update(kwargs)
+        ride = Ride(driver_id=driver.id, car_id=car.id, start_date=start_date,
+                    end_date=start_date + timedelta(days=7), **values)
+        db.session.add(ride)
+        db.session.commit()
+        return ride
+    return _make_ride
+
+
+@pytest.fixture
+def login(client):
+    """Log a user in on the test client without going through the form."""
+    def _login(user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+    return _login
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements issued on the app's engine inside the block."""
+    @contextmanager
+    def _count_queries():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return _count_queries
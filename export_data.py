@@ -1,149 +1,206 @@
+"""
+Streaming database export.
+Writes every table to its own NDJSON file (one JSON object per row and line)
+plus a manifest.json with each table's row count and SHA-256 checksum.
+Rows are read in batches through a streaming cursor (yield_per; a
+server-side cursor on PostgreSQL) and written straight out, so memory stays
+flat however large the tables are.
 
+Checksums cover the uncompressed NDJSON bytes, so they do not depend on the
+compression used. zstd needs the optional `zstandard` package.
+
+Incremental exports (--since PREVIOUS_EXPORT) only write the rows changed
+since that export: the manifest records a high-water mark per table (the
+newest updated_at, or created_at for insert-only tables) and the next run
+selects rows newer than it, less DELTA_OVERLAP to cover transactions that
+committed late. Tables with no timestamp (stats_rollup, stats_event) are written whole.
+Each manifest names its parent, so import_data.py can replay a full export
+followed by its chain of deltas. The app never hard-deletes rows
+(cancellations are status changes), so a delta only carries upserts.
+
+Usage: python export_data.py [--output rideshare_export] [--compress gzip] [--batch-size 1000]
+       python export_data.py --since rideshare_export [--output rideshare_export_delta]
+"""
+
+import argparse
+import gzip
+import hashlib
 import json
 import os
-from app import app, db, User, Car, Ride, Booking, Review, Wallet, Expense
-from datetime import datetime
+import uuid
+from datetime import date, datetime, timedelta
 
-def datetime_serializer(o):
-    if isinstance(o, datetime):
-        return o.isoformat()
-    return str(o)
+from sqlalchemy import select
 
-def export_data():
-    with app.app_context():
-        print("Exporting data from SQLite...")
-        
-        data = {
-            'users': [],
-            'cars': [],
-            'rides': [],
-            'bookings': [],
-            'reviews': [],
-            'wallets': [],
-            'expenses': []
-        }
-
-        # Users
-        for user in User.query.all():
-            data['users'].append({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'password_hash': user.password_hash,
-                'phone': user.phone,
-                'is_admin': user.is_admin,
-                'created_at': user.created_at,
-                'total_rides': user.total_rides,
-                'rating': user.rating,
-                'green_flags': user.green_flags,
-                'red_flags': user.red_flags
-            })
-
-        # Cars
-        for car in Car.query.all():
-            data['cars'].append({
-                'id': car.id,
-                'owner_id': car.owner_id,
-                'make': car.make,
-                'model': car.model,
-                'year': car.year,
-                'color': car.color,
-                'license_plate': car.license_plate,
-                'fuel_type': car.fuel_type,
-                'mileage': car.mileage,
-                'ac': car.ac,
-                'created_at': car.created_at
-            })
-
-        # Rides
-        for ride in Ride.query.all():
-            data['rides'].append({
-                'id': ride.id,
-                'driver_id': ride.driver_id,
-                'car_id': ride.car_id,
-                'start_location': ride.start_location,
-                'end_location': ride.end_location,
-                'start_date': ride.start_date,
-                'end_date': ride.end_date,
-                'actual_start_time': ride.actual_start_time,
-                'actual_end_time': ride.actual_end_time,
-                'estimated_end_time': ride.estimated_end_time,
-                'error_buffer_minutes': ride.error_buffer_minutes,
-                'available_seats': ride.available_seats,
-                'price_per_seat': ride.price_per_seat,
-                'status': ride.status,
-                'distance': ride.distance,
-                'created_at': ride.created_at,
-                'auto_completed': ride.auto_completed,
-                'completed_by': ride.completed_by,
-                'package_type': ride.package_type,
-                'license_photo': ride.license_photo,
-                'driver_photo': ride.driver_photo,
-                'vehicle_photo': ride.vehicle_photo
-            })
-
-        # Bookings
-        for booking in Booking.query.all():
-            data['bookings'].append({
-                'id': booking.id,
-                'ride_id': booking.ride_id,
-                'passenger_id': booking.passenger_id,
-                'seats': booking.seats,
-                'status': booking.status,
-                'created_at': booking.created_at,
-                'pickup_address': booking.pickup_address,
-                'drop_address': booking.drop_address,
-                'share': booking.share, # using 'share' column
-                'contact_number': booking.contact_number,
-                'booking_date': booking.booking_date,
-                'passenger_ride_status': booking.passenger_ride_status,
-                'passenger_completed_at': booking.passenger_completed_at
-            })
-
-        # Reviews
-        for review in Review.query.all():
-            data['reviews'].append({
-                'id': review.id,
-                'reviewer_id': review.reviewer_id,
-                'reviewed_id': review.reviewed_id,
-                'booking_id': review.booking_id,
-                'rating': review.rating,
-                'comment': review.comment,
-                'flag_type': review.flag_type,
-                'review_type': review.review_type,
-                'created_at': review.created_at
-            })
-            
-        # Wallets
-        for wallet in Wallet.query.all():
-            data['wallets'].append({
-                'id': wallet.id,
-                'ride_id': wallet.ride_id,
-                'fuel_cost': wallet.fuel_cost,
-                'toll_cost': wallet.toll_cost,
-                'other_costs': wallet.other_costs,
-                'description': wallet.description,
-                'date_added': wallet.date_added
-            })
-            
-        # Expenses
+from app import app, db, utc_now
+
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# Columns that date a row's last change, in order of preference
+CHANGE_COLUMNS = ('updated_at', 'created_at', 'date_added')
+DELTA_OVERLAP = timedelta(minutes=1)
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def change_column(table):
+    """The column an incremental export filters `table` on, or None."""
+    return next((table.columns[name] for name in CHANGE_COLUMNS if name in table.columns), None)
+
+
+def open_output(path, compress):
+    """Binary writer for `path`, compressing as requested."""
+    if compress == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compress == 'zstd':
         try:
-            for expense in Expense.query.all():
-                 data['expenses'].append({
-                    'id': expense.id,
-                    'ride_id': expense.ride_id,
-                    'toll_cost': expense.toll_cost,
-                    'other_costs': expense.other_costs,
-                    'description': expense.description,
-                    'created_at': expense.created_at
-                })
-        except Exception as e:
-            print(f"Skipping expenses (table might be missing): {e}")
-
-        with open('rideshare_backup.json', 'w') as f:
-            json.dump(data, f, default=datetime_serializer, indent=4)
-            
-        print("Data exported successfully to rideshare_backup.json")
+            import zstandard
+        except ImportError:
+            raise SystemExit('zstd compression needs the zstandard package (pip install zstandard)')
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+
+def export_table(table, path, compress='gzip', batch_size=1000, since=None):
+    """
+    Stream one table into an NDJSON file.
+
+    Args:
+        table: SQLAlchemy Table
+        path: file to write
+        compress: 'none', 'gzip' or 'zstd'
+        batch_size: rows fetched and written per batch
+        since: only rows whose change column is later than this datetime
+
+    Returns:
+        dict: manifest entry (rows, sha256, bytes, columns, high_water)
+    """
+    columns = [column.name for column in table.columns]
+    primary_key = list(table.primary_key.columns)
+    statement = select(table).order_by(*primary_key).execution_options(yield_per=batch_size)
+    changed = change_column(table)
+    if since is not None:
+        statement = statement.where(changed > since)
+    position = columns.index(changed.name) if changed is not None else None
+    high_water = None
+    checksum = hashlib.sha256()
+    rows = 0
+
+    with open_output(path, compress) as out:
+        result = db.session.execute(statement)
+        for batch in result.partitions():
+            chunk = ''.join(json.dumps(dict(zip(columns, row)), default=json_default,
+                                       separators=(',', ':'), ensure_ascii=False) + '\n'
+                            for row in batch).encode('utf-8')
+            checksum.update(chunk)
+            out.write(chunk)
+            rows += len(batch)
+            if position is not None:
+                newest = max((row[position] for row in batch if row[position] is not None), default=None)
+                if newest is not None and (high_water is None or newest > high_water):
+                    high_water = newest
+
+    return {
+        'rows': rows,
+        'sha256': checksum.hexdigest(),
+        'bytes': os.path.getsize(path),
+        'columns': columns,
+        'high_water': high_water.isoformat() if high_water else None,
+    }
+
+
+def read_manifest(export_dir):
+    with open(os.path.join(export_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def export_data(output_dir='rideshare_export', compress='gzip', batch_size=1000, tables=None, since=None,
+                overlap=DELTA_OVERLAP):
+    """
+    Export tables (all of them by default) in foreign-key order.
+
+    Args:
+        output_dir: directory for the table files and manifest.json
+        compress: 'none', 'gzip' or 'zstd'
+        batch_size: rows fetched and written per batch
+        tables: names of the tables to export (full exports only)
+        since: directory of the previous export; only rows changed after it are written
+        overlap: how far before the previous high-water marks to start looking
+
+    Returns:
+        dict: the manifest written to output_dir/manifest.json
+    """
+    parent = read_manifest(since) if since else None
+    if parent and tables:
+        raise ValueError('An incremental export covers every table; --tables cannot be combined with --since')
+    previous_marks = {entry['name']: entry.get('high_water') for entry in parent['tables']} if parent else {}
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        'format': 'ndjson',
+        'version': MANIFEST_VERSION,
+        'id': uuid.uuid4().hex,
+        'kind': 'delta' if parent else 'full',
+        'parent': parent['id'] if parent else None,
+        'created_at': utc_now().isoformat(),
+        'compression': compress,
+        'tables': [],
+    }
+    with app.app_context():
+        print(f"Exporting {manifest['kind']} data from {db.engine.url.render_as_string(hide_password=True)}...")
+        for table in db.metadata.sorted_tables:
+            if tables and table.name not in tables:
+                continue
+            # Tables without a change column, or empty last time, are written whole
+            mode, lower_bound = 'replace', None
+            if parent and change_column(table) is not None:
+                mode = 'upsert'
+                if previous_marks.get(table.name):
+                    lower_bound = datetime.fromisoformat(previous_marks[table.name]) - overlap
+            filename = f'{table.name}.ndjson{COMPRESSION_SUFFIXES[compress]}'
+            entry = export_table(table, os.path.join(output_dir, filename), compress, batch_size, lower_bound)
+            # Nothing changed: the previous mark still stands
+            entry['high_water'] = entry['high_water'] or previous_marks.get(table.name)
+            manifest['tables'].append(dict(name=table.name, file=filename, mode=mode,
+                                           since=lower_bound.isoformat() if lower_bound else None, **entry))
+            print(f"  {table.name:<14} {entry['rows']:>10} rows  {entry['bytes']:>12} bytes")
+        # Consistent reads end here; a long export should not hold its transaction open
+        db.session.rollback()
+
+    # Written last (and atomically), so a manifest always describes complete files
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"Data exported successfully to {output_dir}/")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the database as NDJSON files with a manifest.')
+    parser.add_argument('--output', help='Output directory (default: rideshare_export, '
+                                         'or rideshare_export_<timestamp> with --since)')
+    parser.add_argument('--since', metavar='PREVIOUS_EXPORT',
+                        help='Write only the rows changed since this export (full or incremental)')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES), default='gzip',
+                        help='Compression for the table files (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Rows fetched per batch (default: %(default)s)')
+    parser.add_argument('--tables', help='Comma-separated table names to export (default: all)')
+    args = parser.parse_args()
+
+    output = args.output or ('rideshare_export_' + utc_now().strftime('%Y%m%dT%H%M%S') if args.since
+                             else 'rideshare_export')
+    if args.since and os.path.abspath(output) == os.path.abspath(args.since):
+        parser.error('--output must differ from --since')
+    export_data(output, args.compress, args.batch_size,
+                set(args.tables.split(',')) if args.tables else None, args.since)
+
 
 if __name__ == "__main__":
-    export_data()
+    main()
@@ -0,0 +1,193 @@
+"""
+Semantic answer cache for the support chatbot.
+
+Questions are normalised (lower-case, punctuation and filler words dropped,
+light suffix stemming) and answered from the cache when the same normalised
+question was seen before, or when a stored question is close enough by
+TF-IDF cosine similarity ("how can I cancel my booking?" finds "How do I
+cancel a booking"). Everything is in-process; a lookup touches only the
+entries sharing a word with the question.
+
+Two kinds of entries live side by side:
+    seeded FAQ answers   pinned: never expire or get evicted
+    model answers        least-recently-used eviction past `capacity`,
+                         expire `ttl` seconds after they were stored
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+
+STOP_WORDS = frozenset("""
+    a an the i me my we our you your it its is are am was were be been do does did
+    can could would should will shall may might must how what when where which who why
+    to of in on for at by with from into about as and or if so than then this that
+    these those there here please tell explain want need get any some just have has had
+""".split())
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+_Entry = namedtuple('_Entry', 'terms answer expires_at')
+
+
+def _stem(word):
+    """Very small suffix stripper so book/booked/booking/bookings share a term."""
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('s') and len(word) > 3 and not word.endswith(('ss', 'us')):
+        word = word[:-1]
+    for suffix in ('ing', 'ed'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # cancelled -> cancel, stopped -> stop
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in 'aeious':
+                word = word[:-1]
+            break
+    return word
+
+
+def tokenize(text):
+    """Content words of `text`, stemmed, in order."""
+    return [_stem(word) for word in _TOKEN_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def normalize(text):
+    """Cache key for a message: its content words, or its bare words if it has none."""
+    return ' '.join(tokenize(text)) or ' '.join(_TOKEN_RE.findall(text.lower()))
+
+
+class SemanticCache:
+    """LRU + TTL answer cache with exact and near-duplicate lookup."""
+
+    def __init__(self, capacity=500, ttl=24 * 3600, threshold=0.75, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pinned = {}               # key -> _Entry (seeded FAQ answers)
+        self._recent = OrderedDict()    # key -> _Entry, least recently used first
+        self._postings = defaultdict(set)  # term -> keys containing it
+        self._counters = Counter()
+
+    # Storage
+
+    def seed(self, questions, answer):
+        """Pin `answer` for every phrasing in `questions`."""
+        with self._lock:
+            for question in questions:
+                key = normalize(question)
+                if key:
+                    self._remove(key)
+                    self._pinned[key] = _Entry(Counter(tokenize(question)), answer, None)
+                    self._index(key)
+
+    def put(self, message, answer):
+        """Remember a model answer for `message` (seeded questions are left alone)."""
+        key = normalize(message)
+        with self._lock:
+            if not key or key in self._pinned:
+                return
+            self._remove(key)
+            self._recent[key] = _Entry(Counter(tokenize(message)), answer, self._clock() + self.ttl)
+            self._index(key)
+            while len(self._recent) > self.capacity:
+                self._remove(next(iter(self._recent)))
+                self._counters['evictions'] += 1
+
+    def _index(self, key):
+        for term in self._entry(key).terms:
+            self._postings[term].add(key)
+
+    def _remove(self, key):
+        entry = self._pinned.pop(key, None) or self._recent.pop(key, None)
+        if entry is None:
+            return
+        for term in entry.terms:
+            keys = self._postings[term]
+            keys.discard(key)
+            if not keys:
+                del self._postings[term]
+
+    def _entry(self, key):
+        return self._pinned.get(key) or self._recent.get(key)
+
+    # Lookup
+
+    def get(self, message):
+        """
+        Cached answer for `message`.
+
+        Returns:
+            str or None: the answer of the same normalised question or of the
+            most similar stored question scoring at least `threshold`
+        """
+        key = normalize(message)
+        terms = Counter(tokenize(message))
+        with self._lock:
+            now = self._clock()
+            if key and self._live(key, now):
+                self._counters['hits'] += 1
+                return self._touch(key)
+
+            best_key, best_score = None, 0.0
+            for candidate in set().union(*(self._postings.get(term, ()) for term in terms)):
+                if self._live(candidate, now):
+                    score = self._similarity(terms, self._entry(candidate).terms)
+                    if score > best_score:
+                        best_key, best_score = candidate, score
+            if best_key is not None and best_score >= self.threshold:
+                self._counters['near_hits'] += 1
+                return self._touch(best_key)
+
+            self._counters['misses'] += 1
+            return None
+
+    def _live(self, key, now):
+        """True if `key` is stored and not expired; drops it if it has expired."""
+        entry = self._entry(key)
+        if entry is None:
+            return False
+        if entry.expires_at is not None and entry.expires_at <= now:
+            self._remove(key)
+            self._counters['expirations'] += 1
+            return False
+        return True
+
+    def _touch(self, key):
+        if key in self._recent:
+            self._recent.move_to_end(key)
+        return self._entry(key).answer
+
+    def _similarity(self, left, right):
+        """TF-IDF cosine similarity of two term counts."""
+        documents = len(self._pinned) + len(self._recent)
+
+        def weight(term, count):
+            return count * (math.log((1 + documents) / (1 + len(self._postings.get(term, ())))) + 1)
+
+        left_weights = {term: weight(term, count) for term, count in left.items()}
+        right_weights = {term: weight(term, count) for term, count in right.items()}
+        dot = sum(value * right_weights.get(term, 0.0) for term, value in left_weights.items())
+        norms = math.sqrt(sum(v * v for v in left_weights.values())) * \
+            math.sqrt(sum(v * v for v in right_weights.values()))
+        return dot / norms if norms else 0.0
+
+    # Metrics
+
+    def stats(self):
+        """Counters since startup plus current sizes."""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['near_hits'] + self._counters['misses']
+            return {
+                'hits': self._counters['hits'],
+                'near_hits': self._counters['near_hits'],
+                'misses': self._counters['misses'],
+                'evictions': self._counters['evictions'],
+                'expirations': self._counters['expirations'],
+                'hit_rate': (lookups - self._counters['misses']) / lookups if lookups else 0.0,
+                'pinned': len(self._pinned),
+                'size': len(self._recent),
+            }
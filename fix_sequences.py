@@ -3,21 +3,24 @@ from app import app, db
 def fix_sequences():
     """Fix PostgreSQL sequences after data import."""
     with app.app_context():
-        tables = ['user', 'car', 'ride', 'booking', 'review', 'wallet', 'expense']
-        
-        for table in tables:
+        if db.engine.dialect.name != 'postgresql':
+            print("Not a PostgreSQL database; nothing to fix.")
+            return
+
+        for table in db.metadata.sorted_tables:
+            if 'id' not in table.primary_key.columns:
+                continue
             try:
-                # Get the maximum ID from the table
-                result = db.session.execute(db.text(f'SELECT MAX(id) FROM "{table}"'))
-                max_id = result.scalar()
-                
+                # Set the id sequence to the table's maximum id (next value: max + 1)
+                max_id = db.session.execute(db.text(
+                    f'SELECT setval(pg_get_serial_sequence(:table, \'id\'), MAX(id)) FROM "{table.name}" '
+                    'HAVING MAX(id) IS NOT NULL'), {'table': f'"{table.name}"'}).scalar()
                 if max_id:
-                    # Reset the sequence to max_id + 1
-                    db.session.execute(db.text(f'SELECT setval(\'{table}_id_seq\', {max_id})'))
-                    print(f"Fixed sequence for {table}: set to {max_id}")
+                    print(f"Fixed sequence for {table.name}: set to {max_id}")
             except Exception as e:
-                print(f"Could not fix sequence for {table}: {e}")
-        
+                db.session.rollback()
+                print(f"Could not fix sequence for {table.name}: {e}")
+
         db.session.commit()
         print("All sequences fixed!")
 
@@ -1,56 +1,127 @@
+"""
+Forms for the Ride-Share application.
+
+Flask-WTF form classes with their validation. Imported by the views that
+render them rather than by app.py, so processes that never handle a form
+(workers starting up, scripts) do not load WTForms.
+"""
+
+from datetime import datetime
+
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, DecimalField, IntegerField, DateField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, IntegerField, FloatField, DateTimeField
+from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
+
+from models import User
+
+class ReportForm(FlaskForm):
+    """Form for submitting reports and feedback."""
+    report_type = SelectField('Report Type', choices=[
+        ('emergency', 'Emergency'),
+        ('feedback', 'General Feedback'),
+        ('complaint', 'Complaint')
+    ], validators=[DataRequired()])
+    subject = StringField('Subject', validators=[DataRequired(), Length(min=5, max=100)])
+    description = TextAreaField('Description', validators=[DataRequired(), Length(min=10, max=500)])
+    emergency_type = SelectField('Emergency Type', choices=[
+        ('', 'Select Emergency Type'),
+        ('medical', 'Medical Emergency'),
+        ('accident', 'Accident'),
+        ('breakdown', 'Vehicle Breakdown'),
+        ('safety', 'Safety Concern'),
+        ('other', 'Other')
+    ])
+    location = StringField('Location')
+    submit = SubmitField('Submit Report')
+
+    def validate_emergency_type(self, field):
+        if self.report_type.data == 'emergency' and not field.data:
+            raise ValidationError('Please select the type of emergency')
 
 class RegistrationForm(FlaskForm):
+    """Form for user registration with validation."""
     username = StringField('Username', validators=[
         DataRequired(),
-        Length(min=3, max=20, message="Username must be between 3 and 20 characters")
+        Length(min=4, max=20, message='Username must be between 4 and 20 characters')
     ])
     email = StringField('Email', validators=[
         DataRequired(),
-        Email(message="Please enter a valid email address")
+        Email(message='Please enter a valid email address')
     ])
     password = PasswordField('Password', validators=[
         DataRequired(),
-        Length(min=6, message="Password must be at least 6 characters long")
+        Length(min=6, message='Password must be at least 6 characters long')
     ])
     confirm_password = PasswordField('Confirm Password', validators=[
         DataRequired(),
         EqualTo('password', message='Passwords must match')
     ])
-    submit = SubmitField('Sign Up')
+    submit = SubmitField('Create Account')
 
-    def validate_username(self, username):
-        from app import User
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('Username already exists. Please choose a different one.')
+    def validate_username(self, field):
+        """Validate if the username is already taken."""
+        if User.query.filter_by(username=field.data).first():
+            raise ValidationError('Username is already taken')
 
-    def validate_email(self, email):
-        from app import User
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('Email already registered. Please use a different one.')
+    def validate_email(self, field):
+        """Validate if the email is already registered."""
+        if User.query.filter_by(email=field.data).first():
+            raise ValidationError('Email is already registered')
 
 class LoginForm(FlaskForm):
+    """Form for user login with validation."""
     email = StringField('Email', validators=[
-        DataRequired(),
-        Email(message="Please enter a valid email address")
+        DataRequired(message='Please enter your email'),
+        Email(message='Please enter a valid email address')
+    ])
+    password = PasswordField('Password', validators=[
+        DataRequired(message='Please enter your password')
     ])
-    password = PasswordField('Password', validators=[DataRequired()])
-    submit = SubmitField('Login')
+    submit = SubmitField('Log In')
 
 class RideForm(FlaskForm):
+    """Form for offering a new ride with validation."""
     origin = StringField('Origin', validators=[DataRequired()])
     destination = StringField('Destination', validators=[DataRequired()])
-    date = DateField('Date', validators=[DataRequired()])
+    start_date = DateTimeField('Start Date and Time', 
+                        format='%Y-%m-%dT%H:%M',
+                        validators=[DataRequired()],
+                        render_kw={"type": "datetime-local"})
+    package_type = SelectField('Package Type', validators=[DataRequired()], 
+                     choices=[('weekly', 'Weekly'), ('biweekly', 'Bi-Weekly'), ('monthly', 'Monthly')])
     seats = IntegerField('Available Seats', validators=[
         DataRequired(),
-        Length(min=1, max=8, message="Number of seats must be between 1 and 8")
+        NumberRange(min=1, max=8, message='Number of seats must be between 1 and 8')
     ])
-    price = DecimalField('Price per Seat (₹)', validators=[
+    car = SelectField('Car Model', validators=[DataRequired()], 
+                     choices=[])
+    distance = FloatField('Distance (km)', validators=[
         DataRequired(),
-        Length(min=0, message="Price cannot be negative")
+        NumberRange(min=0, message='Distance cannot be negative')
     ])
     submit = SubmitField('Offer Ride')
+
+    def validate_start_date(self, field):
+        """Validate if the ride start date is in the future."""
+        if field.data <= datetime.now():
+            raise ValidationError('Ride start date must be in the future')
+
+class BookingForm(FlaskForm):
+    """Form for booking a ride with validation."""
+    seats = IntegerField('Number of Seats', validators=[
+        DataRequired(),
+        NumberRange(min=1, max=8, message='Number of seats must be between 1 and 8')
+    ])
+    contact_number = StringField('Contact Number', validators=[
+        DataRequired(),
+        Length(min=10, max=15, message='Please enter a valid contact number')
+    ])
+    pickup_address = StringField('Pickup Address', validators=[
+        DataRequired(),
+        Length(max=200, message='Address is too long (maximum 200 characters)')
+    ])
+    drop_address = StringField('Drop Address', validators=[
+        DataRequired(),
+        Length(max=200, message='Address is too long (maximum 200 characters)')
+    ])
+    submit = SubmitField('Confirm Booking')
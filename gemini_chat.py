@@ -0,0 +1,194 @@
+"""
+Gemini-backed support chatbot.
+
+ChatService holds one genai client for the whole process, so every request
+reuses its HTTP connection pool, and the system instruction and generation
+config are built once. Model calls run on a small thread pool: at most
+`max_concurrency` are in flight, and once that many are busy, or a call
+runs past `timeout` seconds, ask() returns the fallback reply straight away
+instead of holding the web worker. stream() is the same call through the
+model's streaming API, handing text chunks over as they arrive. An optional
+on_result(outcome, seconds) callback sees how every call ended ('ok',
+'error', 'timeout' or 'saturated') and how long it took, for metrics.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'models/gemini-2.5-flash'
+
+UNAVAILABLE_RESPONSE = ('I apologize, but the chatbot service is currently unavailable. '
+                        'Please contact support for assistance.')
+FALLBACK_RESPONSE = ('I apologize, but I encountered an error. '
+                     'Please try again or contact support if the issue persists.')
+
+SYSTEM_INSTRUCTION = """You are RideShareBot, an AI assistant for a Ride-Share web application. The app allows users to register, log in, offer rides, search for rides, book rides, manage bookings, add cars, review other users, and submit reports or feedback. Users can be drivers or passengers. The app uses Google Maps, supports file uploads (such as license and vehicle photos), and has a wallet for ride expenses.
+
+Your tasks:
+- Answer questions about using the site (e.g., how to register, offer a ride, book a ride, cancel a booking, add a car, submit a review, or report an issue).
+- Explain features like ride packages (daily, weekly, biweekly, monthly), wallet/expenses, and user reviews.
+- Help users troubleshoot common issues (e.g., login problems, booking errors, uploading documents).
+- Guide users to the correct page or form for their needs.
+- Be friendly, concise, and clear. If you don't know the answer, suggest contacting support.
+
+Always answer as if you are part of the Ride-Share site's support team. If a user asks about something outside the Ride-Share app, politely decline to answer.
+
+If you need more information, ask the user for clarification."""
+
+
+def create_genai_client(api_key, timeout, max_connections, base_url=None):
+    """
+    Build the process-wide genai client.
+
+    Args:
+        api_key: Gemini API key
+        timeout: per-request HTTP timeout in seconds
+        max_connections: size of the client's HTTP connection pool
+        base_url: API endpoint override (a proxy, or a local stand-in server)
+
+    Returns:
+        google.genai.Client
+    """
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(
+        base_url=base_url, timeout=int(timeout * 1000), client_args={'limits': limits}))
+
+
+class ChatService:
+    """Answers chatbot messages through a shared client with bounded concurrency."""
+
+    def __init__(self, client, model=DEFAULT_MODEL, system_instruction=SYSTEM_INSTRUCTION,
+                 timeout=20, max_concurrency=8, temperature=0.7, on_result=None):
+        self._client = client
+        self._model = model
+        self._config = {'system_instruction': system_instruction, 'temperature': temperature}
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='chatbot')
+        self._on_result = on_result
+
+    @property
+    def available(self):
+        """False when no client is configured (no API key)."""
+        return self._client is not None
+
+    def ask(self, message):
+        """
+        Answer a user's message.
+
+        Args:
+            message: the user's question
+
+        Returns:
+            str: the model's reply, or a fallback message if the service is
+            unavailable, saturated, too slow or failing
+        """
+        if not self.available:
+            return UNAVAILABLE_RESPONSE
+        if not self._slots.acquire(blocking=False):
+            logger.warning('Chatbot saturated; answering with the fallback message')
+            self._report('saturated', time.perf_counter())
+            return FALLBACK_RESPONSE
+
+        # The slot is freed when the model call really finishes, so calls that
+        # outlive their timeout still count against the limit
+        started = time.perf_counter()
+        future = self._executor.submit(self._generate, message)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            answer = future.result(timeout=self.timeout)
+            self._report('ok', started)
+            return answer
+        except FutureTimeoutError:
+            logger.warning('Chatbot call timed out after %ss', self.timeout)
+            self._report('timeout', started)
+        except Exception as e:
+            logger.error(f'Chatbot error: {str(e)}')
+            self._report('error', started)
+        return FALLBACK_RESPONSE
+
+    def stream(self, message, on_complete=None):
+        """
+        Answer a user's message as text chunks, forwarded as the model streams them.
+
+        Args:
+            message: the user's question
+            on_complete: called with the full answer if the model finished it
+
+        Yields:
+            str: answer chunks; a lone fallback message if the service is
+            unavailable, saturated, or fails before producing anything. No
+            chunk may take longer than `timeout` seconds to arrive.
+        """
+        if not self.available:
+            yield UNAVAILABLE_RESPONSE
+            return
+        if not self._slots.acquire(blocking=False):
+            logger.warning('Chatbot saturated; answering with the fallback message')
+            self._report('saturated', time.perf_counter())
+            yield FALLBACK_RESPONSE
+            return
+
+        started = time.perf_counter()
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+        future = self._executor.submit(self._generate_stream, message, chunks, cancelled)
+        future.add_done_callback(lambda _: self._slots.release())
+        parts = []
+        try:
+            while True:
+                try:
+                    kind, text = chunks.get(timeout=self.timeout)
+                except queue.Empty:
+                    logger.warning('Chatbot stream stalled for %ss', self.timeout)
+                    kind, text = 'timeout', None
+                if kind == 'text':
+                    parts.append(text)
+                    yield text
+                elif kind == 'done':
+                    self._report('ok', started)
+                    if on_complete and parts:
+                        on_complete(''.join(parts))
+                    return
+                else:
+                    self._report(kind, started)
+                    if not parts:
+                        yield FALLBACK_RESPONSE
+                    return
+        finally:
+            # Also reached when the browser goes away mid-answer
+            cancelled.set()
+
+    def _report(self, outcome, started):
+        if self._on_result is not None:
+            self._on_result(outcome, time.perf_counter() - started)
+
+    def _generate_stream(self, message, chunks, cancelled):
+        try:
+            for chunk in self._client.models.generate_content_stream(
+                    model=self._model, contents=message, config=self._config):
+                if cancelled.is_set():
+                    return
+                if chunk.text:
+                    chunks.put(('text', chunk.text))
+            chunks.put(('done', None))
+        except Exception as e:
+            logger.error(f'Chatbot error: {str(e)}')
+            chunks.put(('error', None))
+
+    def _generate(self, message):
+        response = self._client.models.generate_content(
+            model=self._model, contents=message, config=self._config)
+        return response.text
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
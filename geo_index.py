@@ -0,0 +1,363 @@
+"""
+In-memory spatial indexes for ride search.
+
+RideSpatialIndex answers radius queries on ride start/end points and
+RouteCorridorIndex answers "which routes pass near both my pickup and my
+drop". Both bucket geometry into a fixed lat/lng grid, so a lookup only visits
+the handful of cells around the query points instead of every open ride.
+Neither has a database dependency; app.py keeps them in sync with the ride
+table.
+"""
+
+import math
+import threading
+from collections import namedtuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+# 0.05 degrees is ~5.5 km of latitude: a 5 km search touches about 9 cells
+DEFAULT_CELL_DEGREES = 0.05
+
+
+def grid_cell(lat, lng, cell_degrees):
+    """(row, col) of the grid cell containing a point."""
+    return (math.floor(lat / cell_degrees), math.floor(lng / cell_degrees))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cells_within(lat, lng, radius_km, cell_degrees, margin=0):
+    """
+    Grid cells overlapping the bounding box of a circle, widened by `margin`
+    extra cells on every side.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Longitude degrees shrink towards the poles; clamp to avoid dividing by ~0
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    row_min, col_min = grid_cell(lat - dlat, lng - dlng, cell_degrees)
+    row_max, col_max = grid_cell(lat + dlat, lng + dlng, cell_degrees)
+    return [(row, col)
+            for row in range(row_min - margin, row_max + margin + 1)
+            for col in range(col_min - margin, col_max + margin + 1)]
+
+
+class RideSpatialIndex:
+    """
+    Grid-bucketed index of (start, end) coordinates keyed by ride id.
+
+    add() and discard() update the index incrementally; nearby() answers
+    "rides starting within R km of A and/or ending within R km of B". All
+    methods are safe to call from several request threads.
+    """
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._points = {}  # ride id -> (start_lat, start_lng, end_lat, end_lng)
+        self._start_cells = {}  # (row, col) -> set of ride ids starting there
+        self._end_cells = {}  # (row, col) -> set of ride ids ending there
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, ride_id):
+        return ride_id in self._points
+
+    def ids(self):
+        """Ride ids currently in the index."""
+        with self._lock:
+            return set(self._points)
+
+    def _cell(self, lat, lng):
+        return grid_cell(lat, lng, self.cell_degrees)
+
+    def _unlink(self, ride_id):
+        point = self._points.pop(ride_id, None)
+        if point is None:
+            return
+        for cells, cell in ((self._start_cells, self._cell(point[0], point[1])),
+                            (self._end_cells, self._cell(point[2], point[3]))):
+            bucket = cells.get(cell)
+            if bucket is not None:
+                bucket.discard(ride_id)
+                if not bucket:
+                    del cells[cell]
+
+    def add(self, ride_id, start_lat, start_lng, end_lat, end_lng):
+        """Insert a ride, replacing any coordinates already stored for it."""
+        with self._lock:
+            self._unlink(ride_id)
+            self._points[ride_id] = (start_lat, start_lng, end_lat, end_lng)
+            self._start_cells.setdefault(self._cell(start_lat, start_lng), set()).add(ride_id)
+            self._end_cells.setdefault(self._cell(end_lat, end_lng), set()).add(ride_id)
+
+    def discard(self, ride_id):
+        """Remove a ride if it is indexed."""
+        with self._lock:
+            self._unlink(ride_id)
+
+    def clear(self):
+        with self._lock:
+            self._points.clear()
+            self._start_cells.clear()
+            self._end_cells.clear()
+
+    def _candidates(self, cells, lat, lng, radius_km):
+        """Ride ids in every grid cell overlapping the circle's bounding box."""
+        found = []
+        for cell in cells_within(lat, lng, radius_km, self.cell_degrees):
+            bucket = cells.get(cell)
+            if bucket:
+                found.extend(bucket)
+        return found
+
+    def nearby(self, origin=None, destination=None, radius_km=5.0):
+        """
+        Find rides whose endpoints lie near the given points.
+
+        Args:
+            origin: (lat, lng) the ride must start near, or None
+            destination: (lat, lng) the ride must end near, or None
+            radius_km: maximum distance from each given point
+
+        Returns:
+            list: matching ride ids, nearest start (or end) first
+        """
+        if origin is None and destination is None:
+            return []
+        with self._lock:
+            # Walk the grid on one side and check the other side exactly
+            if origin is not None:
+                candidates = self._candidates(self._start_cells, origin[0], origin[1], radius_km)
+            else:
+                candidates = self._candidates(self._end_cells, destination[0], destination[1], radius_km)
+            matches = []
+            for ride_id in candidates:
+                start_lat, start_lng, end_lat, end_lng = self._points[ride_id]
+                if origin is not None:
+                    distance = haversine_km(origin[0], origin[1], start_lat, start_lng)
+                    if distance > radius_km:
+                        continue
+                if destination is not None:
+                    end_distance = haversine_km(destination[0], destination[1], end_lat, end_lng)
+                    if end_distance > radius_km:
+                        continue
+                    if origin is None:
+                        distance = end_distance
+                matches.append((distance, ride_id))
+        matches.sort()
+        return [ride_id for _, ride_id in matches]
+
+
+# --------------------------------------------------------------------------
+# Route corridors
+# --------------------------------------------------------------------------
+
+# Polylines are simplified to this tolerance before they are stored/indexed
+ROUTE_SIMPLIFY_KM = 0.05
+ROUTE_MAX_POINTS = 500
+
+RouteMatch = namedtuple('RouteMatch', 'ride_id pickup_km drop_km pickup_offset_km drop_offset_km')
+RouteMatch.__doc__ = """A route passing near a pickup and a drop, in that order.
+
+pickup_km/drop_km are how far the points lie from the route and
+pickup_offset_km/drop_offset_km how far along the route they are reached.
+"""
+
+
+def _to_plane(lat, lng, ref_lat):
+    """Equirectangular projection to km; accurate over a city-sized area."""
+    return (lng * KM_PER_DEGREE_LAT * math.cos(math.radians(ref_lat)), lat * KM_PER_DEGREE_LAT)
+
+
+def _point_segment(p, a, b):
+    """Distance from p to segment ab and the fraction t of ab at the closest point."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy), t
+
+
+def simplify_polyline(points, tolerance_km=ROUTE_SIMPLIFY_KM):
+    """
+    Drop vertices that deviate less than tolerance_km from the line through
+    their neighbours (Douglas-Peucker).
+
+    Args:
+        points: sequence of (lat, lng)
+
+    Returns:
+        list: the kept (lat, lng) points, always including both ends
+    """
+    points = [tuple(point) for point in points]
+    if len(points) < 3:
+        return points
+    ref_lat = points[0][0]
+    plane = [_to_plane(lat, lng, ref_lat) for lat, lng in points]
+    keep = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_index = 0.0, None
+        for i in range(first + 1, last):
+            distance, _ = _point_segment(plane[i], plane[first], plane[last])
+            if distance > worst:
+                worst, worst_index = distance, i
+        if worst_index is not None and worst > tolerance_km:
+            keep.add(worst_index)
+            stack.extend([(first, worst_index), (worst_index, last)])
+    return [points[i] for i in sorted(keep)]
+
+
+def locate_on_route(points, lat, lng):
+    """
+    Find where a route passes closest to a point.
+
+    Args:
+        points: the route as a sequence of (lat, lng), at least one point
+
+    Returns:
+        tuple: (distance from the route in km, km along the route to the
+        closest point)
+    """
+    p = _to_plane(lat, lng, lat)
+    plane = [_to_plane(a_lat, a_lng, lat) for a_lat, a_lng in points]
+    if len(plane) == 1:
+        return math.hypot(p[0] - plane[0][0], p[1] - plane[0][1]), 0.0
+    best_distance, best_offset, travelled = None, 0.0, 0.0
+    for a, b in zip(plane, plane[1:]):
+        segment_km = math.hypot(b[0] - a[0], b[1] - a[1])
+        distance, t = _point_segment(p, a, b)
+        if best_distance is None or distance < best_distance:
+            best_distance, best_offset = distance, travelled + t * segment_km
+        travelled += segment_km
+    return best_distance, best_offset
+
+
+def match_route(points, pickup, drop, buffer_km):
+    """
+    Check whether a route passes within buffer_km of pickup and then of drop.
+
+    Returns:
+        tuple: (pickup_km, drop_km, pickup_offset_km, drop_offset_km), or None
+    """
+    pickup_km, pickup_offset = locate_on_route(points, *pickup)
+    if pickup_km > buffer_km:
+        return None
+    drop_km, drop_offset = locate_on_route(points, *drop)
+    if drop_km > buffer_km or drop_offset <= pickup_offset:
+        return None
+    return pickup_km, drop_km, pickup_offset, drop_offset
+
+
+class RouteCorridorIndex:
+    """
+    Segment-level grid index of ride routes.
+
+    Every cell a route segment crosses points back at the ride, so a corridor
+    query only checks rides with a segment near both the pickup and the drop.
+    """
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._routes = {}  # ride id -> tuple of (lat, lng)
+        self._cells = {}  # (row, col) -> set of ride ids with a segment there
+        self._route_cells = {}  # ride id -> cells it was added to
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, ride_id):
+        return ride_id in self._routes
+
+    def ids(self):
+        """Ride ids currently in the index."""
+        with self._lock:
+            return set(self._routes)
+
+    def _segment_cells(self, points):
+        """Cells visited by sampling each segment at half-cell steps."""
+        cells = set()
+        step = self.cell_degrees / 2
+        for (a_lat, a_lng), (b_lat, b_lng) in zip(points, points[1:] or points):
+            samples = max(1, int(math.ceil(max(abs(b_lat - a_lat), abs(b_lng - a_lng)) / step)))
+            for i in range(samples + 1):
+                t = i / samples
+                cells.add(grid_cell(a_lat + t * (b_lat - a_lat), a_lng + t * (b_lng - a_lng),
+                                    self.cell_degrees))
+        return cells
+
+    def _unlink(self, ride_id):
+        self._routes.pop(ride_id, None)
+        for cell in self._route_cells.pop(ride_id, ()):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(ride_id)
+                if not bucket:
+                    del self._cells[cell]
+
+    def add(self, ride_id, points):
+        """Insert a ride's route, replacing any route already stored for it."""
+        points = tuple(tuple(point) for point in points)
+        if not points:
+            return
+        cells = self._segment_cells(points)
+        with self._lock:
+            self._unlink(ride_id)
+            self._routes[ride_id] = points
+            self._route_cells[ride_id] = cells
+            for cell in cells:
+                self._cells.setdefault(cell, set()).add(ride_id)
+
+    def discard(self, ride_id):
+        """Remove a ride if it is indexed."""
+        with self._lock:
+            self._unlink(ride_id)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self._cells.clear()
+            self._route_cells.clear()
+
+    def _near(self, lat, lng, buffer_km):
+        # A sampled cell can be one cell away from where the segment actually
+        # comes closest, hence the one-cell margin
+        found = set()
+        for cell in cells_within(lat, lng, buffer_km, self.cell_degrees, margin=1):
+            bucket = self._cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return found
+
+    def match(self, pickup, drop, buffer_km):
+        """
+        Find routes passing within buffer_km of pickup and later of drop.
+
+        Args:
+            pickup: (lat, lng) where the passenger gets in
+            drop: (lat, lng) where the passenger gets out
+            buffer_km: maximum distance from the route for either point
+
+        Returns:
+            list: RouteMatch tuples, smallest total detour first
+        """
+        with self._lock:
+            candidates = self._near(pickup[0], pickup[1], buffer_km) & self._near(drop[0], drop[1], buffer_km)
+            routes = [(ride_id, self._routes[ride_id]) for ride_id in candidates]
+        matches = []
+        for ride_id, points in routes:
+            found = match_route(points, pickup, drop, buffer_km)
+            if found:
+                matches.append(RouteMatch(ride_id, *found))
+        matches.sort(key=lambda m: (m.pickup_km + m.drop_km, m.ride_id))
+        return matches
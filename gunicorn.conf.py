@@ -0,0 +1,58 @@
+"""
+Gunicorn settings for production: gunicorn -c gunicorn.conf.py app:app
+
+Workers are gevent workers. Page requests and every open admin SOS stream
+(/admin/stream/sos) run as greenlets, so idle streams do not tie up a
+worker each. SOS events reach the admins of every worker through the
+broker named by SOS_BROKER_URL (default: CACHE_URL; see sos_broker.py):
+with a redis:// URL the default is one worker per CPU, while the
+in-process memory:// broker limits the site to a single worker.
+
+Supported setup: gevent worker with PostgreSQL through psycopg2, made
+gevent-aware by psycogreen in post_fork below. A query then waits on its
+socket like any other greenlet I/O instead of blocking the worker, which
+would stall every page request and SOS stream until it returned. SQLite
+calls still block the worker, so use it for development only.
+"""
+
+import importlib.util
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+# The master needs SOS_BROKER_URL and PROMETHEUS_MULTIPROC_DIR from .env too
+load_dotenv()
+
+SOS_BROKER_URL = os.environ.get('SOS_BROKER_URL') or os.environ.get('CACHE_URL', 'memory://')
+# create_broker() falls back to the in-process broker without the redis package
+SHARED_SOS_BROKER = SOS_BROKER_URL.startswith(('redis://', 'rediss://', 'unix://')) and \
+    importlib.util.find_spec('redis') is not None
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('GUNICORN_WORKERS') or (multiprocessing.cpu_count() if SHARED_SOS_BROKER else 1))
+# Simultaneous connections per gevent worker, including open SOS streams
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+
+def on_starting(server):
+    """Warn when SOS alerts could not reach every admin."""
+    if workers > 1 and not SHARED_SOS_BROKER:
+        server.log.warning('%d workers with the in-process SOS broker: admins only see alerts raised in '
+                           'their own worker. Set SOS_BROKER_URL=redis://...', workers)
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges from the merged /metrics view (PROMETHEUS_MULTIPROC_DIR)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    """Let psycopg2 yield to other greenlets while it waits on PostgreSQL."""
+    if 'gevent' in worker_class.lower():
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
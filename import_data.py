@@ -1,191 +1,340 @@
+"""
+Bulk database import.
+Loads an export written by export_data.py (a directory of per-table NDJSON
+files plus manifest.json) into the configured database, recreating the
+schema first. The old single-file rideshare_backup.json format is still
+accepted.
 
+Rows are streamed from disk and written in batches: multi-row INSERTs, or
+COPY FROM STDIN on PostgreSQL (psycopg2). Every table file is first read
+through once and checked against the manifest's row count and checksum, so
+a damaged export is rejected before anything is dropped. Each table is
+then loaded in one transaction.
+With --workers, tables that do not depend on each other (same depth in the
+foreign-key graph) load in parallel. PostgreSQL id sequences are reset at
+the end (fix_sequences.py), and rides exported without an estimated end time
+get one (backfill_estimated_end_times()).
+
+Incremental exports (export_data.py --since) listed after the full export
+are replayed on top of it in order: their changed rows are upserted, and
+the chain is checked (each delta must name the export before it as its
+parent) before anything is dropped.
+
+Usage: python import_data.py [source] [delta ...] [--batch-size 5000] [--workers 4]
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
 import json
 import os
-from dateutil import parser
-from app import app, db, User, Car, Ride, Booking, Review, Wallet, Expense
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import app, db, backfill_estimated_end_times
+from export_data import MANIFEST_NAME
+from fix_sequences import fix_sequences
+
+# Top-level keys of the old rideshare_backup.json format
+LEGACY_TABLE_KEYS = {
+    'users': 'user', 'cars': 'car', 'rides': 'ride', 'bookings': 'booking',
+    'reviews': 'review', 'wallets': 'wallet', 'expenses': 'expense',
+}
+
+
+# Reading exports
+
+def open_input(path, compress):
+    """Binary line reader for `path`, decompressing as recorded in the manifest."""
+    if compress == 'gzip':
+        return gzip.open(path, 'rb')
+    if compress == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit('zstd exports need the zstandard package (pip install zstandard)')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def read_ndjson(path, compress):
+    """Yield the records of one exported table file."""
+    with open_input(path, compress) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def verify_ndjson(path, compress, entry):
+    """
+    Stream one exported table file and check it against its manifest entry.
+
+    Raises:
+        ValueError: if the file's row count or checksum differs from its manifest entry
+    """
+    checksum = hashlib.sha256()
+    rows = 0
+    with open_input(path, compress) as f:
+        for line in f:
+            checksum.update(line)
+            rows += 1
+    if rows != entry['rows'] or checksum.hexdigest() != entry['sha256']:
+        raise ValueError(f"{entry['file']} does not match the manifest "
+                         f"({rows} rows read, {entry['rows']} expected); the export is damaged")
+
+
+def read_export(source):
+    """
+    Tables to load from `source`. Every table file of an export directory is
+    verified here, before the caller touches the database.
+
+    Args:
+        source: an export directory (or its manifest.json), or a legacy backup .json file
+
+    Returns:
+        tuple: (manifest dict, {table name: (column names, iterable of record dicts, mode)})
+
+    Raises:
+        ValueError: if a table file does not match the manifest
+    """
+    if os.path.isdir(source):
+        source = os.path.join(source, MANIFEST_NAME)
+    with open(source) as f:
+        data = json.load(f)
+
+    if data.get('format') == 'ndjson':
+        directory = os.path.dirname(source)
+        for entry in data['tables']:
+            verify_ndjson(os.path.join(directory, entry['file']), data['compression'], entry)
+        return data, {entry['name']: (entry['columns'],
+                                      read_ndjson(os.path.join(directory, entry['file']), data['compression']),
+                                      entry.get('mode', 'replace'))
+                      for entry in data['tables']}
+
+    tables = {}
+    for key, records in data.items():
+        if key in LEGACY_TABLE_KEYS:
+            columns = list(dict.fromkeys(column for record in records for column in record))
+            tables[LEGACY_TABLE_KEYS[key]] = (columns, records, 'replace')
+    return {'kind': 'full', 'id': None}, tables
+
+
+def row_converter(table, columns):
+    """Turn exported records into insert parameters for `table`'s `columns`."""
+    parsers = {}
+    for name in columns:
+        column_type = table.columns[name].type
+        if isinstance(column_type, db.DateTime):
+            parsers[name] = datetime.fromisoformat
+        elif isinstance(column_type, db.Date):
+            parsers[name] = date.fromisoformat
+
+    def convert(record):
+        row = {name: record.get(name) for name in columns}
+        for name, parse in parsers.items():
+            value = row[name]
+            # Legacy backups wrote missing datetimes as the string 'None'
+            row[name] = parse(value) if value not in (None, '', 'None') else None
+        return row
+    return convert
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Writing
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def copy_batch(connection, table, columns, records):
+    """COPY `records` into `table` over a psycopg2 connection (CSV; unquoted empty means NULL)."""
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(','.join(_copy_value(record.get(name)) for name in columns) + '\n')
+    buffer.seek(0)
+    preparer = connection.dialect.identifier_preparer
+    statement = (f'COPY {preparer.format_table(table)} ({", ".join(preparer.quote(name) for name in columns)}) '
+                 'FROM STDIN WITH (FORMAT csv)')
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(statement, buffer)
 
-def import_data():
+
+def upsert_batch(connection, table, columns, rows):
+    """Insert `rows`, overwriting existing rows with the same primary key."""
+    keys = [column.name for column in table.primary_key.columns]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table)
+        updates = {name: statement.excluded[name] for name in columns if name not in keys}
+        connection.execute(statement.on_conflict_do_update(index_elements=keys, set_=updates)
+                           if updates else statement.on_conflict_do_nothing(index_elements=keys), rows)
+        return
+    # Incremental tables all have a single integer id
+    [key] = keys
+    connection.execute(table.delete().where(table.columns[key].in_([row[key] for row in rows])))
+    connection.execute(table.insert(), rows)
+
+
+def load_table(table, columns, records, batch_size=5000, mode='replace'):
+    """
+    Load one table in a single transaction.
+
+    Args:
+        table: SQLAlchemy Table
+        columns: column names present in the records
+        records: iterable of record dicts
+        batch_size: rows per INSERT / COPY
+        mode: 'replace' (the records are the whole table) or 'upsert' (changed rows only)
+
+    Returns:
+        int: rows loaded
+    """
+    columns = [name for name in columns if name in table.columns]
+    # COPY skips column defaults, so it is only used when the export has every column
+    use_copy = mode == 'replace' and db.engine.dialect.name == 'postgresql' and \
+        db.engine.driver == 'psycopg2' and len(columns) == len(table.columns)
+    convert = row_converter(table, columns)
+    rows = 0
+    with db.engine.begin() as connection:
+        if mode == 'replace':
+            connection.execute(table.delete())
+        for batch in batches(records, batch_size):
+            if use_copy:
+                copy_batch(connection, table, columns, batch)
+            elif mode == 'upsert':
+                upsert_batch(connection, table, columns, [convert(record) for record in batch])
+            else:
+                connection.execute(table.insert(), [convert(record) for record in batch])
+            rows += len(batch)
+    return rows
+
+
+def dependency_levels(tables):
+    """Group tables so each group only references tables of earlier groups."""
+    depth = {}
+    for table in db.metadata.sorted_tables:
+        depth[table.name] = 1 + max((depth[fk.column.table.name] for fk in table.foreign_keys
+                                     if fk.column.table is not table), default=-1)
+    levels = defaultdict(list)
+    for table in tables:
+        levels[depth[table.name]].append(table)
+    return [levels[level] for level in sorted(levels)]
+
+
+def check_chain(exports):
+    """Error message if `exports` is not a full export followed by its own deltas, else None."""
+    (first, _), *deltas = exports
+    if first.get('kind', 'full') != 'full':
+        return "The first export must be a full export, not a delta"
+    parent = first.get('id')
+    for position, (manifest, _) in enumerate(deltas, 1):
+        if manifest.get('kind') != 'delta' or parent is None or manifest.get('parent') != parent:
+            return f"Export #{position + 1} is not an incremental export taken after export #{position}"
+        parent = manifest['id']
+    return None
+
+
+def import_data(source='rideshare_export', batch_size=5000, workers=1, deltas=()):
     logs = []
     def log(msg):
         logs.append(str(msg))
         print(msg)
 
-    if not os.path.exists('rideshare_backup.json'):
-        log("rideshare_backup.json not found!")
-        return "\n".join(logs)
+    for path in (source, *deltas):
+        if not os.path.exists(path):
+            log(f"{path} not found!")
+            return "\n".join(logs)
 
     with app.app_context():
         log("Importing data to configured database...")
-        log(f"Target DB: {app.config['SQLALCHEMY_DATABASE_URI']}")
-        
-        # Ensure tables exist with correct schema
-        log("Dropping existing tables (if any)...")
-        try:
-            db.drop_all()
-            log("Tables dropped.")
-        except Exception as e:
-            log(f"Note: {e}")
-        
-        log("Creating database tables...")
-        try:
-            db.create_all()
-            db.session.commit()
-            log("Tables created successfully.")
-        except Exception as e:
-            log(f"Error creating tables: {e}")
+        log(f"Target DB: {db.engine.url.render_as_string(hide_password=True)}")
 
         try:
-            with open('rideshare_backup.json', 'r') as f:
-                data = json.load(f)
+            exports = [read_export(path) for path in (source, *deltas)]
         except Exception as e:
-            log(f"Error loading backup file: {e}")
+            log(f"Error loading export: {e}")
             return "\n".join(logs)
+        problem = check_chain(exports)
+        if problem:
+            log(problem)
+            return "\n".join(logs)
+
+        # Ensure tables exist with correct schema
+        log("Recreating database tables...")
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        if workers > 1 and db.engine.dialect.name == 'sqlite':
+            log("SQLite allows one writer at a time; loading tables one by one.")
+            workers = 1
+
+        started = time.perf_counter()
+        total = 0
+        for path, (manifest, export) in zip((source, *deltas), exports):
+            if manifest.get('kind') == 'delta':
+                log(f"Applying changes from {path}...")
+            tables = [table for table in db.metadata.sorted_tables if table.name in export]
+            for name in sorted(set(export) - {table.name for table in tables}):
+                log(f"Skipping unknown table {name}")
+
+            def load(table):
+                with app.app_context():
+                    table_started = time.perf_counter()
+                    columns, records, mode = export[table.name]
+                    rows = load_table(table, columns, records, batch_size, mode)
+                    elapsed = time.perf_counter() - table_started
+                    log(f"  {table.name:<14} {rows:>10} rows  {rows / elapsed if elapsed else 0:>10.0f} rows/s")
+                    return rows
 
-        # Users
-        log(f"Importing {len(data['users'])} users...")
-        for u_data in data['users']:
-            if not User.query.get(u_data['id']):
-                user = User(
-                    id=u_data['id'],
-                    username=u_data['username'],
-                    email=u_data['email'],
-                    password_hash=u_data['password_hash'],
-                    phone=u_data['phone'],
-                    is_admin=u_data['is_admin'],
-                    created_at=parser.parse(u_data['created_at']),
-                    total_rides=u_data.get('total_rides', 0),
-                    rating=u_data.get('rating', 0.0),
-                    green_flags=u_data.get('green_flags', 0),
-                    red_flags=u_data.get('red_flags', 0)
-                )
-                db.session.add(user)
-        db.session.commit()
-
-        # Cars
-        log(f"Importing {len(data['cars'])} cars...")
-        for c_data in data['cars']:
-            if not Car.query.get(c_data['id']):
-                car = Car(
-                    id=c_data['id'],
-                    owner_id=c_data['owner_id'],
-                    make=c_data['make'],
-                    model=c_data['model'],
-                    year=c_data['year'],
-                    color=c_data['color'],
-                    license_plate=c_data['license_plate'],
-                    fuel_type=c_data['fuel_type'],
-                    mileage=c_data['mileage'],
-                    ac=c_data['ac'],
-                    created_at=parser.parse(c_data['created_at'])
-                )
-                db.session.add(car)
-        db.session.commit()
-
-        # Rides
-        log(f"Importing {len(data['rides'])} rides...")
-        for r_data in data['rides']:
-            if not Ride.query.get(r_data['id']):
-                ride = Ride(
-                    id=r_data['id'],
-                    driver_id=r_data['driver_id'],
-                    car_id=r_data['car_id'],
-                    start_location=r_data['start_location'],
-                    end_location=r_data['end_location'],
-                    start_date=parser.parse(r_data['start_date']),
-                    end_date=parser.parse(r_data['end_date']),
-                    actual_start_time=parser.parse(r_data['actual_start_time']) if r_data.get('actual_start_time') and r_data['actual_start_time'] != 'None' else None,
-                    actual_end_time=parser.parse(r_data['actual_end_time']) if r_data.get('actual_end_time') and r_data['actual_end_time'] != 'None' else None,
-                    estimated_end_time=parser.parse(r_data['estimated_end_time']) if r_data.get('estimated_end_time') and r_data['estimated_end_time'] != 'None' else None,
-                    error_buffer_minutes=r_data.get('error_buffer_minutes', 15),
-                    available_seats=r_data['available_seats'],
-                    price_per_seat=r_data['price_per_seat'],
-                    status=r_data['status'],
-                    distance=r_data['distance'],
-                    created_at=parser.parse(r_data['created_at']),
-                    auto_completed=r_data.get('auto_completed', False),
-                    completed_by=r_data.get('completed_by'),
-                    package_type=r_data.get('package_type'),
-                    license_photo=r_data.get('license_photo'),
-                    driver_photo=r_data.get('driver_photo'),
-                    vehicle_photo=r_data.get('vehicle_photo')
-                )
-                db.session.add(ride)
-        db.session.commit()
-
-        # Bookings
-        log(f"Importing {len(data['bookings'])} bookings...")
-        for b_data in data['bookings']:
-            if not Booking.query.get(b_data['id']):
-                booking = Booking(
-                    id=b_data['id'],
-                    ride_id=b_data['ride_id'],
-                    passenger_id=b_data['passenger_id'],
-                    seats=b_data['seats'],
-                    status=b_data['status'],
-                    created_at=parser.parse(b_data['created_at']),
-                    pickup_address=b_data['pickup_address'],
-                    drop_address=b_data['drop_address'],
-                    share=b_data.get('share'),
-                    contact_number=b_data.get('contact_number'),
-                    booking_date=parser.parse(b_data['booking_date']),
-                    passenger_ride_status=b_data.get('passenger_ride_status'),
-                    passenger_completed_at=parser.parse(b_data['passenger_completed_at']) if b_data.get('passenger_completed_at') and b_data['passenger_completed_at'] != 'None' else None
-                )
-                db.session.add(booking)
-        db.session.commit()
-        
-        # Reviews
-        log(f"Importing {len(data['reviews'])} reviews...")
-        for rev_data in data['reviews']:
-            if not Review.query.get(rev_data['id']):
-                review = Review(
-                    id=rev_data['id'],
-                    reviewer_id=rev_data['reviewer_id'],
-                    reviewed_id=rev_data['reviewed_id'],
-                    booking_id=rev_data['booking_id'],
-                    rating=rev_data['rating'],
-                    comment=rev_data['comment'],
-                    flag_type=rev_data.get('flag_type'),
-                    review_type=rev_data.get('review_type'),
-                    created_at=parser.parse(rev_data['created_at'])
-                )
-                db.session.add(review)
-        db.session.commit()
-        
-        # Wallets
-        log(f"Importing {len(data['wallets'])} wallets...")
-        for w_data in data['wallets']:
-            if not Wallet.query.get(w_data['id']):
-                wallet = Wallet(
-                    id=w_data['id'],
-                    ride_id=w_data['ride_id'],
-                    fuel_cost=w_data.get('fuel_cost', 0.0),
-                    toll_cost=w_data.get('toll_cost', 0.0),
-                    other_costs=w_data.get('other_costs', 0.0),
-                    description=w_data.get('description'),
-                    date_added=parser.parse(w_data['date_added'])
-                )
-                db.session.add(wallet)
-        db.session.commit()
-        
-        # Expenses
-        log(f"Importing {len(data['expenses'])} expenses...")
-        for e_data in data['expenses']:
-            if not Expense.query.get(e_data['id']):
-                expense = Expense(
-                    id=e_data['id'],
-                    ride_id=e_data['ride_id'],
-                    toll_cost=e_data.get('toll_cost', 0.0),
-                    other_costs=e_data.get('other_costs', 0.0),
-                    description=e_data.get('description'),
-                    created_at=parser.parse(e_data['created_at'])
-                )
-                db.session.add(expense)
-        db.session.commit()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for level in dependency_levels(tables):
+                    total += sum(pool.map(load, level))
+        elapsed = time.perf_counter() - started
+        log(f"Loaded {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+
+        # Core inserts skip the ORM listener that stores each ride's estimated end
+        backfilled = backfill_estimated_end_times()
+        if backfilled:
+            log(f"Stored estimated end times for {backfilled} ride(s).")
+
+        if db.engine.dialect.name == 'postgresql':
+            fix_sequences()
 
         log("Data imported successfully!")
-        
+
         return "\n".join(logs)
 
+
+def main():
+    parser = argparse.ArgumentParser(description='Load an export into the configured database (replacing its data).')
+    parser.add_argument('source', nargs='?', default='rideshare_export',
+                        help='Export directory, or a legacy rideshare_backup.json (default: %(default)s)')
+    parser.add_argument('deltas', nargs='*', help='Incremental exports to replay on top, oldest first')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT/COPY (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Tables loaded in parallel where foreign keys allow (default: %(default)s)')
+    args = parser.parse_args()
+
+    import_data(args.source, args.batch_size, args.workers, args.deltas)
+
+
 if __name__ == "__main__":
-    import_data()
+    main()
@@ -0,0 +1,82 @@
+"""
+Prometheus metrics, kept by prometheus_client.
+
+Counters, gauges and histograms are prometheus_client metrics defined next
+to the code that updates them (app.py, ride_scheduler.py). This module
+renders them for /metrics and copies in counts kept elsewhere:
+
+    CACHE_HITS = RunningTotal(CACHE_REQUESTS.labels('shared', 'hit'))
+    register_callback(lambda: CACHE_HITS.update(cache.hits))
+
+Several processes (gunicorn workers, the ride scheduler) report one merged
+view through prometheus_client's multiprocess mode: start them all with
+PROMETHEUS_MULTIPROC_DIR set to the same empty directory, before anything
+imports prometheus_client. Each process then keeps its values in files
+there, and render() merges the files of every process. Counters and
+histograms of exited processes stay in the totals; gauges use the live*
+modes and disappear once mark_process_dead() has run for their process
+(gunicorn's child_exit hook, close() in the scheduler).
+"""
+
+import os
+import threading
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+_callbacks = []
+
+
+def register_callback(callback):
+    """Call `callback()` after every request and before every render, to copy in values kept elsewhere."""
+    _callbacks.append(callback)
+
+
+def run_callbacks():
+    for callback in _callbacks:
+        callback()
+
+
+class RunningTotal:
+    """Feeds a running total counted elsewhere (e.g. a cache's hit count) into a counter child."""
+
+    def __init__(self, child):
+        self._child = child
+        self._reported = 0
+        self._lock = threading.Lock()
+
+    def update(self, total):
+        if total == self._reported:
+            return
+        with self._lock:
+            # A total that went down was reset (e.g. the cache was rebuilt); it counts from zero
+            increase = total - self._reported if total >= self._reported else total
+            self._reported = total
+        if increase > 0:
+            self._child.inc(increase)
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def render():
+    """
+    Prometheus text exposition of this process's metrics, or of every
+    process sharing PROMETHEUS_MULTIPROC_DIR.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    run_callbacks()
+    if not multiprocess_enabled():
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def close():
+    """Drop this process's live gauges from the merged view; for processes that are about to exit."""
+    if multiprocess_enabled():
+        run_callbacks()
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,22 @@
+"""
+Create the database indexes declared on the models in an existing database,
+plus the location search indexes (pg_trgm on PostgreSQL, FTS5 on SQLite).
+Safe to run repeatedly; only missing indexes are created.
+
+Usage: python migrate_indexes.py
+"""
+
+from app import app, ensure_indexes, ensure_location_search
+
+
+def migrate_indexes():
+    with app.app_context():
+        print(f"Target DB: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        created = ensure_indexes() + ensure_location_search()
+        for index_name in created:
+            print(f"Created index {index_name}")
+        print(f"Done: {len(created)} index(es) created.")
+
+
+if __name__ == "__main__":
+    migrate_indexes()
@@ -1,74 +1,417 @@
+"""
+Database models for the Ride-Share application.
+
+Defines the SQLAlchemy extension object and every model (users, cars,
+rides, bookings, reviews, reports, wallets, expenses, admin logs and the
+statistics rollup), together with the constants their cost and time
+estimates use. The extension is bound to an application by create_app()
+in app.py; models can be imported without one.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
 from flask_login import UserMixin
-from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
-# Fuel prices for cost calculation
+def utc_now():
+    """Return current UTC time as a naive datetime (for SQLite compatibility).
+    This avoids the deprecation warning while maintaining compatibility with existing data."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Constants
 FUEL_PRICES = {
-    'petrol': 96.0,
-    'diesel': 87.0,
-    'electric': 8.0,  # per kWh
-    'hybrid': 96.0
+    'petrol': 102.0,  # ₹102 per liter
+    'diesel': 88.0,   # ₹88 per liter
+    'electric': 10.0  # ₹10 per kWh
 }
 
+# Average speed for time estimation (km/h)
+AVERAGE_SPEED = 40  # Considering city traffic and stops
+
+
 class User(UserMixin, db.Model):
+    """Model for user accounts."""
+    __table_args__ = (
+        # Users changed since the last incremental export
+        db.Index('ix_user_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(60), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    rides_offered = db.relationship('Ride', backref='driver', lazy=True)
-    bookings = db.relationship('Booking', backref='passenger', lazy=True)
+    password_hash = db.Column(db.String(256))
+    phone = db.Column(db.String(20), nullable=True)
+    is_admin = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utc_now, onupdate=utc_now)
+    
+    # Stats and ratings
+    total_rides = db.Column(db.Integer, default=0)
+    rating = db.Column(db.Float, default=0.0)  # rating_sum / rating_count, kept in step by record_review()
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    green_flags = db.Column(db.Integer, default=0)
+    red_flags = db.Column(db.Integer, default=0)
+    
+    # Relationships
+    cars = db.relationship('Car', backref='owner', lazy=True)
+    rides_offered = db.relationship('Ride', backref='driver', lazy=True, foreign_keys='Ride.driver_id')
+    bookings = db.relationship('Booking', backref='passenger', lazy=True, foreign_keys='Booking.passenger_id')
+    reviews_given = db.relationship('Review', backref='reviewer', lazy=True, foreign_keys='Review.reviewer_id')
+    reviews_received = db.relationship('Review', backref='reviewed', lazy=True, foreign_keys='Review.reviewed_id')
+    reports = db.relationship('Report', backref='user', lazy=True)
+    
+    def __repr__(self):
+        return f'<User {self.username}>'
+        
+    def set_password(self, password):
+        """Hash and set the user's password."""
+        self.password_hash = generate_password_hash(password)
+        
+    def check_password(self, password):
+        """Check if the provided password matches the stored hash."""
+        return check_password_hash(self.password_hash, password)
+        
+    @property
+    def current_ride(self):
+        """Get the user's current active ride (as driver or passenger)."""
+        current_time = utc_now()
+        
+        # Check if user is driving any current rides
+        driver_ride = next((ride for ride in self.rides_offered 
+                          if ride.start_date <= current_time 
+                          and ride.end_date >= current_time), None)
+        if driver_ride:
+            return driver_ride
+            
+        # Check if user is a passenger in any current rides
+        passenger_booking = next((booking for booking in self.bookings 
+                                if booking.status == Booking.STATUS_CONFIRMED
+                                and booking.ride.start_date <= current_time 
+                                and booking.ride.end_date >= current_time), None)
+        if passenger_booking:
+            return passenger_booking.ride
+            
+        return None
+
+class Review(db.Model):
+    """Model for user reviews."""
+    # Review type constants
+    TYPE_PASSENGER_TO_DRIVER = 'passenger_to_driver'
+    TYPE_DRIVER_TO_PASSENGER = 'driver_to_passenger'
+    
+    __table_args__ = (
+        # Reviews/ratings of a user, newest first (user_reviews, user_profile)
+        db.Index('ix_review_reviewed_id_created_at', 'reviewed_id', 'created_at'),
+        # Reviews changed since the last incremental export
+        db.Index('ix_review_updated_at', 'updated_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reviewer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reviewed_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    rating = db.Column(db.Integer, nullable=False)
+    comment = db.Column(db.Text)
+    flag_type = db.Column(db.String(10), nullable=True)  # 'green' or 'red'
+    review_type = db.Column(db.String(30), nullable=True)  # 'passenger_to_driver' or 'driver_to_passenger'
+    created_at = db.Column(db.DateTime, default=utc_now)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utc_now, onupdate=utc_now)
+    
+    def __repr__(self):
+        return f'<Review {self.reviewer_id} -> {self.reviewed_id}>'
+    
+    @property
+    def is_driver_review(self):
+        """Check if this is a review of a driver (by a passenger)."""
+        return self.review_type == self.TYPE_PASSENGER_TO_DRIVER
+    
+    @property
+    def is_passenger_review(self):
+        """Check if this is a review of a passenger (by a driver)."""
+        return self.review_type == self.TYPE_DRIVER_TO_PASSENGER
+
+class Car(db.Model):
+    """Model for user's cars."""
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    make = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    color = db.Column(db.String(20), nullable=False)
+    license_plate = db.Column(db.String(20), unique=True, nullable=False)
+    fuel_type = db.Column(db.String(20), nullable=False)  # petrol, diesel, electric
+    mileage = db.Column(db.Float, nullable=False)  # km per liter
+    ac = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
+    
+    def __repr__(self):
+        return f'<Car {self.make} {self.model} ({self.license_plate})>'
+
+class Wallet(db.Model):
+    """Wallet model for storing ride expenses."""
+    id = db.Column(db.Integer, primary_key=True)
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
+    fuel_cost = db.Column(db.Float, nullable=False, default=0.0)
+    toll_cost = db.Column(db.Float, nullable=False, default=0.0)
+    other_costs = db.Column(db.Float, nullable=False, default=0.0)
+    description = db.Column(db.String(200))
+    date_added = db.Column(db.DateTime, nullable=False, default=utc_now)
 
 class Ride(db.Model):
+    """Model for rides."""
+    # Status Constants
+    STATUS_UPCOMING = 'UPCOMING'
+    STATUS_ONGOING = 'ONGOING'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_CANCELLED = 'CANCELLED'
+    
+    __table_args__ = (
+        # Open rides by start time (search_rides, map API, lifecycle sweep)
+        db.Index('ix_ride_status_start_date', 'status', 'start_date'),
+        # A driver's rides by start time (dashboard, user_profile, admin user detail)
+        db.Index('ix_ride_driver_id_start_date', 'driver_id', 'start_date'),
+        # Rides changed since a point in time (admin map deltas, incremental exports)
+        db.Index('ix_ride_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    origin = db.Column(db.String(200), nullable=False)
-    destination = db.Column(db.String(200), nullable=False)
+    car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False)
+    start_location = db.Column(db.String(200), nullable=False)
+    end_location = db.Column(db.String(200), nullable=False)
+    
+    # Coordinates picked on the offer ride map (NULL for rides typed in by hand)
+    start_lat = db.Column(db.Float, nullable=True)
+    start_lng = db.Column(db.Float, nullable=True)
+    end_lat = db.Column(db.Float, nullable=True)
+    end_lng = db.Column(db.Float, nullable=True)
+    # Simplified route as a JSON list of [lat, lng] pairs, start to end
+    route_polyline = db.Column(db.Text, nullable=True)
+    
+    # Scheduled times
     start_date = db.Column(db.DateTime, nullable=False)
-    seats = db.Column(db.Integer, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    bookings = db.relationship('Booking', backref='ride', lazy=True)
+    end_date = db.Column(db.DateTime, nullable=False)
+    
+    # Actual times
+    actual_start_time = db.Column(db.DateTime, nullable=True)
+    actual_end_time = db.Column(db.DateTime, nullable=True)
+    
+    # Estimated times
+    estimated_end_time = db.Column(db.DateTime, nullable=True)
+    error_buffer_minutes = db.Column(db.Integer, default=15)  # Buffer time in minutes
+    
+    available_seats = db.Column(db.Integer, nullable=False)
+    price_per_seat = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='UPCOMING')  # UPCOMING, ONGOING, COMPLETED, CANCELLED
+    distance = db.Column(db.Float, nullable=False)  # Distance in kilometers
+    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
+    # Bumped on every UPDATE, including bulk update() statements
+    updated_at = db.Column(db.DateTime, nullable=True, default=utc_now, onupdate=utc_now)
     
-    # Additional fields that might be needed
-    distance = db.Column(db.Float, nullable=True)  # Distance in kilometers
-    package_type = db.Column(db.String(20), nullable=True, default='weekly')
+    # Completion tracking
+    auto_completed = db.Column(db.Boolean, default=False)  # Track if auto-completed by time
+    completed_by = db.Column(db.String(20), nullable=True)  # 'DRIVER', 'SYSTEM', 'AUTO'
+    
+    # Add package_type with nullable=True to handle existing records
+    package_type = db.Column(db.String(20), nullable=True, default='weekly')  # weekly, biweekly, monthly
+    
+    # Safety images
+    license_photo = db.Column(db.String(300), nullable=True)  # Driver's license photo
+    driver_photo = db.Column(db.String(300), nullable=True)  # Driver's photo
+    vehicle_photo = db.Column(db.String(300), nullable=True)  # Vehicle photo
+    
+    # Relationships
+    bookings = db.relationship('Booking', backref='ride', lazy=True)
+    car = db.relationship('Car', backref='rides', lazy=True)
+    wallet = db.relationship('Wallet', backref='ride', lazy=True)
+    reports = db.relationship('Report', backref='ride', lazy=True)
     expenses = db.relationship('Expense', backref='ride', lazy=True)
-
+    
+    def __repr__(self):
+        return f'<Ride {self.id} {self.start_location} to {self.end_location}>'
+    
     @property
-    def available_seats(self):
-        booked_seats = sum(booking.seats for booking in self.bookings if booking.status != 'cancelled')
-        return self.seats - booked_seats
-
+    def origin(self):
+        """Alias for start_location for template compatibility."""
+        return self.start_location
+    
+    @property
+    def destination(self):
+        """Alias for end_location for template compatibility."""
+        return self.end_location
+    
+    @property
+    def seats(self):
+        """Alias for available_seats for template compatibility."""
+        return self.available_seats
+    
+    def get_total_wallet_expenses(self):
+        """Calculate total expenses for this ride."""
+        total = 0
+        for wallet_entry in self.wallet:
+            total += wallet_entry.fuel_cost + wallet_entry.toll_cost + wallet_entry.other_costs
+        return total
+        
     def get_estimated_total_cost(self):
-        """Calculate estimated total cost for the ride."""
-        if not self.distance:
-            return 0.0
-            
-        # Default fuel price and mileage if not available
-        fuel_price = FUEL_PRICES.get('petrol', 100.0)
-        mileage = 15.0  # Default to 15 kmpl
+        """Calculate estimated total cost for the ride (fuel only)."""
+        # Get car and fuel details
+        fuel_price = FUEL_PRICES.get(self.car.fuel_type.lower(), 100.0)  # Default to 100 if fuel type not found
+        mileage = self.car.mileage or 15.0  # Default to 15 kmpl if mileage not set
         
         # Calculate fuel cost based on distance and mileage
         fuel_cost = (self.distance / mileage) * fuel_price
         
-        # Add maintenance cost (10% of fuel cost)
-        maintenance_cost = fuel_cost * 0.10
+        return round(fuel_cost, 2)
         
-        # Add toll charges (estimated 50 per 100km)
-        toll_charges = (self.distance / 100) * 50
+    def get_average_cost_per_seat(self):
+        """Calculate average cost per seat based on package type cost sharing."""
+        total_cost = self.get_estimated_total_cost()
         
-        total_cost = fuel_cost + maintenance_cost + toll_charges
-        return round(total_cost, 2)
-
+        if self.package_type == 'daily':
+            # Daily: Driver pays 50%, passengers share 50%
+            passenger_share = total_cost * 0.50
+        else:
+            # Weekly/Bi-weekly/Monthly: Driver pays 25%, passengers share 75%
+            passenger_share = total_cost * 0.75
+        
+        # Price per seat = passenger share divided by available seats
+        per_seat_cost = passenger_share / self.available_seats if self.available_seats > 0 else 0
+        return round(per_seat_cost, 2)
+        
+    def calculate_fare_for_booking(self, booking):
+        """Calculate fare for a specific booking."""
+        # Only allow cancellation of pending/confirmed bookings
+        if booking.status not in [Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]:
+            return 0
+            
+        per_seat_cost = self.get_average_cost_per_seat()
+        return round(per_seat_cost * booking.seats, 2)
+        
+    def get_estimated_time(self):
+        """Calculate estimated time to reach destination in minutes."""
+        if not self.distance:
+            return 0
+        # Calculate time in hours, then convert to minutes
+        time_hours = self.distance / AVERAGE_SPEED
+        return round(time_hours * 60)
+    
+    def get_estimated_end_time(self):
+        """Calculate estimated end time of the ride."""
+        if self.estimated_end_time:
+            return self.estimated_end_time
+        estimated_minutes = self.get_estimated_time()
+        # Use actual_start_time if ride has started, otherwise use scheduled start_date
+        start_time = self.actual_start_time if self.actual_start_time else self.start_date
+        return start_time + timedelta(minutes=estimated_minutes)
+    
+    def get_max_completion_time(self):
+        """Calculate maximum time for ride completion (estimated_end_time + error_buffer)."""
+        estimated_end = self.get_estimated_end_time()
+        buffer = self.error_buffer_minutes or 15
+        return estimated_end + timedelta(minutes=buffer)
+    
+    def should_auto_complete(self):
+        """Check if ride should be auto-completed based on time."""
+        if self.status != self.STATUS_ONGOING:
+            return False
+        current_time = utc_now()
+        max_time = self.get_max_completion_time()
+        return current_time >= max_time
+    
+    def is_severely_overdue(self):
+        """Check if UPCOMING ride is more than 1 hour overdue."""
+        if self.status != self.STATUS_UPCOMING:
+            return False
+        current_time = utc_now()
+        hours_overdue = (current_time - self.start_date).total_seconds() / 3600
+        return hours_overdue > 1
+    
+    def can_start(self):
+        """Check if ride can be started."""
+        return self.status == self.STATUS_UPCOMING
+    
+    def can_end(self):
+        """Check if ride can be ended."""
+        return self.status == self.STATUS_ONGOING
+    
+    def start_ride(self):
+        """Start the ride - change status to ONGOING."""
+        if not self.can_start():
+            return False, "Ride cannot be started"
+        
+        self.status = self.STATUS_ONGOING
+        self.actual_start_time = utc_now()
+        
+        # Re-estimate the end time from the actual start (it was first set
+        # from the scheduled start when the ride was offered)
+        self.estimated_end_time = self.actual_start_time + timedelta(minutes=self.get_estimated_time())
+        
+        # Set dynamic buffer based on distance
+        if self.distance <= 50:
+            self.error_buffer_minutes = 30
+        elif self.distance <= 100:
+            self.error_buffer_minutes = 45
+        elif self.distance <= 200:
+            self.error_buffer_minutes = 60
+        else:
+            self.error_buffer_minutes = 90
+        
+        # Update all confirmed bookings to ONGOING
+        for booking in self.bookings:
+            if booking.status == booking.STATUS_CONFIRMED:
+                booking.passenger_ride_status = 'ONGOING'
+        
+        return True, "Ride started successfully"
+    
+    def end_ride(self, completed_by='DRIVER'):
+        """End the ride - change status to COMPLETED."""
+        if not self.can_end():
+            return False, "Ride cannot be ended"
+        
+        self.status = self.STATUS_COMPLETED
+        self.actual_end_time = utc_now()
+        self.completed_by = completed_by
+        
+        # Mark all confirmed/ongoing bookings as completed
+        for booking in self.bookings:
+            if booking.status in [booking.STATUS_CONFIRMED]:
+                booking.status = booking.STATUS_COMPLETED
+                booking.passenger_ride_status = 'COMPLETED'
+                if not booking.passenger_completed_at:
+                    booking.passenger_completed_at = utc_now()
+        
+        return True, "Ride ended successfully"
+    
+    def auto_complete_ride(self):
+        """Auto-complete ride when time exceeds buffer."""
+        self.auto_completed = True
+        return self.end_ride(completed_by='AUTO')
+    
+    def notify_passengers(self, message_type):
+        """Send notification to all confirmed passengers."""
+        # In production, this would send actual notifications (email/SMS/push)
+        # For now, it logs the notification
+        passengers = [b.passenger for b in self.bookings if b.status in [b.STATUS_CONFIRMED, b.STATUS_PENDING]]
+        notification_messages = {
+            'RIDE_STARTED': f'Your ride from {self.start_location} to {self.end_location} has started!',
+            'RIDE_ENDED': f'Your ride from {self.start_location} to {self.end_location} has been completed.',
+            'RIDE_CANCELLED': f'The ride from {self.start_location} to {self.end_location} has been cancelled.'
+        }
+        current_app.logger.info(f'Notification {message_type}: {notification_messages.get(message_type)} sent to {len(passengers)} passengers')
+        return True
+    
     def calculate_fare_distribution(self):
         """Calculate fare distribution for all passengers and driver."""
         total_cost = self.get_estimated_total_cost()
         
         # Get confirmed bookings
-        confirmed_bookings = [b for b in self.bookings if b.status == 'confirmed']
+        confirmed_bookings = [b for b in self.bookings if b.status == b.STATUS_CONFIRMED]
         total_booked_seats = sum(b.seats for b in confirmed_bookings)
         
         # Calculate per seat cost (including driver's seat)
@@ -96,16 +439,97 @@ class Ride(db.Model):
             'bookings': booking_shares
         }
 
+@event.listens_for(Ride, 'before_insert')
+def _set_estimated_end_time(mapper, connection, ride):
+    # Persisted up front so booking conflict checks can compare it in SQL
+    if ride.estimated_end_time is None and ride.start_date is not None:
+        ride.estimated_end_time = ride.get_estimated_end_time()
+
 class Booking(db.Model):
+    """Model for ride bookings."""
+    # Status Constants
+    STATUS_PENDING = 'PENDING'
+    STATUS_CONFIRMED = 'CONFIRMED'
+    STATUS_CANCELLED = 'CANCELLED'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_REJECTED = 'REJECTED'
+    
+    __table_args__ = (
+        # A passenger's bookings by status (my_bookings, book_ride collision check)
+        db.Index('ix_booking_passenger_id_status', 'passenger_id', 'status'),
+        # A ride's bookings by status (booking_details, seat release, lifecycle sweep)
+        db.Index('ix_booking_ride_id_status', 'ride_id', 'status'),
+        # Bookings changed since the last incremental export
+        db.Index('ix_booking_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
     passenger_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     seats = db.Column(db.Integer, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, CONFIRMED, CANCELLED, COMPLETED, REJECTED
+    created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utc_now, onupdate=utc_now)
+    pickup_address = db.Column(db.String(200), nullable=False)
+    drop_address = db.Column(db.String(200), nullable=False)
+    share = db.Column(db.Float, nullable=True)
+    contact_number = db.Column(db.String(20), nullable=True)
+    booking_date = db.Column(db.DateTime, nullable=False, default=utc_now)
     
+    # Individual passenger completion tracking
+    passenger_ride_status = db.Column(db.String(20), default='UPCOMING')  # UPCOMING, ONGOING, COMPLETED
+    passenger_completed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    reviews = db.relationship('Review', backref='booking', lazy=True)
+    
+    def __repr__(self):
+        return f'<Booking {self.id} {self.status}>'
+
     def can_cancel(self):
-        return self.status == 'pending' or (self.status == 'confirmed' and self.ride.start_date > datetime.utcnow())
+        """Check if booking can be cancelled."""
+        return self.status in [self.STATUS_PENDING, self.STATUS_CONFIRMED]
+    
+    def complete_passenger_ride(self):
+        """Mark passenger's individual ride as completed."""
+        if self.status != self.STATUS_CONFIRMED:
+            return False, "Only confirmed bookings can be completed"
+        
+        if self.ride.status != self.ride.STATUS_ONGOING:
+            return False, "Ride must be ongoing to complete"
+        
+        # Mark passenger as completed
+        self.passenger_ride_status = 'COMPLETED'
+        self.passenger_completed_at = utc_now()
+        
+        # Note: This doesn't change booking.status to COMPLETED
+        # That only happens when driver ends the entire ride
+        
+        return True, "Your ride marked as completed"
+
+class Report(db.Model):
+    """Model for user reports and feedback."""
+    __table_args__ = (
+        # Pending SOS count shown on every admin page
+        db.Index('ix_report_report_type_status', 'report_type', 'status'),
+        # Pending reports, newest first (admin_safety, admin dashboard)
+        db.Index('ix_report_status_created_at', 'status', 'created_at'),
+        # Reports changed since the last incremental export
+        db.Index('ix_report_updated_at', 'updated_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=True)
+    report_type = db.Column(db.String(20), nullable=False)  # 'emergency', 'feedback', 'complaint'
+    subject = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, resolved, dismissed
+    created_at = db.Column(db.DateTime, default=utc_now)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utc_now, onupdate=utc_now)
+    resolved_at = db.Column(db.DateTime)
+    emergency_type = db.Column(db.String(50))  # For emergency reports: 'medical', 'accident', 'breakdown', etc.
+    location = db.Column(db.String(200))  # Location when emergency/incident occurred
 
 class Expense(db.Model):
     """Model for ride expenses."""
@@ -114,4 +538,56 @@ class Expense(db.Model):
     toll_cost = db.Column(db.Float, default=0.0)
     other_costs = db.Column(db.Float, default=0.0)
     description = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utc_now)
+
+class AdminLog(db.Model):
+    """Model for admin activity logging."""
+    id = db.Column(db.Integer, primary_key=True)
+    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    action = db.Column(db.String(100), nullable=False)  # e.g., "Suspended user", "Resolved SOS"
+    target_type = db.Column(db.String(50))  # user, ride, report, sos
+    target_id = db.Column(db.Integer)
+    details = db.Column(db.Text)
+    ip_address = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+    
+    # Relationship
+    admin = db.relationship('User', backref='admin_logs', foreign_keys=[admin_id])
+    
+    def __repr__(self):
+        return f'<AdminLog {self.id}: {self.action}>'
+
+class StatsRollup(db.Model):
+    """
+    Pre-aggregated admin statistics: one value per (metric, day) bucket.
+    
+    Daily buckets hold the number of events on that UTC day; the bucket dated
+    STATS_ALL_TIME holds the metric's running total (or, for gauges such as
+    pending_bookings, its latest value).
+    """
+    __tablename__ = 'stats_rollup'
+    
+    metric = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatsRollup {self.metric} {self.day}: {self.value}>'
+
+class StatsEvent(db.Model):
+    """
+    A change to a statistics counter that is not yet in stats_rollup.
+    
+    Write paths append one row per bucket they count in, instead of updating
+    the shared StatsRollup row, so concurrent bookings never wait on each
+    other's row lock. refresh_stats_rollup() folds the rows into StatsRollup.
+    """
+    __tablename__ = 'stats_event'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<StatsEvent {self.metric} {self.day}: {self.amount:+d}>'
@@ -0,0 +1,262 @@
+"""
+Per-request SQL instrumentation.
+
+Hooks SQLAlchemy's before/after_cursor_execute events to record, for each
+request, how many statements ran, how long they took and how often each
+statement shape repeated. A shape (fingerprint) is the SQL with literals,
+bind parameters and IN-lists collapsed, so the lazy loads of an N+1 pattern
+(`SELECT ... FROM booking WHERE ? = booking.ride_id`, once per ride) all
+share one fingerprint.
+
+Every response carries the totals in its headers:
+    X-SQL-Queries: 12
+    Server-Timing: db;dur=4.1;desc="12 queries"
+
+Statements slower than SQL_SLOW_QUERY_MS are written to a rotating slow
+query log, one JSON object per line, with the endpoint, the types of the
+bound parameters (never their values) and the statement's plan from EXPLAIN
+(EXPLAIN QUERY PLAN on SQLite). Plans are cached per fingerprint for a few
+minutes, so a statement that is slow on every request is explained once.
+
+Config:
+    SQL_REPEAT_LIMIT    most times one fingerprint may run in a request (default 10)
+    SQL_REPEAT_ACTION   'warn' (log it), 'raise' (RepeatedQueryError; for tests) or 'off'
+    SQL_DEBUG_TOOLBAR   append a query summary to HTML pages; None follows app.debug
+    SQL_SLOW_QUERY_MS   slow query threshold in milliseconds; None disables the log
+    SQL_SLOW_QUERY_LOG  slow query log file (default <instance path>/slow_queries.log)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETERS = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+|\?')
+_PLACEHOLDER_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+
+class RepeatedQueryError(Exception):
+    """A request ran one statement shape more often than SQL_REPEAT_LIMIT allows."""
+
+
+def fingerprint(statement):
+    """`statement` with literals and parameters replaced by ?, IN-lists collapsed and whitespace squeezed."""
+    statement = _STRING_LITERALS.sub('?', statement)
+    statement = _PARAMETERS.sub('?', statement)
+    statement = _NUMBERS.sub('?', statement)
+    statement = _PLACEHOLDER_LISTS.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class QueryStats:
+    """Statements run during one request, and when it started (perf_counter)."""
+
+    def __init__(self, slow_log=None):
+        self.started = time.perf_counter()
+        self.slow_log = slow_log
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, limit):
+        """(fingerprint, count) for shapes run more than `limit` times, most frequent first."""
+        return [(shape, count) for shape, count in self.fingerprints.most_common() if count > limit]
+
+
+def parameter_shape(parameters, executemany=False):
+    """Type names of bound parameters, e.g. '(int, str, NoneType)'; values are left out."""
+    if executemany:
+        return f'{len(parameters)} x {parameter_shape(parameters[0])}' if parameters else '[]'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+
+def _plan_lines(dialect, rows):
+    if dialect != 'sqlite':
+        return [' | '.join(str(value) for value in row) for row in rows]
+    # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail); indent children under parents
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Writes statements slower than `threshold` seconds, with their plans, to a rotating file."""
+
+    def __init__(self, path, threshold, max_bytes=10 * 1024 * 1024, backup_count=5, plan_ttl=300):
+        self.path = path
+        self.threshold = threshold
+        self.plan_ttl = plan_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self._plans = {}  # fingerprint -> (explained_at, plan lines)
+        self._lock = threading.Lock()
+
+    def record(self, conn, cursor, statement, parameters, executemany, duration):
+        """Log one slow statement; called from the after_cursor_execute listener."""
+        shape = fingerprint(statement)
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'request': f'{request.method} {request.path}' if has_request_context() else None,
+            'duration_ms': round(duration * 1000, 2),
+            'fingerprint': shape,
+            'statement': statement,
+            'parameters': parameter_shape(parameters, executemany),
+            'plan': self._plan(conn, cursor, shape, statement, parameters[0] if executemany else parameters),
+        }
+        self._handler.handle(logging.makeLogRecord({'msg': json.dumps(entry)}))
+
+    def _plan(self, conn, cursor, shape, statement, parameters):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._plans.get(shape)
+        if cached is not None and now - cached[0] < self.plan_ttl:
+            return cached[1]
+        if not _EXPLAINABLE.match(statement):
+            return None
+        try:
+            plan = self._explain(conn.dialect.name, cursor.connection, statement, parameters)
+        except Exception as e:
+            logger.warning('Could not EXPLAIN slow query: %s', e)
+            return None
+        with self._lock:
+            self._plans[shape] = (now, plan)
+        return plan
+
+    def _explain(self, dialect, dbapi_connection, statement, parameters):
+        # Straight through the DB-API connection, so the EXPLAIN is neither
+        # counted nor explained itself; PostgreSQL gets a savepoint so a
+        # failure cannot abort the request's transaction
+        explain_cursor = dbapi_connection.cursor()
+        try:
+            if dialect == 'sqlite':
+                explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())
+                return _plan_lines(dialect, explain_cursor.fetchall())
+            explain_cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                explain_cursor.execute('EXPLAIN ' + statement, parameters or None)
+                plan = _plan_lines(dialect, explain_cursor.fetchall())
+            except Exception:
+                explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                raise
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        finally:
+            explain_cursor.close()
+
+    def close(self):
+        self._handler.close()
+
+
+def current_stats():
+    """QueryStats of the current request, or None outside a request."""
+    return g.get('sql_stats') if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than the pooled connection, so a
+    # statement that fails (after_cursor_execute never fires) leaves nothing behind
+    context._sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._sql_started
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+        if stats.slow_log is not None and duration >= stats.slow_log.threshold:
+            stats.slow_log.record(conn, cursor, statement, parameters, executemany, duration)
+
+
+class QueryCounter:
+    """Flask extension wiring the statement counter into requests and responses."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_REPEAT_LIMIT', 10)
+        app.config.setdefault('SQL_REPEAT_ACTION', 'warn')
+        app.config.setdefault('SQL_DEBUG_TOOLBAR', None)
+        app.config.setdefault('SQL_SLOW_QUERY_MS', None)
+        app.config.setdefault('SQL_SLOW_QUERY_LOG', os.path.join(app.instance_path, 'slow_queries.log'))
+        slow_log = None
+        if app.config['SQL_SLOW_QUERY_MS'] is not None:
+            slow_log = SlowQueryLog(app.config['SQL_SLOW_QUERY_LOG'], app.config['SQL_SLOW_QUERY_MS'] / 1000)
+        # Per app, as one QueryCounter serves every app create_app() builds
+        app.extensions['query_counter'] = {'slow_log': slow_log}
+        # Listening on the Engine class covers engines created after this call too
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.sql_stats = QueryStats(current_app.extensions['query_counter']['slow_log'])
+
+    def _finish(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        milliseconds = stats.duration * 1000
+        response.headers['X-SQL-Queries'] = str(stats.count)
+        response.headers.add('Server-Timing', f'db;dur={milliseconds:.1f};desc="{stats.count} queries"')
+
+        repeated = stats.repeated(current_app.config['SQL_REPEAT_LIMIT'])
+        action = current_app.config['SQL_REPEAT_ACTION']
+        if repeated and action != 'off':
+            shape, count = repeated[0]
+            message = (f'{request.method} {request.path} ran one statement {count} times '
+                       f'(limit {current_app.config["SQL_REPEAT_LIMIT"]}), likely an N+1 query: {shape}')
+            if action == 'raise':
+                raise RepeatedQueryError(message)
+            logger.warning(message)
+
+        toolbar = current_app.config['SQL_DEBUG_TOOLBAR']
+        if (current_app.debug if toolbar is None else toolbar) and response.mimetype == 'text/html' \
+                and not response.direct_passthrough and not response.is_streamed:
+            self._append_toolbar(response, stats, milliseconds, repeated)
+        return response
+
+    def _append_toolbar(self, response, stats, milliseconds, repeated):
+        flagged = {shape for shape, _ in repeated}
+        shapes = ''.join(f'<li style="color:{"#f66" if shape in flagged else "inherit"}">'
+                         f'<b>{count}&times;</b> <code>{escape(shape)}</code></li>'
+                         for shape, count in stats.fingerprints.most_common(15))
+        panel = (f'<details id="sql-toolbar" style="position:fixed;bottom:0;right:0;z-index:99999;'
+                 f'max-width:60vw;max-height:50vh;overflow:auto;background:#222;color:#eee;'
+                 f'font:12px monospace;padding:4px 8px;opacity:.9">'
+                 f'<summary>{stats.count} queries &middot; {milliseconds:.1f} ms'
+                 f'{" &middot; N+1?" if repeated else ""}</summary><ol>{shapes}</ol></details>')
+        html = response.get_data(as_text=True)
+        position = html.rfind('</body>')
+        response.set_data(html[:position] + panel + html[position:] if position != -1 else html + panel)
@@ -0,0 +1,103 @@
+"""
+Ride lifecycle scheduler for the Ride-Share application.
+Runs the time-based ride transitions (auto-start / auto-complete of overdue
+rides) on a fixed cadence, outside of the web request path. Each tick also
+refreshes the admin statistics rollup gauges, and every
+STATS_REBUILD_INTERVAL seconds the rollup counters are rebuilt.
+
+Each job's runs, duration, lag behind its schedule and last success time
+are recorded as Prometheus metrics; with PROMETHEUS_MULTIPROC_DIR set they
+show up on the web app's /metrics next to the request metrics.
+
+Run one scheduler process next to the web workers:
+
+Usage: python ride_scheduler.py [--interval SECONDS] [--once]
+"""
+
+import argparse
+import os
+import time
+
+from app import app, db, metrics, sweep_ride_lifecycle, refresh_stats_rollup, backfill_estimated_end_times
+# After app, which loads .env: prometheus_client reads PROMETHEUS_MULTIPROC_DIR when imported
+from prometheus_client import Counter, Gauge, Histogram
+
+DEFAULT_INTERVAL = int(os.environ.get('RIDE_LIFECYCLE_INTERVAL', 60))
+STATS_REBUILD_INTERVAL = int(os.environ.get('STATS_REBUILD_INTERVAL', 3600))
+
+JOB_RUNS = Counter('rideshare_job_runs_total', 'Scheduler job runs, by job and outcome', ['job', 'outcome'])
+JOB_DURATION = Histogram('rideshare_job_duration_seconds', 'Scheduler job run time', ['job'])
+JOB_LAG = Gauge('rideshare_job_lag_seconds', 'How late the last scheduler tick started', ['job'],
+                multiprocess_mode='livemax')
+JOB_LAST_SUCCESS = Gauge('rideshare_job_last_success_timestamp_seconds',
+                         'Unix time of the last successful run', ['job'], multiprocess_mode='livemax')
+
+
+def run_job(name, job, *args, **kwargs):
+    """Run one scheduler job, recording its outcome and duration; exceptions propagate."""
+    started = time.perf_counter()
+    try:
+        result = job(*args, **kwargs)
+    except Exception:
+        JOB_RUNS.labels(name, 'error').inc()
+        raise
+    finally:
+        JOB_DURATION.labels(name).observe(time.perf_counter() - started)
+    JOB_RUNS.labels(name, 'ok').inc()
+    JOB_LAST_SUCCESS.labels(name).set(time.time())
+    return result
+
+
+def run_scheduler(interval=DEFAULT_INTERVAL, once=False):
+    """Run sweep_ride_lifecycle() and refresh_stats_rollup() every `interval` seconds."""
+    last_rebuild = None
+    due = time.monotonic()
+    with app.app_context():
+        print(f"Ride lifecycle scheduler started (interval: {interval}s)")
+        # Booking conflict checks compare stored end times; rides loaded in bulk may lack one
+        backfilled = backfill_estimated_end_times()
+        if backfilled:
+            print(f"Stored estimated end times for {backfilled} ride(s)")
+        while True:
+            started = time.monotonic()
+            # Both jobs run in the same tick, so they share its lag
+            for job in ('ride_lifecycle', 'stats_rollup'):
+                JOB_LAG.labels(job).set(max(0.0, started - due))
+            try:
+                result = run_job('ride_lifecycle', sweep_ride_lifecycle)
+                if result['auto_completed'] or result['overdue_completed']:
+                    print(f"Auto-completed {result['auto_completed']} ongoing rides, "
+                          f"{result['overdue_completed']} overdue rides")
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'Lifecycle sweep error: {str(e)}')
+            try:
+                # Full rebuild on the first tick, then every STATS_REBUILD_INTERVAL
+                full = last_rebuild is None or started - last_rebuild >= STATS_REBUILD_INTERVAL
+                run_job('stats_rollup', refresh_stats_rollup, full=full)
+                if full:
+                    last_rebuild = started
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'Stats rollup error: {str(e)}')
+            finally:
+                # Drop the session so the next tick sees fresh data
+                db.session.remove()
+                metrics.run_callbacks()
+
+            if once:
+                break
+            due = started + interval
+            time.sleep(max(0, due - time.monotonic()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the ride lifecycle scheduler.')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                        help='Seconds between sweeps (default: %(default)s)')
+    parser.add_argument('--once', action='store_true', help='Run a single sweep and exit')
+    args = parser.parse_args()
+    try:
+        run_scheduler(args.interval, args.once)
+    finally:
+        metrics.close()
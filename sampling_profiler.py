@@ -0,0 +1,236 @@
+"""
+Sampling profiler for live requests.
+
+An admin switches profiling on for a fraction of requests, optionally only
+those of one endpoint. A selected request is tagged in its WSGI environ;
+a background thread then takes a snapshot of every thread's stack every few
+milliseconds (sys._current_frames()), and stacks running inside a tagged
+request are counted for its endpoint. Untagged requests cost one settings
+check, and no thread runs while nothing is being profiled.
+
+Settings and results live in a directory shared by every worker, so the
+switch takes effect without a restart: workers re-read settings.json at
+most once a second, and each writes its counts to
+<endpoint>.<pid>.collapsed, in the collapsed-stack format that
+flamegraph.pl and speedscope read:
+
+    Flask.wsgi_app (flask/app.py:2160);...;dashboard (package/app.py:1488);... 12
+
+The sampler is a real OS thread even under gevent, so it interrupts
+CPU-bound greenlets. It only ever sees the greenlet that is running;
+greenlets parked on I/O are not sampled.
+"""
+
+import _thread
+import glob
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+from flask import Flask
+
+SETTINGS_NAME = 'settings.json'
+DEFAULT_SETTINGS = {'enabled': False, 'fraction': 0.01, 'endpoint': '', 'interval_ms': 5, 'generation': 0}
+ENVIRON_KEY = 'rideshare.profile'
+MAX_STACKS = 5000  # distinct stacks kept per endpoint; the rest are counted as '(other stacks)'
+
+_WSGI_CODE = Flask.wsgi_app.__code__
+
+
+def _os_thread_functions():
+    """start_new_thread, get_ident and sleep of real OS threads, even if gevent patched them."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return _thread.start_new_thread, _thread.get_ident, time.sleep
+    return (monkey.get_original('_thread', 'start_new_thread'), monkey.get_original('_thread', 'get_ident'),
+            monkey.get_original('time', 'sleep'))
+
+
+def frame_label(code):
+    """'qualname (package/module.py:line)' for a code object."""
+    filename = '/'.join(code.co_filename.replace('\\', '/').split('/')[-2:])
+    # co_qualname is new in Python 3.11; older interpreters only have the bare name
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({filename}:{code.co_firstlineno})'
+
+
+def summarize(stacks, top=15):
+    """
+    Functions that used the most samples.
+
+    Args:
+        stacks: Counter of collapsed stack -> samples
+        top: number of functions to return
+
+    Returns:
+        list: (function, samples running it, samples with it on the stack), busiest first
+    """
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    rows = sorted(((frame, own[frame], total[frame]) for frame in total), key=lambda row: (-row[1], -row[2]))
+    return rows[:top]
+
+
+class SamplingProfiler:
+    """Samples the stacks of selected requests; settings and results shared through `directory`."""
+
+    def __init__(self, directory, settings_ttl=1.0, flush_interval=5.0, idle_timeout=30.0):
+        self.directory = directory
+        self.settings_ttl = settings_ttl
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self._settings = dict(DEFAULT_SETTINGS)
+        self._settings_mtime = None
+        self._settings_checked = float('-inf')
+        self._counts = defaultdict(Counter)  # endpoint -> Counter(tuple of code objects -> samples)
+        self._generation = 0
+        self._running = False
+        self._stopping = False
+        self._last_request = 0.0
+        self._start_new_thread, self._get_ident, self._sleep = _os_thread_functions()
+
+    # Settings
+
+    def _settings_path(self):
+        return os.path.join(self.directory, SETTINGS_NAME)
+
+    def settings(self):
+        """Current settings, re-read from the shared directory at most every `settings_ttl` seconds."""
+        now = time.monotonic()
+        if now - self._settings_checked >= self.settings_ttl:
+            self._settings_checked = now
+            try:
+                mtime = os.stat(self._settings_path()).st_mtime_ns
+                if mtime != self._settings_mtime:
+                    with open(self._settings_path()) as f:
+                        self._settings = dict(DEFAULT_SETTINGS, **json.load(f))
+                    self._settings_mtime = mtime
+            except (OSError, ValueError):
+                pass
+        return self._settings
+
+    def update_settings(self, **changes):
+        """Change settings for every worker sharing the directory."""
+        settings = dict(self.settings(), **changes)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f'{self._settings_path()}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(settings, f)
+        os.replace(temporary, self._settings_path())
+        self._settings = settings
+        self._settings_mtime = os.stat(self._settings_path()).st_mtime_ns
+        return settings
+
+    def clear(self):
+        """Delete collected profiles; workers drop their in-memory counts too."""
+        self.update_settings(generation=self.settings()['generation'] + 1)
+        for path in glob.glob(os.path.join(self.directory, '*.collapsed')):
+            os.remove(path)
+
+    # Requests
+
+    def maybe_profile(self, request):
+        """Tag a Flask request for sampling if the settings select it; call from before_request."""
+        settings = self.settings()
+        if not settings['enabled'] or request.endpoint is None:
+            return False
+        if settings['endpoint'] and request.endpoint != settings['endpoint']:
+            return False
+        if random.random() >= settings['fraction']:
+            return False
+        request.environ[ENVIRON_KEY] = request.endpoint
+        self._last_request = time.monotonic()
+        if not self._running:
+            self._running = True
+            self._start_new_thread(self._run, ())
+        return True
+
+    # Sampler thread
+
+    def _run(self):
+        own_ident = self._get_ident()
+        last_flush = time.monotonic()
+        try:
+            while not self._stopping:
+                settings = self.settings()
+                if settings['generation'] != self._generation:
+                    self._counts.clear()
+                    self._generation = settings['generation']
+                self._sample(own_ident)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = now
+                if now - self._last_request > self.idle_timeout:
+                    break
+                self._sleep(settings['interval_ms'] / 1000)
+        finally:
+            self.flush()
+            self._running = False
+
+    def _sample(self, own_ident):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None and frame.f_code is not _WSGI_CODE:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if frame is None:
+                continue
+            endpoint = frame.f_locals.get('environ', {}).get(ENVIRON_KEY)
+            if endpoint is None:
+                continue
+            stack.append(frame.f_code)
+            counts = self._counts[endpoint]
+            key = tuple(reversed(stack))
+            if key not in counts and len(counts) >= MAX_STACKS:
+                key = ()
+            counts[key] += 1
+
+    def flush(self):
+        """Write this process's counts, one collapsed-stack file per endpoint."""
+        if self.settings()['generation'] != self._generation:
+            self._counts.clear()  # cleared since they were sampled
+        if not self._counts:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for endpoint, counts in list(self._counts.items()):
+            path = os.path.join(self.directory, f'{endpoint}.{os.getpid()}.collapsed')
+            lines = (f"{';'.join(map(frame_label, stack)) or '(other stacks)'} {count}\n"
+                     for stack, count in list(counts.items()))
+            with open(f'{path}.tmp', 'w') as f:
+                f.writelines(lines)
+            os.replace(f'{path}.tmp', path)
+
+    def stop(self, timeout=5.0):
+        """Stop the sampler thread (after a final flush); used by tests and at shutdown."""
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            self._sleep(0.01)
+        self._stopping = False
+
+    # Results
+
+    def profiles(self):
+        """Counter of collapsed stack -> samples for each endpoint, merged across workers."""
+        merged = defaultdict(Counter)
+        for path in glob.glob(os.path.join(self.directory, '*.collapsed')):
+            endpoint = os.path.basename(path).rsplit('.', 2)[0]
+            try:
+                with open(path) as f:
+                    for line in f:
+                        stack, _, count = line.rstrip('\n').rpartition(' ')
+                        merged[endpoint][stack] += int(count)
+            except (OSError, ValueError):
+                continue
+        return dict(merged)
@@ -0,0 +1,227 @@
+"""
+Publish/subscribe broker for Server-Sent Events.
+
+Every connected admin holds a Subscription; publish() hands each event to
+every subscriber's queue and returns immediately, so a slow or stalled
+browser never delays the request that raised the event. A short history
+lets a reconnecting EventSource catch up from its Last-Event-ID.
+
+EventBroker lives in one process, so it only serves a single worker.
+RedisEventBroker relays events between processes over Redis pub/sub, with
+event ids and the history kept in Redis, so an SOS raised in one gunicorn
+worker reaches the admins streaming from every other one. create_broker()
+picks the backend from a URL, like ttl_cache.create_cache():
+
+    memory://                  in-process (default)
+    redis://localhost:6379/0   shared; needs the optional `redis` package
+"""
+
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+Event = collections.namedtuple('Event', 'id name data')
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One subscriber's event queue; iterate with get() and close() when done."""
+
+    def __init__(self, broker, maxsize):
+        self._broker = broker
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._replayed = set()
+        self.dropped = 0
+
+    def put(self, event):
+        # A replayed event can also arrive live once; send it only the first time
+        if event.id in self._replayed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # A subscriber that stopped reading loses its oldest events, not the broker
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self._queue.put_nowait(event)
+
+    def get(self, timeout=None):
+        """Return the next Event, or None if none arrived within `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventBroker:
+    """Fan events out to every current subscriber."""
+
+    def __init__(self, history=100, queue_size=100):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = collections.deque(maxlen=history)
+        self._queue_size = queue_size
+        self._last_id = 0
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a new subscriber.
+
+        Args:
+            last_event_id: id of the last event the client saw (EventSource
+                sends it as the Last-Event-ID header when it reconnects);
+                newer events still in the history are queued straight away
+
+        Returns:
+            Subscription
+        """
+        subscription = Subscription(self, self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                for event in self._history:
+                    if event.id > last_event_id:
+                        subscription.put(event)
+        return subscription
+
+    def _deliver(self, event):
+        with self._lock:
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, name, data):
+        """
+        Send an event to every subscriber.
+
+        Args:
+            name: SSE event name
+            data: JSON-serialisable payload
+
+        Returns:
+            Event: the published event
+        """
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, name, data)
+        self._deliver(event)
+        return event
+
+
+class RedisEventBroker(EventBroker):
+    """
+    Fan events out to the subscribers of every process sharing a Redis server.
+
+    publish() numbers the event from a Redis counter, stores it in a capped
+    Redis list (the history) and publishes it on a channel. Each process runs
+    one listener thread on that channel, started by its first subscribe(),
+    that hands events to its local subscribers.
+    """
+
+    def __init__(self, client, prefix='rideshare:sos', history=100, queue_size=100):
+        super().__init__(history, queue_size)
+        self._client = client
+        self._channel = prefix
+        self._id_key = f'{prefix}:last_id'
+        self._history_key = f'{prefix}:history'
+        self._history_size = history
+        self._listener_pid = None
+        self._listening = threading.Event()
+
+    def subscribe(self, last_event_id=None):
+        self._start_listener()
+        subscription = Subscription(self, self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                # Newest first in Redis; replay oldest first
+                for raw in reversed(self._client.lrange(self._history_key, 0, -1)):
+                    event = Event(*json.loads(raw))
+                    if event.id > last_event_id:
+                        subscription.put(event)
+                        subscription._replayed.add(event.id)
+        return subscription
+
+    def publish(self, name, data):
+        event = Event(self._client.incr(self._id_key), name, data)
+        raw = json.dumps(event)
+        self._client.lpush(self._history_key, raw)
+        self._client.ltrim(self._history_key, 0, self._history_size - 1)
+        self._client.publish(self._channel, raw)
+        return event
+
+    def _start_listener(self, timeout=5):
+        # One listener per process; workers forked after import start their own
+        if self._listener_pid != os.getpid():
+            with self._lock:
+                if self._listener_pid != os.getpid():
+                    self._listener_pid = os.getpid()
+                    self._listening.clear()
+                    threading.Thread(target=self._listen, name='sos-broker-listener', daemon=True).start()
+        # Events published before the channel subscription is live would be missed
+        self._listening.wait(timeout)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                self._listening.set()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._deliver(Event(*json.loads(message['data'])))
+            except Exception as e:
+                # Events published while disconnected are still replayed on reconnect
+                logger.warning('SOS broker lost its Redis subscription: %s', e)
+                time.sleep(1)
+
+
+def create_broker(url='memory://'):
+    """
+    Build an event broker from a URL (see module docstring).
+
+    Falls back to the in-process broker, with a warning, when the URL names
+    Redis but the `redis` package is not installed.
+    """
+    if not url or url.startswith('memory://'):
+        return EventBroker()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            logger.warning('SOS_BROKER_URL=%s needs the redis package; using an in-process broker', url)
+            return EventBroker()
+        return RedisEventBroker(redis.Redis.from_url(url))
+    raise ValueError(f'Unsupported SOS broker URL: {url}')
+
+
+def format_sse(event):
+    """Serialise an Event in the text/event-stream wire format."""
+    return f'id: {event.id}\nevent: {event.name}\ndata: {json.dumps(event.data)}\n\n'
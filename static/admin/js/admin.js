@@ -79,3 +79,35 @@ function searchTable(inputId, tableId) {
         }
     });
 }
+
+// Live SOS alerts: the server pushes SOS triggers/cancellations over
+// Server-Sent Events; keep the Safety badge current, toast new alerts and
+// refresh the Safety Center list when it is open.
+function updateSOSBadge(count) {
+    const badge = document.getElementById('sos-badge');
+    if (!badge) return;
+    badge.textContent = count;
+    badge.style.display = count > 0 ? '' : 'none';
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    const streamUrl = document.body.dataset.sosStream;
+    if (!streamUrl || !window.EventSource) return;
+
+    // EventSource reconnects by itself and resumes from the last event id
+    const source = new EventSource(streamUrl);
+    const onSafetyPage = document.getElementById('safety-center') !== null;
+
+    source.addEventListener('sos_trigger', function (e) {
+        const alert = JSON.parse(e.data);
+        updateSOSBadge(alert.pending_sos_count);
+        showToast(`SOS from ${alert.username}: ${alert.sos_message || 'Emergency!'}`, 'danger');
+        if (onSafetyPage) location.reload();
+    });
+
+    source.addEventListener('sos_cancel', function (e) {
+        const update = JSON.parse(e.data);
+        updateSOSBadge(update.pending_sos_count);
+        if (onSafetyPage) location.reload();
+    });
+});
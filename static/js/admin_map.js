@@ -1,22 +1,30 @@
 /**
  * ADMIN MAP JAVASCRIPT
- * 
+ *
  * This file handles the admin map dashboard functionality.
  * It shows all rides, SOS emergencies, and allows filtering.
- * 
+ *
  * Features:
  * 1. Display all active rides on map
  * 2. Show SOS emergencies in RED
  * 3. Filter rides by location/status
- * 4. Auto-refresh every 30 seconds
+ * 4. Poll /api/rides/map for changes every 30 seconds and patch the
+ *    markers in place (no page reloads)
+ * 5. Show SOS triggers/cancellations the moment they happen via the
+ *    /admin/stream/sos Server-Sent Events stream
  */
 
 // Global variables
 let adminMap;
-let allMarkers = [];
-let allRoutes = [];
-let ridesData = [];
-let sosData = [];
+let mapDataUrl;
+let mapVersion = null;      // version of the last response, sent back as ?since=
+let mapEtag = null;         // ETag of the last response, sent back as If-None-Match
+let refreshInFlight = false;
+let hasFittedMap = false;
+
+// Map layers and data keyed by ride / SOS id, so a delta only touches what changed
+const rideLayers = new Map();   // id -> {ride, pickup, drop, route}
+const sosLayers = new Map();    // id -> {sos, marker}
 
 // ============================================
 // INITIALIZE ADMIN MAP
@@ -24,182 +32,243 @@ let sosData = [];
 document.addEventListener('DOMContentLoaded', function () {
     console.log('🗺️ Initializing Admin Map Dashboard...');
 
-    // Load data from hidden script tags
-    loadDataFromPage();
+    const mapElement = document.getElementById('admin-map');
+    mapDataUrl = mapElement.dataset.url || '/api/rides/map';
 
     // Initialize map (centered on India/Mumbai by default)
     adminMap = initMap('admin-map', 19.0760, 72.8777, 6);
 
-    // Display all rides and SOS alerts
-    displayAllRides();
-    displaySOSAlerts();
-
     // Setup event listeners
     setupEventListeners();
 
-    // Auto-refresh every 30 seconds
+    // First load fetches everything, later polls only fetch changes
+    refreshMap();
     setInterval(refreshMap, 30000);
 
+    // SOS alerts are pushed as they happen instead of waiting for the next poll
+    if (mapElement.dataset.sosStream && window.EventSource) {
+        listenForSOS(mapElement.dataset.sosStream);
+    }
+
     console.log('✅ Admin Map loaded successfully!');
 });
 
 // ============================================
-// LOAD DATA FROM PAGE
+// REFRESH MAP
 // ============================================
-function loadDataFromPage() {
+async function refreshMap() {
+    if (refreshInFlight) return;
+    refreshInFlight = true;
+
+    const url = mapVersion === null ? mapDataUrl : `${mapDataUrl}?since=${mapVersion}`;
+    const headers = mapEtag ? { 'If-None-Match': mapEtag } : {};
+
     try {
-        // Get rides data from hidden script tag
-        const ridesScript = document.getElementById('rides-data');
-        if (ridesScript) {
-            ridesData = JSON.parse(ridesScript.textContent);
-            console.log(`📊 Loaded ${ridesData.length} rides`);
+        const response = await fetch(url, { headers, cache: 'no-store', credentials: 'same-origin' });
+        if (response.status === 304) {
+            return;  // Nothing changed since the last poll
         }
-
-        // Get SOS data from hidden script tag
-        const sosScript = document.getElementById('sos-data');
-        if (sosScript) {
-            sosData = JSON.parse(sosScript.textContent);
-            console.log(`🚨 Loaded ${sosData.length} SOS alerts`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
         }
+
+        const data = await response.json();
+        mapEtag = response.headers.get('ETag');
+        mapVersion = data.version;
+        applyMapUpdate(data);
     } catch (error) {
-        console.error('Error loading data:', error);
+        console.error('Error refreshing map data:', error);
+    } finally {
+        refreshInFlight = false;
+    }
+}
+
+// ============================================
+// APPLY A FULL OR DELTA UPDATE
+// ============================================
+function applyMapUpdate(data) {
+    if (data.full) {
+        // A full snapshot replaces everything we know about
+        const rideIds = new Set(data.rides.map(ride => ride.id));
+        const sosIds = new Set(data.sos.map(sos => sos.id));
+        [...rideLayers.keys()].filter(id => !rideIds.has(id)).forEach(removeRide);
+        [...sosLayers.keys()].filter(id => !sosIds.has(id)).forEach(removeSOS);
+    }
+
+    data.removed_rides.forEach(removeRide);
+    data.removed_sos.forEach(removeSOS);
+    data.rides.forEach(upsertRide);
+    data.sos.forEach(upsertSOS);
+
+    applyFilters();
+    updateStats();
+    renderSOSList();
+
+    if (!hasFittedMap) {
+        const markers = [];
+        rideLayers.forEach(entry => markers.push(entry.pickup, entry.drop));
+        sosLayers.forEach(entry => markers.push(entry.marker));
+        if (markers.length > 0) {
+            fitMapToMarkers(adminMap, markers);
+            hasFittedMap = true;
+        }
     }
+
+    console.log(`🔄 Map ${data.full ? 'loaded' : 'updated'}: ` +
+        `${data.rides.length} rides, ${data.sos.length} SOS changed; ` +
+        `${data.removed_rides.length + data.removed_sos.length} removed`);
 }
 
 // ============================================
-// DISPLAY ALL RIDES ON MAP
+// RIDE MARKERS
 // ============================================
-function displayAllRides() {
-    // Clear existing markers and routes
-    clearMapElements();
+function ridePopup(ride) {
+    return `
+        <div class="ride-popup">
+            <h6><i class="bi bi-car-front-fill"></i> ${ride.driver.username}</h6>
+            <p class="mb-1">
+                <strong>From:</strong> ${ride.start_location}<br>
+                <strong>To:</strong> ${ride.end_location}
+            </p>
+            <p class="mb-1">
+                <i class="bi bi-calendar"></i> ${new Date(ride.start_date).toLocaleString()}<br>
+                <i class="bi bi-people"></i> ${ride.available_seats} seats<br>
+                <i class="bi bi-currency-rupee"></i> ₹${ride.price_per_seat} per seat
+            </p>
+            <span class="badge bg-${ride.status === 'ONGOING' ? 'success' : 'info'}">
+                ${ride.status}
+            </span>
+            <br>
+            <a href="/ride/${ride.id}" class="btn btn-sm btn-primary mt-2">View Details</a>
+        </div>
+    `;
+}
 
-    if (!ridesData || ridesData.length === 0) {
-        console.log('No rides to display');
+function upsertRide(ride) {
+    const entry = rideLayers.get(ride.id);
+    if (!entry) {
+        // Add pickup marker (Yellow - our theme color!) and drop marker (Green)
+        rideLayers.set(ride.id, {
+            ride,
+            pickup: addMarker(adminMap, ride.start_lat, ride.start_lng,
+                `Pickup: ${ride.start_location}`, ridePopup(ride), 'yellow'),
+            drop: addMarker(adminMap, ride.end_lat, ride.end_lng,
+                `Drop: ${ride.end_location}`, ridePopup(ride), 'green'),
+            route: null
+        });
         return;
     }
 
-    console.log(`🚗 Displaying ${ridesData.length} rides on map...`);
-
-    ridesData.forEach(ride => {
-        // Use default coordinates if not available
-        const startLat = ride.start_lat || getRandomCoordinate(19.0760, 0.5);
-        const startLng = ride.start_lng || getRandomCoordinate(72.8777, 0.5);
-        const endLat = ride.end_lat || getRandomCoordinate(19.0760, 0.5);
-        const endLng = ride.end_lng || getRandomCoordinate(72.8777, 0.5);
-
-        // Create popup content
-        const popupContent = `
-            <div class="ride-popup">
-                <h6><i class="bi bi-car-front-fill"></i> ${ride.driver.username}</h6>
-                <p class="mb-1">
-                    <strong>From:</strong> ${ride.start_location}<br>
-                    <strong>To:</strong> ${ride.end_location}
-                </p>
-                <p class="mb-1">
-                    <i class="bi bi-calendar"></i> ${new Date(ride.start_date).toLocaleString()}<br>
-                    <i class="bi bi-people"></i> ${ride.available_seats} seats<br>
-                    <i class="bi bi-currency-rupee"></i> ₹${ride.price_per_seat} per seat
-                </p>
-                <span class="badge bg-${ride.status === 'ONGOING' ? 'success' : 'info'}">
-                    ${ride.status}
-                </span>
-                <br>
-                <a href="/ride/${ride.id}" class="btn btn-sm btn-primary mt-2">View Details</a>
-            </div>
-        `;
-
-        // Add pickup marker (Yellow - our theme color!)
-        const pickupMarker = addMarker(
-            adminMap,
-            startLat,
-            startLng,
-            `Pickup: ${ride.start_location}`,
-            popupContent,
-            'yellow'
-        );
-        allMarkers.push(pickupMarker);
-
-        // Add drop marker (Green)
-        const dropMarker = addMarker(
-            adminMap,
-            endLat,
-            endLng,
-            `Drop: ${ride.end_location}`,
-            popupContent,
-            'green'
-        );
-        allMarkers.push(dropMarker);
-
-        // Add route if checkbox is checked
-        if (document.getElementById('show-routes').checked) {
-            const route = addRoute(adminMap, startLat, startLng, endLat, endLng);
-            allRoutes.push(route);
-        }
-    });
+    // Existing ride: move the markers and refresh the popups in place
+    const moved = entry.ride.start_lat !== ride.start_lat || entry.ride.start_lng !== ride.start_lng ||
+        entry.ride.end_lat !== ride.end_lat || entry.ride.end_lng !== ride.end_lng;
+    entry.ride = ride;
+    entry.pickup.setLatLng([ride.start_lat, ride.start_lng]).setPopupContent(ridePopup(ride));
+    entry.drop.setLatLng([ride.end_lat, ride.end_lng]).setPopupContent(ridePopup(ride));
+    if (moved) {
+        removeRoute(entry);
+    }
+}
+
+function removeRide(rideId) {
+    const entry = rideLayers.get(rideId);
+    if (!entry) return;
+    adminMap.removeLayer(entry.pickup);
+    adminMap.removeLayer(entry.drop);
+    removeRoute(entry);
+    rideLayers.delete(rideId);
+}
 
-    // Fit map to show all markers
-    if (allMarkers.length > 0) {
-        fitMapToMarkers(adminMap, allMarkers);
+function removeRoute(entry) {
+    if (entry.route) {
+        adminMap.removeControl(entry.route);
+        entry.route = null;
     }
 }
 
 // ============================================
-// DISPLAY SOS ALERTS ON MAP
+// SOS MARKERS
 // ============================================
-function displaySOSAlerts() {
-    if (!sosData || sosData.length === 0) {
-        console.log('No SOS alerts');
+function sosCoordinates(sos) {
+    // Parse location (format: "lat, lng")
+    if (sos.sos_location && sos.sos_location.includes(',')) {
+        const coords = sos.sos_location.split(',');
+        const lat = parseFloat(coords[0]);
+        const lng = parseFloat(coords[1]);
+        if (!isNaN(lat) && !isNaN(lng)) {
+            return [lat, lng];
+        }
+    }
+    // Default to Mumbai if location not available
+    return [19.0760, 72.8777];
+}
+
+function sosPopup(sos) {
+    return `
+        <div class="sos-popup">
+            <h6 class="text-danger">
+                <i class="bi bi-exclamation-triangle-fill"></i> SOS EMERGENCY
+            </h6>
+            <p class="mb-1">
+                <strong>User:</strong> ${sos.username}<br>
+                <strong>Email:</strong> ${sos.email}<br>
+                <strong>Phone:</strong> ${sos.phone || 'Not available'}<br>
+                <strong>Time:</strong> ${new Date(sos.sos_timestamp).toLocaleString()}<br>
+                <strong>Message:</strong> ${sos.sos_message || 'Emergency!'}
+            </p>
+            <button class="btn btn-sm btn-danger" onclick="alert('Call: ${sos.phone || 'No phone'}')">
+                <i class="bi bi-telephone"></i> Contact User
+            </button>
+        </div>
+    `;
+}
+
+function upsertSOS(sos) {
+    const [lat, lng] = sosCoordinates(sos);
+    const entry = sosLayers.get(sos.id);
+    if (entry) {
+        entry.sos = sos;
+        entry.marker.setLatLng([lat, lng]).setPopupContent(sosPopup(sos));
         return;
     }
 
-    console.log(`🚨 Displaying ${sosData.length} SOS alerts...`);
-
-    sosData.forEach(user => {
-        // Parse location (format: "lat, lng")
-        let lat, lng;
-        if (user.sos_location && user.sos_location.includes(',')) {
-            const coords = user.sos_location.split(',');
-            lat = parseFloat(coords[0]);
-            lng = parseFloat(coords[1]);
-        } else {
-            // Default to Mumbai if location not available
-            lat = 19.0760;
-            lng = 72.8777;
-        }
+    // Add RED marker for SOS
+    const marker = addMarker(adminMap, lat, lng, `SOS: ${sos.username}`, sosPopup(sos), 'red');
 
-        // Create SOS popup
-        const popupContent = `
-            <div class="sos-popup">
-                <h6 class="text-danger">
-                    <i class="bi bi-exclamation-triangle-fill"></i> SOS EMERGENCY
-                </h6>
-                <p class="mb-1">
-                    <strong>User:</strong> ${user.username}<br>
-                    <strong>Email:</strong> ${user.email}<br>
-                    <strong>Phone:</strong> ${user.phone || 'Not available'}<br>
-                    <strong>Time:</strong> ${new Date(user.sos_timestamp).toLocaleString()}<br>
-                    <strong>Message:</strong> ${user.sos_message || 'Emergency!'}
-                </p>
-                <button class="btn btn-sm btn-danger" onclick="alert('Call: ${user.phone || 'No phone'}')">
-                    <i class="bi bi-telephone"></i> Contact User
-                </button>
-            </div>
-        `;
-
-        // Add RED marker for SOS
-        const sosMarker = addMarker(
-            adminMap,
-            lat,
-            lng,
-            `SOS: ${user.username}`,
-            popupContent,
-            'red'
-        );
-
-        // Make SOS marker pulse/blink
-        sosMarker.getElement().classList.add('sos-marker-pulse');
-
-        allMarkers.push(sosMarker);
+    // Make SOS marker pulse/blink
+    const element = marker.getElement();
+    if (element) {
+        element.classList.add('sos-marker-pulse');
+    }
+
+    sosLayers.set(sos.id, { sos, marker });
+}
+
+function removeSOS(sosId) {
+    const entry = sosLayers.get(sosId);
+    if (!entry) return;
+    adminMap.removeLayer(entry.marker);
+    sosLayers.delete(sosId);
+}
+
+// ============================================
+// LIVE SOS STREAM
+// ============================================
+function listenForSOS(streamUrl) {
+    const source = new EventSource(streamUrl);
+
+    source.addEventListener('sos_trigger', function (e) {
+        const sos = JSON.parse(e.data);
+        upsertSOS(sos);
+        updateStats();
+        renderSOSList();
+        console.log(`🚨 SOS from ${sos.username}`);
+    });
+
+    source.addEventListener('sos_cancel', function (e) {
+        removeSOS(JSON.parse(e.data).id);
+        updateStats();
+        renderSOSList();
     });
 }
 
@@ -208,115 +277,109 @@ function displaySOSAlerts() {
 // ============================================
 function setupEventListeners() {
     // Location filter
-    document.getElementById('location-filter').addEventListener('input', filterRides);
+    document.getElementById('location-filter').addEventListener('input', applyFilters);
 
     // Status filter
-    document.getElementById('status-filter').addEventListener('change', filterRides);
+    document.getElementById('status-filter').addEventListener('change', applyFilters);
 
     // Show routes checkbox
-    document.getElementById('show-routes').addEventListener('change', function () {
-        displayAllRides();
-        displaySOSAlerts();
-    });
+    document.getElementById('show-routes').addEventListener('change', applyFilters);
 }
 
 // ============================================
 // FILTER RIDES
 // ============================================
-function filterRides() {
+function rideMatchesFilters(ride) {
     const locationFilter = document.getElementById('location-filter').value.toLowerCase();
     const statusFilter = document.getElementById('status-filter').value;
 
-    // Filter rides data
-    let filteredRides = ridesData;
-
-    // Apply location filter
-    if (locationFilter) {
-        filteredRides = filteredRides.filter(ride =>
-            ride.start_location.toLowerCase().includes(locationFilter) ||
-            ride.end_location.toLowerCase().includes(locationFilter)
-        );
+    if (locationFilter &&
+        !ride.start_location.toLowerCase().includes(locationFilter) &&
+        !ride.end_location.toLowerCase().includes(locationFilter)) {
+        return false;
     }
-
-    // Apply status filter
-    if (statusFilter !== 'all') {
-        filteredRides = filteredRides.filter(ride => ride.status === statusFilter);
-    }
-
-    // Clear map and display filtered rides
-    clearMapElements();
-
-    // Temporarily replace ridesData with filtered data
-    const originalData = ridesData;
-    ridesData = filteredRides;
-    displayAllRides();
-    ridesData = originalData;
-
-    // Always show SOS alerts
-    displaySOSAlerts();
-
-    console.log(`🔍 Filtered to ${filteredRides.length} rides`);
+    return statusFilter === 'all' || ride.status === statusFilter;
 }
 
-// ============================================
-// REFRESH MAP
-// ============================================
-function refreshMap() {
-    console.log('🔄 Refreshing map data...');
+function applyFilters() {
+    const showRoutes = document.getElementById('show-routes').checked;
+    let visible = 0;
+
+    // Toggle existing layers instead of rebuilding them; SOS alerts are always shown
+    rideLayers.forEach(entry => {
+        const show = rideMatchesFilters(entry.ride);
+        [entry.pickup, entry.drop].forEach(marker => {
+            if (show && !adminMap.hasLayer(marker)) marker.addTo(adminMap);
+            if (!show && adminMap.hasLayer(marker)) adminMap.removeLayer(marker);
+        });
+
+        if (show && showRoutes && !entry.route) {
+            entry.route = addRoute(adminMap, entry.ride.start_lat, entry.ride.start_lng,
+                entry.ride.end_lat, entry.ride.end_lng);
+        } else if (!(show && showRoutes)) {
+            removeRoute(entry);
+        }
+        if (show) visible++;
+    });
 
-    // In production, fetch fresh data from API
-    // For now, just reload the page
-    location.reload();
+    console.log(`🔍 Showing ${visible} of ${rideLayers.size} rides`);
 }
 
 // ============================================
-// VIEW SOS ON MAP
+// STATS AND SOS LIST
 // ============================================
-function viewSOSOnMap(userId) {
-    // Find SOS user
-    const user = sosData.find(u => u.id === userId);
-    if (!user) return;
-
-    // Parse location
-    let lat, lng;
-    if (user.sos_location && user.sos_location.includes(',')) {
-        const coords = user.sos_location.split(',');
-        lat = parseFloat(coords[0]);
-        lng = parseFloat(coords[1]);
-    } else {
-        lat = 19.0760;
-        lng = 72.8777;
-    }
+function updateStats() {
+    let ongoing = 0;
+    let upcoming = 0;
+    rideLayers.forEach(entry => {
+        if (entry.ride.status === 'ONGOING') ongoing++;
+        if (entry.ride.status === 'UPCOMING') upcoming++;
+    });
 
-    // Zoom to SOS location
-    adminMap.setView([lat, lng], 15);
+    document.getElementById('total-rides').textContent = rideLayers.size;
+    document.getElementById('sos-count').textContent = sosLayers.size;
+    document.getElementById('ongoing-rides').textContent = ongoing;
+    document.getElementById('upcoming-rides').textContent = upcoming;
+}
 
-    // Find and open the marker popup
-    allMarkers.forEach(marker => {
-        if (marker.getLatLng().lat === lat && marker.getLatLng().lng === lng) {
-            marker.openPopup();
-        }
+function renderSOSList() {
+    const section = document.getElementById('sos-section');
+    const list = document.getElementById('sos-list');
+    section.style.display = sosLayers.size > 0 ? '' : 'none';
+
+    list.innerHTML = '';
+    sosLayers.forEach(({ sos }) => {
+        const alertBox = document.createElement('div');
+        alertBox.className = 'sos-alert';
+
+        const name = document.createElement('strong');
+        name.textContent = sos.username;
+        const details = document.createElement('small');
+        const time = sos.sos_timestamp ?
+            new Date(sos.sos_timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) : '';
+        details.textContent = `${sos.sos_message || 'Emergency!'} (${time})`;
+
+        const locate = document.createElement('button');
+        locate.className = 'btn btn-sm btn-danger float-end';
+        locate.innerHTML = '<i class="bi bi-geo-alt"></i> Locate';
+        locate.addEventListener('click', () => viewSOSOnMap(sos.id));
+
+        alertBox.append(name, ` - ${sos.sos_location || 'Location unknown'}`,
+            document.createElement('br'), details, locate);
+        list.appendChild(alertBox);
     });
 }
 
 // ============================================
-// CLEAR MAP ELEMENTS
+// VIEW SOS ON MAP
 // ============================================
-function clearMapElements() {
-    // Remove all markers
-    allMarkers.forEach(marker => adminMap.removeLayer(marker));
-    allMarkers = [];
-
-    // Remove all routes
-    allRoutes.forEach(route => adminMap.removeControl(route));
-    allRoutes = [];
-}
+function viewSOSOnMap(sosId) {
+    const entry = sosLayers.get(sosId);
+    if (!entry) return;
 
-// ============================================
-// HELPER: GET RANDOM COORDINATE (for demo)
-// ============================================
-function getRandomCoordinate(base, range) {
-    return base + (Math.random() - 0.5) * range;
+    // Zoom to SOS location and open its popup
+    adminMap.setView(entry.marker.getLatLng(), 15);
+    entry.marker.openPopup();
 }
 
 console.log('✅ Admin map script loaded!');
@@ -40,8 +40,15 @@ function initOfferRideMap() {
             }).addTo(offerMap);
 
             pickupMarker.bindPopup('Pickup Location').openPopup();
+            pickupMarker.on('dragend', function () {
+                const position = pickupMarker.getLatLng();
+                setCoordinates('start', position.lat, position.lng);
+                reverseGeocode(position.lat, position.lng, 'origin');
+                drawRoute();
+            });
 
             // Update origin field
+            setCoordinates('start', lat, lng);
             reverseGeocode(lat, lng, 'origin');
 
         } else if (!dropMarker) {
@@ -59,8 +66,15 @@ function initOfferRideMap() {
             }).addTo(offerMap);
 
             dropMarker.bindPopup('Drop Location').openPopup();
+            dropMarker.on('dragend', function () {
+                const position = dropMarker.getLatLng();
+                setCoordinates('end', position.lat, position.lng);
+                reverseGeocode(position.lat, position.lng, 'destination');
+                drawRoute();
+            });
 
             // Update destination field
+            setCoordinates('end', lat, lng);
             reverseGeocode(lat, lng, 'destination');
 
             // Draw route
@@ -68,9 +82,25 @@ function initOfferRideMap() {
         }
     });
 
+    // Typing a location by hand means the map pin no longer describes it
+    document.getElementById('origin').addEventListener('input', function () {
+        setCoordinates('start', '', '');
+        document.getElementById('route_polyline').value = '';
+    });
+    document.getElementById('destination').addEventListener('input', function () {
+        setCoordinates('end', '', '');
+        document.getElementById('route_polyline').value = '';
+    });
+
     console.log('✅ Offer ride map initialized!');
 }
 
+function setCoordinates(prefix, lat, lng) {
+    // Hidden start_lat/start_lng/end_lat/end_lng inputs posted with the form
+    document.getElementById(`${prefix}_lat`).value = lat === '' ? '' : lat.toFixed(6);
+    document.getElementById(`${prefix}_lng`).value = lng === '' ? '' : lng.toFixed(6);
+}
+
 function reverseGeocode(lat, lng, fieldId) {
     // Use OpenStreetMap Nominatim for reverse geocoding (FREE!)
     fetch(`https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lng}`, {
@@ -110,6 +140,11 @@ function drawRoute() {
         opacity: 0.7
     }).addTo(offerMap);
 
+    // Posted as the ride's route; any vertices added to the line are kept
+    document.getElementById('route_polyline').value = JSON.stringify(
+        routeLine.getLatLngs().map(point => [point.lat, point.lng])
+    );
+
     // Fit map to show both markers
     offerMap.fitBounds([pickupLatLng, dropLatLng], { padding: [50, 50] });
 
@@ -143,6 +178,9 @@ function clearMap() {
     document.getElementById('origin').value = '';
     document.getElementById('destination').value = '';
     document.getElementById('distance').value = '';
+    setCoordinates('start', '', '');
+    setCoordinates('end', '', '');
+    document.getElementById('route_polyline').value = '';
 }
 
 console.log('✅ Offer ride map script loaded!');
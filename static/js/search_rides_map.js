@@ -0,0 +1,129 @@
+/**
+ * SEARCH RIDES MAP - pick the pickup and drop points on a Leaflet map
+ *
+ * The first click sets the pickup, the second the drop; both markers can be
+ * dragged. The points fill the hidden origin_lat/origin_lng and
+ * destination_lat/destination_lng fields, so a search with both finds rides
+ * whose route passes the pickup and then the drop, and booking one of them
+ * starts with both points filled in.
+ */
+
+let searchMap;
+let searchPickupMarker;
+let searchDropMarker;
+
+function markerIcon(color) {
+    return L.icon({
+        iconUrl: `https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-2x-${color}.png`,
+        shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.9.4/images/marker-shadow.png',
+        iconSize: [25, 41],
+        iconAnchor: [12, 41],
+        popupAnchor: [1, -34],
+        shadowSize: [41, 41]
+    });
+}
+
+function readSearchPoint(side) {
+    const lat = parseFloat(document.getElementById(`${side}_lat`).value);
+    const lng = parseFloat(document.getElementById(`${side}_lng`).value);
+    return isNaN(lat) || isNaN(lng) ? null : L.latLng(lat, lng);
+}
+
+function setSearchPoint(side, latlng) {
+    document.getElementById(`${side}_lat`).value = latlng.lat.toFixed(6);
+    document.getElementById(`${side}_lng`).value = latlng.lng.toFixed(6);
+    // Assigning the text box does not fire 'input', so the coordinates stay
+    document.getElementById(side).value = `Near ${latlng.lat.toFixed(4)}, ${latlng.lng.toFixed(4)}`;
+    fetch(`https://nominatim.openstreetmap.org/reverse?format=json&lat=${latlng.lat}&lon=${latlng.lng}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data && data.address) {
+                const place = data.address.suburb || data.address.city || data.address.town || data.address.village;
+                if (place) {
+                    document.getElementById(side).value = place;
+                }
+            }
+        })
+        .catch(error => console.error('Geocoding error:', error));
+}
+
+function placeSearchMarker(side, latlng) {
+    const marker = L.marker(latlng, { icon: markerIcon(side === 'origin' ? 'green' : 'red'), draggable: true })
+        .addTo(searchMap)
+        .bindPopup(side === 'origin' ? 'Pickup' : 'Drop');
+    marker.on('dragend', function () {
+        setSearchPoint(side, marker.getLatLng());
+    });
+    return marker;
+}
+
+function initSearchRidesMap() {
+    const pickup = readSearchPoint('origin');
+    const drop = readSearchPoint('destination');
+
+    searchMap = L.map('searchMap').setView(pickup || drop || [20.5937, 78.9629], pickup || drop ? 12 : 5);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: '© OpenStreetMap contributors',
+        maxZoom: 19
+    }).addTo(searchMap);
+
+    // Points from the last search (or Near Me) start on the map
+    if (pickup) {
+        searchPickupMarker = placeSearchMarker('origin', pickup);
+    }
+    if (drop) {
+        searchDropMarker = placeSearchMarker('destination', drop);
+    }
+    if (pickup && drop) {
+        searchMap.fitBounds([pickup, drop], { padding: [40, 40] });
+    }
+
+    searchMap.on('click', function (e) {
+        if (!searchPickupMarker) {
+            searchPickupMarker = placeSearchMarker('origin', e.latlng);
+            setSearchPoint('origin', e.latlng);
+        } else if (!searchDropMarker) {
+            searchDropMarker = placeSearchMarker('destination', e.latlng);
+            setSearchPoint('destination', e.latlng);
+        }
+    });
+
+    // Typing a location by hand replaces that side's pin
+    document.getElementById('origin').addEventListener('input', function () {
+        if (searchPickupMarker) {
+            searchMap.removeLayer(searchPickupMarker);
+            searchPickupMarker = null;
+        }
+    });
+    document.getElementById('destination').addEventListener('input', function () {
+        if (searchDropMarker) {
+            searchMap.removeLayer(searchDropMarker);
+            searchDropMarker = null;
+        }
+    });
+}
+
+function toggleSearchMap() {
+    const container = document.getElementById('searchMapContainer');
+    container.style.display = container.style.display === 'none' ? 'block' : 'none';
+    if (container.style.display === 'block') {
+        if (!searchMap) {
+            initSearchRidesMap();
+        }
+        searchMap.invalidateSize();
+    }
+}
+
+function clearSearchPins() {
+    ['origin', 'destination'].forEach(function (side) {
+        document.getElementById(`${side}_lat`).value = '';
+        document.getElementById(`${side}_lng`).value = '';
+    });
+    [searchPickupMarker, searchDropMarker].forEach(function (marker) {
+        if (marker) {
+            searchMap.removeLayer(marker);
+        }
+    });
+    searchPickupMarker = null;
+    searchDropMarker = null;
+}
@@ -0,0 +1,54 @@
+"""
+Tests for the admin map data API and its delta updates.
+"""
+
+from datetime import timedelta
+
+from app import db, Ride, Report, utc_now
+
+
+def test_map_api_returns_deltas_and_304(client, login, make_user, make_ride):
+    driver = make_user('driver')
+    an_hour_ago = utc_now() - timedelta(hours=1)
+    quiet = make_ride(driver, updated_at=an_hour_ago)
+    cancelled = make_ride(driver, updated_at=an_hour_ago)
+    login(make_user('admin', is_admin=True))
+
+    full = client.get('/api/rides/map')
+    assert full.json['full'] is True
+    assert [ride['id'] for ride in full.json['rides']] == [quiet.id, cancelled.id]
+
+    # A bulk status update still bumps updated_at
+    db.session.execute(db.update(Ride).where(Ride.id == cancelled.id).values(status=Ride.STATUS_CANCELLED))
+    sos = Report(user_id=driver.id, report_type='emergency', subject='SOS', description='Help',
+                 location='19.1, 72.9')
+    db.session.add(sos)
+    db.session.commit()
+
+    delta = client.get(f"/api/rides/map?since={full.json['version']}")
+    assert delta.json['full'] is False
+    assert delta.json['rides'] == []
+    assert delta.json['removed_rides'] == [cancelled.id]
+    assert [alert['id'] for alert in delta.json['sos']] == [sos.id]
+    assert delta.json['sos'][0]['sos_location'] == '19.1, 72.9'
+
+    unchanged = client.get(f"/api/rides/map?since={full.json['version']}",
+                           headers={'If-None-Match': delta.headers['ETag']})
+    assert unchanged.status_code == 304
+
+    sos.status = 'resolved'
+    sos.resolved_at = utc_now()
+    db.session.commit()
+    resolved = client.get(f"/api/rides/map?since={delta.json['version']}",
+                          headers={'If-None-Match': delta.headers['ETag']})
+    assert resolved.status_code == 200
+    assert resolved.json['removed_sos'] == [sos.id]
+
+
+def test_admin_map_page_renders(client, login, make_user):
+    login(make_user('admin', is_admin=True))
+
+    page = client.get('/admin/map')
+
+    assert page.status_code == 200
+    assert b'data-url="/api/rides/map"' in page.data
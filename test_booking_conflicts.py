@@ -0,0 +1,78 @@
+"""
+Tests for the SQL booking time-conflict check (find_booking_conflict).
+"""
+
+from datetime import timedelta
+
+from app import db, Ride, Booking, find_booking_conflict, backfill_estimated_end_times, utc_now
+
+
+def _book(ride, passenger, status=Booking.STATUS_CONFIRMED):
+    db.session.add(Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1, status=status,
+                           pickup_address='A', drop_address='B'))
+    db.session.commit()
+
+
+def test_estimated_end_time_is_stored_on_insert(make_user, make_ride):
+    ride = make_ride(make_user('driver'), distance=30.0)
+
+    assert ride.estimated_end_time == ride.start_date + timedelta(minutes=ride.get_estimated_time())
+
+
+def test_find_booking_conflict_uses_overlap(make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    start = utc_now() + timedelta(days=2)
+    booked = make_ride(driver, start_date=start, distance=60.0)  # roughly a 1-2 hour ride
+    _book(booked, passenger)
+
+    overlapping = make_ride(driver, start_date=start + timedelta(minutes=30))
+    after = make_ride(driver, start_date=booked.estimated_end_time)
+    before = make_ride(driver, start_date=start - timedelta(hours=3), distance=10.0)
+
+    assert find_booking_conflict(passenger.id, overlapping) == booked.id
+    assert find_booking_conflict(passenger.id, after) is None
+    assert find_booking_conflict(passenger.id, before) is None
+    assert find_booking_conflict(passenger.id, booked) is None
+
+    Booking.query.update({'status': Booking.STATUS_CANCELLED})
+    db.session.commit()
+    assert find_booking_conflict(passenger.id, overlapping) is None
+
+
+def test_rides_without_a_stored_end_time_still_conflict(make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    start = utc_now() + timedelta(days=2)
+    booked = make_ride(driver, start_date=start, distance=60.0)
+    _book(booked, passenger)
+    overlapping = make_ride(driver, start_date=start + timedelta(minutes=30))
+    after = make_ride(driver, start_date=booked.estimated_end_time)
+    # As left by a bulk import, which bypasses the insert listener
+    db.session.execute(db.update(Ride).where(Ride.id == booked.id).values(estimated_end_time=None))
+    db.session.commit()
+
+    assert find_booking_conflict(passenger.id, overlapping) == booked.id
+    assert find_booking_conflict(passenger.id, after) is None
+
+
+def test_book_ride_rejects_overlapping_booking(client, login, make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    booked = make_ride(driver)
+    _book(booked, passenger, Booking.STATUS_PENDING)
+    overlapping = make_ride(driver, start_date=booked.start_date + timedelta(minutes=5))
+    login(passenger)
+
+    response = client.get(f'/book-ride/{overlapping.id}')
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert f'ride #{booked.id}' in session['_flashes'][0][1]
+
+
+def test_backfill_estimated_end_times(make_user, make_ride):
+    ride = make_ride(make_user('driver'))
+    db.session.execute(db.update(Ride).values(estimated_end_time=None))
+    db.session.commit()
+
+    assert backfill_estimated_end_times(batch_size=1) == 1
+    db.session.expire_all()
+    assert ride.estimated_end_time == ride.start_date + timedelta(minutes=ride.get_estimated_time())
@@ -0,0 +1,71 @@
+"""
+Tests for the streaming NDJSON export.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tracemalloc
+
+from app import db, User, utc_now
+from export_data import export_data
+
+
+def insert_users(count, start=0):
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x' * 100,
+         'created_at': utc_now()}
+        for i in range(start, start + count)])
+    db.session.commit()
+
+
+def test_export_writes_ndjson_tables_and_manifest(app, make_user, make_ride, tmp_path):
+    ride = make_ride(make_user('driver'))
+    make_user('passenger')
+
+    manifest = export_data(str(tmp_path), compress='gzip', batch_size=1)
+
+    assert json.loads((tmp_path / 'manifest.json').read_text()) == manifest
+    tables = {entry['name']: entry for entry in manifest['tables']}
+    assert set(tables) == {table.name for table in db.metadata.sorted_tables}
+    assert [entry['name'] for entry in manifest['tables']].index('user') < \
+        [entry['name'] for entry in manifest['tables']].index('ride')
+    assert (tables['user']['rows'], tables['car']['rows'], tables['ride']['rows'], tables['booking']['rows']) == \
+        (2, 1, 1, 0)
+
+    raw = gzip.decompress((tmp_path / tables['ride']['file']).read_bytes())
+    assert hashlib.sha256(raw).hexdigest() == tables['ride']['sha256']
+    [record] = [json.loads(line) for line in raw.decode().splitlines()]
+    assert list(record) == tables['ride']['columns']
+    assert (record['id'], record['start_location'], record['start_date']) == \
+        (ride.id, 'Andheri', ride.start_date.isoformat())
+
+
+def test_export_checksums_do_not_depend_on_compression(app, make_user, tmp_path):
+    make_user('rider')
+    plain = export_data(str(tmp_path / 'plain'), compress='none', tables={'user'})
+    packed = export_data(str(tmp_path / 'packed'), compress='gzip', tables={'user'})
+
+    assert [entry['name'] for entry in plain['tables']] == ['user']
+    assert plain['tables'][0]['sha256'] == packed['tables'][0]['sha256']
+    assert plain['tables'][0]['file'] == 'user.ndjson'
+    assert sorted(os.listdir(tmp_path / 'packed')) == ['manifest.json', 'user.ndjson.gz']
+
+
+def test_export_memory_stays_flat_as_tables_grow(app, tmp_path):
+    def peak_for_export(name):
+        tracemalloc.start()
+        manifest = export_data(str(tmp_path / name), compress='none', batch_size=200, tables={'user'})
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return manifest['tables'][0]['rows'], peak
+
+    insert_users(2000)
+    small_rows, small_peak = peak_for_export('small')
+    insert_users(8000, start=2000)
+    large_rows, large_peak = peak_for_export('large')
+
+    assert (small_rows, large_rows) == (2000, 10000)
+    # Five times the rows, about the same peak: only one batch is held at a time
+    assert large_peak < small_peak * 1.5
@@ -0,0 +1,48 @@
+"""
+Tests for the chatbot's semantic answer cache.
+"""
+
+from faq_cache import SemanticCache, normalize
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_ignores_case_punctuation_and_filler():
+    assert normalize('How can I cancel my Bookings?!') == normalize('cancel booking') == 'cancel book'
+    assert normalize('Hi!') == 'hi'
+
+
+def test_near_duplicates_match_but_unrelated_questions_miss():
+    cache = SemanticCache()
+    cache.seed(['How do I cancel a confirmed booking?'], 'cancel answer')
+    cache.seed(['How do I offer a ride?'], 'offer answer')
+
+    assert cache.get('Cancel my booking, please') == 'cancel answer'
+    assert cache.get('ride offering') == 'offer answer'
+    assert cache.get('cancel ride') is None
+    assert cache.get('when is the monsoon') is None
+
+
+def test_lru_and_ttl_eviction_spare_seeded_answers():
+    clock = FakeClock()
+    cache = SemanticCache(capacity=2, ttl=60, clock=clock)
+    cache.seed(['What packages are there?'], 'packages')
+    cache.put('student discount', 'ten percent')
+    cache.put('pet policy', 'small pets ok')
+
+    assert cache.get('student discount') == 'ten percent'   # now most recently used
+    cache.put('luggage limit', 'two bags')
+    assert cache.get('pet policy') is None                  # least recently used, evicted
+
+    clock.now = 61
+    assert cache.get('student discount') is None
+    assert cache.get('what packages are there') == 'packages'
+
+    stats = cache.stats()
+    assert (stats['evictions'], stats['expirations'], stats['pinned'], stats['size']) == (1, 1, 1, 1)
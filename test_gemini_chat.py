@@ -0,0 +1,169 @@
+"""
+Tests for the chatbot service, using a local fake in place of the Gemini client
+and, for streaming, a local stand-in for the Gemini API server.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+import chatbot
+from gemini_chat import (ChatService, create_genai_client, FALLBACK_RESPONSE, SYSTEM_INSTRUCTION,
+                         UNAVAILABLE_RESPONSE)
+
+
+class FakeModels:
+    def __init__(self, reply='Tap "Offer Ride" on your dashboard.', error=None):
+        self.reply = reply
+        self.error = error
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_content(self, model, contents, config):
+        self.calls.append((model, contents, config))
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(text=self.reply)
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    """Swap the app's ChatService for one backed by a FakeClient, with an empty answer cache."""
+    monkeypatch.setattr(chatbot, '_chat_answer_cache', None)
+
+    def _fake_chat(**kwargs):
+        client = FakeClient(**{k: kwargs.pop(k) for k in ('reply', 'error') if k in kwargs})
+        service = ChatService(client, **kwargs)
+        monkeypatch.setattr(chatbot, '_chat_service', service)
+        return client.models
+    return _fake_chat
+
+
+def test_chatbot_reuses_client_and_prompt(client, fake_chat):
+    models = fake_chat()
+
+    for question in ('Is there a student discount?', 'Do drivers get insurance?'):
+        response = client.post('/chatbot', json={'message': question})
+        assert response.json == {'response': 'Tap "Offer Ride" on your dashboard.'}
+
+    assert [call[1] for call in models.calls] == ['Is there a student discount?', 'Do drivers get insurance?']
+    assert models.calls[0][2] is models.calls[1][2]
+    assert models.calls[0][2]['system_instruction'] == SYSTEM_INSTRUCTION
+
+
+def test_chatbot_falls_back_when_saturated_or_slow(client, fake_chat):
+    outcomes = []
+    models = fake_chat(max_concurrency=1, timeout=0.05, on_result=lambda outcome, seconds: outcomes.append(outcome))
+    models.release.clear()
+
+    # The first call times out but keeps its slot until the model answers
+    assert client.post('/chatbot', json={'message': 'slow'}).json['response'] == FALLBACK_RESPONSE
+    assert client.post('/chatbot', json={'message': 'busy'}).json['response'] == FALLBACK_RESPONSE
+    assert [call[1] for call in models.calls] == ['slow']
+    assert outcomes == ['timeout', 'saturated']
+
+    models.release.set()
+    chatbot._chat_service._executor.shutdown(wait=True)
+
+
+def test_chatbot_errors_and_missing_key(client, fake_chat, monkeypatch):
+    models = fake_chat(error=RuntimeError('quota exceeded'))
+    assert client.post('/chatbot', json={'message': 'hi'}).json['response'] == FALLBACK_RESPONSE
+    # Fallback replies are not cached
+    assert client.post('/chatbot', json={'message': 'hi'}).json['response'] == FALLBACK_RESPONSE
+    assert len(models.calls) == 2
+
+    monkeypatch.setattr(chatbot, '_chat_service', ChatService(None))
+    assert client.post('/chatbot', json={'message': 'hi'}).json['response'] == UNAVAILABLE_RESPONSE
+    assert client.post('/chatbot', json={'message': '  '}).status_code == 400
+
+
+def test_chatbot_answers_faqs_and_repeats_from_cache(client, fake_chat):
+    models = fake_chat(reply='Yes, students get 10% off.')
+
+    faq = client.post('/chatbot', json={'message': 'how can I cancel my bookings??'}).json['response']
+    assert '/my-bookings' in faq
+    for question in ('Is there a student discount?', 'is there a STUDENT discount', 'student discount for rides?'):
+        assert client.post('/chatbot', json={'message': question}).json['response'] == 'Yes, students get 10% off.'
+
+    assert [call[1] for call in models.calls] == ['Is there a student discount?']
+    stats = chatbot.get_chat_answer_cache().stats()
+    assert (stats['hits'], stats['near_hits'], stats['misses']) == (2, 1, 1)
+
+
+class StandInModelServer(BaseHTTPRequestHandler):
+    """Answers streamGenerateContent calls with one SSE event per word, `delay` seconds apart."""
+    words = ['Open ', 'Search ', 'Rides ', 'and ', 'tap ', 'Book.']
+    delay = 0.15
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((self.path, body['contents'][0]['parts'][0]['text']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for word in self.words:
+            event = {'candidates': [{'content': {'parts': [{'text': word}], 'role': 'model'}}]}
+            self.wfile.write(f'data: {json.dumps(event)}\r\n\r\n'.encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def model_server(monkeypatch):
+    """Point the app's ChatService at a local stand-in Gemini server."""
+    monkeypatch.setattr(chatbot, '_chat_answer_cache', None)
+    StandInModelServer.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInModelServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = create_genai_client('test-key', timeout=5, max_connections=2,
+                                 base_url=f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(chatbot, '_chat_service', ChatService(client, timeout=5))
+    yield StandInModelServer
+    server.shutdown()
+
+
+def read_chunks(response):
+    """(seconds since the request, text) for every chunk event of a streamed /chatbot/stream reply."""
+    started = time.perf_counter()
+    chunks = []
+    for raw in response.response:
+        for event in raw.decode().strip().split('\n\n'):
+            name, data = (line.split(': ', 1)[1] for line in event.splitlines())
+            if name == 'chunk':
+                chunks.append((time.perf_counter() - started, json.loads(data)['text']))
+    return chunks
+
+
+def test_chatbot_stream_forwards_model_chunks_as_they_arrive(client, model_server):
+    response = client.post('/chatbot/stream', json={'message': 'Is there a student discount?'},
+                           buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = read_chunks(response)
+
+    assert [text for _, text in chunks] == model_server.words
+    assert model_server.requests == [('/v1beta/models/gemini-2.5-flash:streamGenerateContent?alt=sse',
+                                      'Is there a student discount?')]
+    # The first words reach the browser long before the model has finished
+    assert chunks[0][0] < model_server.delay * 2 < chunks[-1][0]
+
+    # The completed answer is cached and comes back whole, without another model call
+    again = read_chunks(client.post('/chatbot/stream', json={'message': 'is there a student discount'},
+                                    buffered=False))
+    assert [text for _, text in again] == [''.join(model_server.words)]
+    assert len(model_server.requests) == 1
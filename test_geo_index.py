@@ -0,0 +1,72 @@
+"""
+Tests for the in-memory ride spatial index (geo_index.py).
+"""
+
+import random
+
+from geo_index import RideSpatialIndex, RouteCorridorIndex, haversine_km, simplify_polyline
+
+
+def test_haversine_known_distance():
+    # Mumbai CST to Pune station is ~120 km as the crow flies
+    assert 115 < haversine_km(18.9398, 72.8355, 18.5284, 73.8742) < 125
+
+
+def test_nearby_matches_brute_force():
+    rng = random.Random(7)
+    index = RideSpatialIndex()
+    points = {}
+    for ride_id in range(1, 5001):
+        point = (19 + rng.uniform(-0.5, 0.5), 72.9 + rng.uniform(-0.5, 0.5),
+                 19 + rng.uniform(-0.5, 0.5), 72.9 + rng.uniform(-0.5, 0.5))
+        points[ride_id] = point
+        index.add(ride_id, *point)
+
+    origin, destination, radius = (19.05, 72.85), (19.2, 73.0), 15.0
+    expected = {ride_id for ride_id, (slat, slng, elat, elng) in points.items()
+                if haversine_km(*origin, slat, slng) <= radius
+                and haversine_km(*destination, elat, elng) <= radius}
+
+    assert expected
+    assert set(index.nearby(origin, destination, radius)) == expected
+    assert set(index.nearby(origin, None, radius)) == {
+        ride_id for ride_id, (slat, slng, _, _) in points.items()
+        if haversine_km(*origin, slat, slng) <= radius}
+
+
+def test_nearby_orders_by_distance_and_follows_updates():
+    index = RideSpatialIndex()
+    index.add(1, 19.10, 72.85, 19.0, 72.8)
+    index.add(2, 19.01, 72.85, 19.0, 72.8)
+
+    assert index.nearby((19.0, 72.85), radius_km=20) == [2, 1]
+
+    index.add(2, 25.0, 80.0, 25.0, 80.0)
+    index.discard(1)
+    assert index.nearby((19.0, 72.85), radius_km=20) == []
+    assert index.nearby(destination=(25.0, 80.0), radius_km=1) == [2]
+    assert len(index) == 1
+
+
+# An L-shaped route: north from Colaba to Dadar, then east to Chembur
+COLABA, DADAR, CHEMBUR = (18.91, 72.82), (19.02, 72.84), (19.06, 72.90)
+
+
+def test_simplify_polyline_keeps_corners():
+    straight = [(18.91 + i * 0.011, 72.82 + i * 0.002) for i in range(11)]
+    assert simplify_polyline(straight + [CHEMBUR]) == [straight[0], straight[-1], CHEMBUR]
+
+
+def test_corridor_match_requires_pickup_before_drop():
+    index = RouteCorridorIndex()
+    index.add(1, [COLABA, DADAR, CHEMBUR])
+    index.add(2, [CHEMBUR, DADAR, COLABA])
+    index.add(3, [(28.6, 77.2), (28.7, 77.3)])
+
+    pickup, drop = (18.96, 72.835), (19.045, 72.87)  # just off each leg
+    matches = index.match(pickup, drop, buffer_km=1.5)
+
+    assert [m.ride_id for m in matches] == [1]
+    assert matches[0].pickup_offset_km < matches[0].drop_offset_km
+    assert index.match(drop, pickup, buffer_km=1.5)[0].ride_id == 2
+    assert index.match(pickup, (19.3, 72.85), buffer_km=1.5) == []
@@ -0,0 +1,126 @@
+"""
+Tests for the bulk import, loading exports written by export_data.py.
+"""
+
+import gzip
+import json
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app import db, User, Ride, Booking, Report
+from export_data import export_data
+from import_data import dependency_levels, import_data
+
+
+def table_rows():
+    return {table.name: [tuple(row) for row in db.session.execute(select(table).order_by(*table.primary_key))]
+            for table in db.metadata.sorted_tables}
+
+
+def test_import_restores_an_export_exactly(app, make_user, make_ride, tmp_path):
+    passenger = make_user('passenger')
+    ride = make_ride(make_user('driver'))
+    db.session.add(Booking(ride_id=ride.id, passenger_id=passenger.id, seats=2,
+                           pickup_address='Andheri East', drop_address='Bandra "West"'))
+    db.session.commit()
+    before = table_rows()
+    export_data(str(tmp_path), compress='gzip')
+
+    db.session.execute(Booking.__table__.delete())
+    db.session.commit()
+    import_data(str(tmp_path), batch_size=2, workers=4)
+
+    db.session.remove()
+    assert table_rows() == before
+
+
+def test_import_rejects_a_damaged_table_file_before_dropping_anything(app, make_user, make_ride, tmp_path):
+    make_ride(make_user('driver'))
+    manifest = export_data(str(tmp_path), compress='gzip')
+    before = table_rows()
+    # The damaged table loads after others that would already have been replaced
+    entry = next(entry for entry in manifest['tables'] if entry['name'] == 'ride')
+    path = tmp_path / entry['file']
+    path.write_bytes(gzip.compress(gzip.decompress(path.read_bytes()).replace(b'"Andheri"', b'"Dadar"')))
+
+    assert 'does not match the manifest' in import_data(str(tmp_path))
+    db.session.remove()
+    assert table_rows() == before
+
+
+def test_import_reads_legacy_backup_file(app, tmp_path):
+    backup = tmp_path / 'rideshare_backup.json'
+    backup.write_text(json.dumps({
+        'users': [{'id': 7, 'username': 'old', 'email': 'old@example.com', 'password_hash': None,
+                   'phone': None, 'is_admin': False, 'created_at': '2024-01-05 09:30:00.123456'}],
+        'cars': [{'id': 3, 'owner_id': 7, 'make': 'Tata', 'model': 'Nexon', 'year': 2021, 'color': 'Blue',
+                  'license_plate': 'MH02-7', 'fuel_type': 'ev', 'mileage': 0, 'ac': True,
+                  'created_at': '2024-01-05T09:31:00'}],
+        'rides': [{'id': 5, 'driver_id': 7, 'car_id': 3, 'start_location': 'A', 'end_location': 'B',
+                   'start_date': '2024-02-01 08:00:00', 'end_date': '2024-02-08 08:00:00',
+                   'actual_start_time': 'None', 'available_seats': 3, 'price_per_seat': 50.0,
+                   'status': 'upcoming', 'distance': 12.5, 'created_at': '2024-01-06 10:00:00'}],
+    }))
+
+    import_data(str(backup))
+
+    db.session.remove()
+    user, ride = db.session.get(User, 7), db.session.get(Ride, 5)
+    assert (user.username, user.created_at.microsecond, user.rating_count) == ('old', 123456, 0)
+    assert (ride.car.license_plate, ride.actual_start_time, ride.start_date.day) == ('MH02-7', None, 1)
+    assert ride.estimated_end_time == ride.start_date + timedelta(minutes=ride.get_estimated_time())
+
+
+def test_dependency_levels_follow_foreign_keys(app):
+    levels = [{table.name for table in level} for level in dependency_levels(db.metadata.sorted_tables)]
+    position = {name: index for index, level in enumerate(levels) for name in level}
+    for table in db.metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if fk.column.table is not table:
+                assert position[fk.column.table.name] < position[table.name]
+
+
+def backdate_all_rows(days=1):
+    """Move every row's timestamps back (SQLite), as if the data predated the last export by a while."""
+    for table in db.metadata.sorted_tables:
+        stamps = {name: func.datetime(table.columns[name], f'-{days} days')
+                  for name in ('created_at', 'updated_at', 'date_added') if name in table.columns}
+        if stamps:
+            db.session.execute(table.update().values(stamps))
+    db.session.commit()
+
+
+def test_incremental_exports_replay_on_top_of_a_full_export(app, make_user, make_ride, tmp_path):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    ride = make_ride(driver)
+    booking = Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1,
+                      pickup_address='Andheri', drop_address='Bandra')
+    db.session.add(booking)
+    db.session.commit()
+    backdate_all_rows()
+    full = export_data(str(tmp_path / 'full'))
+
+    booking.status = Booking.STATUS_CONFIRMED
+    make_user('newcomer')
+    db.session.commit()
+    first = export_data(str(tmp_path / 'delta1'), since=str(tmp_path / 'full'), overlap=timedelta(0))
+
+    db.session.add(Report(user_id=passenger.id, ride_id=ride.id, report_type='feedback',
+                          subject='Great', description='Smooth ride'))
+    db.session.commit()
+    second = export_data(str(tmp_path / 'delta2'), since=str(tmp_path / 'delta1'), overlap=timedelta(0))
+    after = table_rows()
+
+    assert (first['kind'], first['parent'], second['parent']) == ('delta', full['id'], first['id'])
+    changed = {entry['name']: entry['rows'] for entry in first['tables'] if entry['mode'] == 'upsert'}
+    assert (changed['booking'], changed['user'], changed['ride'], changed['car']) == (1, 1, 0, 0)
+    assert {entry['name'] for entry in first['tables'] if entry['mode'] == 'replace'} == {'stats_rollup', 'stats_event'}
+
+    # Deltas must follow their parent
+    assert 'not an incremental export' in import_data(str(tmp_path / 'full'), deltas=[str(tmp_path / 'delta2')])
+    assert db.session.get(Booking, booking.id) is not None
+
+    import_data(str(tmp_path / 'full'), deltas=[str(tmp_path / 'delta1'), str(tmp_path / 'delta2')])
+    db.session.remove()
+    assert table_rows() == after
@@ -0,0 +1,75 @@
+"""
+Query-plan tests for the hot ride/booking/review/report queries.
+Each query is run through EXPLAIN QUERY PLAN and must not fall back to a full
+table scan of any of the indexed tables.
+"""
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from app import (db, Ride, Booking, Review, Report, utc_now, build_ride_search_query, ensure_indexes,
+                 booking_conflict_query)
+
+INDEXED_TABLES = ('ride', 'booking', 'review', 'report')
+
+
+def query_plan(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for a Query or select()."""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect,
+                                 compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    return [line for line in plan
+            if line.startswith('SCAN ') and line.split()[1] in INDEXED_TABLES]
+
+
+HOT_QUERIES = {
+    'search_rides': lambda: build_ride_search_query({}),
+    'search_rides_by_location': lambda: build_ride_search_query({
+        'origin': 'andheri', 'destination': 'bandra', 'sort_by': 'relevance'}),
+    'search_rides_filtered': lambda: build_ride_search_query({
+        'sort_by': 'price_low', 'fuel_type': 'petrol', 'ac_preference': 'ac', 'driver_rating': '4'}),
+    'rides_map': lambda: Ride.query.filter(Ride.status.in_(['UPCOMING', 'ONGOING'])),
+    'rides_map_delta': lambda: Ride.query.filter(Ride.updated_at > utc_now()),
+    'overdue_rides': lambda: Ride.query.filter(Ride.status == Ride.STATUS_UPCOMING,
+                                               Ride.start_date < utc_now()),
+    'driver_rides': lambda: Ride.query.filter_by(driver_id=1).order_by(Ride.start_date.desc()),
+    'my_bookings': lambda: Booking.query.filter_by(passenger_id=1)
+        .filter(Booking.status.in_([Booking.STATUS_PENDING, Booking.STATUS_CONFIRMED]))
+        .join(Ride).order_by(Ride.start_date),
+    'booking_details': lambda: Booking.query.filter_by(ride_id=1)
+        .filter(Booking.status.in_([Booking.STATUS_CONFIRMED, Booking.STATUS_COMPLETED]))
+        .filter(Booking.id != 1),
+    'booking_conflict': lambda: booking_conflict_query(1, Ride(
+        id=2, start_date=utc_now(), estimated_end_time=utc_now() + timedelta(hours=1))),
+    'user_reviews': lambda: Review.query.filter_by(reviewed_id=1).order_by(Review.created_at.desc()),
+    'pending_sos_count': lambda: select(func.count()).select_from(Report)
+        .where(Report.report_type == 'emergency', Report.status == 'pending'),
+    'pending_reports': lambda: Report.query.filter_by(status='pending')
+        .order_by(Report.created_at.desc()).limit(20),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(app, name):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('EXPLAIN QUERY PLAN assertions are SQLite-specific')
+
+    plan = query_plan(HOT_QUERIES[name]())
+
+    assert not full_scans(plan), f'{name} falls back to a table scan: {plan}'
+
+
+def test_ensure_indexes_is_idempotent(app):
+    db.session.execute(text('DROP INDEX ix_ride_status_start_date'))
+    db.session.commit()
+
+    assert ensure_indexes() == ['ix_ride_status_start_date']
+    assert ensure_indexes() == []
@@ -0,0 +1,99 @@
+"""
+Tests for the /metrics endpoint and metrics shared between processes.
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+
+import app as app_module
+from bench_startup import BASE_DIR
+from ride_scheduler import run_job
+
+
+def sample(text, line_prefix):
+    """Value of the exposition line starting with `line_prefix`, or None."""
+    match = re.search(rf'^{re.escape(line_prefix)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def run_process(directory, script):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory))
+    return subprocess.run([sys.executable, '-c', script], cwd=BASE_DIR, env=env,
+                          capture_output=True, text=True, check=True).stdout
+
+
+def test_processes_sharing_a_directory_report_merged_totals(tmp_path):
+    define = '\n'.join([
+        'import metrics',
+        'from prometheus_client import Counter, Gauge',
+        "jobs = Counter('jobs_total', 'Jobs')",
+        "busy = Gauge('busy', 'Busy', multiprocess_mode='livesum')",
+    ])
+    # The first process exits; its count stays, its live gauge goes
+    run_process(tmp_path, define + '\njobs.inc(5)\nbusy.set(7)\nmetrics.close()')
+    text = run_process(tmp_path, define + '\njobs.inc(1)\nbusy.set(3)\nprint(metrics.render()[0].decode())')
+
+    assert (sample(text, 'jobs_total'), sample(text, 'busy')) == (6, 3)
+
+
+def test_running_totals_feed_counters_by_their_increase():
+    counter = app_module.CACHE_REQUESTS.labels('test_cache', 'hit')
+    total = app_module.metrics.RunningTotal(counter)
+    for value in (3, 3, 5, 2):  # 2: the cache was reset and has counted two hits since
+        total.update(value)
+
+    assert REGISTRY.get_sample_value('rideshare_cache_requests_total',
+                                     {'cache': 'test_cache', 'result': 'hit'}) == 7
+
+
+def test_metrics_endpoint_reports_requests_queries_and_caches(app, client, make_user, login):
+    before = app_module.metrics.render()[0].decode()
+    login(make_user('rider'))
+    client.get('/dashboard')
+    client.get('/no-such-page')
+    app_module.get_pending_sos_count()
+
+    response = client.get('/metrics')
+    text = response.get_data(as_text=True)
+
+    assert response.mimetype == 'text/plain'
+
+    def grew(line_prefix):
+        return (sample(text, line_prefix) or 0) - (sample(before, line_prefix) or 0)
+
+    assert grew('rideshare_http_requests_total{endpoint="dashboard",status="200"}') == 1
+    assert grew('rideshare_http_requests_total{endpoint="unmatched",status="404"}') == 1
+    assert grew('rideshare_http_request_duration_seconds_count{endpoint="dashboard"}') == 1
+    assert grew('rideshare_db_queries_total{endpoint="dashboard"}') >= 1
+    assert grew('rideshare_cache_requests_total{cache="shared",result="hit"}') + \
+        grew('rideshare_cache_requests_total{cache="shared",result="miss"}') == 1
+    assert '# TYPE rideshare_chatbot_request_duration_seconds histogram' in text
+
+
+def test_metrics_token_is_required_when_configured(app, client):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    try:
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    finally:
+        app.config['METRICS_TOKEN'] = ''
+
+
+def test_scheduler_jobs_record_outcomes():
+    def failing_job():
+        raise RuntimeError('database is locked')
+
+    def runs(outcome):
+        return REGISTRY.get_sample_value('rideshare_job_runs_total', {'job': 'test_job', 'outcome': outcome}) or 0
+
+    before = runs('error')
+    assert run_job('test_job', lambda: 3) == 3
+    with pytest.raises(RuntimeError):
+        run_job('test_job', failing_job)
+
+    assert (runs('error') - before, runs('ok')) == (1, 1)
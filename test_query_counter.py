@@ -0,0 +1,167 @@
+"""
+Tests for the per-request SQL counter and N+1 detector.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+import pytest
+from flask import g
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db, Booking, Report, Review, Ride, utc_now
+from query_counter import RepeatedQueryError, SlowQueryLog, fingerprint, parameter_shape
+
+
+def fresh_get(client, url):
+    """GET `url` with nothing cached in the session, as a real request would start."""
+    db.session.remove()
+    g.pop('_login_user', None)
+    return client.get(url)
+
+
+@pytest.fixture
+def busy_driver(make_user, make_ride):
+    """A driver with 15 rides, each booked, reviewed and reported by a different passenger."""
+    driver = make_user('driver')
+    passengers = [make_user(f'passenger{i}') for i in range(15)]
+    for i, passenger in enumerate(passengers):
+        ride = make_ride(driver, start_date=utc_now() + timedelta(days=i - 7),
+                         status=Ride.STATUS_UPCOMING if i >= 7 else Ride.STATUS_COMPLETED)
+        booking = Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1, pickup_address='Andheri',
+                          drop_address='Bandra', status=Booking.STATUS_PENDING if i >= 7 else Booking.STATUS_COMPLETED)
+        db.session.add(booking)
+        db.session.flush()
+        db.session.add_all([
+            Review(reviewer_id=passenger.id, reviewed_id=driver.id, booking_id=booking.id, rating=5,
+                   review_type=Review.TYPE_PASSENGER_TO_DRIVER),
+            Report(user_id=passenger.id, ride_id=ride.id, report_type='complaint', subject='Late',
+                   description='Driver was late'),
+        ])
+    db.session.commit()
+    return driver, passengers
+
+
+def test_fingerprint_collapses_literals_parameters_and_in_lists():
+    assert fingerprint("SELECT * FROM ride WHERE id IN (?, ?, ?) AND status = 'UPCOMING' LIMIT 5") == \
+        fingerprint("SELECT *  FROM ride\nWHERE id IN (?) AND status = 'ONGOING' LIMIT 20") == \
+        'SELECT * FROM ride WHERE id IN (?) AND status = ? LIMIT ?'
+    assert fingerprint('SELECT anon_1.x FROM booking WHERE booking.ride_id = %(param_1)s') == \
+        'SELECT anon_1.x FROM booking WHERE booking.ride_id = ?'
+
+
+def test_responses_report_query_count_and_time(client, make_user, login):
+    login(make_user('rider'))
+
+    response = fresh_get(client, '/dashboard')
+
+    assert int(response.headers['X-SQL-Queries']) >= 1
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+
+
+def test_repeated_statement_is_reported(app, client, make_user, make_ride, login, caplog):
+    admin = make_user('admin', is_admin=True)
+    ride = make_ride(make_user('driver'))
+    for name in ('a', 'b', 'c'):
+        db.session.add(Booking(ride_id=ride.id, passenger_id=make_user(name).id, seats=1,
+                               pickup_address='Andheri', drop_address='Bandra'))
+    db.session.commit()
+    login(admin)
+    app.config['SQL_REPEAT_LIMIT'] = 2
+    try:
+        # Each booking's passenger is lazy-loaded by the template
+        with pytest.raises(RepeatedQueryError,
+                           match=r'GET /admin/rides/\d+ ran one statement \d+ times .*FROM user WHERE'):
+            fresh_get(client, f'/admin/rides/{ride.id}')
+
+        app.config['SQL_REPEAT_ACTION'] = 'warn'
+        with caplog.at_level(logging.WARNING, logger='query_counter'):
+            assert fresh_get(client, f'/admin/rides/{ride.id}').status_code == 200
+        assert 'likely an N+1 query' in caplog.text
+    finally:
+        app.config.update(SQL_REPEAT_LIMIT=10, SQL_REPEAT_ACTION='raise')
+
+
+@pytest.mark.parametrize('viewer, url', [
+    ('driver', '/dashboard'),
+    ('driver', '/user/{driver}'),
+    ('passenger', '/user/{driver}/reviews'),
+    ('passenger', '/my-bookings'),
+    ('admin', '/admin/safety'),
+])
+def test_list_pages_do_not_query_per_row(client, make_user, login, busy_driver, viewer, url):
+    driver, passengers = busy_driver
+    user = {'driver': driver, 'passenger': passengers[0], 'admin': make_user('admin', is_admin=True)}[viewer]
+    login(user)
+
+    # SQL_REPEAT_ACTION is 'raise' under test, so a per-row query pattern fails here
+    response = fresh_get(client, url.format(driver=driver.id))
+
+    assert response.status_code == 200
+    assert int(response.headers['X-SQL-Queries']) <= 10
+
+
+def test_debug_toolbar_lists_statements(app, client, make_user, login):
+    login(make_user('rider'))
+    app.config['SQL_DEBUG_TOOLBAR'] = True
+    try:
+        html = fresh_get(client, '/dashboard').get_data(as_text=True)
+    finally:
+        app.config['SQL_DEBUG_TOOLBAR'] = None
+
+    assert '<details id="sql-toolbar"' in html
+    assert html.index('id="sql-toolbar"') < html.rindex('</body>')
+    assert 'FROM ride' in html
+
+
+def test_slow_statements_are_logged_with_parameter_types_and_plan(app, client, make_user, make_ride, tmp_path,
+                                                                   monkeypatch):
+    make_ride(make_user('driver'))
+    log_path = tmp_path / 'slow_queries.log'
+    slow_log = SlowQueryLog(str(log_path), threshold=0, max_bytes=64 * 1024)
+    monkeypatch.setitem(app.extensions['query_counter'], 'slow_log', slow_log)
+
+    for _ in range(2):
+        fresh_get(client, '/search-rides?fuel_type=petrol&ac_preference=ac&driver_rating=4')
+    slow_log.close()
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    searches = [entry for entry in entries if entry['endpoint'] == 'search_rides'
+                and 'JOIN car' in entry['statement'] and 'car.fuel_type = ?' in entry['statement']]
+    assert len(searches) == 2
+    first, second = searches
+    assert first['request'].startswith('GET /search-rides')
+    assert 'str' in first['parameters'] and 'petrol' not in json.dumps(first)
+    # The plan is captured once per statement shape and reused
+    assert any(line.lstrip().startswith(('SCAN', 'SEARCH')) for line in first['plan'])
+    assert second['plan'] == first['plan']
+
+
+def test_each_app_keeps_its_own_slow_query_log(app, tmp_path):
+    other = create_app({'TESTING': True, 'SQL_SLOW_QUERY_MS': 50,
+                        'SQL_SLOW_QUERY_LOG': str(tmp_path / 'slow_queries.log')})
+
+    assert other.extensions['query_counter']['slow_log'].threshold == 0.05
+    assert app.extensions['query_counter']['slow_log'] is None
+
+
+def test_failed_statements_leave_no_timing_state_on_the_connection(app, client, make_user, login):
+    login(make_user('rider'))
+    connection = db.session.connection()
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM no_such_table'))
+    assert not any(key.startswith(('query', 'sql')) for key in connection.info)
+    db.session.rollback()
+
+    response = fresh_get(client, '/dashboard')
+    assert response.status_code == 200 and int(response.headers['X-SQL-Queries']) >= 1
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape((3, 'secret', None)) == '(int, str, NoneType)'
+    assert parameter_shape({'email': 'a@b.c'}) == '{email: str}'
+    assert parameter_shape([(1, 'x'), (2, 'y')], executemany=True) == '2 x (int, str)'
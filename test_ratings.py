@@ -0,0 +1,56 @@
+"""
+Tests for incremental rating aggregation (record_review / check_rating_aggregates).
+"""
+
+from app import db, Review, Booking, Ride, record_review, check_rating_aggregates
+
+
+def _completed_booking(make_ride, driver, passenger):
+    ride = make_ride(driver, status=Ride.STATUS_COMPLETED)
+    booking = Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1, status=Booking.STATUS_COMPLETED,
+                      pickup_address='A', drop_address='B')
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def test_record_review_updates_aggregates_in_sql(app, make_user):
+    user = make_user('driver')
+
+    for rating, flag in [(5, 'green'), (1, 'red'), (5, 'green')]:
+        record_review(user.id, rating, flag)
+    db.session.commit()
+
+    db.session.expire_all()
+    assert (user.rating_sum, user.rating_count, user.green_flags, user.red_flags) == (11, 3, 2, 1)
+    assert user.rating == 11 / 3
+
+
+def test_submit_review_route_keeps_aggregates_consistent(client, login, make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    booking = _completed_booking(make_ride, driver, passenger)
+    login(passenger)
+
+    response = client.post(f'/booking/{booking.id}/review', data={'flag': 'red', 'comment': 'Late'})
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert Review.query.filter_by(reviewed_id=driver.id).count() == 1
+    assert (driver.rating_count, driver.rating, driver.red_flags) == (1, 1.0, 1)
+    assert check_rating_aggregates() == []
+
+
+def test_check_rating_aggregates_finds_and_fixes_drift(app, make_user, make_ride):
+    reviewer, user = make_user('reviewer'), make_user('reviewed')
+    booking = _completed_booking(make_ride, user, reviewer)
+    db.session.add_all([Review(reviewer_id=reviewer.id, reviewed_id=user.id, booking_id=booking.id, rating=r)
+                        for r in (4, 5)])
+    db.session.commit()
+
+    mismatches = check_rating_aggregates()
+    assert [(m['id'], m['actual']) for m in mismatches] == [(user.id, (9, 2, 4.5))]
+
+    check_rating_aggregates(fix=True)
+    db.session.expire_all()
+    assert (user.rating_sum, user.rating_count, user.rating) == (9, 2, 4.5)
+    assert check_rating_aggregates() == []
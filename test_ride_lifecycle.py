@@ -0,0 +1,87 @@
+"""
+Tests for the time-based ride transitions (sweep_ride_lifecycle), run by
+ride_scheduler.py.
+"""
+
+from datetime import timedelta
+
+from app import db, Ride, Booking, sweep_ride_lifecycle, utc_now
+from ride_scheduler import run_scheduler
+
+
+def _book(ride, passenger, status):
+    booking = Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1, status=status,
+                      pickup_address='A', drop_address='B')
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def _snapshot():
+    db.session.expire_all()
+    return [(ride.id, ride.status, ride.actual_start_time, ride.actual_end_time, ride.estimated_end_time)
+            for ride in Ride.query.order_by(Ride.id)] + \
+        [(booking.id, booking.status, booking.passenger_completed_at) for booking in Booking.query.order_by(Booking.id)]
+
+
+def test_sweep_completes_ongoing_rides_past_their_buffer(app, make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    now = utc_now()
+    due = make_ride(driver, status=Ride.STATUS_ONGOING, start_date=now - timedelta(hours=3),
+                    actual_start_time=now - timedelta(hours=3), estimated_end_time=now - timedelta(hours=2),
+                    error_buffer_minutes=30)
+    running = make_ride(driver, status=Ride.STATUS_ONGOING, start_date=now - timedelta(minutes=20),
+                        actual_start_time=now - timedelta(minutes=20), estimated_end_time=now + timedelta(minutes=10),
+                        error_buffer_minutes=30)
+    booking = _book(due, passenger, Booking.STATUS_CONFIRMED)
+
+    assert sweep_ride_lifecycle(now) == {'auto_completed': 1, 'overdue_completed': 0}
+
+    db.session.expire_all()
+    assert (due.status, due.completed_by, due.auto_completed, due.actual_end_time) == \
+        (Ride.STATUS_COMPLETED, 'AUTO', True, now)
+    assert (booking.status, booking.passenger_ride_status, booking.passenger_completed_at) == \
+        (Booking.STATUS_COMPLETED, 'COMPLETED', now)
+    assert running.status == Ride.STATUS_ONGOING
+
+
+def test_sweep_starts_and_completes_severely_overdue_rides(app, make_user, make_ride):
+    driver, passenger, other = make_user('driver'), make_user('passenger'), make_user('other')
+    now = utc_now()
+    overdue = make_ride(driver, start_date=now - timedelta(hours=2), distance=120.0)
+    late = make_ride(driver, start_date=now - timedelta(minutes=30))
+    confirmed = _book(overdue, passenger, Booking.STATUS_CONFIRMED)
+    pending = _book(overdue, other, Booking.STATUS_PENDING)
+
+    assert sweep_ride_lifecycle(now) == {'auto_completed': 0, 'overdue_completed': 1}
+
+    db.session.expire_all()
+    assert (overdue.status, overdue.actual_start_time, overdue.actual_end_time, overdue.completed_by) == \
+        (Ride.STATUS_COMPLETED, now, now, 'AUTO')
+    # Re-estimated from the actual start, as Ride.start_ride() does
+    assert overdue.estimated_end_time == now + timedelta(minutes=overdue.get_estimated_time())
+    assert overdue.error_buffer_minutes == 60
+    assert (confirmed.status, pending.status) == (Booking.STATUS_COMPLETED, Booking.STATUS_REJECTED)
+    assert late.status == Ride.STATUS_UPCOMING
+
+
+def test_a_second_sweep_changes_nothing(app, make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    now = utc_now()
+    _book(make_ride(driver, start_date=now - timedelta(hours=2)), passenger, Booking.STATUS_CONFIRMED)
+    make_ride(driver, status=Ride.STATUS_ONGOING, start_date=now - timedelta(hours=3),
+              actual_start_time=now - timedelta(hours=3), estimated_end_time=now - timedelta(hours=2))
+    sweep_ride_lifecycle(now)
+    after_first = _snapshot()
+
+    assert sweep_ride_lifecycle(now + timedelta(minutes=1)) == {'auto_completed': 0, 'overdue_completed': 0}
+    assert _snapshot() == after_first
+
+
+def test_scheduler_runs_a_sweep(app, make_user, make_ride):
+    ride = make_ride(make_user('driver'), start_date=utc_now() - timedelta(hours=2))
+
+    run_scheduler(once=True)
+
+    db.session.expire_all()
+    assert ride.status == Ride.STATUS_COMPLETED
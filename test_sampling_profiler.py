@@ -0,0 +1,83 @@
+"""
+Tests for the request sampling profiler and its admin page.
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import admin_routes
+import app as app_module
+from sampling_profiler import SamplingProfiler, frame_label, summarize
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    """A profiler writing to tmp_path in place of the app's, picking up settings immediately."""
+    profiler = SamplingProfiler(str(tmp_path), settings_ttl=0, flush_interval=0.05)
+    monkeypatch.setattr(app_module, 'profiler', profiler)
+    monkeypatch.setattr(admin_routes, 'profiler', profiler)
+    yield profiler
+    profiler.stop()
+
+
+def busy_search(params):
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    return [], None
+
+
+def test_only_selected_requests_are_sampled(client, make_user, login, profiler, monkeypatch):
+    monkeypatch.setattr(app_module, 'search_rides_page', busy_search)
+    login(make_user('rider'))
+    assert client.get('/search-rides').status_code == 200
+    assert profiler.profiles() == {}
+
+    profiler.update_settings(enabled=True, fraction=1.0, endpoint='search_rides', interval_ms=1)
+    client.get('/search-rides')
+    client.get('/dashboard')
+    profiler.stop()
+
+    profiles = profiler.profiles()
+    assert list(profiles) == ['search_rides']
+    assert all(stack.startswith('Flask.wsgi_app (flask/app.py:') for stack in profiles['search_rides'])
+    hottest, own, total = summarize(profiles['search_rides'])[0]
+    assert hottest.startswith('busy_search (')
+    assert own > 0.5 * sum(profiles['search_rides'].values())
+
+
+def test_admin_page_shares_settings_and_serves_collapsed_stacks(client, make_user, login, profiler):
+    login(make_user('admin', is_admin=True))
+
+    client.post('/admin/profiling', data={'enabled': 'on', 'percent': '2.5', 'endpoint': 'dashboard',
+                                          'interval_ms': '2'})
+    client.post('/admin/profiling', data={'enabled': 'on', 'percent': '2.5', 'endpoint': 'no_such_view',
+                                          'interval_ms': '2'})
+
+    # Another worker sharing the directory sees the saved settings
+    assert SamplingProfiler(profiler.directory).settings() == \
+        {'enabled': True, 'fraction': 0.025, 'endpoint': 'dashboard', 'interval_ms': 2, 'generation': 0}
+
+    for pid, count in ((101, 3), (102, 4)):
+        with open(f'{profiler.directory}/dashboard.{pid}.collapsed', 'w') as f:
+            f.write(f'wsgi_app (flask/app.py:1);dashboard (package/app.py:2) {count}\n')
+    page = client.get('/admin/profiling').get_data(as_text=True)
+    assert '7 samples' in page and 'dashboard (package/app.py:2)' in page
+
+    download = client.get('/admin/profiling/dashboard.collapsed')
+    assert download.get_data(as_text=True) == 'wsgi_app (flask/app.py:1);dashboard (package/app.py:2) 7\n'
+    assert client.get('/admin/profiling/search_rides.collapsed').status_code == 404
+
+    client.post('/admin/profiling/clear')
+    assert profiler.profiles() == {}
+    assert profiler.settings()['generation'] == 1
+
+
+def test_frame_labels_work_without_co_qualname():
+    # Code objects before Python 3.11 have no co_qualname
+    code = SimpleNamespace(co_filename='/srv/rideshare/app.py', co_name='dashboard', co_firstlineno=12)
+
+    assert frame_label(code) == 'dashboard (rideshare/app.py:12)'
+    assert frame_label(frame_label.__code__).startswith('frame_label (')
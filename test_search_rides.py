@@ -0,0 +1,273 @@
+"""
+Tests for the ride search page and its query layer.
+"""
+
+import re
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app import (db, build_ride_search_query, search_rides_page, utc_now,
+                 location_search_backend, ensure_location_search,
+                 LOCATION_FTS_TABLE, SEARCH_SORT_KEYS, SEARCH_MAX_PAGE_SIZE, GEO_INDEX_PRUNE_SECONDS,
+                 sync_ride_spatial_index)
+
+
+def _make_drivers_with_rides(make_user, make_ride, prefix, count):
+    for i in range(count):
+        make_ride(make_user(f'{prefix}{i}'))
+    db.session.remove()
+
+
+def test_search_page_query_count_is_constant(client, make_user, make_ride, count_queries):
+    _make_drivers_with_rides(make_user, make_ride, 'first', 1)
+    with count_queries() as small:
+        assert client.get('/search-rides?per_page=50').status_code == 200
+
+    _make_drivers_with_rides(make_user, make_ride, 'driver', 25)
+    with count_queries() as large:
+        response = client.get('/search-rides?per_page=50')
+    assert response.status_code == 200
+    assert b'driver24' in response.data
+
+    assert len(large) == len(small) == 1
+
+
+def test_search_filters_on_car_and_driver(app, make_user, make_ride):
+    make_ride(make_user('cool_driver', rating=4.8), ac=True)
+    make_ride(make_user('warm_driver', rating=2.0), ac=False)
+
+    rides = build_ride_search_query({'ac_preference': 'ac', 'driver_rating': '4'}).all()
+
+    assert [ride.driver.username for ride in rides] == ['cool_driver']
+    assert rides[0].car.ac is True
+
+
+def _walk_pages(params):
+    """Follow next cursors from the first page and return every ride id seen."""
+    seen = []
+    params = dict(params)
+    while True:
+        rides, next_cursor = search_rides_page(params)
+        seen.extend(ride.id for ride in rides)
+        if not next_cursor:
+            return seen
+        params['cursor'] = next_cursor
+
+
+def test_keyset_pages_cover_every_sort_order(app, make_user, make_ride):
+    driver = make_user('driver')
+    # Repeated prices/distances force the Ride.id tie-breaker to matter
+    for i in range(11):
+        make_ride(driver, price_per_seat=float(100 + 10 * (i % 3)), distance=float(10 + i % 4),
+                  start_date=utc_now() + timedelta(days=1, hours=i % 5))
+
+    for sort_by in SEARCH_SORT_KEYS:
+        expected = [ride.id for ride in build_ride_search_query({'sort_by': sort_by}).all()]
+        assert _walk_pages({'sort_by': sort_by, 'per_page': '4'}) == expected
+
+
+def test_page_size_is_capped(app, make_user, make_ride):
+    driver = make_user('driver')
+    for _ in range(SEARCH_MAX_PAGE_SIZE + 5):
+        make_ride(driver)
+
+    rides, next_cursor = search_rides_page({'per_page': '10000'})
+
+    assert len(rides) == SEARCH_MAX_PAGE_SIZE
+    assert next_cursor is not None
+
+
+def test_cursor_for_another_sort_order_restarts(app, make_user, make_ride):
+    driver = make_user('driver')
+    for _ in range(3):
+        make_ride(driver)
+    _, next_cursor = search_rides_page({'sort_by': 'date', 'per_page': '1'})
+
+    rides, _ = search_rides_page({'sort_by': 'distance', 'per_page': '3', 'cursor': next_cursor})
+    garbage, _ = search_rides_page({'per_page': '3', 'cursor': 'not-a-cursor'})
+
+    assert len(rides) == len(garbage) == 3
+
+
+def fts5_supported():
+    """Whether this SQLite build can hold the FTS5 trigram location index."""
+    import app as app_module
+    with db.engine.connect() as conn:
+        return app_module._sqlite_supports_fts5(conn)
+
+
+@pytest.mark.parametrize('backend', ['fts5', 'substring'])
+def test_location_search_keeps_substring_semantics(app, make_user, make_ride, backend, monkeypatch):
+    import app as app_module
+    if backend == 'fts5' and not fts5_supported():
+        pytest.skip('SQLite build without FTS5 trigram support')
+    if backend == 'substring':
+        # Rebuild the schema as on a SQLite build without FTS5
+        monkeypatch.setattr(app_module, '_sqlite_supports_fts5', lambda conn: False)
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+    driver = make_user('driver')
+    andheri = make_ride(driver, start_location='Andheri West', end_location='Bandra')
+    powai = make_ride(driver, start_location='Powai', end_location='Bandra Kurla Complex')
+
+    def ids(params):
+        return {ride.id for ride in build_ride_search_query(params).all()}
+
+    assert location_search_backend() == backend
+    assert ids({'origin': 'DHERI'}) == {andheri.id}
+    assert ids({'destination': 'bandra'}) == {andheri.id, powai.id}
+    assert ids({'origin': 'wa', 'destination': 'kurla'}) == {powai.id}
+    assert ids({'origin': 'Thane'}) == set()
+
+
+def test_location_index_follows_ride_updates(app, make_user, make_ride):
+    ride = make_ride(make_user('driver'), start_location='Andheri West')
+
+    ride.start_location = 'Thane West'
+    db.session.commit()
+
+    assert build_ride_search_query({'origin': 'andheri'}).all() == []
+    assert build_ride_search_query({'origin': 'thane'}).all() == [ride]
+
+
+def test_relevance_sort_pages_through_all_matches(app, make_user, make_ride):
+    driver = make_user('driver')
+    for location in ['Andheri', 'Andheri West', 'Andheri East Station Road', 'Bandra', 'Andheri']:
+        make_ride(driver, start_location=location)
+
+    expected = [ride.id for ride in build_ride_search_query({'origin': 'andheri', 'sort_by': 'relevance'})]
+
+    assert len(expected) == 4
+    assert _walk_pages({'origin': 'andheri', 'sort_by': 'relevance', 'per_page': '1'}) == expected
+
+
+def test_ensure_location_search_indexes_existing_rides(app, make_user, make_ride):
+    if not fts5_supported():
+        pytest.skip('SQLite build without FTS5 trigram support')
+    ride = make_ride(make_user('driver'), start_location='Andheri West')
+    db.session.execute(text(f'DROP TABLE {LOCATION_FTS_TABLE}'))
+    db.session.commit()
+
+    assert ensure_location_search() == [LOCATION_FTS_TABLE]
+    assert ensure_location_search() == []
+    assert build_ride_search_query({'origin': 'andheri'}).all() == [ride]
+
+
+def test_radius_search_uses_ride_coordinates(app, make_user, make_ride):
+    driver = make_user('driver')
+    andheri = make_ride(driver, start_lat=19.1197, start_lng=72.8468, end_lat=19.0596, end_lng=72.8295)
+    thane = make_ride(driver, start_lat=19.2183, start_lng=72.9781, end_lat=19.0596, end_lng=72.8295)
+    make_ride(driver)  # typed in without the map, never matches a radius search
+
+    def ids(params):
+        return [ride.id for ride in build_ride_search_query(params).all()]
+
+    near_andheri = {'origin_lat': '19.12', 'origin_lng': '72.85', 'radius': '5'}
+    assert ids(near_andheri) == [andheri.id]
+    # Coordinates take precedence over the typed origin
+    assert ids(dict(near_andheri, origin='Thane')) == [andheri.id]
+    assert ids({'destination_lat': '19.06', 'destination_lng': '72.83'}) == [andheri.id, thane.id]
+
+    # Rides offered after the index was loaded are picked up on the next search
+    later = make_ride(driver, start_lat=19.1200, start_lng=72.8470, end_lat=19.0, end_lng=72.8)
+    assert set(ids(near_andheri)) == {andheri.id, later.id}
+
+
+def test_typed_locations_clear_the_coordinates_they_replace(client):
+    page = client.get('/search-rides?origin_lat=19.12&origin_lng=72.85').get_data(as_text=True)
+
+    # The Near Me position is carried over to the next search...
+    assert 'id="origin_lat" name="origin_lat" value="19.12"' in page
+    # ...until a location is typed on that side, which blanks its hidden lat/lng
+    for side in ('origin', 'destination'):
+        assert re.search(f'<input [^>]*id="{side}" [^>]*data-coordinates="{side}"', page)
+        assert f'id="{side}_lat"' in page and f'id="{side}_lng"' in page
+    assert "input.dataset.coordinates + '_lat'" in page
+
+
+def test_spatial_index_picks_up_rides_committed_out_of_order(app, make_user, make_ride):
+    driver = make_user('driver')
+    coordinates = dict(start_lat=19.12, start_lng=72.85, end_lat=19.06, end_lng=72.83)
+    near = {'origin_lat': '19.12', 'origin_lng': '72.85'}
+
+    def ids():
+        return {ride.id for ride in build_ride_search_query(near).all()}
+
+    first = make_ride(driver, id=10, **coordinates)
+    assert ids() == {first.id}
+
+    # A lower id, flushed before that search loaded the index and committed after it
+    late = make_ride(driver, id=5, updated_at=utc_now() - timedelta(seconds=30), **coordinates)
+    assert ids() == {first.id, late.id}
+
+    # Beyond the catch-up window: added by the next reconciliation pass
+    stale = make_ride(driver, id=6, updated_at=utc_now() - timedelta(hours=1), **coordinates)
+    assert ids() == {first.id, late.id}
+    sync_ride_spatial_index(now=utc_now() + timedelta(seconds=GEO_INDEX_PRUNE_SECONDS + 1))
+    assert ids() == {first.id, late.id, stale.id}
+
+
+def test_radius_search_filters_every_match(app, make_user, make_ride, monkeypatch):
+    import app as app_module
+    driver = make_user('driver')
+    nearer = make_ride(driver, start_lat=19.1200, start_lng=72.8500, end_lat=19.06, end_lng=72.83)
+    farther = make_ride(driver, start_lat=19.1400, start_lng=72.8500, end_lat=19.06, end_lng=72.83)
+    farther.car.fuel_type = 'electric'
+    db.session.commit()
+    near = {'origin_lat': '19.12', 'origin_lng': '72.85'}
+
+    assert [ride.id for ride in build_ride_search_query(near).all()] == [nearer.id, farther.id]
+
+    # A dense city: more matches than SQLite accepts bound parameters, with
+    # the only electric car after all of them
+    monkeypatch.setattr(app_module, 'rides_near',
+                        lambda *args: [nearer.id] + list(range(100000, 140000)) + [farther.id])
+    rides, _ = search_rides_page(dict(near, fuel_type='electric'))
+    assert [ride.id for ride in rides] == [farther.id]
+    rides, _ = search_rides_page(near)
+    assert [ride.id for ride in rides] == [nearer.id, farther.id]
+
+
+def test_route_search_matches_rides_passing_both_points(client, login, make_user, make_ride):
+    from app import encode_route_polyline
+    driver = make_user('driver')
+    route = [(18.91, 72.82), (19.02, 72.84), (19.06, 72.90)]
+    via_dadar = make_ride(driver, start_lat=18.91, start_lng=72.82, end_lat=19.06, end_lng=72.90,
+                          route_polyline=encode_route_polyline(route))
+    reverse = make_ride(driver, start_lat=19.06, start_lng=72.90, end_lat=18.91, end_lng=72.82)
+    pickup = {'origin_lat': '18.96', 'origin_lng': '72.835'}
+    drop = {'destination_lat': '19.045', 'destination_lng': '72.87'}
+
+    assert build_ride_search_query(dict(pickup, **drop, radius='1.5')).all() == [via_dadar]
+
+    login(make_user('passenger'))
+    page = client.get(f'/book-ride/{via_dadar.id}?pickup_lat=18.96&pickup_lng=72.835'
+                      '&drop_lat=19.045&drop_lng=72.87&radius=1.5')
+    assert page.status_code == 200
+    assert b'value="Near 18.96000, 72.83500"' in page.data
+    assert b"On the driver's route" in page.data
+
+    wrong_way = client.get(f'/book-ride/{reverse.id}?pickup_lat=18.96&pickup_lng=72.835'
+                           '&drop_lat=19.045&drop_lng=72.87&radius=1.5')
+    assert wrong_way.status_code == 302
+
+
+def test_search_page_picks_pickup_and_drop_on_a_map(client, make_user, make_ride):
+    from app import encode_route_polyline
+    driver = make_user('driver')
+    route = [(18.91, 72.82), (19.02, 72.84), (19.06, 72.90)]
+    via_dadar = make_ride(driver, start_lat=18.91, start_lng=72.82, end_lat=19.06, end_lng=72.90,
+                          route_polyline=encode_route_polyline(route))
+
+    page = client.get('/search-rides').get_data(as_text=True)
+    assert 'js/search_rides_map.js' in page and 'id="searchMap"' in page
+
+    # What the map submits: both points, so rides are matched on their route and
+    # booking one starts with the pickup and drop filled in
+    page = client.get('/search-rides?origin=Near+18.9600%2C+72.8350&origin_lat=18.96&origin_lng=72.835'
+                      '&destination=Kurla&destination_lat=19.045&destination_lng=72.87&radius=2')
+    assert f'/book-ride/{via_dadar.id}?pickup_lat=18.96&amp;pickup_lng=72.835&amp;drop_lat=19.045' \
+        in page.get_data(as_text=True)
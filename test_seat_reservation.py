@@ -0,0 +1,84 @@
+"""
+Tests for atomic seat reservation and release (reserve_seats / release_booking).
+"""
+
+import threading
+
+from app import app as flask_app, db, Ride, Booking, reserve_seats, release_booking
+
+
+def test_reserve_seats_only_when_available(make_user, make_ride):
+    ride = make_ride(make_user('driver'), available_seats=2)
+
+    assert reserve_seats(ride.id, 2)
+    assert not reserve_seats(ride.id, 1)
+    db.session.commit()
+
+    assert db.session.get(Ride, ride.id).available_seats == 0
+
+
+def test_reserve_seats_rejects_cancelled_ride(make_user, make_ride):
+    ride = make_ride(make_user('driver'), status=Ride.STATUS_CANCELLED)
+
+    assert not reserve_seats(ride.id, 1)
+
+
+def test_release_booking_restores_seats_once(make_user, make_ride):
+    ride = make_ride(make_user('driver'), available_seats=3)
+    passenger = make_user('passenger')
+    assert reserve_seats(ride.id, 2)
+    booking = Booking(ride_id=ride.id, passenger_id=passenger.id, seats=2,
+                      pickup_address='A', drop_address='B')
+    db.session.add(booking)
+    db.session.commit()
+
+    assert release_booking(booking, Booking.STATUS_CANCELLED)
+    assert not release_booking(booking, Booking.STATUS_CANCELLED)
+    db.session.commit()
+
+    db.session.expire_all()
+    assert booking.status == Booking.STATUS_CANCELLED
+    assert db.session.get(Ride, ride.id).available_seats == 3
+
+
+def test_concurrent_bookers_never_oversell(make_user, make_ride):
+    seats = 5
+    ride = make_ride(make_user('driver'), available_seats=seats)
+    passengers = [make_user(f'passenger{i}').id for i in range(40)]
+    barrier = threading.Barrier(len(passengers))
+    won = []
+
+    def book(passenger_id):
+        with flask_app.app_context():
+            barrier.wait()
+            if reserve_seats(ride.id, 1):
+                db.session.add(Booking(ride_id=ride.id, passenger_id=passenger_id, seats=1,
+                                       pickup_address='A', drop_address='B'))
+                won.append(passenger_id)
+            db.session.commit()
+
+    threads = [threading.Thread(target=book, args=(pid,)) for pid in passengers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    assert len(won) == seats
+    assert Booking.query.filter_by(ride_id=ride.id).count() == seats
+    assert db.session.get(Ride, ride.id).available_seats == 0
+
+
+def test_book_ride_route_reserves_seats(client, login, make_user, make_ride):
+    ride = make_ride(make_user('driver'), available_seats=3)
+    passenger = make_user('passenger')
+    login(passenger)
+
+    response = client.post(f'/book-ride/{ride.id}', data={
+        'seats': 2, 'pickup_address': 'Andheri West', 'drop_address': 'Bandra East',
+        'contact': '9876543210'})
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Ride, ride.id).available_seats == 1
+    assert Booking.query.filter_by(passenger_id=passenger.id).one().seats == 2
@@ -0,0 +1,129 @@
+"""
+Tests for the SOS event broker and the admin Server-Sent Events stream.
+"""
+
+import json
+import queue
+
+from flask import g
+
+from app import db, Report, sos_broker
+from sos_broker import EventBroker, RedisEventBroker, create_broker, format_sse
+
+
+class FakeRedis:
+    """The slice of the redis-py client RedisEventBroker uses, within one process."""
+
+    def __init__(self):
+        self.values, self.lists, self.channels = {}, {}, {}
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value.encode())
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    def publish(self, channel, value):
+        for messages in self.channels.get(channel, []):
+            messages.put({'type': 'message', 'data': value.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self._client = client
+        self._messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self._client.channels.setdefault(channel, []).append(self._messages)
+
+    def listen(self):
+        while True:
+            yield self._messages.get()
+
+
+def read_event(chunks):
+    """Next non-keepalive SSE message from a streamed response, parsed."""
+    while True:
+        chunk = next(chunks).decode()
+        if not chunk.startswith((':', 'retry:')):
+            fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+            return fields['event'], json.loads(fields['data'])
+
+
+def test_broker_fans_out_and_replays_missed_events():
+    broker = EventBroker(history=10, queue_size=2)
+    first, second = broker.subscribe(), broker.subscribe()
+
+    sent = [broker.publish('sos_trigger', {'id': n}) for n in range(3)]
+
+    # Each subscriber gets every event; a full queue drops its oldest one
+    assert [first.get(0).data['id'], first.get(0).data['id']] == [1, 2]
+    assert first.dropped == 1
+    assert second.get(0) == sent[1]
+    second.close()
+    assert broker.subscriber_count == 1
+
+    with broker.subscribe(last_event_id=sent[0].id) as reconnected:
+        assert [reconnected.get(0), reconnected.get(0), reconnected.get(0)] == [sent[1], sent[2], None]
+    assert format_sse(sent[0]) == 'id: 1\nevent: sos_trigger\ndata: {"id": 0}\n\n'
+
+
+def test_redis_broker_reaches_subscribers_in_other_processes():
+    client = FakeRedis()
+    # One broker per gunicorn worker, sharing the Redis server
+    publisher, streaming = RedisEventBroker(client, history=10), RedisEventBroker(client, history=10)
+
+    with streaming.subscribe() as subscription:
+        trigger = publisher.publish('sos_trigger', {'id': 7})
+        assert subscription.get(timeout=2) == trigger
+    cancel = publisher.publish('sos_cancel', {'id': 7})
+
+    # A reconnect to either worker replays from the shared history
+    with streaming.subscribe(last_event_id=trigger.id) as reconnected:
+        assert [reconnected.get(timeout=2), reconnected.get(0)] == [cancel, None]
+        later = publisher.publish('sos_trigger', {'id': 8})
+        assert reconnected.get(timeout=2) == later
+    assert (trigger.id, cancel.id, later.id) == (1, 2, 3)
+    assert isinstance(create_broker('memory://'), EventBroker)
+
+
+def test_admin_stream_receives_trigger_and_cancel(app, client, login, make_user):
+    admin_client = app.test_client()
+    login(make_user('admin', is_admin=True))
+    admin_client.set_cookie('session', client.get_cookie('session').value)
+    stream = admin_client.get('/admin/stream/sos', buffered=False)
+    assert stream.mimetype == 'text/event-stream'
+    chunks = iter(stream.response)
+    next(chunks)  # retry hint; the admin is subscribed from here on
+
+    # Requests share the test's app context, so forget the admin Flask-Login cached on g
+    g.pop('_login_user', None)
+    login(make_user('rider', phone='9876543210'))
+    client.post('/api/sos/trigger', json={'location': '19.1, 72.9', 'message': 'Help'})
+    name, alert = read_event(chunks)
+    assert name == 'sos_trigger'
+    assert (alert['username'], alert['sos_location'], alert['pending_sos_count']) == ('rider', '19.1, 72.9', 1)
+
+    client.post('/api/sos/cancel')
+    name, update = read_event(chunks)
+    assert (name, update['id'], update['pending_sos_count']) == ('sos_cancel', alert['id'], 0)
+    assert db.session.get(Report, alert['id']).status == 'dismissed'
+
+    stream.close()
+    assert sos_broker.subscriber_count == 0
+
+
+def test_stream_requires_admin(client, login, make_user):
+    login(make_user('rider'))
+
+    assert client.get('/admin/stream/sos').status_code == 302
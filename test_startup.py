@@ -0,0 +1,52 @@
+"""
+Tests for application startup: what importing the app costs, and the
+application factory.
+"""
+
+import os
+import subprocess
+import sys
+
+from app import app as module_app, create_app
+from bench_startup import BASE_DIR, measure_import
+
+# Importing the app takes about 0.6s; google-genai alone would add over a second
+IMPORT_BUDGET_SECONDS = 1.5
+LAZY_MODULES = ('google.genai', 'wtforms', 'flask_wtf', 'sqlalchemy.dialects.postgresql', 'chatbot', 'forms')
+
+
+def test_import_skips_lazy_modules_and_stays_within_budget():
+    total, imported = measure_import('app')
+
+    assert [name for name in LAZY_MODULES if name in imported] == []
+    slowest = sorted(imported.items(), key=lambda item: -item[1])[:5]
+    assert total < IMPORT_BUDGET_SECONDS, f'import app took {total:.2f}s; slowest imports: {slowest}'
+
+
+def test_genai_is_imported_by_the_first_chatbot_question_the_faq_cannot_answer(tmp_path):
+    script = '\n'.join([
+        'import sys',
+        'from app import app',
+        'client = app.test_client()',
+        "client.post('/chatbot', json={'message': 'How do I cancel a booking?'})",
+        "print('google.genai' in sys.modules)",
+        "client.post('/chatbot', json={'message': 'Is there a student discount?'})",
+        "print('google.genai' in sys.modules)",
+    ])
+    # Nothing listens on the discard port: the question gets the fallback reply straight away
+    env = dict(os.environ, GEMINI_API_KEY='test-key', GEMINI_BASE_URL='http://127.0.0.1:9',
+               CHATBOT_TIMEOUT_SECONDS='5', DATABASE_URL=f'sqlite:///{tmp_path}/test.db')
+    result = subprocess.run([sys.executable, '-c', script], cwd=BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'True']
+
+
+def test_create_app_builds_independent_apps_with_every_route():
+    other = create_app({'TESTING': True, 'SQL_REPEAT_LIMIT': 3})
+
+    assert other is not module_app
+    assert {rule.rule for rule in other.url_map.iter_rules()} == \
+        {rule.rule for rule in module_app.url_map.iter_rules()}
+    assert {'chatbot', 'admin_dashboard', 'admin_profiling', 'prometheus_metrics'} <= set(other.view_functions)
+    assert other.config['SQL_REPEAT_LIMIT'] == 3 and module_app.config['SQL_REPEAT_LIMIT'] == 10
+    assert other.test_client().get('/get-car-models/Tata').json == ['Nexon', 'Harrier', 'Safari', 'Altroz']
@@ -0,0 +1,66 @@
+"""
+Tests for the admin statistics rollup (bump_stat / refresh_stats_rollup).
+"""
+
+from app import (db, Booking, StatsEvent, StatsRollup, bump_stat, refresh_stats_rollup, read_stats_rollup,
+                 record_review, utc_now, STATS_ALL_TIME)
+
+
+def test_bump_stat_appends_events_that_refresh_folds_in(app):
+    bump_stat('rides_created')
+    bump_stat('rides_created', 2)
+    bump_stat('green_flags', daily=False)
+    db.session.commit()
+
+    # Writers only insert; the shared rollup rows are left to the scheduler
+    assert StatsRollup.query.count() == 0
+    totals, daily = read_stats_rollup()
+    assert totals == {'rides_created': 3, 'green_flags': 1}
+    assert daily == {'rides_created': {utc_now().date(): 3}}
+
+    refresh_stats_rollup()
+    bump_stat('rides_created')
+    db.session.commit()
+    refresh_stats_rollup()
+
+    assert StatsEvent.query.count() == 0
+    totals, daily = read_stats_rollup()
+    assert (totals['rides_created'], totals['green_flags'], daily) == (4, 1, {'rides_created': {utc_now().date(): 4}})
+
+
+def test_write_paths_match_a_full_rebuild(app, make_user, make_ride):
+    driver, passenger = make_user('driver'), make_user('passenger')
+    for _ in (driver, passenger):
+        bump_stat('users_created')
+    ride = make_ride(driver, package_type='monthly')
+    bump_stat('rides_created')
+    bump_stat('rides_package:monthly', daily=False)
+    db.session.add(Booking(ride_id=ride.id, passenger_id=passenger.id, seats=1,
+                           pickup_address='A', drop_address='B'))
+    bump_stat('bookings_created')
+    record_review(driver.id, 5, 'green')
+    db.session.commit()
+    refresh_stats_rollup()  # gauges only
+    incremental = read_stats_rollup()
+
+    db.session.query(StatsRollup).delete()
+    refresh_stats_rollup(full=True)
+    rebuilt = read_stats_rollup()
+
+    assert incremental[0] == {k: v for k, v in rebuilt[0].items() if v}
+    assert incremental[1] == {metric: {day: v for day, v in days.items() if v}
+                              for metric, days in rebuilt[1].items() if any(days.values())}
+    assert rebuilt[0]['pending_bookings'] == 1
+
+
+def test_admin_dashboard_reads_rollup(client, login, make_user, make_ride):
+    admin = make_user('admin', is_admin=True)
+    make_ride(admin)
+    login(admin)
+
+    response = client.get('/admin/dashboard')
+
+    assert response.status_code == 200
+    totals, _ = read_stats_rollup()
+    assert (totals['users_created'], totals['rides_created'], totals['active_rides']) == (1, 1, 1)
+    assert db.session.get(StatsRollup, ('active_rides', STATS_ALL_TIME)).value == 1
@@ -0,0 +1,83 @@
+"""
+Tests for the TTL cache backends and the cached admin SOS badge.
+"""
+
+import pytest
+
+from app import Report, get_pending_sos_count, PENDING_SOS_CACHE_KEY, cache
+from ttl_cache import Cache, MemoryCache, RedisCache, create_cache
+
+
+class FakeRedis:
+    """The slice of the redis-py client RedisCache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.data[key] = value.encode()
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_memory_cache_expires_entries():
+    now = [100.0]
+    memory = MemoryCache(clock=lambda: now[0])
+    memory.set('k', 3, ttl=10)
+
+    assert memory.get('k') == 3
+    now[0] += 10
+    assert memory.get('k') is None
+    assert memory.get_or_set('k', lambda: 4, ttl=10) == 4
+    assert memory.get_or_set('k', lambda: 5, ttl=10) == 4
+    assert memory.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_redis_cache_round_trips_json():
+    client = FakeRedis()
+    shared = RedisCache(client)
+
+    assert shared.get_or_set('count', lambda: 7, ttl=5) == 7
+    assert client.data['rideshare:count'] == b'7'
+    shared.delete('count')
+    assert shared.get('count') is None
+
+
+def test_create_cache_defaults_to_memory():
+    assert isinstance(create_cache('memory://'), MemoryCache)
+
+
+def test_incomplete_backend_fails_when_created():
+    class GetOnlyCache(Cache):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError, match='delete, set'):
+        GetOnlyCache()
+
+
+def test_admin_pages_share_the_cached_sos_count(client, login, make_user, count_queries):
+    admin = make_user('admin', is_admin=True)
+    cache.delete(PENDING_SOS_CACHE_KEY)
+    login(admin)
+
+    with count_queries() as first:
+        client.get('/admin/users')
+    with count_queries() as second:
+        client.get('/admin/users')
+    assert len(second) == len(first) - 1
+
+    # Triggering an SOS drops the cached count so the next page sees it
+    reporter = make_user('reporter')
+    login(reporter)
+    client.post('/api/sos/trigger', json={'location': 'Andheri', 'message': 'Help'})
+    assert get_pending_sos_count() == 1
+
+    report = Report.query.one()
+    login(admin)
+    client.post(f'/admin/reports/{report.id}/resolve')
+    assert get_pending_sos_count() == 0
@@ -0,0 +1,118 @@
+"""
+Small TTL cache with pluggable backends.
+
+MemoryCache keeps values in a per-process dict; RedisCache stores them in any
+Redis-compatible server (Redis, Valkey, KeyDB, a local stand-in...) so every
+web worker shares one copy. create_cache() picks the backend from a URL:
+
+    memory://                  in-process (default)
+    redis://localhost:6379/0   shared; needs the optional `redis` package
+"""
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(ABC):
+    """Interface shared by the backends: get/set/delete plus get_or_set."""
+
+    # get_or_set() lookups, per process; approximate under heavy thread contention
+    hits = 0
+    misses = 0
+
+    @abstractmethod
+    def get(self, key):
+        """Return the cached value, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove `key` if it is cached."""
+
+    def get_or_set(self, key, loader, ttl):
+        """Return the cached value, calling loader() to fill it on a miss."""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = loader()
+            self.set(key, value, ttl)
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        """get_or_set() hit and miss counts for this process."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class MemoryCache(Cache):
+    """Per-process cache; entries expire `ttl` seconds after they are set."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCache(Cache):
+    """Cache stored in a Redis-compatible server; values are JSON-encoded."""
+
+    def __init__(self, client, prefix='rideshare:'):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        # Redis expiries are whole milliseconds
+        self._client.set(self._prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+
+def create_cache(url='memory://'):
+    """
+    Build a cache from a URL (see module docstring).
+
+    Falls back to MemoryCache, with a warning, if a Redis URL is given but
+    the `redis` package is not installed.
+    """
+    if not url or url.startswith('memory://'):
+        return MemoryCache()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            logger.warning('CACHE_URL=%s needs the redis package; using an in-process cache', url)
+            return MemoryCache()
+        return RedisCache(redis.Redis.from_url(url))
+    raise ValueError(f'Unsupported cache URL: {url}')